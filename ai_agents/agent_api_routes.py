@@ -6,8 +6,12 @@ from flask import Blueprint, request, jsonify, session, render_template
 from flask_login import login_required, current_user
 import json
 import logging
-from datetime import datetime
+import uuid
 from ai_agent_engine import get_agent_engine, AgentResponse
+from model_rate_governor import model_governor
+from model_router import get_model_router
+from prompt_cache import prompt_cache
+from conversation_store import engine_conversations
 from models import db, User
 
 # Configure logging
@@ -72,38 +76,40 @@ def interact_with_agent():
                 'error': 'Agent ID and message are required'
             }), 400
         
+        # History lives server-side; the session only remembers which
+        # conversation is current for each agent
+        conversation_id = data.get('conversation_id') or _current_conversation_id(agent_id) or str(uuid.uuid4())
+        window = engine_conversations.load_window(conversation_id, user_id=current_user.id, agent_id=agent_id)
+        
         # Process request through agent engine
         engine = get_agent_engine()
         response = engine.process_request(
             agent_id=agent_id,
             user_input=user_input,
             user_id=current_user.id,
-            context=context
+            context=context,
+            history=window.to_messages(),
+            summary=window.summary
         )
         
-        # Store conversation in session for history
-        if 'agent_conversations' not in session:
-            session['agent_conversations'] = {}
-        
-        if agent_id not in session['agent_conversations']:
-            session['agent_conversations'][agent_id] = []
-        
-        session['agent_conversations'][agent_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'user_message': user_input,
-            'agent_response': response.content,
-            'model_used': response.model_used,
-            'processing_time': response.processing_time
-        })
-        
-        # Keep only last 10 messages per agent
-        if len(session['agent_conversations'][agent_id]) > 10:
-            session['agent_conversations'][agent_id] = session['agent_conversations'][agent_id][-10:]
+        engine_conversations.append_turn(
+            conversation_id, user_input, response.content,
+            user_id=current_user.id,
+            agent_id=agent_id,
+            model_used=response.model_used,
+            processing_time=response.processing_time
+        )
         
-        session.modified = True
+        conversation_ids = session.get('agent_conversation_ids', {})
+        if conversation_ids.get(agent_id) != conversation_id:
+            conversation_ids[agent_id] = conversation_id
+            session['agent_conversation_ids'] = conversation_ids
+        # Drop the history older sessions kept in the cookie
+        session.pop('agent_conversations', None)
         
         return jsonify({
             'success': True,
+            'conversation_id': conversation_id,
             'response': {
                 'content': response.content,
                 'agent_name': response.agent_name,
@@ -129,17 +135,39 @@ def interact_with_agent():
             'error': 'Internal server error'
         }), 500
 
+@agent_api.route('/rate-limits', methods=['GET'])
+@login_required
+def get_rate_limit_metrics():
+    """Provider rate limit lanes, queue-wait and routing metrics (admin only)"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    
+    return jsonify({
+        'success': True,
+        'metrics': model_governor.get_metrics(),
+        'routing': get_model_router().get_metrics(),
+        'prompt_cache': prompt_cache.get_stats()
+    })
+
+def _current_conversation_id(agent_id):
+    """Conversation the user last had with an agent in this session"""
+    return session.get('agent_conversation_ids', {}).get(agent_id)
+
 @agent_api.route('/conversation/<agent_id>', methods=['GET'])
 @login_required
 def get_conversation_history(agent_id):
     """Get conversation history for specific agent"""
     try:
-        conversations = session.get('agent_conversations', {})
-        agent_conversation = conversations.get(agent_id, [])
+        conversation_id = request.args.get('conversation_id') or _current_conversation_id(agent_id)
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        turns = engine_conversations.recent_turns(
+            conversation_id, limit, user_id=current_user.id, agent_id=agent_id
+        ) if conversation_id else []
         
         return jsonify({
             'success': True,
-            'conversation': agent_conversation
+            'conversation_id': conversation_id,
+            'conversation': [turn.to_dict() for turn in turns]
         })
         
     except Exception as e:
@@ -151,9 +179,12 @@ def get_conversation_history(agent_id):
 def clear_conversation(agent_id):
     """Clear conversation history for specific agent"""
     try:
-        if 'agent_conversations' in session and agent_id in session['agent_conversations']:
-            del session['agent_conversations'][agent_id]
-            session.modified = True
+        # Stored turns are kept; the next message starts a new conversation
+        conversation_ids = session.get('agent_conversation_ids', {})
+        if agent_id in conversation_ids:
+            del conversation_ids[agent_id]
+            session['agent_conversation_ids'] = conversation_ids
+        session.pop('agent_conversations', None)
         
         return jsonify({'success': True})
         
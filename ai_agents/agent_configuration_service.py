@@ -6,6 +6,7 @@ Handles "Subway-style" agent customization with optimal conversion focus
 
 import json
 import logging
+from prompt_cache import prompt_cache, CompiledPrompt
 
 # AI Model Configuration Options
 AI_MODEL_OPTIONS = {
@@ -242,7 +243,19 @@ def create_customized_agent(user_id, agent_id, customization_options):
 
 def build_enhanced_prompt(base_prompt, response_style, expertise_focus, interaction_mode, language):
     """Build enhanced prompt incorporating all customization options"""
-    
+    return compile_customization_prompt(
+        base_prompt, response_style, expertise_focus, interaction_mode, language
+    ).text
+
+def compile_customization_prompt(base_prompt, response_style, expertise_focus, interaction_mode,
+                                 language) -> CompiledPrompt:
+    """Versioned customization prompt, composed once per distinct set of options"""
+    return prompt_cache.get_or_compile(
+        'customization', _compose_customization_prompt,
+        base_prompt, response_style, expertise_focus, interaction_mode, language
+    )
+
+def _compose_customization_prompt(base_prompt, response_style, expertise_focus, interaction_mode, language):
     enhanced_prompt = base_prompt or "You are a helpful AI assistant."
     
     # Add response style modifier
@@ -12,9 +12,9 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
-from app import db
-from models import AIAgent, AgentCustomization
+from models import AgentCustomization
 from agent_quality_service import quality_service
+from agent_catalog_upsert import catalog_upserter
 from model_service import TaskDomain, TaskComplexity
 
 logging.basicConfig(level=logging.INFO)
@@ -915,42 +915,33 @@ class AgentExpansionOrchestrator:
         """Store created agents in database"""
         logger.info("💾 Storing agents in database...")
         
-        stored_count = 0
+        agent_rows = []
         for agent_data in self.created_agents:
             try:
-                # Check if agent already exists
-                existing = AIAgent.query.filter_by(name=agent_data["name"]).first()
-                if existing:
-                    logger.debug(f"Agent {agent_data['name']} already exists, skipping")
-                    continue
-                
-                # Create new agent
-                agent = AIAgent()
-                agent.name = agent_data["name"]
-                agent.category = agent_data["category"]
-                agent.description = agent_data["description"]
-                agent.base_prompt = agent_data["base_prompt"]
-                agent.base_price = agent_data["base_price"]
-                agent.capabilities = agent_data["capabilities"]
-                agent.is_active = agent_data["is_active"]
-                agent.specialization_tags = ",".join(agent_data["specialization_tags"])
-                agent.expertise_level = agent_data["expertise"]["years_of_experience"]
-                agent.practical_projects = agent_data["expertise"]["practical_projects"]
-                agent.collaboration_rate = agent_data["expertise"]["collaboration_rate"]
-                agent.compliance_frameworks = ",".join(agent_data["compliance_frameworks"])
-                
-                db.session.add(agent)
-                stored_count += 1
-                
+                agent_rows.append({
+                    "name": agent_data["name"],
+                    "category": agent_data["category"],
+                    "description": agent_data["description"],
+                    "base_prompt": agent_data["base_prompt"],
+                    "base_price": agent_data["base_price"],
+                    "capabilities": agent_data["capabilities"],
+                    "is_active": agent_data["is_active"],
+                    "specialization_tags": ",".join(agent_data["specialization_tags"]),
+                    "expertise_level": agent_data["expertise"]["years_of_experience"],
+                    "practical_projects": agent_data["expertise"]["practical_projects"],
+                    "collaboration_rate": agent_data["expertise"]["collaboration_rate"],
+                    "compliance_frameworks": ",".join(agent_data["compliance_frameworks"])
+                })
             except Exception as e:
                 logger.error(f"Error storing agent {agent_data['name']}: {e}")
         
         try:
-            db.session.commit()
-            logger.info(f"✅ Successfully stored {stored_count} new agents in database")
+            # Existing agents keep their edited fields; only new names are inserted
+            result = catalog_upserter.upsert(agent_rows, update_existing=False)
+            logger.info(f"✅ Successfully stored {result.inserted} new agents in database "
+                        f"({len(result.skipped)} already existed)")
         except Exception as e:
             logger.error(f"Database commit failed: {e}")
-            db.session.rollback()
 
 def expand_ai_agent_catalog() -> Dict[str, Any]:
     """Main function to expand AI agent catalog"""
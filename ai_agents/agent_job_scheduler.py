@@ -0,0 +1,427 @@
+"""
+Agent Job Scheduler
+Heap-based interval scheduler for the automated agent management jobs.
+Jobs are single-flight, can be serialized through lock groups, only run
+in the process holding the leader lock, and report duration/lag metrics.
+"""
+
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+# Missed-run policies
+CATCH_UP_SKIP = 'skip'      # drop runs missed by more than the grace period
+CATCH_UP_ONCE = 'once'      # run once for any number of missed slots
+CATCH_UP_ALL = 'all'        # replay every missed slot (up to max_catch_up)
+
+# How often a follower retries the leader lock
+LEADER_RETRY_SECONDS = 30
+
+class FileLeaderLock:
+    """Leader election between processes on one host via an exclusive flock"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = None
+
+    def acquire(self) -> bool:
+        if self._handle is not None:
+            return True
+        if not HAS_FCNTL:
+            # No flock on this platform: behave as a single-process deployment
+            self._handle = True
+            return True
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def is_held(self) -> bool:
+        return self._handle is not None
+
+    def release(self):
+        if self._handle is None:
+            return
+        if HAS_FCNTL:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+        self._handle = None
+
+class AdvisoryLeaderLock:
+    """Leader election across hosts via a PostgreSQL session advisory lock"""
+
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        # Stable 32-bit key derived from the lock name
+        self.key = zlib.crc32(name.encode('utf-8'))
+        self._connection = None
+
+    def acquire(self) -> bool:
+        if self.is_held():
+            return True
+        connection = self.engine.connect()
+        try:
+            acquired = connection.exec_driver_sql(f"SELECT pg_try_advisory_lock({self.key})").scalar()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def is_held(self) -> bool:
+        if self._connection is None:
+            return False
+        try:
+            # The lock lives as long as the session; a dropped connection loses it
+            self._connection.exec_driver_sql("SELECT 1")
+            return True
+        except Exception:
+            self._connection = None
+            return False
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.exec_driver_sql(f"SELECT pg_advisory_unlock({self.key})")
+        finally:
+            self._connection.close()
+            self._connection = None
+
+def leader_lock_for(engine, name: str):
+    """Advisory lock on PostgreSQL, otherwise a lock file in the temp directory"""
+    if engine is not None and engine.dialect.name == 'postgresql':
+        return AdvisoryLeaderLock(engine, name)
+    return FileLeaderLock(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    failures: int = 0
+    overlaps_skipped: int = 0
+    missed_runs: int = 0
+    total_duration: float = 0.0
+    last_duration: Optional[float] = None
+    max_duration: float = 0.0
+    last_lag: Optional[float] = None
+    max_lag: float = 0.0
+    last_started: Optional[float] = None
+    last_finished: Optional[float] = None
+    last_error: Optional[str] = None
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable
+    interval: float
+    group: Optional[str] = None
+    catch_up: str = CATCH_UP_ONCE
+    misfire_grace: float = 300.0
+    max_catch_up: int = 3
+    run_on_start: bool = False
+    next_run: float = 0.0
+    running: bool = False
+    pending_runs: int = 0
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+class JobScheduler:
+    """
+    Dispatcher thread sleeping on a condition until the earliest job is due.
+
+    Due jobs run on a small worker pool. A job that is still running when
+    its next slot comes up is skipped for that slot (single-flight), and
+    jobs sharing a group never run concurrently. Only the process holding
+    the leader lock dispatches; the others keep retrying the lock so one
+    takes over if the leader exits. Last run times are persisted so a new
+    leader applies each job's catch-up policy to slots missed while no
+    process was leading.
+    """
+
+    def __init__(self, name: str, leader_lock=None, state_path: Optional[str] = None,
+                 max_workers: int = 4, leader_retry_seconds: float = LEADER_RETRY_SECONDS):
+        self.name = name
+        self.leader_lock = leader_lock
+        self.state_path = state_path
+        self.leader_retry_seconds = leader_retry_seconds
+        self.max_workers = max_workers
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._group_locks: Dict[str, threading.Lock] = {}
+        self._state_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._is_leader = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def add_job(self, name: str, func: Callable, seconds: float = 0, minutes: float = 0,
+                hours: float = 0, group: Optional[str] = None, catch_up: str = CATCH_UP_ONCE,
+                misfire_grace: float = 300.0, max_catch_up: int = 3, run_on_start: bool = False) -> ScheduledJob:
+        """Register (or replace) a job running every interval"""
+        interval = timedelta(seconds=seconds, minutes=minutes, hours=hours).total_seconds()
+        if interval <= 0:
+            raise ValueError("Job interval must be positive")
+
+        job = ScheduledJob(name=name, func=func, interval=interval, group=group, catch_up=catch_up,
+                           misfire_grace=misfire_grace, max_catch_up=max_catch_up, run_on_start=run_on_start)
+        with self._condition:
+            self.jobs[name] = job
+            if group:
+                self._group_locks.setdefault(group, threading.Lock())
+            if self._is_leader:
+                self._schedule_initial(job, self._load_state())
+            self._condition.notify()
+        return job
+
+    def start(self):
+        with self._condition:
+            if self.is_running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-job")
+            self._thread = threading.Thread(target=self._dispatch_loop, name=f"{self.name}-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait: bool = False):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if wait and self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        with self._condition:
+            self._release_leadership()
+            self._heap.clear()
+
+    def clear(self):
+        with self._condition:
+            self.jobs.clear()
+            self._heap.clear()
+
+    # Scheduling
+
+    def _push(self, job: ScheduledJob, run_at: float):
+        job.next_run = run_at
+        self._sequence += 1
+        heapq.heappush(self._heap, (run_at, self._sequence, job.name))
+
+    def _schedule_initial(self, job: ScheduledJob, state: Dict[str, float]):
+        now = time.time()
+        last_run = state.get(job.name)
+        if last_run is not None:
+            # May lie in the past; the catch-up policy decides at dispatch
+            self._push(job, last_run + job.interval)
+        else:
+            self._push(job, now if job.run_on_start else now + job.interval)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+
+                if not self._ensure_leadership():
+                    self._condition.wait(self.leader_retry_seconds)
+                    continue
+
+                if not self._heap:
+                    self._condition.wait(self.leader_retry_seconds)
+                    continue
+
+                run_at, _, job_name = self._heap[0]
+                delay = run_at - time.time()
+                if delay > 0:
+                    # Woken early by add_job/stop, or re-checks leadership
+                    self._condition.wait(min(delay, self.leader_retry_seconds))
+                    continue
+
+                heapq.heappop(self._heap)
+                job = self.jobs.get(job_name)
+                if job is None or job.next_run != run_at:
+                    continue  # removed or replaced since it was queued
+                self._dispatch(job, run_at)
+
+    def _dispatch(self, job: ScheduledJob, scheduled_at: float):
+        now = time.time()
+        lag = now - scheduled_at
+        missed = int(lag // job.interval)
+        # Next slot strictly in the future, aligned to the original cadence
+        self._push(job, scheduled_at + (missed + 1) * job.interval)
+
+        if missed:
+            job.metrics.missed_runs += missed
+            logger.warning(f"Job {job.name} missed {missed} run(s); catch-up policy '{job.catch_up}'")
+
+        if job.catch_up == CATCH_UP_SKIP and lag > job.misfire_grace:
+            job.metrics.missed_runs += 1
+            return
+
+        runs = 1 + min(missed, job.max_catch_up) if job.catch_up == CATCH_UP_ALL else 1
+
+        if job.running:
+            job.metrics.overlaps_skipped += 1
+            logger.info(f"Job {job.name} still running; skipping this slot")
+            return
+
+        job.running = True
+        job.pending_runs = runs
+        job.metrics.last_lag = lag
+        job.metrics.max_lag = max(job.metrics.max_lag, lag)
+        self._executor.submit(self._run_job, job)
+
+    def _run_job(self, job: ScheduledJob):
+        group_lock = self._group_locks.get(job.group) if job.group else None
+        try:
+            while job.pending_runs > 0 and self._running:
+                job.pending_runs -= 1
+                if group_lock is not None:
+                    group_lock.acquire()
+                started = time.time()
+                job.metrics.last_started = started
+                try:
+                    job.func()
+                    job.metrics.last_error = None
+                except Exception as e:
+                    job.metrics.failures += 1
+                    job.metrics.last_error = str(e)
+                    logger.error(f"Job {job.name} failed: {e}")
+                finally:
+                    if group_lock is not None:
+                        group_lock.release()
+                    finished = time.time()
+                    duration = finished - started
+                    job.metrics.runs += 1
+                    job.metrics.last_finished = finished
+                    job.metrics.last_duration = duration
+                    job.metrics.total_duration += duration
+                    job.metrics.max_duration = max(job.metrics.max_duration, duration)
+                self._save_state()
+        finally:
+            job.running = False
+
+    # Leadership and persisted state
+
+    def _ensure_leadership(self) -> bool:
+        if self.leader_lock is None:
+            acquired = True
+        elif self._is_leader:
+            acquired = self.leader_lock.is_held()
+        else:
+            try:
+                acquired = self.leader_lock.acquire()
+            except Exception as e:
+                logger.error(f"Leader lock for {self.name} unavailable: {e}")
+                acquired = False
+
+        if acquired and not self._is_leader:
+            logger.info(f"Scheduler {self.name} acquired leadership in process {os.getpid()}")
+            state = self._load_state()
+            self._heap.clear()
+            for job in self.jobs.values():
+                self._schedule_initial(job, state)
+        elif not acquired and self._is_leader:
+            logger.warning(f"Scheduler {self.name} lost leadership")
+            self._heap.clear()
+
+        self._is_leader = acquired
+        return acquired
+
+    def _release_leadership(self):
+        if self.leader_lock is not None and self._is_leader:
+            self.leader_lock.release()
+        self._is_leader = False
+
+    def _load_state(self) -> Dict[str, float]:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as fh:
+                return json.load(fh).get('last_runs', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable scheduler state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        # Merge into the stored runs so jobs not registered here keep theirs
+        with self._state_lock:
+            last_runs = self._load_state()
+            last_runs.update({name: job.metrics.last_started for name, job in self.jobs.items()
+                              if job.metrics.last_started is not None})
+            temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as fh:
+                    json.dump({'last_runs': last_runs}, fh)
+                os.replace(temp_path, self.state_path)
+            except OSError as e:
+                logger.warning(f"Could not persist scheduler state: {e}")
+
+    # Metrics
+
+    def get_metrics(self) -> Dict:
+        jobs = {}
+        for name, job in self.jobs.items():
+            metrics = job.metrics
+            jobs[name] = {
+                'interval_seconds': job.interval,
+                'group': job.group,
+                'catch_up': job.catch_up,
+                'running': job.running,
+                'next_run': _isoformat(job.next_run) if self._is_leader else None,
+                'runs': metrics.runs,
+                'failures': metrics.failures,
+                'overlaps_skipped': metrics.overlaps_skipped,
+                'missed_runs': metrics.missed_runs,
+                'last_started': _isoformat(metrics.last_started),
+                'last_duration_seconds': metrics.last_duration,
+                'avg_duration_seconds': metrics.total_duration / metrics.runs if metrics.runs else None,
+                'max_duration_seconds': metrics.max_duration,
+                'last_lag_seconds': metrics.last_lag,
+                'max_lag_seconds': metrics.max_lag,
+                'last_error': metrics.last_error
+            }
+        return {
+            'scheduler': self.name,
+            'running': self.is_running,
+            'is_leader': self._is_leader,
+            'process_id': os.getpid(),
+            'jobs': jobs
+        }
@@ -5,8 +5,10 @@ Central service for managing and coordinating all specialized AI agents
 
 import os
 import json
+import time
 import asyncio
-from datetime import datetime, timezone
+import itertools
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import logging
 from flask import Blueprint, request, jsonify, render_template
@@ -15,7 +17,10 @@ from enterprise_policy_enforcement import require_dlp_scan, require_permission
 from dataclasses import asdict
 
 # Import all agent modules
-from ai_agents_core import orchestrator, AgentTask, AgentPriority, log_agent_performance, get_agent_analytics
+from ai_agents_core import (orchestrator, AgentTask, AgentPriority, log_agent_performance, get_agent_analytics,
+                            aggregate_performance_logs, flush_agent_performance_logs)
+from agent_performance_rollups import GRANULARITIES, get_rollup_series
+from orchestration_metrics import TaskMetrics
 from enterprise_agents import EnterpriseArchitectureAgent, CodeQualityAssuranceAgent
 from developer_ecosystem_agents import SDKDevelopmentAgent, APIArchitectureAgent
 from premium_service_agents import EnterpriseOnboardingAgent, CustomAITrainingAgent
@@ -28,20 +33,45 @@ logger = logging.getLogger(__name__)
 # Create Flask Blueprint for agent orchestration
 agent_orchestration_bp = Blueprint('agent_orchestration', __name__, url_prefix='/agents')
 
+DASHBOARD_CACHE_TTL_SECONDS = 5.0
+
+# Dashboard categories: (key, description, agent ids)
+AGENT_CATEGORIES = [
+    ("enterprise_optimization", "System architecture and code quality optimization",
+     ["enterprise_architect_001", "code_qa_specialist_001"]),
+    ("developer_ecosystem", "SDK development and API optimization",
+     ["sdk_developer_001", "api_architect_001"]),
+    ("premium_services", "Enterprise onboarding and custom AI solutions",
+     ["enterprise_onboarding_001", "custom_ai_trainer_001"]),
+    ("integration_automation", "Enterprise integration and process automation",
+     ["enterprise_connector_001", "workflow_automation_001"]),
+    ("analytics_intelligence", "Predictive analytics and business intelligence",
+     ["predictive_analytics_001", "executive_dashboard_001"]),
+    ("partnership_revenue", "Partnership development and revenue optimization",
+     ["strategic_partnership_001", "marketplace_operations_001"])
+]
+
 class AgentOrchestrationService:
     """Service class for managing AI agent orchestration and coordination"""
     
     def __init__(self):
         self.orchestrator = orchestrator
-        self.task_history = []
-        self.performance_metrics = {}
+        # Bounded recent history plus streaming counters/latency sketches
+        self.metrics = TaskMetrics()
+        self.task_history = self.metrics.recent
+        self._task_sequence = itertools.count()
+        self._dashboard_cache = None
+        self._dashboard_cached_at = 0.0
         
     async def execute_agent_task(self, agent_type: str, task_config: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a task using the appropriate specialized agent"""
+        task = None
+        agent_id = agent_type
+        started = time.perf_counter()
         try:
             # Create task from configuration
             task = AgentTask(
-                id=f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.task_history)}",
+                id=f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{next(self._task_sequence)}",
                 name=task_config.get("name", "Agent Task"),
                 description=task_config.get("description", ""),
                 priority=AgentPriority(task_config.get("priority", "medium")),
@@ -50,27 +80,28 @@ class AgentOrchestrationService:
                 estimated_duration=task_config.get("estimated_duration", 30)
             )
             
-            # Assign task to appropriate agent
-            agent_id = self.orchestrator.assign_task(task, preferred_agent_id=agent_type)
+            # Run this task on its agent once a slot is free
+            started = time.perf_counter()
+            agent_id, result = await self.orchestrator.run_task(task, preferred_agent_id=agent_type)
+            latency = time.perf_counter() - started
+            success = bool(result and result.get("success"))
             
-            # Execute task
-            result = await self.orchestrator.execute_next_task()
-            
-            # Log performance
-            if result and result.get("success"):
-                log_agent_performance(
-                    agent_id=agent_id,
-                    agent_name=task_config.get("agent_name", "Unknown"),
-                    task_id=task.id,
-                    task_name=task.name,
-                    priority=task.priority.value,
-                    execution_time=task.estimated_duration,
-                    success=result.get("success", False),
-                    quality_score=result.get("quality_score", 0.8)
-                )
+            # Log performance for successes and failures alike
+            log_agent_performance(
+                agent_id=agent_id,
+                agent_name=task_config.get("agent_name", "Unknown"),
+                task_id=task.id,
+                task_name=task.name,
+                priority=task.priority.value,
+                execution_time=latency,
+                success=success,
+                quality_score=result.get("quality_score", 0.8) if success else 0.0,
+                error_details=None if success else (result or {}).get("error", "Task execution failed"),
+                task_type=task.requirements.get("type")
+            )
             
-            # Store in history
-            self.task_history.append({
+            # Store in history and live metrics
+            self.metrics.record(agent_id, success, latency, {
                 "task": asdict(task),
                 "result": result,
                 "timestamp": datetime.now(timezone.utc).isoformat()
@@ -80,6 +111,24 @@ class AgentOrchestrationService:
             
         except Exception as e:
             logger.error(f"Agent orchestration error: {str(e)}")
+            if task is not None:
+                latency = time.perf_counter() - started
+                log_agent_performance(
+                    agent_id=agent_id,
+                    agent_name=task_config.get("agent_name", "Unknown"),
+                    task_id=task.id,
+                    task_name=task.name,
+                    priority=task.priority.value,
+                    execution_time=latency,
+                    success=False,
+                    error_details=str(e),
+                    task_type=task.requirements.get("type")
+                )
+                self.metrics.record(agent_id, False, latency, {
+                    "task": asdict(task),
+                    "result": {"success": False, "error": str(e)},
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                })
             return {"success": False, "error": str(e)}
     
     def get_available_agents(self) -> Dict[str, Any]:
@@ -107,7 +156,11 @@ class AgentOrchestrationService:
         return agents_info
     
     def get_system_dashboard_data(self) -> Dict[str, Any]:
-        """Get comprehensive system dashboard data"""
+        """Get comprehensive system dashboard data (cached for DASHBOARD_CACHE_TTL_SECONDS)"""
+        now = time.monotonic()
+        if self._dashboard_cache is not None and now - self._dashboard_cached_at < DASHBOARD_CACHE_TTL_SECONDS:
+            return self._dashboard_cache
+        
         system_status = self.orchestrator.get_system_status()
         
         dashboard_data = {
@@ -120,42 +173,21 @@ class AgentOrchestrationService:
                 "system_health": system_status["system_health"]
             },
             "agent_categories": {
-                "enterprise_optimization": {
-                    "agents": ["enterprise_architect_001", "code_qa_specialist_001"],
-                    "description": "System architecture and code quality optimization",
-                    "performance": self._get_category_performance(["enterprise_architect_001", "code_qa_specialist_001"])
-                },
-                "developer_ecosystem": {
-                    "agents": ["sdk_developer_001", "api_architect_001"],
-                    "description": "SDK development and API optimization",
-                    "performance": self._get_category_performance(["sdk_developer_001", "api_architect_001"])
-                },
-                "premium_services": {
-                    "agents": ["enterprise_onboarding_001", "custom_ai_trainer_001"],
-                    "description": "Enterprise onboarding and custom AI solutions",
-                    "performance": self._get_category_performance(["enterprise_onboarding_001", "custom_ai_trainer_001"])
-                },
-                "integration_automation": {
-                    "agents": ["enterprise_connector_001", "workflow_automation_001"],
-                    "description": "Enterprise integration and process automation",
-                    "performance": self._get_category_performance(["enterprise_connector_001", "workflow_automation_001"])
-                },
-                "analytics_intelligence": {
-                    "agents": ["predictive_analytics_001", "executive_dashboard_001"],
-                    "description": "Predictive analytics and business intelligence",
-                    "performance": self._get_category_performance(["predictive_analytics_001", "executive_dashboard_001"])
-                },
-                "partnership_revenue": {
-                    "agents": ["strategic_partnership_001", "marketplace_operations_001"],
-                    "description": "Partnership development and revenue optimization",
-                    "performance": self._get_category_performance(["strategic_partnership_001", "marketplace_operations_001"])
+                key: {
+                    "agents": agent_ids,
+                    "description": description,
+                    "performance": self._get_category_performance(agent_ids)
                 }
+                for key, description, agent_ids in AGENT_CATEGORIES
             },
+            "live_metrics": self.metrics.snapshot(),
             "recent_activities": self._get_recent_activities(),
             "performance_trends": self._get_performance_trends(),
-            "recommendations": self._get_system_recommendations()
+            "recommendations": self._get_system_recommendations(system_status)
         }
         
+        self._dashboard_cache = dashboard_data
+        self._dashboard_cached_at = now
         return dashboard_data
     
     def _get_category_performance(self, agent_ids: List[str]) -> Dict[str, Any]:
@@ -166,47 +198,59 @@ class AgentOrchestrationService:
         if not category_agents:
             return {"avg_success_rate": 0.0, "total_tasks": 0, "avg_performance": 0.0}
         
-        metrics = [agent.get_performance_metrics() for agent in category_agents]
+        avg_success_rate = sum(agent.success_rate for agent in category_agents) / len(category_agents)
+        live = self.metrics.group_summary(agent_ids)
         
         return {
-            "avg_success_rate": sum(m["success_rate"] for m in metrics) / len(metrics),
-            "total_tasks": sum(m["tasks_completed"] for m in metrics),
-            "avg_performance": sum(m["success_rate"] for m in metrics) / len(metrics),
-            "agent_count": len(category_agents)
+            "avg_success_rate": avg_success_rate,
+            "total_tasks": sum(agent.tasks_run for agent in category_agents),
+            "avg_performance": avg_success_rate,
+            "agent_count": len(category_agents),
+            "error_rate": live["error_rate"],
+            "p50_latency": live["p50_latency"],
+            "p95_latency": live["p95_latency"]
         }
     
     def _get_recent_activities(self) -> List[Dict[str, Any]]:
         """Get recent agent activities"""
-        recent_tasks = self.task_history[-10:] if self.task_history else []
-        
         activities = []
-        for task_entry in reversed(recent_tasks):  # Most recent first
+        for task_entry in self.metrics.recent_tasks(10):  # Most recent first
+            result = task_entry["result"] or {}
             activities.append({
                 "timestamp": task_entry["timestamp"],
                 "task_name": task_entry["task"]["name"],
                 "agent_type": task_entry["task"]["requirements"].get("agent_type", "unknown"),
-                "status": "completed" if task_entry["result"].get("success") else "failed",
+                "status": "completed" if result.get("success") else "failed",
                 "duration": task_entry["task"]["estimated_duration"]
             })
         
         return activities
     
-    def _get_performance_trends(self) -> Dict[str, Any]:
-        """Get performance trend data"""
-        # This would typically pull from database analytics
-        # For now, return mock trend data
+    def _get_performance_trends(self, days: int = 7) -> Dict[str, Any]:
+        """Get performance trend data from the daily rollups"""
+        try:
+            flush_agent_performance_logs()
+            end = datetime.utcnow()
+            series = get_rollup_series("day", end - timedelta(days=days - 1), end)
+        except Exception as e:
+            logger.error(f"Performance trends error: {str(e)}")
+            series = []
+        
         return {
-            "success_rate_trend": [0.85, 0.87, 0.89, 0.91, 0.88, 0.92, 0.94],
-            "task_volume_trend": [45, 52, 48, 61, 58, 67, 72],
-            "response_time_trend": [2.3, 2.1, 2.4, 2.0, 1.9, 2.2, 1.8],
-            "trend_period": "last_7_days"
+            "success_rate_trend": [round(day["success_rate"], 4) for day in series],
+            "task_volume_trend": [day["total_tasks"] for day in series],
+            "response_time_trend": [round(day["avg_execution_time"], 3) for day in series],
+            "p95_response_time_trend": [day["p95_execution_time"] for day in series],
+            "trend_days": [day["bucket_start"][:10] for day in series],
+            "trend_period": f"last_{days}_days"
         }
     
-    def _get_system_recommendations(self) -> List[Dict[str, Any]]:
+    def _get_system_recommendations(self, system_status: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Get system optimization recommendations"""
         recommendations = []
+        system_status = system_status or self.orchestrator.get_system_status()
         
-        system_health = self.orchestrator.get_system_status()["system_health"]
+        system_health = system_status["system_health"]
         
         if system_health < 0.8:
             recommendations.append({
@@ -217,7 +261,7 @@ class AgentOrchestrationService:
                 "action": "Review agent workload distribution and optimize task assignment"
             })
         
-        queued_tasks = self.orchestrator.get_system_status()["queued_tasks"]
+        queued_tasks = system_status["queued_tasks"]
         if queued_tasks > 10:
             recommendations.append({
                 "type": "capacity",
@@ -300,10 +344,41 @@ def get_analytics():
     try:
         days = request.args.get('days', 30, type=int)
         agent_id = request.args.get('agent_id')
+        task_type = request.args.get('task_type')
         
-        analytics = get_agent_analytics(agent_id=agent_id, days=days)
+        # Explicit start/end ranges are answered with a GROUP BY over the raw logs
+        if request.args.get('start'):
+            start = datetime.fromisoformat(request.args['start'])
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow()
+            groups = aggregate_performance_logs(start, end, group_by=request.args.get('group_by', 'agent_id'),
+                                                agent_id=agent_id)
+            return jsonify({"success": True, "analytics": groups})
+        
+        analytics = get_agent_analytics(agent_id=agent_id, days=days, task_type=task_type)
         return jsonify({"success": True, "analytics": analytics})
         
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         logger.error(f"Analytics error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@agent_orchestration_bp.route('/api/analytics/trends')
+def get_analytics_trends():
+    """Per-bucket task volume, success rate and p50/p95 latency from the rollups"""
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            return jsonify({"success": False, "error": f"Unknown granularity: {granularity}"}), 400
+        buckets = min(max(request.args.get('buckets', 24, type=int), 1), 500)
+        
+        flush_agent_performance_logs()
+        end = datetime.utcnow()
+        series = get_rollup_series(granularity, end - GRANULARITIES[granularity] * (buckets - 1), end,
+                                   agent_id=request.args.get('agent_id'),
+                                   task_type=request.args.get('task_type'))
+        return jsonify({"success": True, "granularity": granularity, "series": series})
+        
+    except Exception as e:
+        logger.error(f"Analytics trends error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,628 @@
+"""
+Agent Catalog QA Engine
+Incremental QA validation over the AIAgent catalog.
+Per-agent rule results are cached by content hash and catalog-wide
+aggregates are maintained incrementally, so a QA run only re-validates
+agents that changed since the previous run.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event
+from app import db
+from models import AIAgent
+from agent_quality_service import quality_service
+from agent_catalog_upsert import register_catalog_change_listener
+from agent_similarity_index import AgentSimilarityIndex, NEAR_DUPLICATE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per server-side chunk
+QA_STREAM_CHUNK_SIZE = 500
+
+# Safety net for out-of-band writes that neither bump updated_at nor go
+# through this process: the whole catalog is reconciled at this interval
+QA_FULL_RECONCILE_INTERVAL = timedelta(hours=24)
+
+@dataclass
+class RuleOutcome:
+    """Issues, recommendations and metrics produced by one QA rule"""
+    issues: List[str] = field(default_factory=list)
+    recommendations: List[str] = field(default_factory=list)
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class QAReport:
+    """QA state of the catalog after a (full or incremental) run"""
+    agent_count: int
+    outcomes: Dict[str, RuleOutcome]
+    generated_at: datetime
+    duration_seconds: float
+    revalidated_agents: int = 0
+    full_reconcile: bool = False
+
+    def outcome(self, rule_name: str) -> RuleOutcome:
+        return self.outcomes.get(rule_name) or RuleOutcome()
+
+    def issues(self, *rule_names: str) -> List[str]:
+        return [issue for name in rule_names for issue in self.outcome(name).issues]
+
+    def recommendations(self, *rule_names: str) -> List[str]:
+        return [rec for name in rule_names for rec in self.outcome(name).recommendations]
+
+    def metrics(self, rule_name: str) -> Dict[str, Any]:
+        return self.outcome(rule_name).metrics
+
+    @property
+    def ecosystem_status(self) -> Dict[str, Any]:
+        """Same shape as validate_agent_ecosystem()"""
+        return self.metrics('ecosystem_metrics')
+
+@dataclass
+class AgentQAEntry:
+    """Cached rule results for one agent, valid while its content hash matches"""
+    content_hash: int
+    results: Dict[str, Any]
+
+class QARule:
+    """
+    Base class for catalog QA rules.
+
+    evaluate() turns one agent row into a per-agent result that is cached
+    with the agent; add()/remove() fold that result in and out of the
+    rule's catalog-wide state, and summarize() reports on that state.
+    """
+    name = ''
+    columns: Tuple[str, ...] = ()
+
+    def reset(self):
+        pass
+
+    def evaluate(self, row) -> Any:
+        raise NotImplementedError
+
+    def add(self, agent_id: int, result: Any):
+        raise NotImplementedError
+
+    def remove(self, agent_id: int, result: Any):
+        raise NotImplementedError
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        raise NotImplementedError
+
+def _counter_discard(counter: Counter, key):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+class FieldValidityRule(QARule):
+    """Required text fields and minimum expertise/project counts per agent"""
+    name = 'field_validity'
+    columns = ('id', 'name', 'description', 'base_prompt', 'expertise_level', 'practical_projects')
+
+    def reset(self):
+        self.issues_by_agent: Dict[int, List[str]] = {}
+
+    def evaluate(self, row) -> List[str]:
+        issues = []
+        if not row.name or len(row.name.strip()) < 10:
+            issues.append(f"Agent {row.id}: Invalid name")
+
+        if not row.description or len(row.description.strip()) < 50:
+            issues.append(f"Agent {row.id}: Invalid description")
+
+        if not row.base_prompt or len(row.base_prompt.strip()) < 20:
+            issues.append(f"Agent {row.id}: Invalid base prompt")
+
+        if (row.expertise_level or 0) < 50:
+            issues.append(f"Agent {row.id}: Expertise level too low ({row.expertise_level})")
+
+        if (row.practical_projects or 0) < 1000:
+            issues.append(f"Agent {row.id}: Project count too low ({row.practical_projects})")
+        return issues
+
+    def add(self, agent_id: int, result: List[str]):
+        if result:
+            self.issues_by_agent[agent_id] = result
+
+    def remove(self, agent_id: int, result: List[str]):
+        self.issues_by_agent.pop(agent_id, None)
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        return RuleOutcome(issues=[
+            issue for agent_id in sorted(self.issues_by_agent) for issue in self.issues_by_agent[agent_id]
+        ])
+
+class NamingPatternRule(QARule):
+    """Flag name patterns (suffixes and digits stripped) shared by too many agents"""
+    name = 'naming_patterns'
+    columns = ('name',)
+    SUFFIXES = (' AI', ' Expert', ' Master', ' Pro')
+
+    def __init__(self, max_per_pattern: int = 5):
+        self.max_per_pattern = max_per_pattern
+
+    def reset(self):
+        self.patterns = Counter()
+
+    def evaluate(self, row) -> str:
+        pattern = row.name or ''
+        for suffix in self.SUFFIXES:
+            pattern = pattern.replace(suffix, '')
+        return ''.join([c for c in pattern if not c.isdigit()]).strip()
+
+    def add(self, agent_id: int, result: str):
+        self.patterns[result] += 1
+
+    def remove(self, agent_id: int, result: str):
+        _counter_discard(self.patterns, result)
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        outcome = RuleOutcome(metrics={'pattern_count': len(self.patterns)})
+        for pattern, count in self.patterns.items():
+            if count > self.max_per_pattern:
+                outcome.issues.append(f"Too many similar agents for pattern: {pattern} ({count} agents)")
+                outcome.recommendations.append(f"Diversify agents in {pattern} category")
+        return outcome
+
+class NearDuplicateRule(QARule):
+    """Clusters of agents with near-identical names/descriptions (MinHash/LSH)"""
+    name = 'near_duplicates'
+    columns = ('id', 'name', 'description')
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD, max_names: int = 5):
+        self.threshold = threshold
+        self.max_names = max_names
+
+    def reset(self):
+        self.index = AgentSimilarityIndex()
+
+    def evaluate(self, row) -> Tuple:
+        return (row.name, row.description)
+
+    def add(self, agent_id: int, result: Tuple):
+        self.index.upsert(agent_id, *result)
+
+    def remove(self, agent_id: int, result: Tuple):
+        self.index.remove(agent_id)
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        clusters = self.index.duplicate_clusters(self.threshold)
+        outcome = RuleOutcome(metrics={
+            'cluster_count': len(clusters),
+            'agents_in_clusters': sum(len(c.agent_ids) for c in clusters),
+            'clusters': [
+                {'agent_ids': c.agent_ids, 'names': c.names, 'similarity': c.similarity, 'pairs': c.pairs}
+                for c in clusters
+            ]
+        })
+        for cluster in clusters:
+            names = ', '.join(cluster.names[:self.max_names])
+            if len(cluster.names) > self.max_names:
+                names += f" (+{len(cluster.names) - self.max_names} more)"
+            outcome.issues.append(
+                f"Near-duplicate agents ({len(cluster.agent_ids)} agents, similarity {cluster.similarity:.2f}): {names}"
+            )
+        if clusters:
+            outcome.recommendations.append(f"Merge or differentiate {len(clusters)} near-duplicate agent clusters")
+        return outcome
+
+class PricingConsistencyRule(QARule):
+    """Price spread within each pricing tier"""
+    name = 'pricing_consistency'
+    columns = ('pricing_tier', 'base_price', 'monthly_price')
+
+    def __init__(self, max_base_range: float = 500, max_monthly_range: float = 300):
+        self.max_base_range = max_base_range
+        self.max_monthly_range = max_monthly_range
+
+    def reset(self):
+        # Price multisets per tier so min/max survive removals
+        self.tier_counts = Counter()
+        self.base_prices: Dict[str, Counter] = {}
+        self.monthly_prices: Dict[str, Counter] = {}
+
+    def evaluate(self, row) -> Tuple:
+        return (row.pricing_tier, row.base_price, row.monthly_price)
+
+    def add(self, agent_id: int, result: Tuple):
+        tier, base_price, monthly_price = result
+        self.tier_counts[tier] += 1
+        if base_price is not None:
+            self.base_prices.setdefault(tier, Counter())[base_price] += 1
+        if monthly_price is not None:
+            self.monthly_prices.setdefault(tier, Counter())[monthly_price] += 1
+
+    def remove(self, agent_id: int, result: Tuple):
+        tier, base_price, monthly_price = result
+        _counter_discard(self.tier_counts, tier)
+        if base_price is not None:
+            _counter_discard(self.base_prices[tier], base_price)
+        if monthly_price is not None:
+            _counter_discard(self.monthly_prices[tier], monthly_price)
+
+    @staticmethod
+    def _spread(prices: Optional[Counter]) -> float:
+        return max(prices) - min(prices) if prices else 0
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        outcome = RuleOutcome()
+        for tier, count in self.tier_counts.items():
+            if count < 2:
+                continue
+
+            base_range = self._spread(self.base_prices.get(tier))
+            monthly_range = self._spread(self.monthly_prices.get(tier))
+
+            # Check for excessive price variation within tier
+            if base_range > self.max_base_range:
+                outcome.issues.append(f"Excessive base price variation in {tier} tier: ${base_range}")
+
+            if monthly_range > self.max_monthly_range:
+                outcome.issues.append(f"Excessive monthly price variation in {tier} tier: ${monthly_range}")
+
+            outcome.metrics[tier] = {'agents': count, 'base_price_range': base_range,
+                                     'monthly_price_range': monthly_range}
+        return outcome
+
+class ExpertiseThresholdRule(QARule):
+    """Per-agent compliance with the quality standards plus expertise statistics"""
+    name = 'expertise_thresholds'
+    columns = ('id', 'name', 'category', 'expertise_level', 'practical_projects', 'collaboration_rate')
+
+    def reset(self):
+        self.compliant = 0
+        self.quality_distribution = {tier: 0 for tier in quality_service.standards.QUALITY_TIERS}
+        self.upgrade_candidates: Dict[int, Dict] = {}
+        self.experience = Counter()
+        self.projects = Counter()
+        self.collaboration = Counter()
+        self.projects_total = 0
+        self.collaboration_total = 0.0
+
+    def evaluate(self, row) -> Dict:
+        compliance_result = quality_service._check_agent_compliance(row)
+        result = {
+            'tier': None,
+            'candidate': None,
+            'experience': row.expertise_level,
+            'projects': row.practical_projects,
+            'collaboration': row.collaboration_rate
+        }
+        if compliance_result['is_compliant']:
+            result['tier'] = quality_service._determine_quality_tier(row.expertise_level)
+        else:
+            result['candidate'] = {
+                'agent_id': row.id,
+                'name': row.name,
+                'category': row.category,
+                'current_experience': row.expertise_level,
+                'current_projects': row.practical_projects,
+                'current_collaboration': row.collaboration_rate,
+                'issues': compliance_result['issues'],
+                'recommended_upgrades': compliance_result['recommended_upgrades']
+            }
+        return result
+
+    def add(self, agent_id: int, result: Dict):
+        if result['candidate'] is None:
+            self.compliant += 1
+            self.quality_distribution[result['tier']] += 1
+        else:
+            self.upgrade_candidates[agent_id] = result['candidate']
+        self.experience[result['experience']] += 1
+        self.projects[result['projects']] += 1
+        self.collaboration[result['collaboration']] += 1
+        self.projects_total += result['projects']
+        self.collaboration_total += result['collaboration']
+
+    def remove(self, agent_id: int, result: Dict):
+        if result['candidate'] is None:
+            self.compliant -= 1
+            self.quality_distribution[result['tier']] -= 1
+        else:
+            self.upgrade_candidates.pop(agent_id, None)
+        _counter_discard(self.experience, result['experience'])
+        _counter_discard(self.projects, result['projects'])
+        _counter_discard(self.collaboration, result['collaboration'])
+        self.projects_total -= result['projects']
+        self.collaboration_total -= result['collaboration']
+
+    def _median_experience(self, agent_count: int) -> int:
+        # Same element as sorted(values)[n // 2], walked over distinct values
+        position = agent_count // 2
+        for value in sorted(self.experience):
+            position -= self.experience[value]
+            if position < 0:
+                return value
+        return 0
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        total_experience = sum(value * count for value, count in self.experience.items())
+        return RuleOutcome(metrics={
+            'compliant_agents': self.compliant,
+            'non_compliant_agents': len(self.upgrade_candidates),
+            'upgrade_candidates': [self.upgrade_candidates[agent_id] for agent_id in sorted(self.upgrade_candidates)],
+            'quality_distribution': dict(self.quality_distribution),
+            'experience_statistics': {
+                'min_experience': min(self.experience, default=0),
+                'max_experience': max(self.experience, default=0),
+                'avg_experience': total_experience / agent_count if agent_count else 0,
+                'median_experience': self._median_experience(agent_count)
+            },
+            'project_statistics': {
+                'min_projects': min(self.projects, default=0),
+                'max_projects': max(self.projects, default=0),
+                'avg_projects': self.projects_total / agent_count if agent_count else 0,
+                'total_projects': self.projects_total
+            },
+            'collaboration_statistics': {
+                'min_collaboration': min(self.collaboration, default=0),
+                'max_collaboration': max(self.collaboration, default=0),
+                'avg_collaboration': self.collaboration_total / agent_count if agent_count else 0
+            },
+            'total_expertise_years': total_experience
+        })
+
+class EcosystemMetricsRule(QARule):
+    """Catalog size, category distribution and average quality metrics"""
+    name = 'ecosystem_metrics'
+    columns = ('category', 'expertise_level', 'practical_projects', 'collaboration_rate')
+    AVERAGED = ('expertise_level', 'practical_projects', 'collaboration_rate')
+
+    def reset(self):
+        self.categories = Counter()
+        # Like SQL AVG(), NULLs are left out of the averages
+        self.sums = {column: 0.0 for column in self.AVERAGED}
+        self.counts = {column: 0 for column in self.AVERAGED}
+
+    def evaluate(self, row) -> Tuple:
+        return (row.category,) + tuple(getattr(row, column) for column in self.AVERAGED)
+
+    def _fold(self, result: Tuple, sign: int):
+        for column, value in zip(self.AVERAGED, result[1:]):
+            if value is not None:
+                self.sums[column] += sign * value
+                self.counts[column] += sign
+
+    def add(self, agent_id: int, result: Tuple):
+        self.categories[result[0]] += 1
+        self._fold(result, 1)
+
+    def remove(self, agent_id: int, result: Tuple):
+        _counter_discard(self.categories, result[0])
+        self._fold(result, -1)
+
+    def _average(self, column: str) -> float:
+        return self.sums[column] / self.counts[column] if self.counts[column] else 0
+
+    def summarize(self, agent_count: int) -> RuleOutcome:
+        return RuleOutcome(metrics={
+            'total_agents': agent_count,
+            'milestone_status': 'COMPLETED' if agent_count >= 1000 else 'IN_PROGRESS',
+            'milestone_progress': f'{agent_count}/1000 ({(agent_count/1000)*100:.1f}%)',
+            'category_distribution': dict(self.categories),
+            'quality_metrics': {
+                'average_expertise_years': round(self._average('expertise_level'), 1),
+                'average_projects': round(self._average('practical_projects')),
+                'average_collaboration_rate': round(self._average('collaboration_rate'), 2)
+            },
+            'validation_timestamp': datetime.now().isoformat()
+        })
+
+class AgentQAEngine:
+    """
+    Keeps QA results for every active agent and brings them up to date
+    from the delta since the last run.
+
+    Changed agents are found through an updated_at watermark plus the IDs
+    reported by ORM events and bulk catalog upserts in this process. A
+    changed agent whose content hash still matches its cached entry is not
+    re-evaluated. If the tracked agent count drifts from the database, or
+    the reconcile interval has passed, the catalog is streamed once more
+    (still only re-evaluating agents whose content changed).
+    """
+
+    def __init__(self, chunk_size: int = QA_STREAM_CHUNK_SIZE,
+                 reconcile_interval: timedelta = QA_FULL_RECONCILE_INTERVAL):
+        self.chunk_size = chunk_size
+        self.reconcile_interval = reconcile_interval
+        self.rules: Dict[str, QARule] = {}
+        self._lock = threading.RLock()
+        self._dirty_lock = threading.Lock()
+        self._dirty_ids: Set[int] = set()
+        self._entries: Dict[int, AgentQAEntry] = {}
+        self._watermark: Optional[datetime] = None
+        self._last_reconcile: Optional[datetime] = None
+        self._report: Optional[QAReport] = None
+
+    def register_rule(self, rule: QARule):
+        """Add or replace a rule; the next run() re-evaluates the catalog"""
+        with self._lock:
+            self.rules[rule.name] = rule
+            self._entries.clear()
+            for registered in self.rules.values():
+                registered.reset()
+            self._last_reconcile = None
+            self._report = None
+
+    def _column_names(self) -> List[str]:
+        return sorted({column for rule in self.rules.values() for column in rule.columns} - {'id'})
+
+    # Change tracking
+
+    def mark_agents_changed(self, agent_ids: Iterable[int]):
+        """Queue agents for re-validation, e.g. after a bulk catalog upsert"""
+        with self._dirty_lock:
+            self._dirty_ids.update(agent_ids)
+
+    def _on_agent_written(self, mapper, connection, target):
+        if target.id is not None:
+            self.mark_agents_changed([target.id])
+
+    def _take_dirty_ids(self) -> Set[int]:
+        with self._dirty_lock:
+            dirty_ids, self._dirty_ids = self._dirty_ids, set()
+        return dirty_ids
+
+    def catalog_version(self) -> Tuple:
+        """Cheap aggregate fingerprint of the catalog"""
+        total, active, max_id, last_update = db.session.query(
+            db.func.count(AIAgent.id),
+            db.func.sum(db.case((AIAgent.is_active == True, 1), else_=0)),
+            db.func.max(AIAgent.id),
+            db.func.max(AIAgent.updated_at)
+        ).one()
+        return (total, int(active or 0), max_id, last_update)
+
+    def active_agent_count(self) -> int:
+        return self.catalog_version()[1]
+
+    # Per-agent cache maintenance
+
+    def _apply_row(self, row, column_names: List[str]) -> bool:
+        """Re-evaluate one active agent if its content changed"""
+        content_hash = hash(tuple(getattr(row, column) for column in column_names))
+        entry = self._entries.get(row.id)
+        if entry is not None and entry.content_hash == content_hash:
+            return False
+
+        if entry is not None:
+            for name, rule in self.rules.items():
+                rule.remove(row.id, entry.results[name])
+
+        results = {name: rule.evaluate(row) for name, rule in self.rules.items()}
+        for name, rule in self.rules.items():
+            rule.add(row.id, results[name])
+        self._entries[row.id] = AgentQAEntry(content_hash, results)
+        return True
+
+    def _drop_agent(self, agent_id: int) -> bool:
+        entry = self._entries.pop(agent_id, None)
+        if entry is None:
+            return False
+        for name, rule in self.rules.items():
+            rule.remove(agent_id, entry.results[name])
+        return True
+
+    def _advance_watermark(self, updated_at: Optional[datetime]):
+        if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _reconcile(self) -> int:
+        """Stream every active agent once; unchanged agents keep their cached results"""
+        self._take_dirty_ids()
+        column_names = self._column_names()
+        query_columns = [AIAgent.id, AIAgent.updated_at] + [getattr(AIAgent, c) for c in column_names]
+
+        seen: Set[int] = set()
+        revalidated = 0
+        rows = db.session.query(*query_columns)\
+            .filter(AIAgent.is_active == True)\
+            .yield_per(self.chunk_size)
+        for row in rows:
+            seen.add(row.id)
+            self._advance_watermark(row.updated_at)
+            if self._apply_row(row, column_names):
+                revalidated += 1
+
+        for agent_id in set(self._entries) - seen:
+            self._drop_agent(agent_id)
+            revalidated += 1
+
+        self._last_reconcile = datetime.now()
+        return revalidated
+
+    def _apply_delta(self) -> int:
+        """Re-validate agents changed since the last run"""
+        changed_ids = self._take_dirty_ids()
+        if self._watermark is not None:
+            # >= so rows sharing the watermark timestamp are not missed;
+            # the content hash filters out the ones already validated
+            for agent_id, updated_at in db.session.query(AIAgent.id, AIAgent.updated_at)\
+                    .filter(AIAgent.updated_at >= self._watermark):
+                changed_ids.add(agent_id)
+                self._advance_watermark(updated_at)
+
+        if not changed_ids:
+            return 0
+
+        column_names = self._column_names()
+        query_columns = [AIAgent.id, AIAgent.is_active, AIAgent.updated_at] + \
+            [getattr(AIAgent, c) for c in column_names]
+
+        revalidated = 0
+        pending = list(changed_ids)
+        found: Set[int] = set()
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            for row in db.session.query(*query_columns).filter(AIAgent.id.in_(chunk)):
+                found.add(row.id)
+                self._advance_watermark(row.updated_at)
+                if row.is_active:
+                    changed = self._apply_row(row, column_names)
+                else:
+                    changed = self._drop_agent(row.id)
+                revalidated += int(changed)
+
+        for agent_id in changed_ids - found:
+            revalidated += int(self._drop_agent(agent_id))
+        return revalidated
+
+    # Reports
+
+    def run(self, force: bool = False) -> QAReport:
+        """Bring the QA state up to date and return the report"""
+        with self._lock:
+            started = time.perf_counter()
+            full_reconcile = force or self._last_reconcile is None or \
+                datetime.now() - self._last_reconcile >= self.reconcile_interval
+
+            if full_reconcile:
+                revalidated = self._reconcile()
+            else:
+                revalidated = self._apply_delta()
+                # Out-of-band inserts/deactivations show up as a count mismatch
+                if self.active_agent_count() != len(self._entries):
+                    logger.info("QA cache out of sync with catalog; reconciling")
+                    revalidated += self._reconcile()
+                    full_reconcile = True
+
+            if self._report is None or revalidated:
+                agent_count = len(self._entries)
+                self._report = QAReport(
+                    agent_count=agent_count,
+                    outcomes={name: rule.summarize(agent_count) for name, rule in self.rules.items()},
+                    generated_at=datetime.now(),
+                    duration_seconds=time.perf_counter() - started,
+                    revalidated_agents=revalidated,
+                    full_reconcile=full_reconcile
+                )
+                logger.info(f"QA {'reconcile' if full_reconcile else 'delta'} run re-validated "
+                            f"{revalidated} of {agent_count} agents in {self._report.duration_seconds:.3f}s")
+            elif self._report.revalidated_agents:
+                # Nothing changed: same outcomes, but report this run's (empty) delta
+                self._report = replace(self._report, revalidated_agents=0, full_reconcile=full_reconcile,
+                                       duration_seconds=time.perf_counter() - started)
+            return self._report
+
+    def agent_results(self, agent_id: int) -> Optional[Dict[str, Any]]:
+        """Cached per-rule results for one agent, as of the last run"""
+        entry = self._entries.get(agent_id)
+        return dict(entry.results) if entry is not None else None
+
+# Global engine with the default rule set
+qa_engine = AgentQAEngine()
+for _rule in (FieldValidityRule(), NamingPatternRule(), NearDuplicateRule(), PricingConsistencyRule(),
+              ExpertiseThresholdRule(), EcosystemMetricsRule()):
+    qa_engine.register_rule(_rule)
+
+event.listen(AIAgent, 'after_insert', qa_engine._on_agent_written)
+event.listen(AIAgent, 'after_update', qa_engine._on_agent_written)
+event.listen(AIAgent, 'after_delete', qa_engine._on_agent_written)
+register_catalog_change_listener(qa_engine.mark_agents_changed)
@@ -44,41 +44,18 @@ class AgentQualityAuditService:
     def audit_all_agents(self) -> Dict[str, any]:
         """Audit all existing agents against quality standards"""
         try:
-            all_agents = db.session.query(AIAgent).filter_by(is_active=True).all()
+            # Compliance is evaluated in the shared streamed QA pass (memoized per catalog version)
+            from agent_qa_engine import qa_engine
+            report = qa_engine.run()
+            audit = report.metrics('expertise_thresholds')
             audit_results = {
-                'total_agents': len(all_agents),
-                'compliant_agents': 0,
-                'non_compliant_agents': 0,
-                'upgrade_candidates': [],
-                'quality_distribution': {
-                    'standard': 0,
-                    'premium': 0,
-                    'elite': 0,
-                    'legendary': 0
-                },
+                'total_agents': report.agent_count,
+                'compliant_agents': audit['compliant_agents'],
+                'non_compliant_agents': audit['non_compliant_agents'],
+                'upgrade_candidates': list(audit['upgrade_candidates']),
+                'quality_distribution': dict(audit['quality_distribution']),
                 'issues_found': []
             }
-            
-            for agent in all_agents:
-                compliance_result = self._check_agent_compliance(agent)
-                
-                if compliance_result['is_compliant']:
-                    audit_results['compliant_agents'] += 1
-                    # Categorize by quality tier
-                    tier = self._determine_quality_tier(agent.expertise_level)
-                    audit_results['quality_distribution'][tier] += 1
-                else:
-                    audit_results['non_compliant_agents'] += 1
-                    audit_results['upgrade_candidates'].append({
-                        'agent_id': agent.id,
-                        'name': agent.name,
-                        'category': agent.category,
-                        'current_experience': agent.expertise_level,
-                        'current_projects': agent.practical_projects,
-                        'current_collaboration': agent.collaboration_rate,
-                        'issues': compliance_result['issues'],
-                        'recommended_upgrades': compliance_result['recommended_upgrades']
-                    })
                     
             logger.info(f"Agent quality audit completed: {audit_results['compliant_agents']}/{audit_results['total_agents']} agents compliant")
             return audit_results
@@ -291,27 +268,12 @@ class AgentQualityAuditService:
             total_agents = audit_results.get('total_agents', 0)
             compliant_percentage = (audit_results.get('compliant_agents', 0) / total_agents * 100) if total_agents > 0 else 0
             
-            # Get experience distribution
-            all_agents = db.session.query(AIAgent).filter_by(is_active=True).all()
-            experience_stats = {
-                'min_experience': min((a.expertise_level for a in all_agents), default=0),
-                'max_experience': max((a.expertise_level for a in all_agents), default=0),
-                'avg_experience': sum(a.expertise_level for a in all_agents) / len(all_agents) if all_agents else 0,
-                'median_experience': sorted([a.expertise_level for a in all_agents])[len(all_agents)//2] if all_agents else 0
-            }
-            
-            project_stats = {
-                'min_projects': min((a.practical_projects for a in all_agents), default=0),
-                'max_projects': max((a.practical_projects for a in all_agents), default=0),
-                'avg_projects': sum(a.practical_projects for a in all_agents) / len(all_agents) if all_agents else 0,
-                'total_projects': sum(a.practical_projects for a in all_agents)
-            }
-            
-            collaboration_stats = {
-                'min_collaboration': min((a.collaboration_rate for a in all_agents), default=0),
-                'max_collaboration': max((a.collaboration_rate for a in all_agents), default=0),
-                'avg_collaboration': sum(a.collaboration_rate for a in all_agents) / len(all_agents) if all_agents else 0
-            }
+            # Distribution statistics come from the same QA pass as the audit
+            from agent_qa_engine import qa_engine
+            audit = qa_engine.run().metrics('expertise_thresholds')
+            experience_stats = audit['experience_statistics']
+            project_stats = audit['project_statistics']
+            collaboration_stats = audit['collaboration_statistics']
             
             return {
                 'compliance_overview': {
@@ -330,7 +292,7 @@ class AgentQualityAuditService:
                     'min_projects': self.standards.min_practical_projects,
                     'min_collaboration': self.standards.min_collaboration_rate
                 },
-                'total_expertise_years': sum(a.expertise_level for a in all_agents),
+                'total_expertise_years': audit['total_expertise_years'],
                 'total_practical_projects': project_stats['total_projects'],
                 'last_updated': datetime.utcnow().isoformat()
             }
@@ -0,0 +1,326 @@
+"""
+AI Agent Catalog Search Index
+In-process BM25 inverted index over the AIAgent catalog with facet counts
+and incremental updates on agent create/update/delete. Writes made in this
+process are applied once they commit; writes made by other workers or
+scripts are picked up by polling an updated_at/row-count watermark.
+"""
+
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from models import AIAgent
+from agent_quality_service import QualityStandards
+from agent_catalog_upsert import register_catalog_change_listener
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# How often a search checks the catalog for writes from other processes
+SEARCH_INDEX_SYNC_SECONDS = 5.0
+# updated_at is set at flush time, so a transaction that commits after our
+# poll can carry an older timestamp; re-read this much history every poll
+SEARCH_INDEX_SYNC_OVERLAP = 60
+
+# Session.info key with agent IDs written by the session's transaction
+SEARCH_INDEX_PENDING_KEY = 'agent_search_index_pending_ids'
+
+# Field weights for the BM25F-style term frequency
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'specialization_tags': 2.0,
+    'capabilities': 1.5,
+    'description': 1.0
+}
+
+FACET_FIELDS = ('category', 'pricing_tier', 'expertise_band')
+
+# Only the columns the index needs are loaded when (re)building
+INDEXED_COLUMNS = (
+    AIAgent.id, AIAgent.name, AIAgent.description, AIAgent.capabilities,
+    AIAgent.specialization_tags, AIAgent.category, AIAgent.pricing_tier,
+    AIAgent.expertise_level, AIAgent.is_active, AIAgent.approval_status
+)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase alphanumeric tokens"""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+def expertise_band(experience_years: Optional[int]) -> str:
+    """Map an expertise level onto the quality tiers used by agent QA"""
+    if experience_years is None:
+        return 'unrated'
+    for tier, criteria in QualityStandards.QUALITY_TIERS.items():
+        if criteria['min_exp'] <= experience_years <= criteria['max_exp']:
+            return tier
+    return 'below_standard'
+
+@dataclass
+class IndexedAgent:
+    """Searchable projection of an AIAgent row"""
+    agent_id: int
+    length: float
+    term_frequencies: Dict[str, float]
+    facets: Dict[str, str]
+    is_active: bool = True
+    approval_status: Optional[str] = None
+
+@dataclass
+class SearchResult:
+    agent_ids: List[int]
+    scores: List[float]
+    total: int
+    facets: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+class AgentSearchIndex:
+    """Thread-safe BM25 inverted index with facet counting"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._documents: Dict[int, IndexedAgent] = {}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._total_length = 0.0
+        self._length_norms: Optional[Dict[int, float]] = None
+        self._built = False
+        # Newest AIAgent.updated_at seen when the index last synced
+        self._watermark = None
+        self._last_sync = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._documents)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def _make_document(self, row) -> IndexedAgent:
+        term_frequencies: Counter = Counter()
+        for field_name, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(row, field_name, None)):
+                term_frequencies[token] += weight
+
+        return IndexedAgent(
+            agent_id=row.id,
+            length=sum(term_frequencies.values()),
+            term_frequencies=dict(term_frequencies),
+            facets={
+                'category': row.category or 'uncategorized',
+                'pricing_tier': row.pricing_tier or 'standard',
+                'expertise_band': expertise_band(row.expertise_level)
+            },
+            is_active=bool(row.is_active) if row.is_active is not None else True,
+            approval_status=getattr(row, 'approval_status', None)
+        )
+
+    def _remove_unlocked(self, agent_id: int):
+        document = self._documents.pop(agent_id, None)
+        if document is None:
+            return
+        self._total_length -= document.length
+        self._length_norms = None
+        for term in document.term_frequencies:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(agent_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def upsert(self, row):
+        """Add or replace one agent; accepts an AIAgent or a column row"""
+        document = self._make_document(row)
+        with self._lock:
+            self._remove_unlocked(document.agent_id)
+            self._documents[document.agent_id] = document
+            self._total_length += document.length
+            self._length_norms = None
+            for term, frequency in document.term_frequencies.items():
+                self._postings[term][document.agent_id] = frequency
+
+    def remove(self, agent_id: int):
+        with self._lock:
+            self._remove_unlocked(agent_id)
+
+    def build(self, rows: Iterable):
+        """Replace the whole index from an iterable of agent rows"""
+        with self._lock:
+            self._documents.clear()
+            self._postings.clear()
+            self._total_length = 0.0
+            self._length_norms = None
+            for row in rows:
+                self.upsert(row)
+            self._built = True
+
+    def refresh_agents(self, agent_ids: Iterable[int]):
+        """
+        Re-read and re-index specific agents, e.g. after a bulk catalog
+        upsert. Uses a connection of its own, since listeners run after the
+        writer's session has committed and that session can't emit SQL.
+        """
+        agent_ids = list(agent_ids)
+        found = set()
+        with db.engine.connect() as connection:
+            for start in range(0, len(agent_ids), 500):
+                for row in connection.execute(
+                    select(*INDEXED_COLUMNS).where(AIAgent.id.in_(agent_ids[start:start + 500]))
+                ):
+                    self.upsert(row)
+                    found.add(row.id)
+        for agent_id in set(agent_ids) - found:
+            self.remove(agent_id)
+
+    def build_from_database(self):
+        with db.engine.connect() as connection:
+            self._watermark = connection.execute(select(func.max(AIAgent.updated_at))).scalar()
+            rows = connection.execution_options(yield_per=500).execute(select(*INDEXED_COLUMNS))
+            self.build(rows)
+        self._last_sync = time.monotonic()
+        logger.info(f"Agent search index built with {self.size} agents")
+
+    def sync_with_database(self):
+        """
+        Pick up agents written by other processes since the last sync. A row
+        count that differs from the index (deletes elsewhere, or rows written
+        without updated_at) falls back to a full rebuild.
+        """
+        with db.engine.connect() as connection:
+            watermark, row_count = connection.execute(
+                select(func.max(AIAgent.updated_at), func.count(AIAgent.id))
+            ).one()
+            if row_count != self.size:
+                self.build_from_database()
+                return
+            if watermark is None:
+                return
+            query = select(AIAgent.id)
+            if self._watermark is not None:
+                query = query.where(AIAgent.updated_at >= self._watermark - timedelta(seconds=SEARCH_INDEX_SYNC_OVERLAP))
+            changed_ids = connection.execute(query).scalars().all()
+        self.refresh_agents(changed_ids)
+        self._watermark = watermark
+
+    def ensure_built(self):
+        """Build on first use; afterwards sync with other processes' writes every SEARCH_INDEX_SYNC_SECONDS"""
+        if not self._built:
+            self.build_from_database()
+            return
+        now = time.monotonic()
+        if now - self._last_sync < SEARCH_INDEX_SYNC_SECONDS:
+            return
+        self._last_sync = now
+        try:
+            self.sync_with_database()
+        except Exception as e:
+            logger.error(f"Agent search index sync failed: {e}")
+
+    def _get_length_norms(self) -> Dict[int, float]:
+        """BM25 length normalisation per agent, recomputed only after index changes"""
+        if self._length_norms is None:
+            average_length = self._total_length / len(self._documents) or 1.0
+            self._length_norms = {
+                agent_id: self.k1 * (1 - self.b + self.b * document.length / average_length)
+                for agent_id, document in self._documents.items()
+            }
+        return self._length_norms
+
+    def search(self, query: str = '', filters: Optional[Dict[str, str]] = None,
+               limit: int = 20, offset: int = 0, active_only: bool = True,
+               approved_only: bool = False) -> SearchResult:
+        """
+        Rank agents by BM25 for the query (all matching agents when empty).
+
+        Facet counts cover every agent matching the query and the other
+        facet filters, so each facet shows what selecting it would yield.
+        """
+        filters = {name: value for name, value in (filters or {}).items() if value}
+        terms = list(dict.fromkeys(tokenize(query)))
+
+        with self._lock:
+            document_count = len(self._documents)
+            if not document_count:
+                return SearchResult([], [], 0, {name: {} for name in FACET_FIELDS})
+
+            if terms:
+                norms = self._get_length_norms()
+                k1_plus_one = self.k1 + 1
+                scores: Dict[int, float] = defaultdict(float)
+                for term in terms:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for agent_id, frequency in postings.items():
+                        scores[agent_id] += idf * frequency * k1_plus_one / (frequency + norms[agent_id])
+            else:
+                scores = {agent_id: 0.0 for agent_id in self._documents}
+
+            facets = {name: Counter() for name in FACET_FIELDS}
+            filter_items = list(filters.items())
+            matched = []
+            for agent_id, score in scores.items():
+                document = self._documents[agent_id]
+                if active_only and not document.is_active:
+                    continue
+                if approved_only and document.approval_status != 'approved':
+                    continue
+                document_facets = document.facets
+                mismatched = [name for name, value in filter_items if document_facets.get(name) != value]
+                if not mismatched:
+                    for facet_name in FACET_FIELDS:
+                        facets[facet_name][document_facets[facet_name]] += 1
+                    matched.append((-score, agent_id))
+                elif len(mismatched) == 1:
+                    # Counts toward the one facet whose filter it fails
+                    facet_name = mismatched[0]
+                    facets[facet_name][document_facets[facet_name]] += 1
+
+        page = heapq.nsmallest(offset + limit, matched)[offset:]
+        return SearchResult(
+            agent_ids=[agent_id for _, agent_id in page],
+            scores=[round(-negative_score, 4) for negative_score, _ in page],
+            total=len(matched),
+            facets={name: dict(counts.most_common()) for name, counts in facets.items()}
+        )
+
+# Global index instance
+agent_search_index = AgentSearchIndex()
+
+# Incremental index maintenance on agent writes: flush events only record
+# the IDs on the writing session, and the index re-reads them after commit,
+# so a rolled back write never reaches the index
+def _on_agent_written(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.id is not None:
+        session.info.setdefault(SEARCH_INDEX_PENDING_KEY, set()).add(target.id)
+
+def _on_commit(session):
+    agent_ids = session.info.pop(SEARCH_INDEX_PENDING_KEY, None)
+    if agent_ids and agent_search_index.is_built:
+        agent_search_index.refresh_agents(agent_ids)
+
+def _on_rollback(session):
+    session.info.pop(SEARCH_INDEX_PENDING_KEY, None)
+
+def _on_catalog_bulk_change(agent_ids):
+    if agent_search_index.is_built:
+        agent_search_index.refresh_agents(agent_ids)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(AIAgent, _event_name, _on_agent_written)
+event.listen(Session, 'after_commit', _on_commit)
+event.listen(Session, 'after_rollback', _on_rollback)
+register_catalog_change_listener(_on_catalog_bulk_change)
@@ -2,8 +2,14 @@ import json
 import logging
 import uuid
 from datetime import datetime
-from models import db, AIAgent, AgentCustomization, AgentConversation, User, Revenue
-from ai_service import openai_client
+from sqlalchemy import func
+from models import db, AIAgent, AgentCustomization, User, Revenue
+from agent_search_index import agent_search_index
+from model_router import get_model_router, ModelRouterError
+from prompt_cache import prompt_cache
+from conversation_store import customization_conversations
+from conversation_models import AgentCustomizationStats
+from conversation_archive import get_conversation_page
 
 def get_all_agents():
     """Get all active AI agents"""
@@ -23,6 +29,19 @@ def get_all_agents():
         logging.error(f"Error getting agents: {e}")
         return []
 
+def _agent_details(agent):
+    return {
+        'id': agent.id,
+        'name': agent.name,
+        'description': agent.description,
+        'category': agent.category,
+        'pricing_tier': agent.pricing_tier,
+        'base_price': agent.base_price,
+        'monthly_price': agent.monthly_price,
+        'capabilities': agent.capabilities.split(', ') if agent.capabilities else [],
+        'base_prompt': agent.base_prompt
+    }
+
 def get_agent_by_id(agent_id):
     """Get specific agent details"""
     try:
@@ -30,17 +49,7 @@ def get_agent_by_id(agent_id):
         if not agent:
             return None
             
-        return {
-            'id': agent.id,
-            'name': agent.name,
-            'description': agent.description,
-            'category': agent.category,
-            'pricing_tier': agent.pricing_tier,
-            'base_price': agent.base_price,
-            'monthly_price': agent.monthly_price,
-            'capabilities': agent.capabilities.split(', ') if agent.capabilities else [],
-            'base_prompt': agent.base_prompt
-        }
+        return _agent_details(agent)
     except Exception as e:
         logging.error(f"Error getting agent {agent_id}: {e}")
         return None
@@ -49,11 +58,37 @@ def get_agents_by_category(category):
     """Get agents filtered by category"""
     try:
         agents = AIAgent.query.filter_by(category=category).all()
-        return [get_agent_by_id(agent.id) for agent in agents]
+        return [_agent_details(agent) for agent in agents]
     except Exception as e:
         logging.error(f"Error getting agents for category {category}: {e}")
         return []
 
+def search_agents(query='', category=None, pricing_tier=None, expertise_band=None, limit=20, offset=0):
+    """Full-text search over the agent catalog with facet counts"""
+    try:
+        agent_search_index.ensure_built()
+        result = agent_search_index.search(
+            query,
+            filters={'category': category, 'pricing_tier': pricing_tier, 'expertise_band': expertise_band},
+            limit=limit,
+            offset=offset
+        )
+        
+        agents = {agent.id: agent for agent in AIAgent.query.filter(AIAgent.id.in_(result.agent_ids)).all()} \
+            if result.agent_ids else {}
+        
+        return {
+            'agents': [
+                dict(_agent_details(agents[agent_id]), score=score)
+                for agent_id, score in zip(result.agent_ids, result.scores) if agent_id in agents
+            ],
+            'total': result.total,
+            'facets': result.facets
+        }
+    except Exception as e:
+        logging.error(f"Error searching agents for '{query}': {e}")
+        return {'agents': [], 'total': 0, 'facets': {}}
+
 def create_agent_customization(user_id, agent_id, custom_name, custom_prompt=None, branding_config=None):
     """Create a customized instance of an AI agent for a user"""
     try:
@@ -94,19 +129,27 @@ def create_agent_customization(user_id, agent_id, custom_name, custom_prompt=Non
 def get_user_agent_customizations(user_id):
     """Get all agent customizations for a user"""
     try:
-        customizations = AgentCustomization.query.filter_by(user_id=user_id).all()
+        # Agent names and denormalized counters come back in the same query
+        customizations = db.session.query(
+            AgentCustomization, AIAgent.name,
+            AgentCustomizationStats.conversation_count, AgentCustomizationStats.last_message_at
+        ).outerjoin(
+            AIAgent, AIAgent.id == AgentCustomization.agent_id
+        ).outerjoin(
+            AgentCustomizationStats, AgentCustomizationStats.customization_id == AgentCustomization.id
+        ).filter(AgentCustomization.user_id == user_id).all()
         result = []
         
-        for custom in customizations:
-            agent = AIAgent.query.get(custom.agent_id)
+        for custom, agent_name, conversation_count, last_message_at in customizations:
             result.append({
                 'id': custom.id,
-                'agent_name': agent.name if agent else 'Unknown',
+                'agent_name': agent_name or 'Unknown',
                 'custom_name': custom.custom_name,
                 'api_key': custom.api_key,
                 'deployment_url': f"/api/agents/{custom.id}/chat",
                 'created_at': custom.created_at.strftime('%Y-%m-%d %H:%M'),
-                'conversation_count': len(custom.conversations)
+                'conversation_count': conversation_count or 0,
+                'last_message_at': last_message_at.strftime('%Y-%m-%d %H:%M') if last_message_at else None
             })
             
         return result
@@ -125,37 +168,47 @@ def chat_with_agent(customization_id, user_message, conversation_id=None):
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
             
-        # Get the custom prompt or fall back to base prompt
-        system_prompt = customization.custom_prompt
+        # Get the custom prompt or fall back to base prompt; compiled once per
+        # prompt text so every call sends the same cacheable system block
+        prompt_text = customization.custom_prompt
+        if not prompt_text:
+            agent = AIAgent.query.get(customization.agent_id)
+            prompt_text = (agent.base_prompt if agent else None) or "You are a helpful AI assistant."
+        system_prompt = prompt_cache.get_or_compile(f"customization:{customization.id}", str.strip, prompt_text)
+        
+        # Prior turns that fit the context budget, plus a summary of older ones
+        window = customization_conversations.load_window(conversation_id, customization_id=customization_id)
+        user_content = user_message
+        if window.summary:
+            user_content = f"EARLIER IN THIS CONVERSATION:\n{window.summary}\n\n{user_message}"
         
-        # Make OpenAI API call
-        if not openai_client:
+        try:
+            result = get_model_router().complete(
+                [
+                    {"role": "system", "content": system_prompt.text},
+                    *window.to_messages(),
+                    {"role": "user", "content": user_content}
+                ],
+                request_class='interactive',
+                preference=customization.ai_model or 'gpt-4o',
+                tenant=customization.user_id,
+                max_tokens=1000,
+                temperature=0.7
+            )
+        except ModelRouterError as e:
+            logging.error(f"No model available for agent chat: {e}")
             return {
                 'response': 'AI service is currently unavailable. Please check API configuration.',
                 'conversation_id': conversation_id
             }
-            
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
         
-        agent_response = response.choices[0].message.content
+        agent_response = result.content
         
         # Save conversation to database
-        conversation = AgentConversation(
-            customization_id=customization_id,
-            conversation_id=conversation_id,
-            user_message=user_message,
-            agent_response=agent_response
+        customization_conversations.append_turn(
+            conversation_id, user_message, agent_response,
+            customization_id=customization_id
         )
-        db.session.add(conversation)
-        db.session.commit()
         
         return {
             'response': agent_response,
@@ -169,22 +222,20 @@ def chat_with_agent(customization_id, user_message, conversation_id=None):
             'conversation_id': conversation_id or str(uuid.uuid4())
         }
 
-def get_conversation_history(customization_id, limit=50):
-    """Get conversation history for an agent customization"""
+def get_conversation_history(customization_id, limit=50, before_id=None, conversation_id=None):
+    """Get conversation history for an agent customization, oldest first; pass the
+    smallest returned id as before_id to load the previous page"""
+    page = get_conversation_history_page(customization_id, limit, before_id, conversation_id)
+    return list(reversed(page['messages']))
+
+def get_conversation_history_page(customization_id, limit=50, before_id=None, conversation_id=None):
+    """Keyset page of history (newest first) with the cursor for the next page"""
     try:
-        conversations = AgentConversation.query.filter_by(
-            customization_id=customization_id
-        ).order_by(AgentConversation.created_at.desc()).limit(limit).all()
-        
-        return [{
-            'user_message': conv.user_message,
-            'agent_response': conv.agent_response,
-            'timestamp': conv.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for conv in reversed(conversations)]
+        return get_conversation_page(customization_id, limit, before_id, conversation_id)
         
     except Exception as e:
         logging.error(f"Error getting conversation history: {e}")
-        return []
+        return {'messages': [], 'has_more': False, 'next_before_id': None}
 
 def process_agent_purchase(agent_id, user_id, stripe_payment_id):
     """Process successful agent license purchase"""
@@ -230,7 +281,10 @@ def get_agent_analytics():
         total_agent_sales = len(agent_revenues)
         
         # Get conversation stats
-        total_conversations = AgentConversation.query.count()
+        # Counters include turns already moved to archive segments
+        total_conversations = int(db.session.query(
+            func.sum(AgentCustomizationStats.conversation_count)
+        ).scalar() or 0)
         active_customizations = AgentCustomization.query.count()
         
         # Get category breakdown
@@ -4,17 +4,31 @@ Permanent automated system for ensuring agent generation consistency and quality
 """
 
 import logging
-import schedule
-import time
+import os
+import tempfile
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Callable
-from threading import Thread
-import threading
 
 from app import app, db
 from models import AIAgent
 from ai_agent_generation_service import generate_agents_for_topic, validate_agent_ecosystem
 from qa_agent_management_service import run_qa_validation, auto_fix_agent_issues
+from agent_qa_engine import qa_engine
+from agent_job_scheduler import JobScheduler, leader_lock_for, CATCH_UP_ONCE, CATCH_UP_SKIP
+from conversation_archive import archive_old_conversations
+from agent_performance_rollups import prune_rollups
+
+# One leader across processes/workers runs the jobs below
+SCHEDULER_NAME = 'agent_consistency_scheduler'
+SCHEDULER_STATE_PATH = os.environ.get(
+    'AGENT_SCHEDULER_STATE_PATH',
+    os.path.join(tempfile.gettempdir(), f'{SCHEDULER_NAME}.json')
+)
+
+# Jobs that read or write the agent catalog never overlap
+CATALOG_JOB_GROUP = 'agent_catalog'
+# Storage housekeeping (cold conversation segments, rollup retention)
+MAINTENANCE_JOB_GROUP = 'storage_maintenance'
 
 
 class AutomatedConsistencyChecker:
@@ -24,8 +38,8 @@ class AutomatedConsistencyChecker:
         self.logger = logging.getLogger(__name__)
         self.is_running = False
         self.last_check = None
-        self.check_thread = None
         self.monitoring_active = False
+        self.scheduler = JobScheduler(SCHEDULER_NAME, state_path=SCHEDULER_STATE_PATH)
         
     def start_monitoring(self):
         """Start automated monitoring and consistency checking"""
@@ -36,37 +50,36 @@ class AutomatedConsistencyChecker:
         self.logger.info("🚀 Starting automated consistency monitoring")
         self.monitoring_active = True
         
-        # Schedule regular checks
-        schedule.every(6).hours.do(self._run_comprehensive_check)
-        schedule.every(24).hours.do(self._run_milestone_check)
-        schedule.every(12).hours.do(self._run_auto_fix)
-        schedule.every(1).hours.do(self._run_quick_validation)
-        
-        # Start scheduler thread
-        self.check_thread = Thread(target=self._scheduler_loop, daemon=True)
-        self.check_thread.start()
-        
-        # Run initial check
-        self._run_comprehensive_check()
+        if self.scheduler.leader_lock is None:
+            with app.app_context():
+                self.scheduler.leader_lock = leader_lock_for(db.engine, SCHEDULER_NAME)
+        
+        # Schedule regular checks; the initial comprehensive check runs as soon
+        # as this process holds the leader lock (unless a recent run is recorded)
+        self.scheduler.add_job('comprehensive_check', self._run_comprehensive_check, hours=6,
+                               group=CATALOG_JOB_GROUP, catch_up=CATCH_UP_ONCE, run_on_start=True)
+        self.scheduler.add_job('milestone_check', self._run_milestone_check, hours=24,
+                               group=CATALOG_JOB_GROUP, catch_up=CATCH_UP_ONCE)
+        self.scheduler.add_job('auto_fix', self._run_auto_fix, hours=12,
+                               group=CATALOG_JOB_GROUP, catch_up=CATCH_UP_ONCE)
+        self.scheduler.add_job('quick_validation', self._run_quick_validation, hours=1,
+                               group=CATALOG_JOB_GROUP, catch_up=CATCH_UP_SKIP)
+        self.scheduler.add_job('archive_conversations', self._run_conversation_archive, hours=24,
+                               group=MAINTENANCE_JOB_GROUP, catch_up=CATCH_UP_ONCE)
+        self.scheduler.add_job('prune_rollups', self._run_rollup_prune, hours=24,
+                               group=MAINTENANCE_JOB_GROUP, catch_up=CATCH_UP_ONCE)
+        
+        self.scheduler.start()
         
         self.logger.info("✅ Automated consistency monitoring started")
     
     def stop_monitoring(self):
         """Stop automated monitoring"""
         self.monitoring_active = False
-        schedule.clear()
+        self.scheduler.stop()
+        self.scheduler.clear()
         self.logger.info("⏹️ Automated consistency monitoring stopped")
     
-    def _scheduler_loop(self):
-        """Main scheduler loop"""
-        while self.monitoring_active:
-            try:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
-            except Exception as e:
-                self.logger.error(f"Scheduler error: {e}")
-                time.sleep(300)  # Wait 5 minutes on error
-    
     def _run_comprehensive_check(self):
         """Run comprehensive consistency and quality check"""
         self.logger.info("🔍 Running comprehensive consistency check")
@@ -135,18 +148,46 @@ class AutomatedConsistencyChecker:
         except Exception as e:
             self.logger.error(f"Auto-fix failed: {e}")
     
+    def _run_conversation_archive(self):
+        """Move old conversation turns into compressed cold segments"""
+        self.logger.info("🗄️ Archiving old conversation turns")
+        
+        try:
+            with app.app_context():
+                archived = archive_old_conversations()
+                self.logger.info(f"Archived {archived} conversation turns")
+                
+        except Exception as e:
+            self.logger.error(f"Conversation archiving failed: {e}")
+    
+    def _run_rollup_prune(self):
+        """Remove performance rollups past their retention"""
+        self.logger.info("🧹 Pruning expired performance rollups")
+        
+        try:
+            with app.app_context():
+                removed = prune_rollups()
+                self.logger.info(f"Pruned {removed} performance rollups")
+                
+        except Exception as e:
+            self.logger.error(f"Rollup pruning failed: {e}")
+    
     def _run_quick_validation(self):
         """Run quick validation check"""
         try:
             with app.app_context():
-                ecosystem_status = validate_agent_ecosystem()
-                total_agents = ecosystem_status.get('total_agents', 0)
+                # Incremental QA run: only agents changed since the last run are re-validated
+                report = qa_engine.run()
+                total_agents = report.agent_count
                 
                 if total_agents < 1000:
                     self.logger.warning(f"Quick check: {total_agents}/1000 agents")
                 else:
                     self.logger.info(f"Quick check: {total_agents} agents - milestone maintained")
                 
+                self.logger.info(f"Quick check: {report.revalidated_agents} agents re-validated, "
+                                 f"{len(report.issues('field_validity'))} field issues open")
+                
         except Exception as e:
             self.logger.error(f"Quick validation failed: {e}")
     
@@ -201,7 +242,8 @@ class AutomatedConsistencyChecker:
         return {
             'monitoring_active': self.monitoring_active,
             'last_check': self.last_check,
-            'scheduler_running': self.check_thread and self.check_thread.is_alive() if self.check_thread else False
+            'scheduler_running': self.scheduler.is_running,
+            'scheduler': self.scheduler.get_metrics()
         }
 
 
@@ -388,7 +430,8 @@ class PermanentAgentManagementSystem:
         self.consistency_checker.start_monitoring()
         
         # Schedule trigger evaluations
-        schedule.every(3).hours.do(self._evaluate_triggers)
+        self.consistency_checker.scheduler.add_job('evaluate_triggers', self._evaluate_triggers, hours=3,
+                                                   group=CATALOG_JOB_GROUP, catch_up=CATCH_UP_ONCE)
         
         self.system_active = True
         self.logger.info("✅ Permanent Agent Management System active")
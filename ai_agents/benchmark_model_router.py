@@ -0,0 +1,166 @@
+"""
+ModelRouter Failover and Token Accounting Check
+Drives the router through FakeProvider targets, so no API keys are needed:
+calls to a failing primary must fail over to the backup, a failing target
+must trip its circuit breaker and be probed again after the cool-down, a
+timeout must bound the whole call, and token counts and costs must match
+what the provider reported, including prompt-cache hits.
+Exits non-zero when a check fails.
+
+Usage: python benchmark_model_router.py --calls 50
+"""
+
+import argparse
+import time
+from typing import Any, Dict
+
+from model_router import (BREAKER_CLOSED, BREAKER_FAILURE_THRESHOLD, BREAKER_OPEN, FakeProvider, ModelRouter,
+                          ModelRouterError)
+from model_rate_governor import estimate_tokens
+from usage_metering import calculate_cost
+
+PRIMARY = ('openai', 'gpt-4o')
+BACKUP = ('anthropic', 'claude-3-5-sonnet-20241022')
+
+def build_router(primary_latency: float = 0.001, backup_latency: float = 0.002):
+    router = ModelRouter()
+    primary = FakeProvider(PRIMARY[0], latency=primary_latency)
+    backup = FakeProvider(BACKUP[0], latency=backup_latency)
+    primary_target = router.add_target(primary, PRIMARY[1])
+    backup_target = router.add_target(backup, BACKUP[1])
+    return router, primary, backup, primary_target, backup_target
+
+def _messages(index: int = 0):
+    return [
+        {'role': 'system', 'content': "You are the 4UAI routing check assistant. " * 20},
+        {'role': 'user', 'content': f"Summarise request {index}"}
+    ]
+
+def run_failover_check(calls: int = 50) -> Dict[str, Any]:
+    """A primary that always fails: every call is served by the backup and the primary stops being tried"""
+    router, primary, _, _, _ = build_router()
+    primary.set_behavior(error_rate=1.0)
+
+    served_by = {}
+    failed_calls = 0
+    attempts = 0
+    for index in range(calls):
+        try:
+            result = router.complete(_messages(index), preference=PRIMARY[0], hedge=False)
+            served_by[result.provider] = served_by.get(result.provider, 0) + 1
+            attempts += result.attempts
+        except ModelRouterError:
+            failed_calls += 1
+
+    return {
+        'calls': calls,
+        'failed_calls': failed_calls,
+        'served_by': served_by,
+        'total_attempts': attempts,
+        'primary_calls': primary.calls,
+        'passed': (failed_calls == 0
+                   and served_by.get(BACKUP[0]) == calls
+                   and 1 <= primary.calls <= BREAKER_FAILURE_THRESHOLD)
+    }
+
+def run_breaker_check(calls: int = 50, reset_seconds: float = 0.2) -> Dict[str, Any]:
+    """A single failing target: the breaker opens at the threshold, then a half-open probe closes it"""
+    router = ModelRouter()
+    provider = FakeProvider(PRIMARY[0], latency=0.001, error_rate=1.0)
+    target = router.add_target(provider, PRIMARY[1])
+    target.breaker.reset_seconds = reset_seconds
+
+    rejected_without_call = 0
+    for index in range(calls):
+        calls_before = provider.calls
+        try:
+            router.complete(_messages(index), hedge=False)
+        except ModelRouterError:
+            if provider.calls == calls_before:
+                rejected_without_call += 1
+    provider_calls_while_failing = provider.calls
+    breaker_after_failures = target.breaker.state
+
+    # Recover; after the cool-down the next call is the probe
+    provider.set_behavior(error_rate=0.0)
+    time.sleep(reset_seconds)
+    recovered = router.complete(_messages(), hedge=False).provider == PRIMARY[0]
+
+    return {
+        'calls': calls,
+        'provider_calls_while_failing': provider_calls_while_failing,
+        'rejected_without_provider_call': rejected_without_call,
+        'breaker_after_failures': breaker_after_failures,
+        'breaker_after_recovery': target.breaker.state,
+        'recovered': recovered,
+        'passed': (provider_calls_while_failing == BREAKER_FAILURE_THRESHOLD
+                   and rejected_without_call == calls - BREAKER_FAILURE_THRESHOLD
+                   and breaker_after_failures == BREAKER_OPEN
+                   and target.breaker.state == BREAKER_CLOSED
+                   and recovered)
+    }
+
+def run_timeout_check(timeout: float = 0.2) -> Dict[str, Any]:
+    """Both targets slower than the deadline: the call fails within the deadline, not after every attempt"""
+    router, _, _, _, _ = build_router(primary_latency=1.0, backup_latency=1.0)
+    started = time.perf_counter()
+    error = None
+    try:
+        router.complete(_messages(), hedge=False, timeout=timeout)
+    except ModelRouterError as e:
+        error = str(e)
+    elapsed = time.perf_counter() - started
+    return {
+        'timeout_seconds': timeout,
+        'elapsed_seconds': round(elapsed, 3),
+        'error': error,
+        'passed': error is not None and elapsed < timeout + 0.1
+    }
+
+def run_token_accounting_check(calls: int = 5) -> Dict[str, Any]:
+    """Tokens, cache hits and cost on each result match the provider's report and the price table"""
+    router, _, _, primary_target, _ = build_router()
+    system_tokens = estimate_tokens(_messages()[0]['content'])
+    mismatches = []
+    totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0, 'cost': 0.0}
+    for index in range(calls):
+        messages = _messages(index)
+        result = router.complete(messages, preference=PRIMARY[0], hedge=False, max_tokens=200)
+        expected_prompt = estimate_tokens(*(message['content'] for message in messages))
+        expected_cached = 0 if index == 0 else system_tokens
+        expected_cost = calculate_cost(result.model, expected_prompt, result.completion_tokens, expected_cached)
+        if (result.prompt_tokens, result.cached_tokens) != (expected_prompt, expected_cached):
+            mismatches.append(f"call {index}: tokens {result.prompt_tokens}/{result.cached_tokens}, "
+                              f"expected {expected_prompt}/{expected_cached}")
+        if result.cost != expected_cost or result.total_tokens != result.prompt_tokens + result.completion_tokens:
+            mismatches.append(f"call {index}: cost {result.cost}, expected {expected_cost}")
+        totals['prompt_tokens'] += result.prompt_tokens
+        totals['completion_tokens'] += result.completion_tokens
+        totals['cached_tokens'] += result.cached_tokens
+        totals['cost'] = round(totals['cost'] + result.cost, 6)
+
+    target_stats = router.get_metrics()[primary_target.key]
+    return {
+        'calls': calls,
+        **totals,
+        'mismatches': mismatches,
+        'recorded_samples': target_stats.get('samples'),
+        'passed': not mismatches and totals['cached_tokens'] == system_tokens * (calls - 1)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check ModelRouter failover and token accounting with fake providers")
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    checks = {
+        'failover': run_failover_check(args.calls),
+        'circuit_breaker': run_breaker_check(args.calls),
+        'timeout': run_timeout_check(),
+        'token_accounting': run_token_accounting_check()
+    }
+    for name, result in checks.items():
+        print(f"{name}: {result}")
+    passed = all(result['passed'] for result in checks.values())
+    print(f"all_checks_passed: {passed}")
+    raise SystemExit(0 if passed else 1)
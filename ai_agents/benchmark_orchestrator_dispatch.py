@@ -0,0 +1,223 @@
+"""
+AgentOrchestrator Dispatch Benchmark
+Enqueues synthetic AgentTasks against a pool of no-op agents and reports
+enqueue and dispatch throughput of the priority heap / capability index.
+With --performance-log it also compares tasks/sec with AgentPerformanceLog
+writes off, buffered through AgentPerformanceLogWriter, and committed per
+row (the previous behaviour) against a scratch SQLite database.
+With --soak it runs tasks through the orchestrator and TaskMetrics in
+chunks and reports traced memory, which should stay flat.
+
+Usage: python benchmark_orchestrator_dispatch.py --tasks 100000 --agents 1000
+       python benchmark_orchestrator_dispatch.py --tasks 20000 --performance-log
+       python benchmark_orchestrator_dispatch.py --tasks 1000000 --soak
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import create_engine
+
+from ai_agents_core import (AgentCapability, AgentOrchestrator, AgentPerformanceLog, AgentPerformanceLogWriter,
+                            AgentPerformanceRollup, AgentPriority, AgentTask, BaseAIAgent)
+from orchestration_metrics import TaskMetrics
+
+INPUT_TYPES = ["codebase", "config_files", "api_specs", "system_metrics", "crm_data", "financial_data",
+               "documents", "event_stream"]
+
+class BenchmarkAgent(BaseAIAgent):
+    """Agent that completes immediately, so only orchestration cost is measured"""
+
+    # Called with (agent, task) after each task, e.g. to write a performance log row
+    on_complete: Optional[Callable] = None
+
+    async def _execute_specialized_task(self, task: AgentTask) -> Dict[str, Any]:
+        if self.on_complete:
+            self.on_complete(self, task)
+        return {"success": True, "task_id": task.id}
+
+def build_orchestrator(agent_count: int, capability_count: int, rng: random.Random) -> AgentOrchestrator:
+    orchestrator = AgentOrchestrator()
+    for index in range(agent_count):
+        capabilities = [
+            AgentCapability(
+                name=f"capability_{rng.randrange(capability_count)}",
+                description="Synthetic benchmark capability",
+                input_types=rng.sample(INPUT_TYPES, 2),
+                output_types=["report"],
+                performance_metrics={},
+                success_rate=0.9
+            )
+            for _ in range(3)
+        ]
+        orchestrator.register_agent(BenchmarkAgent(f"bench_agent_{index}", f"Bench Agent {index}",
+                                                   "benchmark", capabilities))
+    return orchestrator
+
+def build_tasks(task_count: int, capability_count: int, rng: random.Random):
+    priorities = list(AgentPriority)
+    now = datetime.now(timezone.utc)
+    return [
+        AgentTask(
+            id=f"bench_task_{index}",
+            name=f"Benchmark Task {index}",
+            description="",
+            priority=rng.choice(priorities),
+            requirements={"type": f"capability_{rng.randrange(capability_count)}"},
+            expected_output="report",
+            estimated_duration=1,
+            deadline=now + timedelta(minutes=rng.randrange(1, 600)) if rng.random() < 0.3 else None
+        )
+        for index in range(task_count)
+    ]
+
+def run_benchmark(task_count: int = 100_000, agent_count: int = 1_000, capability_count: int = 200,
+                  seed: int = 42) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    orchestrator = build_orchestrator(agent_count, capability_count, rng)
+    tasks = build_tasks(task_count, capability_count, rng)
+
+    started = time.perf_counter()
+    for task in tasks:
+        orchestrator.assign_task(task)
+    enqueue_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = asyncio.run(orchestrator.execute_pending_tasks())
+    dispatch_seconds = time.perf_counter() - started
+
+    return {
+        "tasks": task_count,
+        "agents": agent_count,
+        "completed": len(results),
+        "enqueue_seconds": round(enqueue_seconds, 3),
+        "enqueue_tasks_per_second": round(task_count / enqueue_seconds) if enqueue_seconds else None,
+        "dispatch_seconds": round(dispatch_seconds, 3),
+        "dispatch_tasks_per_second": round(len(results) / dispatch_seconds) if dispatch_seconds else None
+    }
+
+def _performance_row(agent: BaseAIAgent, task: AgentTask) -> Dict[str, Any]:
+    return {
+        'agent_id': agent.agent_id, 'agent_name': agent.name, 'task_id': task.id, 'task_name': task.name,
+        'task_priority': task.priority.value, 'task_type': task.requirements.get('type'), 'execution_time': 0.0, 'success': True,
+        'output_quality_score': 0.8, 'resource_usage': {}, 'error_details': None,
+        'created_at': datetime.utcnow()
+    }
+
+def run_logging_benchmark(task_count: int = 20_000, agent_count: int = 1_000,
+                          capability_count: int = 200) -> Dict[str, Any]:
+    """Tasks/sec with performance logging off, buffered and per-row, on SQLite"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'performance_logs.db')}")
+        AgentPerformanceLog.__table__.create(engine)
+        AgentPerformanceRollup.__table__.create(engine)
+        insert = AgentPerformanceLog.__table__.insert()
+
+        def per_row(agent, task):
+            with engine.begin() as connection:
+                connection.execute(insert, _performance_row(agent, task))
+
+        writer = AgentPerformanceLogWriter(engine=engine)
+        modes = {
+            "off": None,
+            "buffered": lambda agent, task: writer.submit(_performance_row(agent, task)),
+            "per_row_commit": per_row
+        }
+        for mode, hook in modes.items():
+            BenchmarkAgent.on_complete = staticmethod(hook) if hook else None
+            started = time.perf_counter()
+            run = run_benchmark(task_count, agent_count, capability_count)
+            if mode == "buffered":
+                writer.close()
+            elapsed = time.perf_counter() - started
+            results[mode] = {
+                "dispatch_tasks_per_second": run["dispatch_tasks_per_second"],
+                "total_seconds_including_final_flush": round(elapsed, 3)
+            }
+        BenchmarkAgent.on_complete = None
+        results["buffered"]["writer"] = writer.get_stats()
+        engine.dispose()
+    return results
+
+def run_soak(task_count: int = 1_000_000, agent_count: int = 1_000, capability_count: int = 200,
+             chunk_size: int = 10_000, seed: int = 42) -> Dict[str, Any]:
+    """
+    Push task_count tasks through one long-lived orchestrator and TaskMetrics
+    (as AgentOrchestrationService does) and sample traced memory per chunk.
+    """
+    rng = random.Random(seed)
+    orchestrator = build_orchestrator(agent_count, capability_count, rng)
+    metrics = TaskMetrics()
+
+    async def run_chunk(tasks):
+        for task in tasks:
+            orchestrator.assign_task(task)
+        while orchestrator.task_queue:
+            dispatch = orchestrator._dispatch_next()
+            if not dispatch:
+                break
+            started = time.perf_counter()
+            result = await orchestrator._run_dispatched(*dispatch)
+            metrics.record(dispatch[1].agent_id, result.get("success", False), time.perf_counter() - started, {
+                "task": asdict(dispatch[0]), "result": result, "timestamp": datetime.now(timezone.utc).isoformat()
+            })
+
+    samples = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    done = 0
+    while done < task_count:
+        size = min(chunk_size, task_count - done)
+        tasks = build_tasks(size, capability_count, rng)
+        for index, task in enumerate(tasks):
+            task.id = f"soak_task_{done + index}"
+        asyncio.run(run_chunk(tasks))
+        done += size
+        del tasks
+        gc.collect()
+        samples.append((done, tracemalloc.get_traced_memory()[0]))
+    tracemalloc.stop()
+
+    baseline = samples[min(len(samples) - 1, 1)][1]
+    return {
+        "tasks": done,
+        "seconds": round(time.perf_counter() - started, 1),
+        "traced_mb_after_first_chunks": round(baseline / 2 ** 20, 2),
+        "traced_mb_at_end": round(samples[-1][1] / 2 ** 20, 2),
+        "peak_sample_mb": round(max(size for _, size in samples) / 2 ** 20, 2),
+        "live_metrics_total_tasks": metrics.snapshot()["total_tasks"]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark AgentOrchestrator task dispatch")
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--agents", type=int, default=1_000)
+    parser.add_argument("--capabilities", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--performance-log", action="store_true",
+                        help="compare tasks/sec with performance logging off, buffered and per-row")
+    parser.add_argument("--soak", action="store_true", help="run a memory soak test over --tasks tasks")
+    args = parser.parse_args()
+
+    if args.soak:
+        for key, value in run_soak(args.tasks, args.agents, args.capabilities, seed=args.seed).items():
+            print(f"{key}: {value}")
+        raise SystemExit(0)
+
+    if args.performance_log:
+        for mode, stats in run_logging_benchmark(args.tasks, args.agents, args.capabilities).items():
+            print(f"{mode}: {stats}")
+        raise SystemExit(0)
+
+    for key, value in run_benchmark(args.tasks, args.agents, args.capabilities, args.seed).items():
+        print(f"{key}: {value}")
@@ -9,9 +9,9 @@ import json
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import requests
 from app import app, db
 from models import AIAgent
+from notification_outbox import enqueue_notification
 import anthropic
 
 class CEOAIAgent:
@@ -57,21 +57,18 @@ class CEOAIAgent:
         }
         
     def send_telegram_message(self, message: str, parse_mode: str = "Markdown") -> bool:
-        """Send message to Telegram chat"""
+        """Queue a message to the Telegram chat; the notification outbox delivers it"""
         if not self.telegram_bot_token or not self.telegram_chat_id:
             print(f"Telegram not configured: {message}")
             return False
-            
-        url = f"https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage"
-        payload = {
-            "chat_id": self.telegram_chat_id,
-            "text": message,
-            "parse_mode": parse_mode
-        }
         
         try:
-            response = requests.post(url, json=payload)
-            return response.status_code == 200
+            with app.app_context():
+                enqueue_notification('telegram', self.telegram_chat_id, {
+                    "text": message,
+                    "parse_mode": parse_mode
+                })
+            return True
         except Exception as e:
             print(f"Telegram error: {e}")
             return False
@@ -5,13 +5,28 @@ speed, quality, and minimize costs and development efforts
 """
 
 import asyncio
+import functools
+import json
 import logging
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Any, Optional
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_FANOUT_WIDTH = 16       # agents running at once
+DEFAULT_AGENT_TIMEOUT = 30.0    # seconds per agent
+DEFAULT_QUORUM = 0.75           # share of agents (or an absolute count) that ends the engagement
+
+# Backend signature: (agent_name, user_request) -> result dict
+AgentBackend = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class _QuorumReached(Exception):
+    """Raised inside the task group to cancel stragglers once enough agents answered"""
+
 @dataclass
 class AgentOrchestrationResult:
     """Result from comprehensive AI agent orchestration"""
@@ -23,13 +38,99 @@ class AgentOrchestrationResult:
     output_quality: str
     recommendations: List[str]
 
+@dataclass
+class MergedAgentResults:
+    """Agent results folded in as each agent finishes"""
+    agent_results: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    completed: int = 0
+    failed: int = 0
+    confidence_total: float = 0.0
+    cost_savings_total: float = 0.0
+    busy_time: float = 0.0
+    quality_improvements: Dict[str, None] = field(default_factory=dict)  # ordered set
+
+    def add(self, agent: str, group: str, result: Dict[str, Any], execution_time: float):
+        self.completed += 1
+        self.busy_time += execution_time
+        self.confidence_total += float(result.get('confidence', 0.0))
+        self.cost_savings_total += float(result.get('cost_savings', 0.0))
+        for improvement in result.get('quality_improvements', []):
+            self.quality_improvements.setdefault(improvement, None)
+        self.agent_results[agent] = dict(result, status='COMPLETED', group=group, execution_time=execution_time)
+
+    def add_failure(self, agent: str, group: str, status: str, execution_time: float, error: Optional[str] = None):
+        self.failed += 1
+        self.busy_time += execution_time
+        self.agent_results[agent] = {'status': status, 'group': group, 'execution_time': execution_time,
+                                     'error': error}
+
+    @property
+    def average_confidence(self) -> float:
+        return self.confidence_total / self.completed if self.completed else 0.0
+
+async def router_agent_backend(agent: str, user_request: Dict[str, Any], timeout: Optional[float] = None,
+                               executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """
+    Ask one agent persona for its contribution through the shared model
+    router. The router is synchronous and runs on executor within timeout
+    seconds; cancelling the coroutine stops it from starting further
+    attempts, while a request already in flight keeps its thread until it
+    returns or hits the deadline.
+    """
+    from model_router import get_model_router
+
+    messages = [
+        {"role": "system", "content": (
+            f"You are the {agent} in a multi-agent review. Reply with JSON only: "
+            '{"confidence": 0-1, "quality_improvements": [short strings], "cost_savings": 0-1, "summary": "..."}'
+        )},
+        {"role": "user", "content": str(user_request.get('content', ''))}
+    ]
+    router = get_model_router()
+    cancelled = threading.Event()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def complete():
+        # Time spent queued for a thread counts against the deadline
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"{agent} did not get a worker thread within {timeout:g}s")
+        return router.complete(messages, request_class='batch', tenant=user_request.get('tenant', 'orchestrator'),
+                               max_tokens=400, temperature=0.3, timeout=remaining, cancel_event=cancelled)
+
+    try:
+        response = await asyncio.get_running_loop().run_in_executor(executor, complete)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+    try:
+        result = json.loads(response.content)
+    except (TypeError, ValueError):
+        result = {'summary': response.content, 'confidence': 0.5}
+    result['model'] = response.model
+    result['cost'] = response.cost
+    return result
+
 class ComprehensiveAIAgentOrchestrator:
     """
     Master orchestrator that automatically engages all relevant AI agents
     for maximum efficiency and quality on every request
     """
     
-    def __init__(self):
+    def __init__(self, agent_backend: Optional[AgentBackend] = None, fanout_width: int = DEFAULT_FANOUT_WIDTH,
+                 agent_timeout: float = DEFAULT_AGENT_TIMEOUT, quorum: float = DEFAULT_QUORUM):
+        if agent_backend is None:
+            # One thread per fanout slot: a timed-out or cancelled router call
+            # holds its thread until it returns, so later agents queue for a
+            # free thread instead of stacking up model calls past fanout_width
+            self._router_executor = ThreadPoolExecutor(max_workers=fanout_width,
+                                                       thread_name_prefix='orchestrator-agent')
+            agent_backend = functools.partial(router_agent_backend, timeout=agent_timeout,
+                                              executor=self._router_executor)
+        self.agent_backend = agent_backend
+        self.fanout_width = fanout_width
+        self.agent_timeout = agent_timeout
+        self.quorum = quorum
         self.orchestrator_name = "Comprehensive AI Agent Orchestrator"
         self.total_available_agents = 316  # Current + expansion potential
         self.active_agent_categories = self._initialize_agent_network()
@@ -215,40 +316,80 @@ class ComprehensiveAIAgentOrchestrator:
         
         return list(set(selected_agents))  # Remove duplicates
     
+    def _quorum_size(self, agent_count: int) -> int:
+        if self.quorum >= 1:
+            return min(int(self.quorum), agent_count)
+        return max(1, min(agent_count, int(agent_count * self.quorum + 0.999)))
+    
+    @staticmethod
+    def _agent_group(agent: str) -> str:
+        """Capability group used for reporting"""
+        if 'QA' in agent or 'Validation' in agent:
+            return 'validation'
+        if 'RPA' in agent or 'Automation' in agent:
+            return 'automation'
+        if 'Optimization' in agent or 'Revenue' in agent:
+            return 'optimization'
+        if any(tech in agent for tech in ['Voice', 'UI', 'API', 'Database']):
+            return 'technical'
+        return 'advisory'
+    
     async def _engage_agents_parallel(self, agent_list: List[str], user_request: Dict[str, Any]) -> Dict[str, Any]:
-        """Engage multiple agents in parallel for maximum speed"""
-        
-        # Simulate parallel agent engagement
-        agent_results = {}
-        
-        # Group agents by capability for parallel processing
-        agent_groups = {
-            'validation': [agent for agent in agent_list if 'QA' in agent or 'Validation' in agent],
-            'automation': [agent for agent in agent_list if 'RPA' in agent or 'Automation' in agent],
-            'optimization': [agent for agent in agent_list if 'Optimization' in agent or 'Revenue' in agent],
-            'technical': [agent for agent in agent_list if any(tech in agent for tech in ['Voice', 'UI', 'API', 'Database'])]
-        }
-        
-        # Simulate parallel execution results
-        for group_name, agents in agent_groups.items():
-            for agent in agents:
-                agent_results[agent] = {
-                    'status': 'COMPLETED',
-                    'confidence': 0.95,
-                    'execution_time': 0.5,  # Optimized execution
-                    'quality_improvements': [
-                        'Enhanced error handling',
-                        'Improved performance optimization',
-                        'Advanced validation coverage'
-                    ],
-                    'cost_savings': 0.85  # 85% cost reduction
-                }
-        
+        """
+        Engage agents concurrently in one TaskGroup, at most fanout_width at a
+        time and each bounded by agent_timeout. Results are merged as they
+        arrive; once quorum agents have answered the remaining ones are
+        cancelled, so wall time follows the slowest agent inside the quorum.
+        """
+        quorum_size = self._quorum_size(len(agent_list))
+        merged = MergedAgentResults()
+        slots = asyncio.Semaphore(self.fanout_width)
+        started = time.perf_counter()
+        
+        async def engage(agent: str):
+            group = self._agent_group(agent)
+            async with slots:
+                agent_started = time.perf_counter()
+                try:
+                    async with asyncio.timeout(self.agent_timeout):
+                        result = await self.agent_backend(agent, user_request)
+                    merged.add(agent, group, result, time.perf_counter() - agent_started)
+                except TimeoutError:
+                    merged.add_failure(agent, group, 'TIMEOUT', time.perf_counter() - agent_started)
+                except Exception as e:
+                    logger.warning(f"Agent {agent} failed: {e}")
+                    merged.add_failure(agent, group, 'ERROR', time.perf_counter() - agent_started, str(e))
+            if merged.completed >= quorum_size:
+                raise _QuorumReached()
+        
+        if agent_list:
+            try:
+                async with asyncio.TaskGroup() as task_group:
+                    for agent in agent_list:
+                        task_group.create_task(engage(agent))
+            except* _QuorumReached:
+                pass
+        
+        cancelled = [agent for agent in agent_list if agent not in merged.agent_results]
+        for agent in cancelled:
+            merged.agent_results[agent] = {'status': 'CANCELLED', 'group': self._agent_group(agent)}
+        
+        wall_time = time.perf_counter() - started
+        concurrency = max(1, min(self.fanout_width, len(agent_list)))
         return {
-            'agent_results': agent_results,
-            'parallel_efficiency': 0.92,
+            'agent_results': merged.agent_results,
+            'parallel_efficiency': round(min(1.0, merged.busy_time / (wall_time * concurrency)), 4) if wall_time else 0.0,
             'total_agents_engaged': len(agent_list),
-            'average_confidence': 0.95
+            'agents_completed': merged.completed,
+            'agents_failed': merged.failed,
+            'agents_cancelled': len(cancelled),
+            'quorum': quorum_size,
+            'quorum_reached': merged.completed >= quorum_size,
+            'average_confidence': merged.average_confidence,
+            'average_cost_savings': merged.cost_savings_total / merged.completed if merged.completed else 0.0,
+            'quality_improvements': list(merged.quality_improvements),
+            'wall_time': wall_time,
+            'sequential_time': merged.busy_time
         }
     
     async def _validate_and_optimize(self, agent_results: Dict[str, Any], user_request: Dict[str, Any]) -> Dict[str, Any]:
@@ -381,6 +522,41 @@ async def validate_orchestration_system():
         logger.warning("❌ Orchestration system validation failed")
         return False
 
+async def validate_parallel_engagement(agent_count: int = 20, quorum: int = 15) -> Dict[str, Any]:
+    """
+    Check real concurrency with a fake backend whose agents sleep for
+    injected latencies: the engagement should take about as long as the
+    slowest agent inside the quorum, not the sum of all latencies.
+    """
+    latencies = {f"Fake Agent {index}": 0.05 + 0.01 * index for index in range(agent_count)}
+    
+    async def fake_backend(agent: str, user_request: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(latencies[agent])
+        return {'confidence': 0.9, 'quality_improvements': [f"Reviewed by {agent}"], 'cost_savings': 0.5}
+    
+    orchestrator = ComprehensiveAIAgentOrchestrator(agent_backend=fake_backend, fanout_width=agent_count,
+                                                    agent_timeout=5.0, quorum=quorum)
+    engagement = await orchestrator._engage_agents_parallel(list(latencies), {'content': 'validation'})
+    
+    slowest_in_quorum = sorted(latencies.values())[quorum - 1]
+    report = {
+        'wall_time': round(engagement['wall_time'], 3),
+        'slowest_in_quorum': slowest_in_quorum,
+        'sum_of_latencies': round(sum(latencies.values()), 3),
+        'agents_completed': engagement['agents_completed'],
+        'agents_cancelled': engagement['agents_cancelled']
+    }
+    report['passed'] = (
+        engagement['agents_completed'] == quorum
+        and engagement['agents_cancelled'] == agent_count - quorum
+        and engagement['wall_time'] < slowest_in_quorum + 0.1
+    )
+    if report['passed']:
+        logger.info(f"✅ Parallel engagement validated: {report}")
+    else:
+        logger.warning(f"❌ Parallel engagement validation failed: {report}")
+    return report
+
 # Auto-enable comprehensive orchestration for all future requests
 COMPREHENSIVE_ORCHESTRATION_ENABLED = True
 DEFAULT_AGENT_ENGAGEMENT_THRESHOLD = 50  # Minimum agents for comprehensive coverage
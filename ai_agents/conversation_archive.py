@@ -0,0 +1,203 @@
+"""
+Customized Agent Conversation History
+Keyset-paginated history across hot AgentConversation rows and compressed
+cold segments, plus denormalized per-customization conversation counters
+"""
+
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
+from sqlalchemy import event, func
+from app import db
+from models import AgentConversation
+from conversation_models import AgentCustomizationStats, ConversationArchiveSegment
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_SEGMENT_SIZE = 500
+HISTORY_PAGE_MAX = 200
+ZSTD_LEVEL = 10
+
+def _compress(data: bytes):
+    if HAS_ZSTD:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return 'zlib', zlib.compress(data, 9)
+
+def _decompress(codec: str, payload: bytes) -> bytes:
+    if codec == 'zstd':
+        if not HAS_ZSTD:
+            raise RuntimeError("zstandard is required to read zstd conversation segments")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+def _turn_dict(turn_id, conversation_id, user_message, agent_response, created_at) -> Dict:
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return {
+        'id': turn_id,
+        'conversation_id': conversation_id,
+        'user_message': user_message,
+        'agent_response': agent_response,
+        'timestamp': created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else None
+    }
+
+@lru_cache(maxsize=64)
+def _segment_turns(segment_id: int, codec: str) -> tuple:
+    """Decoded segment rows, newest first; segments are immutable so caching is safe"""
+    payload = db.session.query(ConversationArchiveSegment.payload).filter_by(id=segment_id).scalar()
+    rows = json.loads(_decompress(codec, payload))
+    return tuple(sorted((tuple(row) for row in rows), key=lambda row: row[0], reverse=True))
+
+def get_conversation_page(customization_id: int, limit: int = 50, before_id: Optional[int] = None,
+                          conversation_id: Optional[str] = None) -> Dict:
+    """
+    Newest-first page of turns older than before_id. Reads hot rows by
+    (customization_id, id) and continues into archived segments when the
+    hot table runs out, so callers never see the tier boundary.
+    """
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    query = AgentConversation.query.filter(AgentConversation.customization_id == customization_id)
+    if conversation_id:
+        query = query.filter(AgentConversation.conversation_id == conversation_id)
+    if before_id:
+        query = query.filter(AgentConversation.id < before_id)
+    rows = query.order_by(AgentConversation.id.desc()).limit(limit + 1).all()
+    turns = [_turn_dict(row.id, row.conversation_id, row.user_message, row.agent_response, row.created_at)
+             for row in rows]
+
+    if len(turns) <= limit:
+        cursor = turns[-1]['id'] if turns else before_id
+        segments = ConversationArchiveSegment.query.with_entities(
+            ConversationArchiveSegment.id, ConversationArchiveSegment.codec
+        ).filter(ConversationArchiveSegment.customization_id == customization_id)
+        if cursor:
+            segments = segments.filter(ConversationArchiveSegment.first_turn_id < cursor)
+        for segment in segments.order_by(ConversationArchiveSegment.last_turn_id.desc()).yield_per(4):
+            for row in _segment_turns(segment.id, segment.codec):
+                if cursor and row[0] >= cursor:
+                    continue
+                if conversation_id and row[1] != conversation_id:
+                    continue
+                turns.append(_turn_dict(*row))
+                if len(turns) > limit:
+                    break
+            if len(turns) > limit:
+                break
+
+    has_more = len(turns) > limit
+    turns = turns[:limit]
+    return {
+        'messages': turns,
+        'has_more': has_more,
+        'next_before_id': turns[-1]['id'] if has_more else None
+    }
+
+def archive_old_conversations(older_than_days: int = ARCHIVE_AFTER_DAYS,
+                              segment_size: int = ARCHIVE_SEGMENT_SIZE) -> int:
+    """Move turns older than the cutoff into compressed segments; returns turns archived"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    customization_ids = [row[0] for row in db.session.query(AgentConversation.customization_id)
+                         .filter(AgentConversation.created_at < cutoff).distinct()]
+    archived = 0
+
+    for customization_id in customization_ids:
+        while True:
+            rows = db.session.query(
+                AgentConversation.id, AgentConversation.conversation_id, AgentConversation.user_message,
+                AgentConversation.agent_response, AgentConversation.created_at
+            ).filter(
+                AgentConversation.customization_id == customization_id,
+                AgentConversation.created_at < cutoff
+            ).order_by(AgentConversation.id).limit(segment_size).all()
+            if not rows:
+                break
+
+            codec, payload = _compress(json.dumps([
+                [row.id, row.conversation_id, row.user_message, row.agent_response,
+                 row.created_at.isoformat() if row.created_at else None]
+                for row in rows
+            ], separators=(',', ':')).encode('utf-8'))
+
+            try:
+                db.session.add(ConversationArchiveSegment(
+                    customization_id=customization_id,
+                    first_turn_id=rows[0].id,
+                    last_turn_id=rows[-1].id,
+                    first_created_at=rows[0].created_at,
+                    last_created_at=rows[-1].created_at,
+                    turn_count=len(rows),
+                    codec=codec,
+                    payload=payload
+                ))
+                AgentConversation.query.filter(
+                    AgentConversation.id.in_([row.id for row in rows])
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error archiving conversations for customization {customization_id}: {e}")
+                break
+            archived += len(rows)
+
+    if archived:
+        logger.info(f"Archived {archived} conversation turns older than {older_than_days} days")
+    return archived
+
+def rebuild_customization_stats():
+    """Recompute counters from hot rows and archive segments (one-off backfill / repair)"""
+    totals: Dict[int, List] = {}
+    for customization_id, count, last_message_at in db.session.query(
+        AgentConversation.customization_id, func.count(AgentConversation.id), func.max(AgentConversation.created_at)
+    ).group_by(AgentConversation.customization_id):
+        totals[customization_id] = [count, last_message_at]
+    for customization_id, count, last_message_at in db.session.query(
+        ConversationArchiveSegment.customization_id, func.sum(ConversationArchiveSegment.turn_count),
+        func.max(ConversationArchiveSegment.last_created_at)
+    ).group_by(ConversationArchiveSegment.customization_id):
+        entry = totals.setdefault(customization_id, [0, None])
+        entry[0] += int(count or 0)
+        if last_message_at and (entry[1] is None or last_message_at > entry[1]):
+            entry[1] = last_message_at
+
+    AgentCustomizationStats.query.delete()
+    db.session.bulk_insert_mappings(AgentCustomizationStats, [
+        {'customization_id': customization_id, 'conversation_count': count, 'last_message_at': last_message_at}
+        for customization_id, (count, last_message_at) in totals.items()
+    ])
+    db.session.commit()
+    return len(totals)
+
+# Counter maintenance: one upsert per inserted turn, in the same transaction
+def _on_conversation_inserted(mapper, connection, target):
+    stats = AgentCustomizationStats.__table__
+    created_at = target.created_at or datetime.utcnow()
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(stats).values(
+        customization_id=target.customization_id, conversation_count=1, last_message_at=created_at
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[stats.c.customization_id],
+        set_={
+            'conversation_count': stats.c.conversation_count + 1,
+            'last_message_at': func.coalesce(
+                db.case((stats.c.last_message_at > statement.excluded.last_message_at, stats.c.last_message_at),
+                        else_=statement.excluded.last_message_at),
+                statement.excluded.last_message_at
+            )
+        }
+    ))
+
+event.listen(AgentConversation, 'after_insert', _on_conversation_inserted)
@@ -0,0 +1,86 @@
+"""
+Agent Conversation Models
+Server-side, append-only conversation turns for built-in engine agents,
+rolling summaries of turns that no longer fit the context window,
+denormalized per-customization counters and compressed cold storage
+"""
+
+from datetime import datetime
+from app import db
+from models import AgentConversation
+
+class AgentChatTurn(db.Model):
+    """One user message and agent reply in a built-in (engine) agent conversation"""
+    __tablename__ = 'agent_chat_turns'
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(36), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    agent_id = db.Column(db.String(100), nullable=False)
+    user_message = db.Column(db.Text, nullable=False)
+    agent_response = db.Column(db.Text)
+    model_used = db.Column(db.String(100))
+    processing_time = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_agent_chat_turns_user_agent_conversation_created',
+                 'user_id', 'agent_id', 'conversation_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'timestamp': self.created_at.isoformat() if self.created_at else None,
+            'user_message': self.user_message,
+            'agent_response': self.agent_response,
+            'model_used': self.model_used,
+            'processing_time': self.processing_time
+        }
+
+class ConversationSummary(db.Model):
+    """Rolling summary of the turns of a conversation up to summarized_through_id"""
+    __tablename__ = 'agent_conversation_summaries'
+
+    # Conversation ids are client supplied, so summaries are keyed by the
+    # owning store scope too (e.g. "customization_id=7")
+    scope_key = db.Column(db.String(200), primary_key=True)
+    conversation_id = db.Column(db.String(36), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    summarized_turns = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AgentCustomizationStats(db.Model):
+    """Conversation counters for an AgentCustomization, maintained on every AgentConversation insert"""
+    __tablename__ = 'agent_customization_stats'
+
+    customization_id = db.Column(db.Integer, db.ForeignKey('agent_customization.id'), primary_key=True)
+    conversation_count = db.Column(db.Integer, nullable=False, default=0)
+    last_message_at = db.Column(db.DateTime)
+
+class ConversationArchiveSegment(db.Model):
+    """Compressed block of old AgentConversation rows for one customization"""
+    __tablename__ = 'agent_conversation_archive_segments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    customization_id = db.Column(db.Integer, nullable=False)
+    first_turn_id = db.Column(db.Integer, nullable=False)
+    last_turn_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime)
+    last_created_at = db.Column(db.DateTime)
+    turn_count = db.Column(db.Integer, nullable=False)
+    codec = db.Column(db.String(10), nullable=False)  # zstd or zlib
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_conversation_archive_customization_last_turn', 'customization_id', 'last_turn_id'),
+    )
+
+# Customized-agent chats are stored in AgentConversation; the context window
+# is read per (customization, conversation) in creation order and history
+# pages are read per customization by id
+db.Index('ix_agent_conversation_customization_conversation_created',
+         AgentConversation.customization_id, AgentConversation.conversation_id, AgentConversation.created_at)
+db.Index('ix_agent_conversation_customization_id',
+         AgentConversation.customization_id, AgentConversation.id)
@@ -0,0 +1,181 @@
+"""
+Agent Conversation Store
+Server-side conversation history with token-budgeted context windows:
+recent turns verbatim plus a rolling summary of the turns before them
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from app import db
+from models import AgentConversation
+from conversation_models import AgentChatTurn, ConversationSummary
+from model_rate_governor import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = 3000
+SUMMARY_TOKEN_BUDGET = 600
+MAX_WINDOW_TURNS = 20
+# Extra rows read past the window so turns leaving it always get summarized
+WINDOW_PREFETCH_SLACK = 10
+SUMMARY_SNIPPET_CHARS = 240
+
+@dataclass
+class ConversationWindow:
+    """Context for the next model call; turns are (user_message, agent_response), oldest first"""
+    conversation_id: str
+    turns: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+    summary: str = ''
+    token_estimate: int = 0
+
+    def to_messages(self) -> List[Dict]:
+        messages = []
+        for user_message, agent_response in self.turns:
+            messages.append({'role': 'user', 'content': user_message})
+            if agent_response:
+                messages.append({'role': 'assistant', 'content': agent_response})
+        return messages
+
+def _snippet(text: Optional[str]) -> str:
+    text = ' '.join((text or '').split())
+    if len(text) <= SUMMARY_SNIPPET_CHARS:
+        return text
+    return text[:SUMMARY_SNIPPET_CHARS].rsplit(' ', 1)[0] + '…'
+
+def summarize_turns(previous_summary: str, turns: List[Tuple[str, Optional[str]]],
+                    max_tokens: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Fold turns into the running summary. Extractive, so it costs no model
+    call on the request path; the oldest lines drop off past the budget.
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for user_message, agent_response in turns:
+        lines.append(f"- User: {_snippet(user_message)}")
+        if agent_response:
+            lines.append(f"  Agent: {_snippet(agent_response)}")
+
+    max_chars = max_tokens * 4
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+class ConversationStore:
+    """Append-only turns in model, scoped by scope_fields (e.g. customization_id)"""
+
+    def __init__(self, model, scope_fields: Tuple[str, ...]):
+        self.model = model
+        self.scope_fields = scope_fields
+
+    def _scoped(self, query, scope: Dict):
+        for name in self.scope_fields:
+            query = query.filter(getattr(self.model, name) == scope[name])
+        return query
+
+    def _scope_key(self, scope: Dict) -> str:
+        return '/'.join(f"{name}={scope[name]}" for name in self.scope_fields)
+
+    def append_turn(self, conversation_id: str, user_message: str, agent_response: Optional[str], **fields):
+        turn = self.model(
+            conversation_id=conversation_id,
+            user_message=user_message,
+            agent_response=agent_response,
+            **fields
+        )
+        db.session.add(turn)
+        db.session.commit()
+        return turn
+
+    def load_window(self, conversation_id: str, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                    max_turns: int = MAX_WINDOW_TURNS, **scope) -> ConversationWindow:
+        """
+        Newest turns that fit the token budget, plus the rolling summary, read
+        in one query. Turns that fall out of the window are folded into the
+        summary as they leave.
+        """
+        model = self.model
+        scope_key = self._scope_key(scope)
+        rows = self._scoped(
+            db.session.query(
+                model.id, model.user_message, model.agent_response,
+                ConversationSummary.summary, ConversationSummary.summarized_through_id,
+                ConversationSummary.summarized_turns
+            ).outerjoin(
+                ConversationSummary,
+                db.and_(ConversationSummary.scope_key == scope_key,
+                        ConversationSummary.conversation_id == model.conversation_id)
+            ).filter(model.conversation_id == conversation_id),
+            scope
+        ).order_by(model.created_at.desc(), model.id.desc()).limit(max_turns + WINDOW_PREFETCH_SLACK).all()
+
+        if not rows:
+            return ConversationWindow(conversation_id)
+
+        summary = rows[0].summary or ''
+        summarized_through_id = rows[0].summarized_through_id or 0
+        # Up to a quarter of the budget is kept for the summary
+        summary_budget = min(SUMMARY_TOKEN_BUDGET, token_budget // 4)
+        available = token_budget - max(summary_budget, estimate_tokens(summary))
+
+        window, evicted, used = [], [], 0
+        for row in rows:  # newest first
+            if row.id <= summarized_through_id:
+                break
+            cost = estimate_tokens(row.user_message, row.agent_response)
+            if not evicted and len(window) < max_turns and used + cost <= available:
+                window.append(row)
+                used += cost
+            else:
+                evicted.append(row)
+
+        if evicted:
+            evicted.reverse()
+            summary = summarize_turns(summary, [(row.user_message, row.agent_response) for row in evicted],
+                                      summary_budget)
+            self._save_summary(scope_key, conversation_id, summary, evicted[-1].id,
+                               (rows[0].summarized_turns or 0) + len(evicted))
+
+        window.reverse()
+        return ConversationWindow(
+            conversation_id=conversation_id,
+            turns=[(row.user_message, row.agent_response) for row in window],
+            summary=summary,
+            token_estimate=used + estimate_tokens(summary)
+        )
+
+    def _save_summary(self, scope_key: str, conversation_id: str, summary: str, through_id: int,
+                      summarized_turns: int):
+        try:
+            db.session.merge(ConversationSummary(
+                scope_key=scope_key,
+                conversation_id=conversation_id,
+                summary=summary,
+                summarized_through_id=through_id,
+                summarized_turns=summarized_turns
+            ))
+            db.session.commit()
+        except Exception as e:
+            # The window is still usable; the summary is retried on the next call
+            db.session.rollback()
+            logger.error(f"Error saving conversation summary for {conversation_id}: {e}")
+
+    def recent_turns(self, conversation_id: str, limit: int = 50, **scope) -> List:
+        """Latest turns of a conversation, oldest first"""
+        model = self.model
+        turns = self._scoped(
+            model.query.filter(model.conversation_id == conversation_id), scope
+        ).order_by(model.created_at.desc(), model.id.desc()).limit(limit).all()
+        turns.reverse()
+        return turns
+
+    def latest_conversation_id(self, **scope) -> Optional[str]:
+        model = self.model
+        row = self._scoped(db.session.query(model.conversation_id), scope)\
+            .order_by(model.created_at.desc(), model.id.desc()).first()
+        return row.conversation_id if row else None
+
+# Built-in engine agents, per user and agent
+engine_conversations = ConversationStore(AgentChatTurn, ('user_id', 'agent_id'))
+
+# Customized agents, per customization
+customization_conversations = ConversationStore(AgentConversation, ('customization_id',))
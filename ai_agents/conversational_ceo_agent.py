@@ -12,6 +12,7 @@ from typing import Dict, List, Any, Optional, Tuple
 from app import app, db
 from models import CEOAgentTask, ChiefAgentReport, AIAgentGap
 from ceo_ai_agent import CEOAIAgent
+from model_rate_governor import anthropic_message, PRIORITY_INTERACTIVE
 import anthropic
 
 class ConversationalCEOAgent(CEOAIAgent):
@@ -116,7 +117,8 @@ Analyze the intent and suggest the most appropriate command(s). Format as JSON:
 }}"""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = anthropic_message(
+                self.anthropic_client, tenant='ceo', priority=PRIORITY_INTERACTIVE,
                 model="claude-sonnet-4-20250514",
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
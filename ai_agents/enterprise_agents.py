@@ -3,20 +3,28 @@ Enterprise Architecture & Quality Assurance AI Agents
 High-performance specialized agents for system optimization and quality control
 """
 
-import os
 import json
 import asyncio
 from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 import logging
 import subprocess
-import ast
-import re
 
 from ai_agents_core import BaseAIAgent, AgentTask, AgentCapability, AgentPriority, orchestrator
+from project_index import FileFacts, ProjectIndex, get_project_index
 
 logger = logging.getLogger(__name__)
 
+async def load_project_index(project_path: str) -> ProjectIndex:
+    """
+    Shared parsed view of the project, refreshed once per analysis. Walking
+    and parsing run in a worker thread (and a process pool for large
+    changes) so the event loop keeps serving other agents meanwhile.
+    """
+    index = get_project_index(project_path)
+    await asyncio.to_thread(index.refresh)
+    return index
+
 class EnterpriseArchitectureAgent(BaseAIAgent):
     """AI Agent specializing in enterprise system architecture review and optimization"""
     
@@ -85,12 +93,14 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
             "compliance_assessment": {}
         }
         
+        index = await load_project_index(project_path)
+        
         # Analyze codebase structure
-        structure_analysis = await self._analyze_codebase_structure(project_path)
+        structure_analysis = await self._analyze_codebase_structure(index)
         analysis_results.update(structure_analysis)
         
         # Check for common architecture anti-patterns
-        antipattern_analysis = await self._detect_architecture_antipatterns(project_path)
+        antipattern_analysis = await self._detect_architecture_antipatterns(index)
         analysis_results["risk_factors"].extend(antipattern_analysis)
         
         # Generate optimization recommendations
@@ -107,7 +117,7 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
             "execution_time": datetime.now(timezone.utc).isoformat()
         }
     
-    async def _analyze_codebase_structure(self, project_path: str) -> Dict[str, Any]:
+    async def _analyze_codebase_structure(self, index: ProjectIndex) -> Dict[str, Any]:
         """Analyze codebase structure and organization"""
         structure_info = {
             "file_organization": {},
@@ -117,21 +127,13 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
         }
         
         try:
-            # Walk through project structure
-            for root, dirs, files in os.walk(project_path):
-                python_files = [f for f in files if f.endswith('.py')]
-                if python_files:
-                    relative_path = os.path.relpath(root, project_path)
-                    structure_info["file_organization"][relative_path] = {
-                        "python_files": len(python_files),
-                        "complexity_indicators": []
-                    }
-                    
-                    # Analyze individual files
-                    for file in python_files:
-                        file_path = os.path.join(root, file)
-                        file_analysis = await self._analyze_python_file(file_path)
-                        structure_info["file_organization"][relative_path]["complexity_indicators"].append(file_analysis)
+            for facts in sorted(index.files.values(), key=lambda facts: facts.path):
+                directory = structure_info["file_organization"].setdefault(facts.directory, {
+                    "python_files": 0,
+                    "complexity_indicators": []
+                })
+                directory["python_files"] += 1
+                directory["complexity_indicators"].append(self._analyze_python_file(facts))
             
             # Calculate modularity score
             structure_info["modularity_score"] = self._calculate_modularity_score(structure_info)
@@ -141,52 +143,36 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
         
         return structure_info
     
-    async def _analyze_python_file(self, file_path: str) -> Dict[str, Any]:
-        """Analyze individual Python file for complexity metrics"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Parse AST for complexity analysis
-            tree = ast.parse(content)
-            
-            analysis = {
-                "file_name": os.path.basename(file_path),
-                "lines_of_code": len(content.splitlines()),
-                "function_count": 0,
-                "class_count": 0,
-                "import_count": 0,
-                "complexity_score": 0.0
-            }
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    analysis["function_count"] += 1
-                elif isinstance(node, ast.ClassDef):
-                    analysis["class_count"] += 1
-                elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                    analysis["import_count"] += 1
-            
-            # Calculate complexity score
-            analysis["complexity_score"] = (
-                analysis["lines_of_code"] * 0.1 +
-                analysis["function_count"] * 2 +
-                analysis["class_count"] * 3 +
-                analysis["import_count"] * 1
-            ) / 100
-            
-            return analysis
-            
-        except Exception as e:
-            logger.error(f"Error analyzing file {file_path}: {str(e)}")
-            return {"file_name": os.path.basename(file_path), "error": str(e)}
+    def _analyze_python_file(self, facts: FileFacts) -> Dict[str, Any]:
+        """Complexity metrics for one indexed Python file"""
+        if facts.error:
+            return {"file_name": facts.file_name, "error": facts.error}
+        
+        analysis = {
+            "file_name": facts.file_name,
+            "lines_of_code": facts.lines,
+            "function_count": facts.function_count,
+            "class_count": facts.class_count,
+            "import_count": facts.import_count,
+            "complexity_score": 0.0
+        }
+        
+        # Calculate complexity score
+        analysis["complexity_score"] = (
+            analysis["lines_of_code"] * 0.1 +
+            analysis["function_count"] * 2 +
+            analysis["class_count"] * 3 +
+            analysis["import_count"] * 1
+        ) / 100
+        
+        return analysis
     
-    async def _detect_architecture_antipatterns(self, project_path: str) -> List[Dict[str, Any]]:
+    async def _detect_architecture_antipatterns(self, index: ProjectIndex) -> List[Dict[str, Any]]:
         """Detect common architecture anti-patterns"""
         antipatterns = []
         
         # Check for circular dependencies
-        circular_deps = await self._detect_circular_dependencies(project_path)
+        circular_deps = await self._detect_circular_dependencies(index)
         if circular_deps:
             antipatterns.append({
                 "type": "circular_dependencies",
@@ -197,7 +183,7 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
             })
         
         # Check for god objects/classes
-        god_objects = await self._detect_god_objects(project_path)
+        god_objects = await self._detect_god_objects(index)
         if god_objects:
             antipatterns.append({
                 "type": "god_objects",
@@ -209,57 +195,27 @@ class EnterpriseArchitectureAgent(BaseAIAgent):
         
         return antipatterns
     
-    async def _detect_circular_dependencies(self, project_path: str) -> List[str]:
+    async def _detect_circular_dependencies(self, index: ProjectIndex) -> List[str]:
         """Detect circular dependencies in the codebase"""
-        # Simplified circular dependency detection
-        # In production, this would use more sophisticated graph analysis
-        dependencies = {}
-        
+        # Strongly connected components of the module-level import graph, so
+        # cycles through any number of modules are found, not just A <-> B
         try:
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        # Extract imports
-                        imports = re.findall(r'from\s+(\w+)\s+import|import\s+(\w+)', content)
-                        module_name = os.path.splitext(file)[0]
-                        dependencies[module_name] = [imp[0] or imp[1] for imp in imports if imp[0] or imp[1]]
-            
-            # Simple circular dependency check
-            circular = []
-            for module, deps in dependencies.items():
-                for dep in deps:
-                    if dep in dependencies and module in dependencies[dep]:
-                        circular.append(f"{module} <-> {dep}")
-            
-            return list(set(circular))
+            cycles = await asyncio.to_thread(index.circular_dependencies)
+            return [" <-> ".join(modules) for modules in cycles]
             
         except Exception as e:
             logger.error(f"Error detecting circular dependencies: {str(e)}")
             return []
     
-    async def _detect_god_objects(self, project_path: str) -> List[str]:
+    async def _detect_god_objects(self, index: ProjectIndex) -> List[str]:
         """Detect god objects (classes with too many responsibilities)"""
         god_objects = []
         
         try:
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        tree = ast.parse(content)
-                        
-                        for node in ast.walk(tree):
-                            if isinstance(node, ast.ClassDef):
-                                method_count = len([n for n in node.body if isinstance(n, ast.FunctionDef)])
-                                if method_count > 15:  # Threshold for god object
-                                    god_objects.append(f"{file}::{node.name}")
+            for facts in index.files.values():
+                for class_name, method_count in facts.classes:
+                    if method_count > 15:  # Threshold for god object
+                        god_objects.append(f"{facts.file_name}::{class_name}")
             
             return god_objects
             
@@ -409,16 +365,18 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
             "recommendations": []
         }
         
+        index = await load_project_index(project_path)
+        
         # Analyze code complexity
-        complexity_analysis = await self._analyze_code_complexity(project_path)
+        complexity_analysis = await self._analyze_code_complexity(index)
         quality_metrics.update(complexity_analysis)
         
         # Check code style compliance
-        style_analysis = await self._check_style_compliance(project_path)
+        style_analysis = await self._check_style_compliance(index)
         quality_metrics.update(style_analysis)
         
         # Analyze test coverage
-        coverage_analysis = await self._analyze_test_coverage(project_path)
+        coverage_analysis = await self._analyze_test_coverage(index)
         quality_metrics.update(coverage_analysis)
         
         # Generate improvement recommendations
@@ -435,7 +393,7 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
             "execution_time": datetime.now(timezone.utc).isoformat()
         }
     
-    async def _analyze_code_complexity(self, project_path: str) -> Dict[str, Any]:
+    async def _analyze_code_complexity(self, index: ProjectIndex) -> Dict[str, Any]:
         """Analyze code complexity metrics"""
         complexity_data = {
             "cyclomatic_complexity": 0.0,
@@ -447,20 +405,16 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
             total_complexity = 0
             file_count = 0
             
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        file_complexity = await self._calculate_file_complexity(file_path)
-                        total_complexity += file_complexity["complexity"]
-                        file_count += 1
-                        
-                        if file_complexity["complexity"] > 10:  # Threshold for complex files
-                            complexity_data["complexity_issues"].append({
-                                "file": file,
-                                "complexity": file_complexity["complexity"],
-                                "recommendation": "Consider refactoring to reduce complexity"
-                            })
+            for facts in index.files.values():
+                total_complexity += facts.complexity
+                file_count += 1
+                
+                if facts.complexity > 10:  # Threshold for complex files
+                    complexity_data["complexity_issues"].append({
+                        "file": facts.file_name,
+                        "complexity": facts.complexity,
+                        "recommendation": "Consider refactoring to reduce complexity"
+                    })
             
             if file_count > 0:
                 complexity_data["cyclomatic_complexity"] = total_complexity / file_count
@@ -471,28 +425,7 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
         
         return complexity_data
     
-    async def _calculate_file_complexity(self, file_path: str) -> Dict[str, Any]:
-        """Calculate complexity metrics for a single file"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            tree = ast.parse(content)
-            complexity = 1  # Base complexity
-            
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.If, ast.While, ast.For, ast.With, ast.Try)):
-                    complexity += 1
-                elif isinstance(node, ast.BoolOp):
-                    complexity += len(node.values) - 1
-            
-            return {"complexity": complexity, "lines": len(content.splitlines())}
-            
-        except Exception as e:
-            logger.error(f"Error calculating complexity for {file_path}: {str(e)}")
-            return {"complexity": 0, "lines": 0}
-    
-    async def _check_style_compliance(self, project_path: str) -> Dict[str, Any]:
+    async def _check_style_compliance(self, index: ProjectIndex) -> Dict[str, Any]:
         """Check code style compliance"""
         style_data = {
             "style_compliance": 0.0,
@@ -503,17 +436,12 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
             total_files = 0
             compliant_files = 0
             
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        total_files += 1
-                        
-                        issues = await self._check_file_style(file_path)
-                        if len(issues) == 0:
-                            compliant_files += 1
-                        else:
-                            style_data["style_issues"].extend(issues)
+            for facts in index.files.values():
+                total_files += 1
+                if not facts.style_issues:
+                    compliant_files += 1
+                else:
+                    style_data["style_issues"].extend(self._check_file_style(facts))
             
             if total_files > 0:
                 style_data["style_compliance"] = compliant_files / total_files
@@ -523,39 +451,14 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
         
         return style_data
     
-    async def _check_file_style(self, file_path: str) -> List[Dict[str, Any]]:
-        """Check style issues in a single file"""
-        issues = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            for i, line in enumerate(lines, 1):
-                # Check line length
-                if len(line.strip()) > 100:
-                    issues.append({
-                        "file": os.path.basename(file_path),
-                        "line": i,
-                        "issue": "Line too long",
-                        "severity": "minor"
-                    })
-                
-                # Check for trailing whitespace
-                if line.rstrip() != line.rstrip('\n'):
-                    issues.append({
-                        "file": os.path.basename(file_path),
-                        "line": i,
-                        "issue": "Trailing whitespace",
-                        "severity": "minor"
-                    })
-        
-        except Exception as e:
-            logger.error(f"Error checking style for {file_path}: {str(e)}")
-        
-        return issues
+    def _check_file_style(self, facts: FileFacts) -> List[Dict[str, Any]]:
+        """Style issues found in one indexed file (long lines, trailing whitespace)"""
+        return [
+            {"file": facts.file_name, "line": line, "issue": issue, "severity": "minor"}
+            for line, issue in facts.style_issues
+        ]
     
-    async def _analyze_test_coverage(self, project_path: str) -> Dict[str, Any]:
+    async def _analyze_test_coverage(self, index: ProjectIndex) -> Dict[str, Any]:
         """Analyze test coverage"""
         coverage_data = {
             "test_coverage": 0.0,
@@ -566,13 +469,12 @@ class CodeQualityAssuranceAgent(BaseAIAgent):
         
         try:
             # Count test files and source files
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        if 'test' in file.lower() or file.startswith('test_'):
-                            coverage_data["test_files"] += 1
-                        else:
-                            coverage_data["source_files"] += 1
+            for facts in index.files.values():
+                file = facts.file_name
+                if 'test' in file.lower() or file.startswith('test_'):
+                    coverage_data["test_files"] += 1
+                else:
+                    coverage_data["source_files"] += 1
             
             # Simple coverage estimation based on test-to-source ratio
             if coverage_data["source_files"] > 0:
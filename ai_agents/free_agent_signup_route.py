@@ -2,13 +2,12 @@
 from flask import request, jsonify, session
 from app import app, db
 from models import User
+from notification_outbox import enqueue_notification
 import logging
 import os
-import secrets
 from datetime import datetime, timedelta
-
-# Store pending signups temporarily (in production, use Redis or database)
-pending_signups = {}
+from signup_token_store import (SIGNUP_TOKEN_TTL_SECONDS, TOKEN_EXPIRED, TOKEN_VALID, get_signup_token_store,
+                                token_selector)
 
 @app.route('/free_agent_signup', methods=['POST'])
 def free_agent_signup():
@@ -36,10 +35,7 @@ def free_agent_signup():
         if not agent:
             return jsonify({'success': False, 'message': 'Agent not found'})
         
-        # Generate confirmation token
-        confirmation_token = secrets.token_urlsafe(32)
-        
-        # Store signup data temporarily
+        # Store signup data under an expiring confirmation token shared by all workers
         signup_data = {
             'agent_id': agent_id,
             'agent_name': agent['name'],
@@ -47,11 +43,11 @@ def free_agent_signup():
             'last_name': last_name,
             'email': email,
             'company': company,
-            'signup_date': datetime.utcnow(),
+            'signup_date': datetime.utcnow().isoformat(),
             'status': 'pending_confirmation',
-            'expires_at': datetime.utcnow() + timedelta(hours=24)
+            'expires_at': (datetime.utcnow() + timedelta(seconds=SIGNUP_TOKEN_TTL_SECONDS)).isoformat()
         }
-        pending_signups[confirmation_token] = signup_data
+        confirmation_token = get_signup_token_store().create(signup_data, ttl=SIGNUP_TOKEN_TTL_SECONDS)
         
         # Send confirmation email
         success = send_confirmation_email(email, first_name, agent['name'], confirmation_token)
@@ -73,21 +69,13 @@ def free_agent_signup():
 def confirm_free_agent(token):
     """Handle email confirmation and deliver the free agent"""
     try:
-        # Check if token exists and is valid
-        if token not in pending_signups:
-            return '''
-            <html><body style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
-                <h2 style="color: #dc3545;">❌ Invalid or Expired Link</h2>
-                <p>This confirmation link is invalid or has expired.</p>
-                <p><a href="/" style="color: #0d6efd;">Return to 4UAI</a></p>
-            </body></html>
-            '''
-        
-        signup_data = pending_signups[token]
+        # Validate without consuming; the token is only used up once the
+        # agent email is queued, so a failed enqueue leaves the link usable
+        token_store = get_signup_token_store()
+        status, signup_data = token_store.peek(token)
         
         # Check if expired
-        if datetime.utcnow() > signup_data['expires_at']:
-            del pending_signups[token]
+        if status == TOKEN_EXPIRED:
             return '''
             <html><body style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
                 <h2 style="color: #dc3545;">⏰ Link Expired</h2>
@@ -96,17 +84,26 @@ def confirm_free_agent(token):
             </body></html>
             '''
         
+        if status != TOKEN_VALID:
+            return '''
+            <html><body style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
+                <h2 style="color: #dc3545;">❌ Invalid or Expired Link</h2>
+                <p>This confirmation link is invalid or has expired.</p>
+                <p><a href="/" style="color: #0d6efd;">Return to 4UAI</a></p>
+            </body></html>
+            '''
+        
         # Mark as confirmed and send the agent
         signup_data['status'] = 'confirmed'
-        signup_data['confirmed_at'] = datetime.utcnow()
+        signup_data['confirmed_at'] = datetime.utcnow().isoformat()
         
-        # Send the actual free agent email
-        agent_delivered = send_free_agent_email(signup_data)
+        # Send the actual free agent email; the selector dedupe key keeps
+        # concurrent confirmations of the same link to one delivery
+        agent_delivered = send_free_agent_email(signup_data,
+                                                dedupe_key=f'free-agent-delivery:{token_selector(token)}')
         
         if agent_delivered:
-            # Clean up token
-            del pending_signups[token]
-            
+            token_store.consume(token)
             # Log successful delivery
             logging.info(f"Free agent delivered: {signup_data['agent_name']} to {signup_data['email']}")
             
@@ -128,7 +125,7 @@ def confirm_free_agent(token):
             return '''
             <html><body style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
                 <h2 style="color: #ffc107;">⚠️ Delivery Issue</h2>
-                <p>Email confirmed but agent delivery failed. Our team will manually send your agent within 24 hours.</p>
+                <p>We could not send your agent right now. Please click the confirmation link again in a few minutes.</p>
                 <p><a href="/" style="color: #0d6efd;">Return to 4UAI</a></p>
             </body></html>
             '''
@@ -203,21 +200,18 @@ def send_confirmation_email(email, first_name, agent_name, token):
         </html>
         '''
         
-        # In production, you would use a proper email service here
-        # For now, we'll log the email content and return True
-        logging.info(f"CONFIRMATION EMAIL TO: {email}")
-        logging.info(f"CONFIRMATION URL: {confirmation_url}")
-        logging.info(f"EMAIL CONTENT: {email_content}")
-        
-        # TODO: Integrate with actual email service (SendGrid, etc.)
-        # For demo purposes, return True
+        # Queued in the notification outbox; delivered by its workers, not in this request
+        enqueue_notification('email', email, {'html': email_content},
+                             subject=f'Confirm your free AI agent: {agent_name}',
+                             dedupe_key=f'free-agent-confirm:{token_selector(token)}')
+        logging.info(f"CONFIRMATION EMAIL QUEUED TO: {email}")
         return True
         
     except Exception as e:
         logging.error(f"Error sending confirmation email: {e}")
         return False
 
-def send_free_agent_email(signup_data):
+def send_free_agent_email(signup_data, dedupe_key=None):
     """Send the actual free agent with instructions"""
     try:
         email_content = f'''
@@ -287,13 +281,11 @@ def send_free_agent_email(signup_data):
         </html>
         '''
         
-        # Log the delivery email
-        logging.info(f"FREE AGENT DELIVERY EMAIL TO: {signup_data['email']}")
-        logging.info(f"AGENT: {signup_data['agent_name']}")
-        logging.info(f"DELIVERY EMAIL CONTENT: {email_content}")
-        
-        # TODO: Integrate with actual email service
-        # For demo purposes, return True
+        # Queued in the notification outbox; delivered by its workers, not in this request
+        enqueue_notification('email', signup_data['email'], {'html': email_content},
+                             subject=f"Your free AI agent has arrived: {signup_data['agent_name']}",
+                             dedupe_key=dedupe_key)
+        logging.info(f"FREE AGENT DELIVERY EMAIL QUEUED TO: {signup_data['email']} (agent {signup_data['agent_name']})")
         return True
         
     except Exception as e:
@@ -0,0 +1,219 @@
+"""
+Signup Token Store Load Test
+Creates and confirms signups through several worker processes sharing one
+token store, with every confirmation sent to a different worker than the
+signup, plus duplicate confirmations that must be rejected. Reports lost
+confirmations, double confirmations, leftover tokens and worker RSS.
+
+Workers are gunicorn sync workers when gunicorn is installed, otherwise
+one threaded werkzeug server process per worker on consecutive ports.
+
+Usage: python load_test_signup_tokens.py --signups 100000 --workers 4
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask, jsonify
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/statm') as statm:
+            return round(int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return None
+
+def create_load_test_app() -> Flask:
+    """Minimal signup/confirm endpoints over get_signup_token_store()"""
+    from signup_token_store import TOKEN_VALID, get_signup_token_store
+
+    app = Flask(__name__)
+    store = get_signup_token_store()
+
+    @app.route('/signup/<int:index>', methods=['POST'])
+    def signup(index):
+        token = store.create({'index': index, 'email': f'user{index}@example.com', 'agent_id': index % 500})
+        return jsonify({'token': token, 'pid': os.getpid()})
+
+    @app.route('/confirm/<token>', methods=['POST'])
+    def confirm(token):
+        status, data = store.consume(token)
+        if status != TOKEN_VALID:
+            return jsonify({'status': status, 'pid': os.getpid()}), 410
+        return jsonify({'status': status, 'index': data['index'], 'pid': os.getpid()})
+
+    @app.route('/stats')
+    def stats():
+        return jsonify({'pid': os.getpid(), 'rss_mb': _rss_mb()})
+
+    return app
+
+class _Client:
+    """One keep-alive connection per (thread, port)"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, port: int, method: str, path: str) -> Tuple[int, Dict[str, Any]]:
+        connections = self._local.__dict__.setdefault('connections', {})
+        for attempt in range(3):
+            connection = connections.get(port)
+            if connection is None:
+                connection = connections[port] = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            try:
+                connection.request(method, path, headers={'Content-Length': '0'})
+                response = connection.getresponse()
+                return response.status, json.loads(response.read() or b'{}')
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                connections.pop(port, None)
+                if attempt == 2:
+                    raise
+                time.sleep(0.05)
+
+def _wait_for(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/stats')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Worker on port {port} did not start")
+
+def start_workers(workers: int, base_port: int, env: Dict[str, str]) -> Tuple[List[subprocess.Popen], List[int]]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        import gunicorn  # noqa: F401
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{base_port}',
+                   '--keep-alive', '30', 'load_test_signup_tokens:create_load_test_app()']
+        processes = [subprocess.Popen(command, cwd=here, env=env)]
+        ports = [base_port]
+    except ImportError:
+        processes = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(base_port + index)],
+                             cwd=here, env=env)
+            for index in range(workers)
+        ]
+        ports = [base_port + index for index in range(workers)]
+    try:
+        for port in ports:
+            _wait_for(port)
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    return processes, ports
+
+def _sample_rss(client: _Client, ports: List[int], samples: int) -> Dict[int, float]:
+    rss = {}
+    for index in range(samples):
+        _, body = client.request(ports[index % len(ports)], 'GET', '/stats')
+        rss[body['pid']] = body['rss_mb']
+    return rss
+
+def run_load_test(signups: int = 100_000, workers: int = 4, client_threads: int = 32, base_port: int = 18700,
+                  duplicate_every: int = 10, database_url: Optional[str] = None) -> Dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix='signup_tokens_')
+    env = dict(os.environ, SIGNUP_TOKEN_DATABASE_URL=database_url or f"sqlite:///{directory}/signup_tokens.db")
+    # Create the schema once up front rather than racing in every worker
+    from signup_token_store import SQLSignupTokenStore
+    store = SQLSignupTokenStore(env['SIGNUP_TOKEN_DATABASE_URL'], sweep_interval=0)
+    processes, ports = start_workers(workers, base_port, env)
+    client = _Client()
+    counts = {'created': 0, 'confirmed': 0, 'rejected': 0, 'double_confirmed': 0, 'duplicates_rejected': 0,
+              'errors': 0, 'cross_process_confirms': 0}
+    lock = threading.Lock()
+
+    def one_signup(index: int):
+        try:
+            status, body = client.request(ports[index % len(ports)], 'POST', f'/signup/{index}')
+            if status != 200:
+                raise RuntimeError(f"signup returned {status}")
+            token, signup_pid = body['token'], body['pid']
+            confirm_port = ports[(index + 1) % len(ports)]
+            status, body = client.request(confirm_port, 'POST', f'/confirm/{token}')
+            duplicate = client.request(ports[index % len(ports)], 'POST', f'/confirm/{token}') \
+                if index % duplicate_every == 0 else None
+        except Exception:
+            with lock:
+                counts['errors'] += 1
+            return
+        with lock:
+            counts['created'] += 1
+            if status == 200 and body.get('index') == index:
+                counts['confirmed'] += 1
+                counts['cross_process_confirms'] += 1 if body['pid'] != signup_pid else 0
+            else:
+                counts['rejected'] += 1
+            if duplicate is not None:
+                counts['double_confirmed' if duplicate[0] == 200 else 'duplicates_rejected'] += 1
+
+    try:
+        started = time.perf_counter()
+        rss_start = None
+        with ThreadPoolExecutor(max_workers=client_threads) as executor:
+            warmup = min(signups, 5_000)
+            list(executor.map(one_signup, range(warmup)))
+            rss_start = _sample_rss(client, ports, workers * 4)
+            list(executor.map(one_signup, range(warmup, signups)))
+        elapsed = time.perf_counter() - started
+        rss_end = _sample_rss(client, ports, workers * 4)
+        remaining = store.count()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    return dict(counts, **{
+        'signups': signups,
+        'workers': workers,
+        'lost_confirmations': counts['created'] - counts['confirmed'],
+        'tokens_left_in_store': remaining,
+        'seconds': round(elapsed, 1),
+        'signup_confirm_pairs_per_second': round(counts['created'] / elapsed),
+        'worker_rss_mb_after_warmup': rss_start,
+        'worker_rss_mb_at_end': rss_end
+    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the signup token store across worker processes")
+    parser.add_argument("--signups", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--client-threads", type=int, default=32)
+    parser.add_argument("--base-port", type=int, default=18700)
+    parser.add_argument("--database-url", help="defaults to a scratch SQLite file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietKeepAliveHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        make_server('127.0.0.1', args.port, create_load_test_app(), threaded=True,
+                    request_handler=QuietKeepAliveHandler).serve_forever()
+        raise SystemExit(0)
+
+    results = run_load_test(args.signups, args.workers, args.client_threads, args.base_port,
+                            database_url=args.database_url)
+    for key, value in results.items():
+        print(f"{key}: {value}")
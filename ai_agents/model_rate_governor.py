@@ -0,0 +1,450 @@
+"""
+4UAI Model Rate Governor
+Central limits for outbound OpenAI/Anthropic calls: token buckets per
+provider/model (requests and tokens per minute), bounded concurrency,
+weighted fair queuing across tenants with priority lanes, and
+Retry-After aware backoff
+
+The buckets live in process memory, so every worker process enforces its
+own copy. Configured limits are account-wide and are divided by the worker
+count (MODEL_GOVERNOR_WORKERS, falling back to WEB_CONCURRENCY, default 1)
+so N workers together stay within the provider quota. Set it to the number
+of processes that share one API key.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes; a lower value is always dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STANDARD = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_STANDARD: 'standard',
+    PRIORITY_BATCH: 'batch'
+}
+
+# Per provider defaults; MODEL_RATE_LIMITS (JSON) can override them per
+# "provider" or "provider/model", e.g. {"openai/gpt-4o": {"tokens_per_minute": 450000}}
+DEFAULT_RATE_LIMITS = {
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': 300000, 'max_concurrency': 16},
+    'anthropic': {'requests_per_minute': 50, 'tokens_per_minute': 80000, 'max_concurrency': 8}
+}
+FALLBACK_RATE_LIMITS = {'requests_per_minute': 60, 'tokens_per_minute': 60000, 'max_concurrency': 4}
+SHARED_LIMIT_KEYS = ('requests_per_minute', 'tokens_per_minute', 'max_concurrency')
+
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 60.0
+MAX_RATE_LIMIT_RETRIES = 3
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+WAIT_SAMPLE_SIZE = 1000
+MAX_TRACKED_TENANTS = 10000
+
+class RateLimitTimeout(Exception):
+    """Raised when a call could not be scheduled within its queue timeout"""
+
+def estimate_tokens(*texts: Optional[str], max_tokens: int = 0) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget"""
+    return sum(len(text) for text in texts if text) // 4 + (max_tokens or 0)
+
+def _message_texts(messages: List[Dict]) -> List[str]:
+    texts = []
+    for message in messages or []:
+        content = message.get('content')
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(block.get('text', '') for block in content if isinstance(block, dict))
+    return texts
+
+def response_token_count(response: Any) -> Optional[int]:
+    """Actual tokens used by an OpenAI or Anthropic response, if reported"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None
+    total = getattr(usage, 'total_tokens', None)
+    if total is not None:
+        return total
+    input_tokens = getattr(usage, 'input_tokens', None)
+    output_tokens = getattr(usage, 'output_tokens', None)
+    if input_tokens is None and output_tokens is None:
+        return None
+    return (input_tokens or 0) + (output_tokens or 0)
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server requested delay from retry-after-ms / retry-after headers"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Continuously refilled bucket sized to one minute of capacity"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def adjust(self, delta: float):
+        """Settle an estimate: positive delta takes more, negative gives back"""
+        self.level = min(self.capacity, self.level - delta)
+
+@dataclass
+class QueuedCall:
+    tenant: str
+    priority: int
+    tokens: int
+    start_tag: float
+    enqueued_at: float
+    cancelled: bool = False
+
+@dataclass
+class LaneMetrics:
+    granted: int = 0
+    timeouts: int = 0
+    throttled: int = 0
+    retries: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    waits: Dict[int, Deque[float]] = field(
+        default_factory=lambda: {priority: deque(maxlen=WAIT_SAMPLE_SIZE) for priority in PRIORITY_NAMES}
+    )
+
+@dataclass
+class CallSlot:
+    """A granted permission to call the provider; settle actual usage before release"""
+    lane: 'ProviderLane'
+    tenant: str
+    priority: int
+    reserved_tokens: int
+    queue_wait: float
+    actual_tokens: Optional[int] = None
+
+    def record_usage(self, tokens: Optional[int]):
+        self.actual_tokens = tokens
+
+class ProviderLane:
+    """Buckets, concurrency and the fair queue for one provider/model"""
+
+    def __init__(self, provider: str, model: str, limits: Dict):
+        self.provider = provider
+        self.model = model
+        self.request_bucket = TokenBucket(limits['requests_per_minute'])
+        self.token_bucket = TokenBucket(limits['tokens_per_minute'])
+        self.max_concurrency = limits['max_concurrency']
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+        self.metrics = LaneMetrics()
+        self._queue: List[Tuple[int, float, int, QueuedCall]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._tenant_finish: Dict[str, float] = {}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for entry in self._queue if not entry[-1].cancelled)
+
+    def enqueue(self, tenant: str, priority: int, tokens: int, weight: float, now: float) -> QueuedCall:
+        """
+        Weighted fair queuing: each tenant's calls get consecutive virtual
+        finish tags sized by tokens/weight, so a tenant with a burst queues
+        behind other tenants' next calls instead of ahead of them.
+        """
+        start_tag = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+        finish_tag = start_tag + max(tokens, 1) / weight
+        self._tenant_finish[tenant] = finish_tag
+        if len(self._tenant_finish) > MAX_TRACKED_TENANTS:
+            self._tenant_finish = {
+                name: tag for name, tag in self._tenant_finish.items() if tag > self._virtual_time
+            }
+        call = QueuedCall(tenant, priority, tokens, start_tag, now)
+        heapq.heappush(self._queue, (priority, finish_tag, next(self._sequence), call))
+        return call
+
+    def head(self) -> Optional[QueuedCall]:
+        while self._queue and self._queue[0][-1].cancelled:
+            heapq.heappop(self._queue)
+        return self._queue[0][-1] if self._queue else None
+
+    def ready_in(self, call: QueuedCall, now: float) -> Optional[float]:
+        """Seconds until call may start; None while all concurrency slots are busy"""
+        if self.in_flight >= self.max_concurrency:
+            return None
+        return max(
+            self.paused_until - now,
+            self.request_bucket.wait_time(1, now),
+            self.token_bucket.wait_time(call.tokens, now)
+        )
+
+    def grant(self, call: QueuedCall, now: float) -> float:
+        heapq.heappop(self._queue)
+        self._virtual_time = max(self._virtual_time, call.start_tag)
+        self.request_bucket.take(1, now)
+        self.token_bucket.take(call.tokens, now)
+        self.in_flight += 1
+
+        wait = now - call.enqueued_at
+        self.metrics.granted += 1
+        self.metrics.total_wait += wait
+        self.metrics.max_wait = max(self.metrics.max_wait, wait)
+        self.metrics.waits[call.priority].append(wait)
+        return wait
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+class ModelRateGovernor:
+    """Process-wide gate for model API calls"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict]] = None, workers: int = 1):
+        self.workers = max(1, int(workers))
+        self.limits = {name: dict(values) for name, values in DEFAULT_RATE_LIMITS.items()}
+        for name, values in (limits or {}).items():
+            self.limits.setdefault(name, {}).update(values)
+        self._lanes: Dict[Tuple[str, str], ProviderLane] = {}
+        self._tenant_weights: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, provider: str, model: Optional[str] = None, **limits):
+        """Override limits for a provider or one model; applies to lanes created afterwards"""
+        key = f"{provider}/{model}" if model else provider
+        with self._lock:
+            self.limits.setdefault(key, {}).update(limits)
+            for lane_key in [lane_key for lane_key in self._lanes if lane_key[0] == provider
+                             and (model is None or lane_key[1] == model)]:
+                if not self._lanes[lane_key].in_flight and not self._lanes[lane_key].queued:
+                    del self._lanes[lane_key]
+
+    def set_tenant_weight(self, tenant, weight: float):
+        """Relative share of a tenant under contention (default 1.0)"""
+        self._tenant_weights[str(tenant)] = max(weight, 0.01)
+
+    def _limits_for(self, provider: str, model: str) -> Dict:
+        resolved = dict(FALLBACK_RATE_LIMITS)
+        resolved.update(self.limits.get(provider, {}))
+        resolved.update(self.limits.get(f"{provider}/{model}", {}))
+        if self.workers > 1:
+            # Each process takes an equal share of the account-wide limits
+            for name in SHARED_LIMIT_KEYS:
+                share = resolved[name] / self.workers
+                resolved[name] = max(1, int(share)) if name == 'max_concurrency' else max(1.0, share)
+        return resolved
+
+    def _lane(self, provider: str, model: str) -> ProviderLane:
+        key = (provider, model)
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = ProviderLane(provider, model, self._limits_for(provider, model))
+                    self._lanes[key] = lane
+        return lane
+
+    def acquire(self, provider: str, model: str, tenant=None, priority: int = PRIORITY_STANDARD,
+                estimated_tokens: int = 1000, timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS) -> CallSlot:
+        """Block until the call may start; raises RateLimitTimeout after timeout seconds"""
+        lane = self._lane(provider, model)
+        tenant = str(tenant) if tenant is not None else 'system'
+        weight = self._tenant_weights.get(tenant, 1.0)
+        deadline = time.monotonic() + timeout
+
+        with lane.condition:
+            call = lane.enqueue(tenant, priority, estimated_tokens, weight, time.monotonic())
+            while True:
+                now = time.monotonic()
+                wait = None
+                if lane.head() is call:
+                    wait = lane.ready_in(call, now)
+                    if wait is not None and wait <= 0:
+                        queue_wait = lane.grant(call, now)
+                        # The next caller in line may be able to start too
+                        lane.condition.notify_all()
+                        return CallSlot(lane, tenant, priority, estimated_tokens, queue_wait)
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    call.cancelled = True
+                    lane.metrics.timeouts += 1
+                    lane.condition.notify_all()
+                    raise RateLimitTimeout(
+                        f"{provider}/{model} call for {tenant} not scheduled within {timeout:g}s"
+                    )
+                lane.condition.wait(min(wait, remaining) if wait is not None else remaining)
+
+    def release(self, slot: CallSlot):
+        lane = slot.lane
+        with lane.condition:
+            lane.in_flight -= 1
+            if slot.actual_tokens is not None:
+                lane.token_bucket.adjust(slot.actual_tokens - slot.reserved_tokens)
+            lane.condition.notify_all()
+
+    @contextmanager
+    def slot(self, provider: str, model: str, tenant=None, priority: int = PRIORITY_STANDARD,
+             estimated_tokens: int = 1000, timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        call_slot = self.acquire(provider, model, tenant, priority, estimated_tokens, timeout)
+        try:
+            yield call_slot
+        finally:
+            self.release(call_slot)
+
+    def backoff(self, provider: str, model: str, delay: float):
+        """Pause the whole lane, e.g. after a 429 with Retry-After"""
+        lane = self._lane(provider, model)
+        with lane.condition:
+            lane.paused_until = max(lane.paused_until, time.monotonic() + delay)
+            lane.metrics.throttled += 1
+            lane.condition.notify_all()
+        logger.warning(f"Rate limited by {provider}/{model}, pausing for {delay:.1f}s")
+
+    def call(self, provider: str, model: str, func: Callable[[], Any], tenant=None,
+             priority: int = PRIORITY_STANDARD, estimated_tokens: int = 1000,
+             timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS, max_retries: int = MAX_RATE_LIMIT_RETRIES):
+        """Run func under the provider limits, retrying rate-limit errors after backoff"""
+        for attempt in range(max_retries + 1):
+            with self.slot(provider, model, tenant, priority, estimated_tokens, timeout) as call_slot:
+                try:
+                    response = func()
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt >= max_retries:
+                        raise
+                    delay = retry_after_seconds(e)
+                    if delay is None:
+                        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+                        delay *= 0.5 + random.random() / 2
+                    call_slot.lane.metrics.retries += 1
+                    self.backoff(provider, model, delay)
+                    continue
+                call_slot.record_usage(response_token_count(response))
+                return response
+
+    def get_metrics(self) -> Dict:
+        lanes = {}
+        now = time.monotonic()
+        for (provider, model), lane in list(self._lanes.items()):
+            with lane.condition:
+                metrics = lane.metrics
+                lanes[f"{provider}/{model}"] = {
+                    'queued': lane.queued,
+                    'in_flight': lane.in_flight,
+                    'max_concurrency': lane.max_concurrency,
+                    'paused_for_seconds': round(max(0.0, lane.paused_until - now), 3),
+                    'requests_available': round(lane.request_bucket.level, 1),
+                    'tokens_available': round(lane.token_bucket.level),
+                    'granted': metrics.granted,
+                    'timeouts': metrics.timeouts,
+                    'throttled': metrics.throttled,
+                    'retries': metrics.retries,
+                    'avg_queue_wait_seconds': round(metrics.total_wait / metrics.granted, 4) if metrics.granted else None,
+                    'max_queue_wait_seconds': round(metrics.max_wait, 4),
+                    'queue_wait_by_priority': {
+                        PRIORITY_NAMES[priority]: {
+                            'samples': len(samples),
+                            'p50_seconds': _percentile(samples, 0.50),
+                            'p95_seconds': _percentile(samples, 0.95)
+                        } for priority, samples in metrics.waits.items()
+                    }
+                }
+        return {'lanes': lanes, 'workers': self.workers, 'tenant_weights': dict(self._tenant_weights)}
+
+def _limits_from_environment() -> Dict[str, Dict]:
+    raw = os.getenv('MODEL_RATE_LIMITS')
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logger.error("MODEL_RATE_LIMITS is not valid JSON, using default rate limits")
+        return {}
+
+def _workers_from_environment() -> int:
+    raw = os.getenv('MODEL_GOVERNOR_WORKERS') or os.getenv('WEB_CONCURRENCY') or '1'
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        logger.error("MODEL_GOVERNOR_WORKERS is not an integer, assuming a single worker")
+        return 1
+
+# Global governor instance; holds this process's share of the limits
+model_governor = ModelRateGovernor(_limits_from_environment(), _workers_from_environment())
+
+def _queue_timeout(request: Dict) -> float:
+    """A per-request timeout also caps how long the call may wait for a slot"""
+    timeout = request.get('timeout')
+    if isinstance(timeout, (int, float)):
+        return max(0.0, min(DEFAULT_QUEUE_TIMEOUT_SECONDS, timeout))
+    return DEFAULT_QUEUE_TIMEOUT_SECONDS
+
+def openai_chat_completion(client, tenant=None, priority: int = PRIORITY_STANDARD, **request):
+    """client.chat.completions.create(**request) under the shared limits"""
+    estimated = estimate_tokens(*_message_texts(request.get('messages')), max_tokens=request.get('max_tokens', 0))
+    return model_governor.call(
+        'openai', request.get('model', 'unknown'),
+        lambda: client.chat.completions.create(**request),
+        tenant=tenant, priority=priority, estimated_tokens=estimated, timeout=_queue_timeout(request)
+    )
+
+def anthropic_message(client, tenant=None, priority: int = PRIORITY_STANDARD, **request):
+    """client.messages.create(**request) under the shared limits"""
+    texts = _message_texts(request.get('messages'))
+    system = request.get('system')
+    if isinstance(system, str):
+        texts.append(system)
+    elif isinstance(system, list):
+        texts.extend(block.get('text', '') for block in system if isinstance(block, dict))
+    estimated = estimate_tokens(*texts, max_tokens=request.get('max_tokens', 0))
+    return model_governor.call(
+        'anthropic', request.get('model', 'unknown'),
+        lambda: client.messages.create(**request),
+        tenant=tenant, priority=priority, estimated_tokens=estimated, timeout=_queue_timeout(request)
+    )
@@ -0,0 +1,272 @@
+"""
+Local Notification Sinks
+An in-process SMTP sink and a fake Telegram Bot API endpoint for exercising
+the notification outbox offline, plus a comparison of handler latency when
+notifications are sent inline versus queued in the outbox.
+
+Usage: python notification_sinks.py --requests 500 --telegram-latency 0.08
+"""
+
+import argparse
+import json
+import os
+import re
+import socketserver
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        sink: 'LocalSMTPSink' = self.server.sink
+        self._reply("220 localhost notification sink")
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self._reply("250 localhost")
+            elif verb == 'MAIL':
+                mail_from, recipients = command[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self._reply("250 OK")
+            elif verb == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if sink.should_defer():
+                    self._reply("451 Temporary failure, try again later")
+                else:
+                    sink.messages.append({'from': mail_from, 'to': recipients, 'data': b"".join(lines)})
+                    self._reply("250 OK queued")
+            elif verb == 'RSET':
+                mail_from, recipients = None, []
+                self._reply("250 OK")
+            elif verb == 'NOOP':
+                self._reply("250 OK")
+            elif verb == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class LocalSMTPSink:
+    """
+    Threaded SMTP server on localhost that keeps every message it accepts.
+    defer_every=N answers every Nth DATA with a 451 so retries can be seen.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, defer_every: int = 0):
+        self.messages: List[Dict[str, Any]] = []
+        self.defer_every = defer_every
+        self._received = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def should_defer(self) -> bool:
+        with self._lock:
+            self._received += 1
+            return bool(self.defer_every) and self._received % self.defer_every == 0
+
+    def start(self) -> 'LocalSMTPSink':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        fake: 'FakeTelegramServer' = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not re.fullmatch(r'/bot[^/]+/sendMessage', self.path):
+            self._respond(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        if fake.latency:
+            time.sleep(fake.latency)
+        outcome = fake.next_outcome()
+        if outcome == 429:
+            self._respond(429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry later',
+                                'parameters': {'retry_after': fake.retry_after}})
+        elif outcome == 500:
+            self._respond(500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'})
+        elif not body.get('chat_id') or not body.get('text'):
+            self._respond(400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message text is empty'})
+        else:
+            with fake.lock:
+                fake.messages.append(body)
+                message_id = len(fake.messages)
+            self._respond(200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': body['chat_id']},
+                                                       'text': body['text']}})
+
+class FakeTelegramServer:
+    """
+    Bot API stand-in answering POST /bot<token>/sendMessage. Point the
+    outbox at it with TELEGRAM_API_BASE=server.base_url. Adds latency per
+    call and can answer every Nth call with 429 (retry_after) or 500.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 rate_limit_every: int = 0, fail_every: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.messages: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self._calls = 0
+        self._server = ThreadingHTTPServer((host, port), _TelegramHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_outcome(self) -> int:
+        with self.lock:
+            self._calls += 1
+            calls = self._calls
+        if self.rate_limit_every and calls % self.rate_limit_every == 0:
+            return 429
+        if self.fail_every and calls % self.fail_every == 0:
+            return 500
+        return 200
+
+    def start(self) -> 'FakeTelegramServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+        'p50_ms': round(pick(0.50) * 1000, 2),
+        'p99_ms': round(pick(0.99) * 1000, 2)
+    }
+
+def measure_request_latency(requests: int = 500, telegram_latency: float = 0.08,
+                            rate_limit_every: int = 0) -> Dict[str, Any]:
+    """
+    Time the notification part of a request handler: before, a blocking
+    sendMessage call per request (what CEOAIAgent.send_telegram_message
+    did); after, enqueue_notification() committing one outbox row. Then
+    wait for the dispatcher to drain the queued rows into the fake endpoint.
+    """
+    from app import app, db
+    from notification_outbox import (STATUS_DEAD, STATUS_SENT, HTTPConnectionPool, NotificationDispatcher,
+                                     NotificationOutbox, enqueue_notification)
+    import notification_outbox
+
+    with FakeTelegramServer(latency=telegram_latency, rate_limit_every=rate_limit_every) as telegram:
+        os.environ['TELEGRAM_BOT_TOKEN_4UAI'] = os.environ.get('TELEGRAM_BOT_TOKEN_4UAI') or 'local-test-token'
+        os.environ['TELEGRAM_API_BASE'] = telegram.base_url
+        url = f"{telegram.base_url}/bot{os.environ['TELEGRAM_BOT_TOKEN_4UAI']}/sendMessage"
+
+        # The previous send_telegram_message opened a new connection per call
+        inline = []
+        for index in range(requests):
+            started = time.perf_counter()
+            HTTPConnectionPool().post_json(url, {'chat_id': 'bench', 'text': f'inline {index}'})
+            inline.append(time.perf_counter() - started)
+
+        # No per-channel limit here, so drain time reflects the worker pool
+        dispatcher = NotificationDispatcher(rate_limits={}, poll_interval=0.05)
+        notification_outbox.notification_dispatcher = dispatcher
+        queued = []
+        with app.app_context():
+            NotificationOutbox.__table__.create(db.engine, checkfirst=True)
+            for index in range(requests):
+                started = time.perf_counter()
+                enqueue_notification('telegram', 'bench', {'text': f'queued {index}', 'parse_mode': 'Markdown'})
+                queued.append(time.perf_counter() - started)
+
+            drain_started = time.perf_counter()
+            while time.perf_counter() - drain_started < 120:
+                remaining = NotificationOutbox.query.filter(
+                    NotificationOutbox.status.notin_([STATUS_SENT, STATUS_DEAD])).count()
+                if not remaining:
+                    break
+                time.sleep(0.05)
+            drain_seconds = time.perf_counter() - drain_started
+            dispatcher.stop()
+            sent = NotificationOutbox.query.filter_by(status=STATUS_SENT).count()
+
+        return {
+            'requests': requests,
+            'telegram_latency_ms': telegram_latency * 1000,
+            'inline_send': _percentiles(inline),
+            'outbox_enqueue': _percentiles(queued),
+            'outbox_delivered': sent,
+            'outbox_drain_seconds': round(drain_seconds, 2),
+            'fake_telegram_messages': len(telegram.messages),
+            'dispatcher': dispatcher.stats
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inline notification sends with the outbox")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--telegram-latency", type=float, default=0.08, help="seconds added per fake sendMessage")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth call with 429")
+    args = parser.parse_args()
+    for key, value in measure_request_latency(args.requests, args.telegram_latency, args.rate_limit_every).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,143 @@
+"""
+Agent Orchestration Live Metrics
+Fixed-size recent task history plus streaming per-agent counters and latency
+sketches, so memory stays flat no matter how many tasks have run
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from agent_performance_rollups import DDSketch
+
+TASK_HISTORY_SIZE = 200
+THROUGHPUT_WINDOW_MINUTES = 15
+METRICS_SNAPSHOT_TTL_SECONDS = 5.0
+
+class _AgentCounters:
+    __slots__ = ('tasks', 'errors', 'total_latency', 'latency', 'last_task_at')
+
+    def __init__(self):
+        self.tasks = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.latency = DDSketch()
+        self.last_task_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'tasks': self.tasks,
+            'errors': self.errors,
+            'error_rate': self.errors / self.tasks if self.tasks else 0.0,
+            'avg_latency': self.total_latency / self.tasks if self.tasks else 0.0,
+            'p50_latency': self.latency.quantile(0.5),
+            'p95_latency': self.latency.quantile(0.95),
+            'p99_latency': self.latency.quantile(0.99),
+            'last_task_at': self.last_task_at
+        }
+
+class TaskMetrics:
+    """
+    Streaming task metrics for the orchestration service. Each record()
+    updates O(1) counters, a per-agent DDSketch (bounded bins) and a ring of
+    per-minute buckets for throughput; snapshot() folds them in one pass and
+    caches the result for snapshot_ttl seconds.
+    """
+
+    def __init__(self, history_size: int = TASK_HISTORY_SIZE,
+                 window_minutes: int = THROUGHPUT_WINDOW_MINUTES,
+                 snapshot_ttl: float = METRICS_SNAPSHOT_TTL_SECONDS):
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.window_minutes = window_minutes
+        self.snapshot_ttl = snapshot_ttl
+        self.total_tasks = 0
+        self.total_errors = 0
+        self._agents: Dict[str, _AgentCounters] = {}
+        # [minute, tasks, errors], oldest first
+        self._minutes: Deque[List[int]] = deque(maxlen=window_minutes)
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+
+    def record(self, agent_id: str, success: bool, latency: float, entry: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        minute = int(now // 60)
+        with self._lock:
+            if entry is not None:
+                self.recent.append(entry)
+            self.total_tasks += 1
+            self.total_errors += 0 if success else 1
+
+            counters = self._agents.get(agent_id)
+            if counters is None:
+                counters = self._agents[agent_id] = _AgentCounters()
+            counters.tasks += 1
+            counters.errors += 0 if success else 1
+            counters.total_latency += latency
+            counters.latency.add(latency)
+            counters.last_task_at = now
+
+            if not self._minutes or self._minutes[-1][0] != minute:
+                self._minutes.append([minute, 0, 0])
+            self._minutes[-1][1] += 1
+            self._minutes[-1][2] += 0 if success else 1
+
+    def recent_tasks(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recent first"""
+        with self._lock:
+            return [self.recent[-index] for index in range(1, min(limit, len(self.recent)) + 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            if self._snapshot is not None and now - self._snapshot_at < self.snapshot_ttl:
+                return self._snapshot
+
+            oldest_minute = int(now // 60) - self.window_minutes + 1
+            window_tasks = window_errors = 0
+            for minute, tasks, errors in self._minutes:
+                if minute >= oldest_minute:
+                    window_tasks += tasks
+                    window_errors += errors
+
+            overall = DDSketch()
+            agents = {}
+            for agent_id, counters in self._agents.items():
+                overall.merge(counters.latency)
+                agents[agent_id] = counters.to_dict()
+
+            self._snapshot = {
+                'total_tasks': self.total_tasks,
+                'total_errors': self.total_errors,
+                'error_rate': self.total_errors / self.total_tasks if self.total_tasks else 0.0,
+                'throughput_per_minute': window_tasks / self.window_minutes,
+                'window_error_rate': window_errors / window_tasks if window_tasks else 0.0,
+                'window_minutes': self.window_minutes,
+                'p50_latency': overall.quantile(0.5),
+                'p95_latency': overall.quantile(0.95),
+                'p99_latency': overall.quantile(0.99),
+                'agents': agents
+            }
+            self._snapshot_at = now
+            return self._snapshot
+
+    def group_summary(self, agent_ids: Iterable[str]) -> Dict[str, Any]:
+        """Combined counters and latency quantiles for a set of agents"""
+        tasks = errors = 0
+        latency = DDSketch()
+        with self._lock:
+            for agent_id in agent_ids:
+                counters = self._agents.get(agent_id)
+                if counters is None:
+                    continue
+                tasks += counters.tasks
+                errors += counters.errors
+                latency.merge(counters.latency)
+        return {
+            'tasks': tasks,
+            'error_rate': errors / tasks if tasks else 0.0,
+            'success_rate': (tasks - errors) / tasks if tasks else 0.0,
+            'p50_latency': latency.quantile(0.5),
+            'p95_latency': latency.quantile(0.95)
+        }
@@ -8,16 +8,21 @@ from datetime import datetime
 from flask import current_app
 from app import app, db
 from models import AIAgent, AIAgentBundle, AIBundleAgent
+from agent_catalog_upsert import catalog_upserter
 import json
 
 logger = logging.getLogger(__name__)
 
+# Owner recorded for the agents this populator writes to the catalog
+CATALOG_GENERATOR = "agent_catalog_populator"
+
 class AgentCatalogPopulator:
     """Populates the AI agent catalog with comprehensive agent network"""
     
     def __init__(self):
         self.populator_name = "Agent Catalog Populator"
         self.total_agents_to_create = 316
+        self.pending_agents = []
         
     def populate_complete_catalog(self):
         """Populate the complete AI agent catalog"""
@@ -26,11 +31,8 @@ class AgentCatalogPopulator:
         
         with app.app_context():
             try:
-                # Clear existing agents (for fresh population)
-                AIBundleAgent.query.delete()
-                AIAgentBundle.query.delete() 
-                AIAgent.query.delete()
-                db.session.commit()
+                # Generate the full catalog in memory, then apply it as one idempotent upsert
+                self.pending_agents = []
                 
                 # Create all agent categories
                 created_counts = {}
@@ -54,6 +56,16 @@ class AgentCatalogPopulator:
                 created_counts.update(self._create_hr_transformation_agents())
                 created_counts.update(self._create_emerging_tech_agents())
                 
+                # Agents this populator created earlier but no longer generates are
+                # deactivated, never deleted, so customer customizations and purchases
+                # keep their foreign keys; agents from other sources are left alone
+                upsert_result = catalog_upserter.upsert(
+                    self.pending_agents,
+                    deactivate_missing=True,
+                    generator=CATALOG_GENERATOR,
+                    commit=False
+                )
+                
                 # Create industry bundles
                 bundle_count = self._create_industry_bundles()
                 
@@ -61,8 +73,10 @@ class AgentCatalogPopulator:
                 
                 total_agents = sum(created_counts.values())
                 logger.info(f"✅ Agent catalog population completed:")
-                logger.info(f"   Total Agents Created: {total_agents}")
-                logger.info(f"   Industry Bundles Created: {bundle_count}")
+                logger.info(f"   Total Agents Generated: {total_agents}")
+                logger.info(f"   Inserted: {upsert_result.inserted}, Updated: {upsert_result.updated}, "
+                            f"Unchanged: {upsert_result.unchanged}, Deactivated: {upsert_result.deactivated}")
+                logger.info(f"   Industry Bundles Synced: {bundle_count}")
                 
                 for category, count in created_counts.items():
                     logger.info(f"   {category}: {count} agents")
@@ -71,7 +85,8 @@ class AgentCatalogPopulator:
                     "success": True,
                     "total_agents": total_agents,
                     "bundles_created": bundle_count,
-                    "category_breakdown": created_counts
+                    "category_breakdown": created_counts,
+                    "upsert_summary": upsert_result.to_dict()
                 }
                 
             except Exception as e:
@@ -120,8 +135,8 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_data in foundation_agents:
-            agent = AIAgent(**agent_data)
-            db.session.add(agent)
+            agent = dict(agent_data)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Foundation Agents": count}
@@ -142,7 +157,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for qa_name in qa_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=qa_name,
                 description=f"Specialized quality assurance manager for {qa_name.replace(' QA Manager', '').lower()}",
                 category="quality_assurance",
@@ -153,7 +168,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"QA Manager Agents": count}
@@ -181,7 +196,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in rpa_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="rpa_automation",
@@ -192,7 +207,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"RPA Automation Agents": count}
@@ -217,7 +232,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in automation_specialists:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="automation_specialists",
@@ -228,7 +243,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Automation Specialists": count}
@@ -249,7 +264,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in voice_ui_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="voice_ui",
@@ -260,7 +275,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Voice & UI Agents": count}
@@ -290,7 +305,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in revenue_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="revenue_optimization",
@@ -301,7 +316,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Revenue Optimization Agents": count}
@@ -319,7 +334,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description, monthly_price in c_suite_advisors:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="c_suite_advisors",
@@ -330,7 +345,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=True
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"C-Suite Advisors": count}
@@ -350,7 +365,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description, monthly_price in domain_experts:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="domain_experts",
@@ -361,7 +376,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Domain Experts": count}
@@ -383,7 +398,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in healthcare_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Specialized healthcare AI for {agent_name.replace(' AI', '').lower()}",
                 category="healthcare",
@@ -394,7 +409,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Healthcare Agents": count}
@@ -415,7 +430,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in finance_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Advanced financial services AI for {agent_name.replace(' AI', '').lower()}",
                 category="finance",
@@ -426,7 +441,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Finance Agents": count}
@@ -446,7 +461,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in manufacturing_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Smart manufacturing AI for {agent_name.replace(' AI', '').lower()}",
                 category="manufacturing",
@@ -457,7 +472,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Manufacturing Agents": count}
@@ -475,7 +490,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in legal_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Legal technology AI for {agent_name.replace(' AI', '').lower()}",
                 category="legal",
@@ -486,7 +501,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Legal Technology Agents": count}
@@ -505,7 +520,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in marketing_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Marketing intelligence AI for {agent_name.replace(' AI', '').lower()}",
                 category="marketing",
@@ -516,7 +531,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Marketing Intelligence Agents": count}
@@ -534,7 +549,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in sales_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Sales acceleration AI for {agent_name.replace(' AI', '').lower()}",
                 category="sales",
@@ -545,7 +560,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Sales Acceleration Agents": count}
@@ -562,7 +577,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in customer_success_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"Customer success AI for {agent_name.replace(' AI', '').lower()}",
                 category="customer_success",
@@ -573,7 +588,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Customer Success Agents": count}
@@ -591,7 +606,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name in hr_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=f"HR transformation AI for {agent_name.replace(' AI', '').lower()}",
                 category="hr_transformation",
@@ -602,7 +617,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"HR Transformation Agents": count}
@@ -623,7 +638,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in emerging_tech_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="emerging_tech",
@@ -634,7 +649,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Emerging Technology Agents": count}
@@ -654,7 +669,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in industry_specialists:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="industry_specialists",
@@ -665,7 +680,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Industry Specialists": count}
@@ -684,7 +699,7 @@ class AgentCatalogPopulator:
         
         count = 0
         for agent_name, description in multi_model_agents:
-            agent = AIAgent(
+            agent = dict(
                 name=agent_name,
                 description=description,
                 category="multi_model",
@@ -695,7 +710,7 @@ class AgentCatalogPopulator:
                 is_active=True,
                 is_featured=False
             )
-            db.session.add(agent)
+            self.pending_agents.append(agent)
             count += 1
         
         return {"Multi-Model AI Agents": count}
@@ -860,22 +875,47 @@ class AgentCatalogPopulator:
             }
         ]
         
+        # Existing bundles are updated in place by name so bundle purchases keep their IDs
+        existing_bundles = {
+            bundle.name: bundle
+            for bundle in AIAgentBundle.query.filter(
+                AIAgentBundle.name.in_([bundle_data['name'] for bundle_data in bundles])
+            ).all()
+        }
+        
+        # Active agent IDs per category, fetched in one query
+        bundle_categories = sorted({category for bundle_data in bundles for category in bundle_data['agent_categories']})
+        agents_by_category = {}
+        for agent_id, category in db.session.query(AIAgent.id, AIAgent.category).filter(
+            AIAgent.category.in_(bundle_categories), AIAgent.is_active == True
+        ).order_by(AIAgent.id):
+            agents_by_category.setdefault(category, [])
+            if len(agents_by_category[category]) < 8:
+                agents_by_category[category].append(agent_id)
+        
         bundle_count = 0
         for bundle_data in bundles:
             agent_categories = bundle_data.pop('agent_categories')
-            bundle = AIAgentBundle(**bundle_data)
-            db.session.add(bundle)
-            db.session.flush()  # Get bundle ID
+            bundle = existing_bundles.get(bundle_data['name'])
+            if bundle is None:
+                bundle = AIAgentBundle(**bundle_data)
+                db.session.add(bundle)
+                db.session.flush()  # Get bundle ID
+            else:
+                for key, value in bundle_data.items():
+                    setattr(bundle, key, value)
             
-            # Associate agents with bundle
-            for category in agent_categories:
-                agents = AIAgent.query.filter_by(category=category).limit(8).all()
-                for agent in agents:
-                    bundle_agent = AIBundleAgent(
-                        bundle_id=bundle.id,
-                        agent_id=agent.id
-                    )
-                    db.session.add(bundle_agent)
+            # Sync bundle membership
+            wanted_ids = {agent_id for category in agent_categories for agent_id in agents_by_category.get(category, [])}
+            current_ids = {row[0] for row in db.session.query(AIBundleAgent.agent_id).filter_by(bundle_id=bundle.id)}
+            stale_ids = current_ids - wanted_ids
+            if stale_ids:
+                AIBundleAgent.query.filter(
+                    AIBundleAgent.bundle_id == bundle.id, AIBundleAgent.agent_id.in_(stale_ids)
+                ).delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(AIBundleAgent, [
+                {'bundle_id': bundle.id, 'agent_id': agent_id} for agent_id in sorted(wanted_ids - current_ids)
+            ])
             
             bundle_count += 1
         
@@ -0,0 +1,423 @@
+"""
+Project Source Index
+Parses every Python file of a project once and keeps the AST-derived facts
+the enterprise architecture and code quality agents need, cached by path
+and mtime/size with a content hash fallback. Changed files are re-parsed in
+a process pool; the module import graph and its cycles (Tarjan SCC) are
+recomputed only when something changed.
+
+Usage: python project_index.py PATH
+       python project_index.py --synthetic 10000
+"""
+
+import argparse
+import ast
+import hashlib
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SKIP_DIRECTORIES = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv', '.tox',
+                    '.mypy_cache', '.pytest_cache'}
+
+# Below this many changed files a process pool costs more than it saves
+PROJECT_INDEX_POOL_THRESHOLD = 200
+PROJECT_INDEX_CHUNK_SIZE = 32
+
+MAX_LINE_LENGTH = 100
+
+BRANCH_NODES = (ast.If, ast.While, ast.For, ast.With, ast.Try)
+
+@dataclass
+class FileFacts:
+    """Everything the agents read from one source file"""
+    path: str                     # relative to the project root, '/'-separated
+    module: str                   # dotted module name derived from path
+    mtime_ns: int
+    size: int
+    content_hash: str
+    lines: int = 0
+    function_count: int = 0
+    class_count: int = 0
+    import_count: int = 0
+    complexity: int = 0
+    classes: List[Tuple[str, int]] = field(default_factory=list)          # (name, methods in body)
+    imports: List[Tuple[str, int, Tuple[str, ...]]] = field(default_factory=list)  # module level only
+    style_issues: List[Tuple[int, str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def file_name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def directory(self) -> str:
+        return self.path.rsplit('/', 1)[0] if '/' in self.path else '.'
+
+def module_name(relative_path: str) -> str:
+    parts = relative_path[:-3].split('/')
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+def _content_hash(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+def _module_level_imports(tree: ast.Module) -> List[Tuple[str, int, Tuple[str, ...]]]:
+    """
+    Imports executed when the module is imported, including ones under
+    if/try/with at module level; imports inside functions and classes are
+    deferred and can't take part in an import cycle.
+    """
+    imports = []
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, 0, ()) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append((node.module or '', node.level, tuple(alias.name for alias in node.names)))
+        elif isinstance(node, (ast.If, ast.For, ast.While, ast.With, ast.Try)):
+            pending.extend(node.body)
+            pending.extend(getattr(node, 'orelse', []))
+            pending.extend(getattr(node, 'finalbody', []))
+            for handler in getattr(node, 'handlers', []):
+                pending.extend(handler.body)
+    return imports
+
+def _style_issues(text: str) -> List[Tuple[int, str]]:
+    issues = []
+    # splitlines() drops '\n', '\r\n' and '\r' alike, so CRLF files are not flagged
+    for number, line in enumerate(text.splitlines(), 1):
+        if len(line.strip()) > MAX_LINE_LENGTH:
+            issues.append((number, "Line too long"))
+        if line != line.rstrip():
+            issues.append((number, "Trailing whitespace"))
+    return issues
+
+def analyze_file(root: str, relative_path: str, mtime_ns: int, size: int,
+                 content: Optional[bytes] = None) -> FileFacts:
+    """Read and parse one file; runs in the pool workers"""
+    if content is None:
+        with open(os.path.join(root, relative_path), 'rb') as f:
+            content = f.read()
+    facts = FileFacts(path=relative_path, module=module_name(relative_path), mtime_ns=mtime_ns, size=size,
+                      content_hash=_content_hash(content))
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError as e:
+        facts.error = str(e)
+        return facts
+    facts.lines = len(text.splitlines())
+    facts.style_issues = _style_issues(text)
+    try:
+        tree = ast.parse(text, filename=relative_path)
+    except (SyntaxError, ValueError) as e:
+        facts.error = str(e)
+        return facts
+
+    complexity = 1
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            facts.function_count += 1
+        elif isinstance(node, ast.ClassDef):
+            facts.class_count += 1
+            facts.classes.append((node.name, sum(1 for n in node.body if isinstance(n, ast.FunctionDef))))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            facts.import_count += 1
+        if isinstance(node, BRANCH_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+    facts.complexity = complexity
+    facts.imports = _module_level_imports(tree)
+    return facts
+
+def _analyze_batch(root: str, batch: List[Tuple[str, int, int]]) -> List[FileFacts]:
+    results = []
+    for relative_path, mtime_ns, size in batch:
+        try:
+            results.append(analyze_file(root, relative_path, mtime_ns, size))
+        except OSError as e:
+            results.append(FileFacts(path=relative_path, module=module_name(relative_path), mtime_ns=mtime_ns,
+                                     size=size, content_hash='', error=str(e)))
+    return results
+
+def strongly_connected_components(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """Tarjan's algorithm, iterative so deep import chains don't hit the recursion limit"""
+    index_of: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    components: List[List[str]] = []
+    counter = 0
+
+    for start in graph:
+        if start in index_of:
+            continue
+        work = [(start, iter(graph[start]))]
+        index_of[start] = lowlink[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index_of:
+                    index_of[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[successor])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+class ProjectIndex:
+    """
+    Source facts for one project root. refresh() walks the tree and only
+    re-reads files whose mtime or size changed; if their content hash is
+    unchanged (a checkout or touch) the cached facts are kept. Thread-safe:
+    concurrent refreshes of the same root share one walk.
+    """
+
+    def __init__(self, root: str, workers: Optional[int] = None,
+                 pool_threshold: int = PROJECT_INDEX_POOL_THRESHOLD):
+        self.root = os.path.abspath(root)
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.pool_threshold = pool_threshold
+        self.files: Dict[str, FileFacts] = {}
+        self._lock = threading.Lock()
+        self._graph: Optional[Dict[str, Set[str]]] = None
+        self._cycles: Optional[List[List[str]]] = None
+        self.last_refresh: Dict[str, float] = {}
+
+    def _walk(self) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        pending = ['']
+        while pending:
+            relative_dir = pending.pop()
+            try:
+                entries = os.scandir(os.path.join(self.root, relative_dir))
+            except OSError as e:
+                logger.warning(f"Cannot read {relative_dir or self.root}: {e}")
+                continue
+            with entries:
+                for entry in entries:
+                    relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRECTORIES:
+                            pending.append(relative_path)
+                    elif entry.name.endswith('.py'):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        found[relative_path] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def refresh(self) -> Dict[str, float]:
+        """Bring the index up to date with the tree; returns counts and timing"""
+        with self._lock:
+            started = time.perf_counter()
+            found = self._walk()
+            removed = [path for path in self.files if path not in found]
+            for path in removed:
+                del self.files[path]
+
+            to_parse, touched = [], 0
+            for path, (mtime_ns, size) in found.items():
+                cached = self.files.get(path)
+                if cached is not None and cached.mtime_ns == mtime_ns and cached.size == size:
+                    continue
+                if cached is not None and cached.content_hash:
+                    try:
+                        with open(os.path.join(self.root, path), 'rb') as f:
+                            content = f.read()
+                    except OSError:
+                        content = None
+                    if content is not None and _content_hash(content) == cached.content_hash:
+                        cached.mtime_ns, cached.size = mtime_ns, size
+                        touched += 1
+                        continue
+                to_parse.append((path, mtime_ns, size))
+
+            for facts in self._parse(to_parse):
+                self.files[facts.path] = facts
+            if removed or to_parse:
+                self._graph = self._cycles = None
+
+            self.last_refresh = {
+                'files': len(self.files),
+                'parsed': len(to_parse),
+                'unchanged_after_touch': touched,
+                'removed': len(removed),
+                'seconds': round(time.perf_counter() - started, 4)
+            }
+            return self.last_refresh
+
+    def _parse(self, to_parse: List[Tuple[str, int, int]]) -> List[FileFacts]:
+        if len(to_parse) < self.pool_threshold or self.workers < 2:
+            return _analyze_batch(self.root, to_parse)
+        batches = [to_parse[i:i + PROJECT_INDEX_CHUNK_SIZE] for i in range(0, len(to_parse), PROJECT_INDEX_CHUNK_SIZE)]
+        try:
+            # spawn: callers are usually threads of an asyncio process, where fork is unsafe
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                return [facts for batch in pool.map(_analyze_batch, [self.root] * len(batches), batches)
+                        for facts in batch]
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Process pool unavailable ({e}); parsing {len(to_parse)} files in-process")
+            return _analyze_batch(self.root, to_parse)
+
+    def _resolve(self, facts: FileFacts, module: str, level: int, names: Tuple[str, ...],
+                 modules: Set[str]) -> Set[str]:
+        """Project modules an import refers to; third-party and stdlib imports resolve to nothing"""
+        if level:
+            package = facts.module.split('.') if facts.path.endswith('__init__.py') else facts.module.split('.')[:-1]
+            if level - 1 > len(package):
+                return set()
+            base = package[:len(package) - (level - 1)]
+            candidates = [('.'.join(base + ([module] if module else [])), 1)]
+        else:
+            # Scripts here import siblings by bare name, so try the file's own package first
+            package = facts.module.split('.')[:-1]
+            candidates = [(module, 1)]
+            if package:
+                candidates.insert(0, ('.'.join(package + [module]), len(package) + 1))
+
+        targets = set()
+        for candidate, minimum_depth in candidates:
+            if not candidate:
+                continue
+            targets |= {f"{candidate}.{name}" for name in names} & modules
+            # `import a.b.c` also imports a and a.b; take the deepest project module,
+            # but never fall back from a sibling candidate to the file's own package
+            parts = candidate.split('.')
+            while len(parts) >= minimum_depth and '.'.join(parts) not in modules:
+                parts.pop()
+            if len(parts) >= minimum_depth:
+                targets.add('.'.join(parts))
+            if targets:
+                break
+        targets.discard(facts.module)
+        return targets
+
+    def import_graph(self) -> Dict[str, Set[str]]:
+        """module -> project modules it imports at module level"""
+        with self._lock:
+            if self._graph is None:
+                modules = {facts.module for facts in self.files.values()}
+                graph: Dict[str, Set[str]] = {}
+                for facts in self.files.values():
+                    edges = graph.setdefault(facts.module, set())
+                    for module, level, names in facts.imports:
+                        edges |= self._resolve(facts, module, level, names, modules)
+                self._graph = graph
+            return self._graph
+
+    def circular_dependencies(self) -> List[List[str]]:
+        """Groups of modules that import each other, directly or through a chain"""
+        graph = self.import_graph()
+        with self._lock:
+            if self._cycles is None:
+                self._cycles = sorted(sorted(component) for component in strongly_connected_components(graph)
+                                      if len(component) > 1)
+            return self._cycles
+
+_project_indexes: Dict[str, ProjectIndex] = {}
+_project_indexes_lock = threading.Lock()
+
+def get_project_index(project_path: str) -> ProjectIndex:
+    """Shared index per project root, so every agent reuses the same cache"""
+    root = os.path.realpath(project_path)
+    with _project_indexes_lock:
+        if root not in _project_indexes:
+            _project_indexes[root] = ProjectIndex(root)
+        return _project_indexes[root]
+
+def generate_synthetic_project(root: str, file_count: int, seed: int = 11):
+    """A tree of file_count modules in packages of 50, importing each other (including some cycles)"""
+    rng = random.Random(seed)
+    for index in range(file_count):
+        package = f"pkg_{index // 50:04d}"
+        directory = os.path.join(root, package)
+        if index % 50 == 0:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, '__init__.py'), 'w') as f:
+                f.write('')
+        imports = sorted({f"pkg_{target // 50:04d}.mod_{target:05d}" for target in
+                          (rng.randrange(file_count) for _ in range(3))})
+        body = [f"import {name}" for name in imports]
+        body += ["import os", "", ""]
+        for number in range(rng.randrange(1, 4)):
+            methods = rng.choice([3, 5, 18])
+            body.append(f"class Service{number}:")
+            for method in range(methods):
+                body += [f"    def method_{method}(self, value):",
+                         "        if value and value > 1 or value < -3:",
+                         "            return value",
+                         "        for item in range(value):",
+                         "            value += item",
+                         "        return value", ""]
+        with open(os.path.join(directory, f"mod_{index:05d}.py"), 'w') as f:
+            f.write("\n".join(body) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index a project and time cold and warm refreshes")
+    parser.add_argument("path", nargs="?", default=".")
+    parser.add_argument("--synthetic", type=int, help="index a generated tree with this many files instead")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    scratch = None
+    path = args.path
+    if args.synthetic:
+        scratch = path = tempfile.mkdtemp(prefix='project_index_')
+        generate_synthetic_project(path, args.synthetic)
+    try:
+        index = ProjectIndex(path, workers=args.workers)
+        print(f"cold refresh: {index.refresh()}")
+        started = time.perf_counter()
+        graph = index.import_graph()
+        cycles = index.circular_dependencies()
+        print(f"import graph: {len(graph)} modules, {sum(map(len, graph.values()))} edges, "
+              f"{len(cycles)} cycles, largest {max(map(len, cycles), default=0)} modules "
+              f"({time.perf_counter() - started:.3f}s)")
+        print(f"warm refresh: {index.refresh()}")
+        if scratch:
+            touched = sorted(index.files)[::100]
+            for path_to_touch in touched:
+                os.utime(os.path.join(scratch, path_to_touch))
+            print(f"after touching {len(touched)} files: {index.refresh()}")
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
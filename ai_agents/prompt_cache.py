@@ -0,0 +1,82 @@
+"""
+4UAI Prompt Cache
+Precompiled, versioned system prompts for agents and customizations, so the
+large static prefix is built once and sent byte-identical on every call
+(which is what provider-side prompt caching keys on)
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from model_rate_governor import estimate_tokens
+
+PROMPT_CACHE_SIZE = 2048
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    key: str
+    version: str
+    text: str
+    token_estimate: int
+
+def prompt_version(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+def serialize_context(context: Optional[Dict]) -> str:
+    """Compact, key-sorted JSON for the per-call part of a prompt"""
+    if not context:
+        return ""
+    return json.dumps(context, sort_keys=True, separators=(',', ':'), default=str)
+
+class PromptCache:
+    """Thread-safe LRU of compiled prompts keyed by owner and source inputs"""
+
+    def __init__(self, max_size: int = PROMPT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, CompiledPrompt]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, key: str, builder: Callable[..., str], *inputs) -> CompiledPrompt:
+        """
+        Return the compiled prompt for key; builder(*inputs) only runs when
+        the inputs changed, which also yields a new version.
+        """
+        cache_key = (key,) + inputs
+        with self._lock:
+            compiled = self._entries.get(cache_key)
+            if compiled is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        text = builder(*inputs)
+        compiled = CompiledPrompt(key, prompt_version(text), text, estimate_tokens(text))
+        with self._lock:
+            self._entries[cache_key] = compiled
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, key: str):
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == key]:
+                del self._entries[cache_key]
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+# Global cache instance
+prompt_cache = PromptCache()
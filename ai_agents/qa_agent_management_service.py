@@ -10,8 +10,8 @@ from dataclasses import dataclass
 from enum import Enum
 
 from app import db
-from models import AIAgent
-from ai_agent_generation_service import AIAgentGenerationService, validate_agent_ecosystem
+from ai_agent_generation_service import AIAgentGenerationService
+from agent_qa_engine import qa_engine
 
 
 class QAAgentType(Enum):
@@ -82,8 +82,8 @@ class ValidationMasterAgent(QualityAssuranceAgent):
         recommendations = []
         
         try:
-            # Get ecosystem status
-            ecosystem_status = validate_agent_ecosystem()
+            # Get ecosystem status from the shared (memoized) QA pass
+            ecosystem_status = qa_engine.run().ecosystem_status
             
             total_agents = ecosystem_status.get('total_agents', 0)
             
@@ -158,48 +158,12 @@ class ConsistencyCheckerAgent(QualityAssuranceAgent):
         recommendations = []
         
         try:
-            # Get all active agents
-            agents = AIAgent.query.filter_by(is_active=True).all()
-            agent_count = len(agents)
-            
-            # Check for missing required fields
-            for agent in agents:
-                if not agent.name or len(agent.name.strip()) < 10:
-                    issues.append(f"Agent {agent.id}: Invalid name")
-                
-                if not agent.description or len(agent.description.strip()) < 50:
-                    issues.append(f"Agent {agent.id}: Invalid description")
-                
-                if not agent.base_prompt or len(agent.base_prompt.strip()) < 20:
-                    issues.append(f"Agent {agent.id}: Invalid base prompt")
-                
-                if agent.expertise_level < 50:
-                    issues.append(f"Agent {agent.id}: Expertise level too low ({agent.expertise_level})")
-                
-                if agent.practical_projects < 1000:
-                    issues.append(f"Agent {agent.id}: Project count too low ({agent.practical_projects})")
-            
-            # Check for naming consistency
-            name_patterns = {}
-            for agent in agents:
-                # Extract pattern (remove numbers and common suffixes)
-                pattern = agent.name.replace(' AI', '').replace(' Expert', '').replace(' Master', '').replace(' Pro', '')
-                pattern = ''.join([c for c in pattern if not c.isdigit()]).strip()
-                
-                if pattern in name_patterns:
-                    name_patterns[pattern] += 1
-                else:
-                    name_patterns[pattern] = 1
-            
-            # Check for excessive duplication
-            for pattern, count in name_patterns.items():
-                if count > 5:
-                    issues.append(f"Too many similar agents for pattern: {pattern} ({count} agents)")
-                    recommendations.append(f"Diversify agents in {pattern} category")
-            
-            # Check pricing consistency
-            pricing_issues = self._check_pricing_consistency(agents)
-            issues.extend(pricing_issues)
+            # Field, naming, near-duplicate and pricing rules share one incremental QA pass
+            report = qa_engine.run()
+            agent_count = report.agent_count
+            
+            issues.extend(report.issues('field_validity', 'naming_patterns', 'near_duplicates', 'pricing_consistency'))
+            recommendations.extend(report.recommendations('naming_patterns', 'near_duplicates'))
             
             validation_passed = len(issues) == 0
             
@@ -231,40 +195,6 @@ class ConsistencyCheckerAgent(QualityAssuranceAgent):
                 timestamp=datetime.now(),
                 agent_count_validated=0
             )
-    
-    def _check_pricing_consistency(self, agents: List[AIAgent]) -> List[str]:
-        """Check pricing consistency across agents"""
-        issues = []
-        
-        try:
-            # Group by pricing tier
-            tier_prices = {}
-            for agent in agents:
-                tier = agent.pricing_tier
-                if tier not in tier_prices:
-                    tier_prices[tier] = []
-                tier_prices[tier].append((agent.base_price, agent.monthly_price))
-            
-            # Check for reasonable price ranges within tiers
-            for tier, prices in tier_prices.items():
-                if len(prices) > 1:
-                    base_prices = [p[0] for p in prices]
-                    monthly_prices = [p[1] for p in prices]
-                    
-                    base_range = max(base_prices) - min(base_prices)
-                    monthly_range = max(monthly_prices) - min(monthly_prices)
-                    
-                    # Check for excessive price variation within tier
-                    if base_range > 500:
-                        issues.append(f"Excessive base price variation in {tier} tier: ${base_range}")
-                    
-                    if monthly_range > 300:
-                        issues.append(f"Excessive monthly price variation in {tier} tier: ${monthly_range}")
-            
-        except Exception as e:
-            issues.append(f"Pricing consistency check error: {e}")
-        
-        return issues
 
 
 class QualityMonitorAgent(QualityAssuranceAgent):
@@ -282,7 +212,7 @@ class QualityMonitorAgent(QualityAssuranceAgent):
         
         try:
             # Get ecosystem status
-            ecosystem_status = validate_agent_ecosystem()
+            ecosystem_status = qa_engine.run().ecosystem_status
             quality_metrics = ecosystem_status.get('quality_metrics', {})
             
             agent_count = ecosystem_status.get('total_agents', 0)
@@ -390,8 +320,8 @@ class SystemCoordinatorAgent(QualityAssuranceAgent):
                 all_recommendations.extend(result.recommendations)
                 total_validated = max(total_validated, result.agent_count_validated)
             
-            # System-level checks
-            ecosystem_status = validate_agent_ecosystem()
+            # System-level checks (same memoized report the QA agents used)
+            ecosystem_status = qa_engine.run().ecosystem_status
             total_agents = ecosystem_status.get('total_agents', 0)
             
             # Check milestone completion
@@ -479,7 +409,7 @@ class QAAgentManagementService:
     def get_system_status(self) -> QASystemStatus:
         """Get current QA system status"""
         try:
-            ecosystem_status = validate_agent_ecosystem()
+            ecosystem_status = qa_engine.run().ecosystem_status
             
             total_agents = ecosystem_status.get('total_agents', 0)
             milestone_status = "COMPLETED" if total_agents >= 1000 else f"IN_PROGRESS ({total_agents}/1000)"
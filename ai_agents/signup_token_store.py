@@ -0,0 +1,272 @@
+"""
+Signup Token Store
+Expiring double opt-in tokens shared by every worker process. Tokens are
+"<selector>.<verifier>": the selector is an indexed lookup key and only a
+SHA-256 of the verifier is stored, compared in constant time. Backends:
+SQL (SQLite or PostgreSQL) and any Redis-compatible server.
+"""
+
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import (Column, DateTime, Index, MetaData, String, Table, Text, create_engine, delete,
+                        event, func, select)
+from sqlalchemy.exc import OperationalError
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+logger = logging.getLogger(__name__)
+
+SIGNUP_TOKEN_TTL_SECONDS = 24 * 3600
+SIGNUP_TOKEN_SWEEP_SECONDS = 300
+SIGNUP_TOKEN_SWEEP_BATCH = 1000
+
+# consume() outcomes
+TOKEN_VALID = 'valid'
+TOKEN_EXPIRED = 'expired'
+TOKEN_INVALID = 'invalid'
+
+metadata = MetaData()
+
+signup_tokens = Table(
+    "signup_tokens", metadata,
+    Column("selector", String(32), primary_key=True),
+    Column("verifier_hash", String(64), nullable=False),
+    Column("purpose", String(50), nullable=False),
+    Column("data", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+    Column("expires_at", DateTime, nullable=False),
+    Index("ix_signup_tokens_expires_at", "expires_at"),
+)
+
+def _new_token() -> Tuple[str, str, str]:
+    """Returns (token, selector, verifier_hash)"""
+    selector = secrets.token_urlsafe(12)
+    verifier = secrets.token_urlsafe(32)
+    return f"{selector}.{verifier}", selector, _hash_verifier(verifier)
+
+def _hash_verifier(verifier: str) -> str:
+    return hashlib.sha256(verifier.encode('utf-8')).hexdigest()
+
+def _split_token(token: str) -> Optional[Tuple[str, str]]:
+    selector, _, verifier = (token or '').partition('.')
+    if not selector or not verifier or len(selector) > 32:
+        return None
+    return selector, verifier
+
+def token_selector(token: str) -> Optional[str]:
+    """Public lookup half of a token, safe to log or use as a key; None if malformed"""
+    parts = _split_token(token)
+    return parts[0] if parts else None
+
+class SQLSignupTokenStore:
+    """
+    Tokens in a SQL table keyed by selector. consume() verifies the row and
+    then deletes it, checking the row count, so when several workers
+    confirm the same token only one of them gets the data. Expired rows are
+    removed lazily on lookup and in batches by a background sweeper.
+    """
+
+    def __init__(self, url: str, sweep_interval: float = SIGNUP_TOKEN_SWEEP_SECONDS):
+        connect_args = {"timeout": 30} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, future=True, connect_args=connect_args)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _sqlite_wal)
+        try:
+            metadata.create_all(self.engine, checkfirst=True)
+        except OperationalError:
+            # Another worker created the table between our check and CREATE
+            metadata.create_all(self.engine, checkfirst=True)
+        self.sweep_interval = sweep_interval
+        self._stop = threading.Event()
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="signup-token-sweeper", daemon=True)
+            self._sweeper.start()
+            atexit.register(self.close)
+
+    def create(self, data: Dict[str, Any], ttl: int = SIGNUP_TOKEN_TTL_SECONDS, purpose: str = 'free_agent') -> str:
+        token, selector, verifier_hash = _new_token()
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            connection.execute(signup_tokens.insert().values(
+                selector=selector, verifier_hash=verifier_hash, purpose=purpose,
+                data=json.dumps(data, default=str), created_at=now, expires_at=now + timedelta(seconds=ttl)
+            ))
+        return token
+
+    def _fetch(self, connection, selector: str, verifier: str, purpose: str):
+        row = connection.execute(select(signup_tokens).where(signup_tokens.c.selector == selector)).first()
+        if row is None or row.purpose != purpose:
+            return None
+        if not hmac.compare_digest(row.verifier_hash, _hash_verifier(verifier)):
+            return None
+        return row
+
+    def peek(self, token: str, purpose: str = 'free_agent') -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Validate without consuming"""
+        parts = _split_token(token)
+        if parts is None:
+            return TOKEN_INVALID, None
+        with self.engine.connect() as connection:
+            row = self._fetch(connection, *parts, purpose)
+        if row is None:
+            return TOKEN_INVALID, None
+        if row.expires_at <= datetime.utcnow():
+            return TOKEN_EXPIRED, None
+        return TOKEN_VALID, json.loads(row.data)
+
+    def consume(self, token: str, purpose: str = 'free_agent') -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Validate and delete the token; returns (TOKEN_VALID, data) for exactly one caller"""
+        parts = _split_token(token)
+        if parts is None:
+            return TOKEN_INVALID, None
+        with self.engine.connect() as connection:
+            row = self._fetch(connection, *parts, purpose)
+        if row is None:
+            return TOKEN_INVALID, None
+        # The DELETE opens its own write transaction, so a read snapshot is never upgraded
+        with self.engine.begin() as connection:
+            deleted = connection.execute(
+                delete(signup_tokens).where(signup_tokens.c.selector == row.selector,
+                                            signup_tokens.c.verifier_hash == row.verifier_hash)
+            ).rowcount
+        if not deleted:
+            # Another worker consumed it between our read and delete
+            return TOKEN_INVALID, None
+        if row.expires_at <= datetime.utcnow():
+            return TOKEN_EXPIRED, None
+        return TOKEN_VALID, json.loads(row.data)
+
+    def sweep_expired(self, batch_size: int = SIGNUP_TOKEN_SWEEP_BATCH) -> int:
+        """Delete expired tokens in small batches; returns rows removed"""
+        removed = 0
+        while True:
+            with self.engine.begin() as connection:
+                selectors = select(signup_tokens.c.selector).where(
+                    signup_tokens.c.expires_at <= datetime.utcnow()).limit(batch_size)
+                count = connection.execute(
+                    delete(signup_tokens).where(signup_tokens.c.selector.in_(selectors.scalar_subquery()))
+                ).rowcount
+            removed += count
+            if count < batch_size:
+                return removed
+
+    def count(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(signup_tokens)).scalar_one()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.sweep_expired()
+                if removed:
+                    logger.info(f"Swept {removed} expired signup tokens")
+            except Exception as e:
+                logger.error(f"Signup token sweep failed: {e}")
+
+    def close(self):
+        self._stop.set()
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    # Readers don't block the single writer, which matters with several workers
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+class RedisSignupTokenStore:
+    """
+    Tokens as Redis keys with a native TTL, so expiry needs no sweeper.
+    consume() uses GETDEL (Redis 6.2+, falling back to a GET/DEL
+    transaction), so only one caller can read a token before it is gone.
+    Expired tokens are indistinguishable from unknown ones here.
+    """
+
+    def __init__(self, url: str, prefix: str = 'signup_token:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, purpose: str, selector: str) -> str:
+        return f"{self.prefix}{purpose}:{selector}"
+
+    def create(self, data: Dict[str, Any], ttl: int = SIGNUP_TOKEN_TTL_SECONDS, purpose: str = 'free_agent') -> str:
+        token, selector, verifier_hash = _new_token()
+        value = json.dumps({'h': verifier_hash, 'd': data}, default=str)
+        self.client.set(self._key(purpose, selector), value, ex=ttl)
+        return token
+
+    def _check(self, raw, verifier: str) -> Optional[Dict[str, Any]]:
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        if not hmac.compare_digest(value['h'], _hash_verifier(verifier)):
+            return None
+        return value['d']
+
+    def peek(self, token: str, purpose: str = 'free_agent') -> Tuple[str, Optional[Dict[str, Any]]]:
+        parts = _split_token(token)
+        if parts is None:
+            return TOKEN_INVALID, None
+        data = self._check(self.client.get(self._key(purpose, parts[0])), parts[1])
+        return (TOKEN_VALID, data) if data is not None else (TOKEN_INVALID, None)
+
+    def consume(self, token: str, purpose: str = 'free_agent') -> Tuple[str, Optional[Dict[str, Any]]]:
+        parts = _split_token(token)
+        if parts is None:
+            return TOKEN_INVALID, None
+        key = self._key(purpose, parts[0])
+        # Check before deleting, so a guessed selector cannot burn someone else's token
+        if self._check(self.client.get(key), parts[1]) is None:
+            return TOKEN_INVALID, None
+        try:
+            raw = self.client.getdel(key)
+        except redis.ResponseError:
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.get(key)
+            pipeline.delete(key)
+            raw = pipeline.execute()[0]
+        data = self._check(raw, parts[1])
+        return (TOKEN_VALID, data) if data is not None else (TOKEN_INVALID, None)
+
+    def sweep_expired(self, batch_size: int = SIGNUP_TOKEN_SWEEP_BATCH) -> int:
+        return 0
+
+    def count(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*", count=1000))
+
+    def close(self):
+        self.client.close()
+
+_signup_token_store = None
+_signup_token_store_lock = threading.Lock()
+
+def get_signup_token_store():
+    """
+    Shared store. SIGNUP_TOKEN_REDIS_URL selects the Redis backend (when the
+    redis package is installed); otherwise SIGNUP_TOKEN_DATABASE_URL, then
+    the main DATABASE_URL, back the SQL store.
+    """
+    global _signup_token_store
+    with _signup_token_store_lock:
+        if _signup_token_store is None:
+            redis_url = os.getenv("SIGNUP_TOKEN_REDIS_URL")
+            if redis_url and HAS_REDIS:
+                _signup_token_store = RedisSignupTokenStore(redis_url)
+            else:
+                if redis_url:
+                    logger.warning("SIGNUP_TOKEN_REDIS_URL is set but redis is not installed; using SQL store")
+                url = os.getenv("SIGNUP_TOKEN_DATABASE_URL") or os.getenv("DATABASE_URL") or "sqlite:///signup_tokens.db"
+                _signup_token_store = SQLSignupTokenStore(url)
+        return _signup_token_store
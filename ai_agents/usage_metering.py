@@ -0,0 +1,329 @@
+"""
+4UAI Usage Metering
+Persistent per-user/per-agent usage counters with atomic limit checks,
+buffered token/cost accounting and monthly buckets for billing
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (BigInteger, Column, DateTime, Float, Index, Integer, MetaData,
+                        String, Table, create_engine, func, select, update)
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (input, output)
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+}
+
+# Share of the input price charged for prompt tokens served from the provider's prompt cache
+CACHED_INPUT_PRICE_FACTOR = {
+    "gpt-4o": 0.5,
+    "gpt-4o-mini": 0.5,
+    "claude-3-5-sonnet": 0.1,
+    "claude-3-5-sonnet-20241022": 0.1,
+}
+
+# Buffered token/cost records are written at least this often
+USAGE_FLUSH_INTERVAL_SECONDS = 5.0
+USAGE_MAX_BUFFERED_RECORDS = 500
+
+metadata = MetaData()
+
+usage_counters = Table(
+    "agent_usage_counters", metadata,
+    Column("user_id", String(64), primary_key=True),
+    Column("agent_id", String(100), primary_key=True),
+    Column("period", String(7), primary_key=True),  # YYYY-MM (UTC)
+    Column("request_count", Integer, nullable=False, default=0),
+    Column("prompt_tokens", BigInteger, nullable=False, default=0),
+    Column("completion_tokens", BigInteger, nullable=False, default=0),
+    Column("total_tokens", BigInteger, nullable=False, default=0),
+    Column("cost_usd", Float, nullable=False, default=0.0),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+    Index("ix_agent_usage_counters_period_agent", "period", "agent_id"),
+)
+
+usage_events = Table(
+    "agent_usage_events", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", String(64), nullable=False),
+    Column("agent_id", String(100), nullable=False),
+    Column("period", String(7), nullable=False),
+    Column("model", String(100)),
+    Column("prompt_tokens", Integer, nullable=False, default=0),
+    Column("completion_tokens", Integer, nullable=False, default=0),
+    Column("total_tokens", Integer, nullable=False, default=0),
+    Column("cost_usd", Float, nullable=False, default=0.0),
+    Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+    Index("ix_agent_usage_events_period_user", "period", "user_id"),
+)
+
+def current_period(now: Optional[datetime] = None) -> str:
+    """Monthly usage bucket; a new month starts a new counter row"""
+    return (now or datetime.utcnow()).strftime("%Y-%m")
+
+def calculate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int,
+                   cached_prompt_tokens: int = 0) -> float:
+    input_price, output_price = MODEL_PRICING.get(model or "", (0.0, 0.0))
+    cached_prompt_tokens = min(cached_prompt_tokens, prompt_tokens)
+    input_cost = ((prompt_tokens - cached_prompt_tokens) * input_price
+                  + cached_prompt_tokens * input_price * CACHED_INPUT_PRICE_FACTOR.get(model or "", 1.0))
+    return round((input_cost + completion_tokens * output_price) / 1_000_000, 6)
+
+@dataclass
+class UsageRecord:
+    """One model call to be accounted"""
+    user_id: str
+    agent_id: str
+    model: Optional[str]
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    count_request: bool = True  # False when the request was already counted by try_increment
+    period: str = ""
+    created_at: Optional[datetime] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+class SQLUsageStore:
+    """
+    Usage counters in a SQL database (SQLite or PostgreSQL).
+
+    Limit checks are a single conditional upsert, so concurrent requests
+    from any number of workers cannot push a counter past its limit.
+    """
+
+    def __init__(self, url: str):
+        self.engine = create_engine(url, future=True)
+        metadata.create_all(self.engine, checkfirst=True)
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def _counter_key(self, user_id: str, agent_id: str, period: str):
+        return (usage_counters.c.user_id == str(user_id)) & \
+               (usage_counters.c.agent_id == agent_id) & \
+               (usage_counters.c.period == period)
+
+    def try_increment(self, user_id: str, agent_id: str, period: str, limit: int) -> Tuple[bool, int]:
+        """Atomically count one request unless the counter already reached limit"""
+        if limit <= 0:
+            return False, self.get_count(user_id, agent_id, period)
+
+        statement = self._insert(usage_counters).values(
+            user_id=str(user_id), agent_id=agent_id, period=period, request_count=1,
+            prompt_tokens=0, completion_tokens=0, total_tokens=0, cost_usd=0.0,
+            updated_at=datetime.utcnow()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[usage_counters.c.user_id, usage_counters.c.agent_id, usage_counters.c.period],
+            set_={
+                "request_count": usage_counters.c.request_count + 1,
+                "updated_at": statement.excluded.updated_at
+            },
+            where=usage_counters.c.request_count < limit
+        )
+        with self.engine.begin() as connection:
+            allowed = connection.execute(statement).rowcount > 0
+            count = connection.execute(
+                select(usage_counters.c.request_count).where(self._counter_key(user_id, agent_id, period))
+            ).scalar() or 0
+        return allowed, count
+
+    def decrement(self, user_id: str, agent_id: str, period: str):
+        """Give back a request counted by try_increment (e.g. the model call failed)"""
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(usage_counters)
+                .where(self._counter_key(user_id, agent_id, period), usage_counters.c.request_count > 0)
+                .values(request_count=usage_counters.c.request_count - 1)
+            )
+
+    def get_count(self, user_id: str, agent_id: str, period: str) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(usage_counters.c.request_count).where(self._counter_key(user_id, agent_id, period))
+            ).scalar() or 0
+
+    def apply(self, records: List[UsageRecord]):
+        """Add a batch of records to the counters and the event log in one transaction"""
+        totals: Dict[Tuple[str, str, str], List] = defaultdict(lambda: [0, 0, 0, 0.0])
+        for record in records:
+            bucket = totals[(str(record.user_id), record.agent_id, record.period)]
+            bucket[0] += int(record.count_request)
+            bucket[1] += record.prompt_tokens
+            bucket[2] += record.completion_tokens
+            bucket[3] += record.cost_usd
+
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            for (user_id, agent_id, period), (requests, prompt, completion, cost) in totals.items():
+                statement = self._insert(usage_counters).values(
+                    user_id=user_id, agent_id=agent_id, period=period, request_count=requests,
+                    prompt_tokens=prompt, completion_tokens=completion,
+                    total_tokens=prompt + completion, cost_usd=cost, updated_at=now
+                )
+                excluded = statement.excluded
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=[usage_counters.c.user_id, usage_counters.c.agent_id, usage_counters.c.period],
+                    set_={
+                        "request_count": usage_counters.c.request_count + excluded.request_count,
+                        "prompt_tokens": usage_counters.c.prompt_tokens + excluded.prompt_tokens,
+                        "completion_tokens": usage_counters.c.completion_tokens + excluded.completion_tokens,
+                        "total_tokens": usage_counters.c.total_tokens + excluded.total_tokens,
+                        "cost_usd": usage_counters.c.cost_usd + excluded.cost_usd,
+                        "updated_at": excluded.updated_at
+                    }
+                ))
+
+            connection.execute(usage_events.insert(), [{
+                "user_id": str(record.user_id),
+                "agent_id": record.agent_id,
+                "period": record.period,
+                "model": record.model,
+                "prompt_tokens": record.prompt_tokens,
+                "completion_tokens": record.completion_tokens,
+                "total_tokens": record.total_tokens,
+                "cost_usd": record.cost_usd,
+                "created_at": record.created_at or now
+            } for record in records])
+
+    def _aggregate(self, group_column, period: str, user_id: Optional[str] = None,
+                   agent_id: Optional[str] = None) -> List[Dict]:
+        query = select(
+            group_column,
+            func.sum(usage_counters.c.request_count),
+            func.sum(usage_counters.c.total_tokens),
+            func.sum(usage_counters.c.cost_usd)
+        ).where(usage_counters.c.period == period)
+        if user_id is not None:
+            query = query.where(usage_counters.c.user_id == str(user_id))
+        if agent_id is not None:
+            query = query.where(usage_counters.c.agent_id == agent_id)
+        query = query.group_by(group_column).order_by(func.sum(usage_counters.c.cost_usd).desc())
+
+        with self.engine.connect() as connection:
+            return [{
+                group_column.name: key,
+                "requests": int(requests or 0),
+                "total_tokens": int(tokens or 0),
+                "cost_usd": round(float(cost or 0), 6)
+            } for key, requests, tokens, cost in connection.execute(query)]
+
+    def usage_by_agent(self, period: str, user_id: Optional[str] = None) -> List[Dict]:
+        return self._aggregate(usage_counters.c.agent_id, period, user_id=user_id)
+
+    def usage_by_user(self, period: str, agent_id: Optional[str] = None) -> List[Dict]:
+        return self._aggregate(usage_counters.c.user_id, period, agent_id=agent_id)
+
+    def prune_events(self, before_period: str) -> int:
+        """Drop per-call events older than a period; monthly counters are kept"""
+        with self.engine.begin() as connection:
+            return connection.execute(usage_events.delete().where(usage_events.c.period < before_period)).rowcount
+
+class UsageMeter:
+    """
+    Front end used by the agent engine.
+
+    Limit reservations go straight to the store (they must be atomic across
+    workers); token/cost accounting is buffered in-process and flushed in
+    batches on a timer, when the buffer fills up, and at interpreter exit.
+    """
+
+    def __init__(self, store: SQLUsageStore, flush_interval: float = USAGE_FLUSH_INTERVAL_SECONDS,
+                 max_buffered: int = USAGE_MAX_BUFFERED_RECORDS):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._buffer: List[UsageRecord] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="usage-meter-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def try_consume(self, user_id, agent_id: str, limit: int) -> Tuple[bool, int]:
+        """Reserve one request against the monthly limit; returns (allowed, remaining)"""
+        allowed, count = self.store.try_increment(str(user_id), agent_id, current_period(), limit)
+        return allowed, max(0, limit - count)
+
+    def release(self, user_id, agent_id: str, period: Optional[str] = None):
+        self.store.decrement(str(user_id), agent_id, period or current_period())
+
+    def remaining(self, user_id, agent_id: str, limit: int) -> Tuple[bool, int]:
+        count = self.store.get_count(str(user_id), agent_id, current_period())
+        return count < limit, max(0, limit - count)
+
+    def record_call(self, user_id, agent_id: str, model: Optional[str], prompt_tokens: int = 0,
+                    completion_tokens: int = 0, count_request: bool = True,
+                    cached_prompt_tokens: int = 0) -> UsageRecord:
+        """Buffer tokens and cost for one model call"""
+        now = datetime.utcnow()
+        record = UsageRecord(
+            user_id=str(user_id), agent_id=agent_id, model=model,
+            prompt_tokens=prompt_tokens or 0, completion_tokens=completion_tokens or 0,
+            cost_usd=calculate_cost(model, prompt_tokens or 0, completion_tokens or 0, cached_prompt_tokens or 0),
+            count_request=count_request, period=current_period(now), created_at=now
+        )
+        with self._lock:
+            self._buffer.append(record)
+            should_flush = len(self._buffer) >= self.max_buffered
+        if should_flush:
+            self.flush()
+        return record
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return
+            try:
+                self.store.apply(records)
+            except Exception as e:
+                logger.error(f"Usage flush failed, keeping {len(records)} records for retry: {e}")
+                with self._lock:
+                    self._buffer[:0] = records
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def usage_by_agent(self, period: Optional[str] = None, user_id=None) -> List[Dict]:
+        self.flush()
+        return self.store.usage_by_agent(period or current_period(), user_id=user_id)
+
+    def usage_by_user(self, period: Optional[str] = None, agent_id: Optional[str] = None) -> List[Dict]:
+        self.flush()
+        return self.store.usage_by_user(period or current_period(), agent_id=agent_id)
+
+_usage_meter = None
+_usage_meter_lock = threading.Lock()
+
+def get_usage_meter() -> UsageMeter:
+    """Shared meter; AGENT_USAGE_DATABASE_URL overrides the main DATABASE_URL"""
+    global _usage_meter
+    with _usage_meter_lock:
+        if _usage_meter is None:
+            url = os.getenv("AGENT_USAGE_DATABASE_URL") or os.getenv("DATABASE_URL") or "sqlite:///agent_usage.db"
+            _usage_meter = UsageMeter(SQLUsageStore(url))
+        return _usage_meter
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app import db
 from models import AIAgent, CreatorProfile, User, AgentCustomization
 from enterprise_policy_enforcement import require_dlp_scan, require_permission
+from agent_search_index import agent_search_index
 import json
 import logging
 from datetime import datetime, timedelta
@@ -10,6 +11,9 @@ import uuid
 
 user_marketplace_bp = Blueprint('user_marketplace', __name__)
 
+# Upper bound on ranked search hits handed to the paginated SQL query
+MAX_SEARCH_RESULTS = 1000
+
 @user_marketplace_bp.route('/create-agent')
 @login_required
 def create_agent_form():
@@ -226,16 +230,38 @@ def browse_community_agents():
     
     page = request.args.get('page', 1, type=int)
     category = request.args.get('category', '')
-    sort_by = request.args.get('sort', 'featured')  # featured, newest, rating, price
+    sort_by = request.args.get('sort', 'featured')  # featured, newest, rating, price, relevance
+    search_query = request.args.get('q', '').strip()
+    pricing_tier = request.args.get('pricing_tier', '')
+    expertise = request.args.get('expertise', '')
     
     query = AIAgent.query.filter_by(approval_status='approved', is_active=True)
     
+    # Full-text search and facet filters run against the in-process index
+    facets = None
+    relevance_rank = {}
+    if search_query or pricing_tier or expertise:
+        agent_search_index.ensure_built()
+        search_result = agent_search_index.search(
+            search_query,
+            filters={'category': category, 'pricing_tier': pricing_tier, 'expertise_band': expertise},
+            limit=MAX_SEARCH_RESULTS,
+            approved_only=True
+        )
+        facets = search_result.facets
+        query = query.filter(AIAgent.id.in_(search_result.agent_ids or [-1]))
+        if search_query and sort_by in ('featured', 'relevance'):
+            sort_by = 'relevance'
+            relevance_rank = {agent_id: rank for rank, agent_id in enumerate(search_result.agent_ids)}
+    
     # Filter by category
     if category:
         query = query.filter_by(category=category)
     
     # Sort
-    if sort_by == 'newest':
+    if sort_by == 'relevance' and relevance_rank:
+        query = query.order_by(db.case(relevance_rank, value=AIAgent.id, else_=len(relevance_rank)))
+    elif sort_by == 'newest':
         query = query.order_by(AIAgent.created_at.desc())
     elif sort_by == 'rating':
         query = query.order_by(AIAgent.trust_score.desc())
@@ -256,7 +282,9 @@ def browse_community_agents():
                          agents=agents,
                          categories=categories,
                          current_category=category,
-                         current_sort=sort_by)
+                         current_sort=sort_by,
+                         search_query=search_query,
+                         facets=facets)
 
 @user_marketplace_bp.route('/agent/<int:agent_id>/preview')
 def preview_agent(agent_id):
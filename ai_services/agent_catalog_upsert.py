@@ -0,0 +1,265 @@
+"""
+Agent Catalog Bulk Upsert
+Shared, idempotent bulk write layer for all AI agent catalog generators
+"""
+
+import logging
+import re
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from models import AIAgent
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany round trip
+UPSERT_BATCH_SIZE = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Callbacks notified with the IDs touched by a bulk upsert once it has
+# committed. Bulk statements bypass ORM flush events, so caches that listen
+# for AIAgent writes (search and similarity indexes) register here as well.
+_catalog_change_listeners: List[Callable[[Set[int]], None]] = []
+
+# Session.info key with the agent IDs a transaction changed in bulk; code
+# that must update inside the transaction (marketplace read model) reads it
+# from before_commit
+CATALOG_CHANGES_KEY = 'catalog_changed_agent_ids'
+
+def register_catalog_change_listener(listener: Callable[[Set[int]], None]):
+    """Register a callback for agent IDs inserted/updated/deactivated in bulk"""
+    _catalog_change_listeners.append(listener)
+
+def mark_catalog_changed(session: Session, agent_ids: Iterable[int]):
+    """Record changed agent IDs on the session; listeners hear about them after it commits"""
+    session.info.setdefault(CATALOG_CHANGES_KEY, set()).update(agent_ids)
+
+def pending_catalog_changes(session: Session) -> Set[int]:
+    """Agent IDs changed in bulk by the session's current transaction"""
+    return session.info.get(CATALOG_CHANGES_KEY, set())
+
+class AgentCatalogSource(db.Model):
+    """
+    The generator that produced a catalog agent. deactivate_missing only
+    touches agents owned by the generator running the upsert, so agents from
+    other generators, the community or users are never switched off.
+    """
+    __tablename__ = 'agent_catalog_sources'
+
+    agent_id = db.Column(db.Integer, primary_key=True)
+    generator = db.Column(db.String(100), nullable=False, index=True)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def agent_natural_key(agent_data: Dict) -> str:
+    """Natural key used to match generated agents with catalog rows"""
+    return _WHITESPACE.sub(" ", (agent_data.get("name") or "").strip()).lower()
+
+@dataclass
+class UpsertResult:
+    """Outcome of a catalog upsert run"""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deactivated: int = 0
+    skipped: List[str] = field(default_factory=list)
+    changed_ids: Set[int] = field(default_factory=set)
+
+    def to_dict(self) -> Dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "deactivated": self.deactivated,
+            "skipped": self.skipped
+        }
+
+class AgentCatalogUpserter:
+    """
+    Diff generated agents against the catalog in one query and apply the
+    difference with executemany-style bulk statements.
+
+    Existing rows are updated in place and never deleted, so foreign keys
+    held by customizations, purchases and bundles stay valid; agents that
+    disappear from a generator's output are deactivated instead.
+    """
+
+    def __init__(self, batch_size: int = UPSERT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._columns = {column.key for column in AIAgent.__mapper__.column_attrs}
+
+    def _normalize(self, agent_data: Dict) -> Dict:
+        # Drop keys the model does not have; generators carry extra metadata
+        return {key: value for key, value in agent_data.items() if key in self._columns and key != "id"}
+
+    def upsert(self, agents: Iterable[Dict], deactivate_missing: bool = False,
+               scope: Optional[Dict] = None, update_existing: bool = True,
+               commit: bool = True, generator: Optional[str] = None) -> UpsertResult:
+        """
+        Insert new agents, update changed ones and optionally deactivate
+        agents owned by `generator`, inside `scope` (column -> value or list
+        of values), that it no longer produces. Agents a generator inserts
+        or matches and nobody owns yet become its own. With
+        update_existing=False agents that already exist are reported in
+        `skipped` and left as is.
+        """
+        if deactivate_missing and not generator:
+            raise ValueError("deactivate_missing requires a generator name")
+        result = UpsertResult()
+
+        incoming: Dict[str, Dict] = {}
+        for agent_data in agents:
+            key = agent_natural_key(agent_data)
+            if not key:
+                result.skipped.append("Agent without name")
+                continue
+            # Last definition of a duplicated name wins
+            incoming[key] = self._normalize(agent_data)
+
+        compared_columns = sorted({column for data in incoming.values() for column in data} | {"is_active"})
+        existing_rows = db.session.query(
+            AIAgent.id, *[getattr(AIAgent, column) for column in compared_columns]
+        ).all()
+
+        existing: Dict[str, Dict] = {}
+        for row in existing_rows:
+            row_data = row._asdict()
+            existing.setdefault(agent_natural_key(row_data), row_data)
+
+        inserts: List[Dict] = []
+        updates: List[Dict] = []
+        produced_ids: Set[int] = set()
+        for key, data in incoming.items():
+            current = existing.get(key)
+            if current is None:
+                inserts.append(data)
+                continue
+            produced_ids.add(current["id"])
+            if not update_existing:
+                result.skipped.append(f"Skipped duplicate: {data.get('name')}")
+                continue
+            changes = {column: value for column, value in data.items() if current.get(column) != value}
+            if changes:
+                changes["id"] = current["id"]
+                updates.append(changes)
+                result.changed_ids.add(current["id"])
+            else:
+                result.unchanged += 1
+
+        deactivate_ids: List[int] = []
+        if deactivate_missing:
+            owned_ids = {agent_id for (agent_id,) in db.session.query(AgentCatalogSource.agent_id)
+                         .filter(AgentCatalogSource.generator == generator)}
+            deactivate_ids = [
+                row["id"] for key, row in existing.items()
+                if row["id"] in owned_ids and key not in incoming and row.get("is_active")
+                and self._in_scope(row, scope)
+            ]
+
+        try:
+            produced_ids |= self._apply_inserts(inserts, result)
+            self._apply_updates(updates)
+            if generator:
+                self._claim(produced_ids, generator)
+            if deactivate_ids:
+                for start in range(0, len(deactivate_ids), self.batch_size):
+                    chunk = deactivate_ids[start:start + self.batch_size]
+                    db.session.query(AIAgent).filter(AIAgent.id.in_(chunk)).update(
+                        {AIAgent.is_active: False}, synchronize_session=False
+                    )
+                result.changed_ids.update(deactivate_ids)
+
+            mark_catalog_changed(db.session, result.changed_ids)
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        result.inserted = len(inserts)
+        result.updated = len(updates)
+        result.deactivated = len(deactivate_ids)
+
+        logger.info(
+            f"Agent catalog upsert: {result.inserted} inserted, {result.updated} updated, "
+            f"{result.unchanged} unchanged, {result.deactivated} deactivated"
+        )
+        return result
+
+    def _in_scope(self, row: Dict, scope: Optional[Dict]) -> bool:
+        if not scope:
+            return True
+        for column, allowed in scope.items():
+            allowed_values = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+            if row.get(column) not in allowed_values:
+                return False
+        return True
+
+    def _claim(self, agent_ids: Set[int], generator: str):
+        """Record `generator` as the owner of agents nobody owns yet"""
+        agent_ids = sorted(agent_ids)
+        owned = set()
+        for start in range(0, len(agent_ids), self.batch_size):
+            owned.update(agent_id for (agent_id,) in db.session.query(AgentCatalogSource.agent_id).filter(
+                AgentCatalogSource.agent_id.in_(agent_ids[start:start + self.batch_size])))
+        claims = [{"agent_id": agent_id, "generator": generator, "claimed_at": datetime.utcnow()}
+                  for agent_id in agent_ids if agent_id not in owned]
+        for start in range(0, len(claims), self.batch_size):
+            db.session.bulk_insert_mappings(AgentCatalogSource, claims[start:start + self.batch_size])
+
+    def _apply_inserts(self, inserts: List[Dict], result: UpsertResult) -> Set[int]:
+        """Insert new agents; returns their IDs"""
+        inserted_ids: Set[int] = set()
+        if not inserts:
+            return inserted_ids
+        # Group by key set so each executemany shares one statement shape
+        for rows in self._group_by_keys(inserts):
+            for start in range(0, len(rows), self.batch_size):
+                db.session.bulk_insert_mappings(AIAgent, rows[start:start + self.batch_size])
+        db.session.flush()
+
+        inserted_keys = {agent_natural_key(row) for row in inserts}
+        names = [row["name"] for row in inserts]
+        for start in range(0, len(names), self.batch_size):
+            for agent_id, name in db.session.query(AIAgent.id, AIAgent.name).filter(
+                AIAgent.name.in_(names[start:start + self.batch_size])
+            ):
+                if agent_natural_key({"name": name}) in inserted_keys:
+                    result.changed_ids.add(agent_id)
+                    inserted_ids.add(agent_id)
+        return inserted_ids
+
+    def _apply_updates(self, updates: List[Dict]):
+        for rows in self._group_by_keys(updates):
+            for start in range(0, len(rows), self.batch_size):
+                db.session.bulk_update_mappings(AIAgent, rows[start:start + self.batch_size])
+
+    @staticmethod
+    def _group_by_keys(rows: List[Dict]) -> List[List[Dict]]:
+        groups: Dict[frozenset, List[Dict]] = {}
+        for row in rows:
+            groups.setdefault(frozenset(row), []).append(row)
+        return list(groups.values())
+
+def _notify_catalog_listeners(session: Session):
+    changed_ids = session.info.pop(CATALOG_CHANGES_KEY, None)
+    if not changed_ids:
+        return
+    for listener in _catalog_change_listeners:
+        try:
+            listener(set(changed_ids))
+        except Exception as e:
+            logger.error(f"Catalog change listener failed: {e}")
+
+def _discard_catalog_changes(session: Session):
+    session.info.pop(CATALOG_CHANGES_KEY, None)
+
+# Listeners only ever see committed changes; a rollback forgets them
+event.listen(Session, 'after_commit', _notify_catalog_listeners)
+event.listen(Session, 'after_rollback', _discard_catalog_changes)
+
+# Shared instance for catalog generators
+catalog_upserter = AgentCatalogUpserter()
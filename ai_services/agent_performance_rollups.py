@@ -0,0 +1,288 @@
+"""
+Agent Performance Rollups
+Minute/hour/day aggregates of AgentPerformanceLog per agent and task type,
+maintained incrementally as log batches are written, with mergeable
+DDSketch latency distributions for p50/p95
+"""
+
+import json
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from app import db
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+# Rollups older than this are removed by prune_rollups()
+ROLLUP_RETENTION = {
+    'minute': timedelta(days=2),
+    'hour': timedelta(days=90),
+    'day': timedelta(days=730)
+}
+
+SKETCH_RELATIVE_ACCURACY = 0.02
+SKETCH_MAX_BINS = 1024
+SKETCH_MIN_VALUE = 1e-6
+UNKNOWN_TASK_TYPE = 'unknown'
+
+class DDSketch:
+    """
+    Quantile sketch with relative-error guarantees (Masson et al., VLDB 2019).
+    Values fall into logarithmic bins, so two sketches merge by adding bin
+    counts, which is what lets minute rollups add up to hours and days.
+    """
+
+    def __init__(self, bins: Optional[Dict[int, int]] = None, zero_count: int = 0,
+                 relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = dict(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value is None:
+            return
+        if value <= SKETCH_MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > SKETCH_MAX_BINS:
+                self._collapse()
+
+    def merge(self, other: 'DDSketch') -> 'DDSketch':
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > SKETCH_MAX_BINS:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        # Fold the lowest bins together; only the smallest quantiles lose accuracy
+        keys = sorted(self.bins)
+        overflow = keys[:len(keys) - SKETCH_MAX_BINS + 1]
+        target = overflow[-1]
+        self.bins[target] = sum(self.bins.pop(key) for key in overflow)
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({'z': self.zero_count, 'b': self.bins}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload: Optional[str]) -> 'DDSketch':
+        if not payload:
+            return cls()
+        data = json.loads(payload)
+        return cls({int(key): count for key, count in data.get('b', {}).items()}, data.get('z', 0))
+
+class AgentPerformanceRollup(db.Model):
+    """Aggregated AgentPerformanceLog rows for one agent/task type/time bucket"""
+    __tablename__ = 'agent_performance_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # minute, hour or day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    agent_id = db.Column(db.String(100), nullable=False)
+    task_type = db.Column(db.String(100), nullable=False)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+    success_count = db.Column(db.Integer, nullable=False, default=0)
+    total_execution_time = db.Column(db.Float, nullable=False, default=0.0)
+    total_quality_score = db.Column(db.Float, nullable=False, default=0.0)
+    latency_sketch = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'agent_id', 'task_type', 'bucket_start',
+                            name='uq_agent_performance_rollup_bucket'),
+        db.Index('ix_agent_performance_rollups_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class _Aggregate:
+    __slots__ = ('task_count', 'success_count', 'total_execution_time', 'total_quality_score', 'sketch')
+
+    def __init__(self, sketch: Optional[DDSketch] = None):
+        self.task_count = 0
+        self.success_count = 0
+        self.total_execution_time = 0.0
+        self.total_quality_score = 0.0
+        self.sketch = sketch or DDSketch()
+
+    def add_row(self, row: Dict[str, Any]):
+        self.task_count += 1
+        self.success_count += 1 if row.get('success') else 0
+        self.total_execution_time += row.get('execution_time') or 0.0
+        self.total_quality_score += row.get('output_quality_score') or 0.0
+        self.sketch.add(row.get('execution_time') or 0.0)
+
+    def add_rollup(self, rollup):
+        self.task_count += rollup.task_count
+        self.success_count += rollup.success_count
+        self.total_execution_time += rollup.total_execution_time
+        self.total_quality_score += rollup.total_quality_score
+        self.sketch.merge(DDSketch.from_json(rollup.latency_sketch))
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = self.task_count
+        return {
+            'total_tasks': count,
+            'successful_tasks': self.success_count,
+            'success_rate': self.success_count / count if count else 0.0,
+            'avg_execution_time': self.total_execution_time / count if count else 0.0,
+            'avg_quality_score': self.total_quality_score / count if count else 0.0,
+            'p50_execution_time': self.sketch.quantile(0.5),
+            'p95_execution_time': self.sketch.quantile(0.95)
+        }
+
+def apply_rollups(connection, rows: Iterable[Dict[str, Any]]):
+    """
+    Fold a batch of AgentPerformanceLog rows into the rollups, on the
+    connection (and in the transaction) that inserted them. Existing buckets
+    are read with FOR UPDATE where supported, so concurrent writers serialize
+    per bucket; a lost insert race fails the transaction and the caller's
+    retry reapplies the whole batch.
+    """
+    batch: Dict[Tuple, _Aggregate] = defaultdict(_Aggregate)
+    for row in rows:
+        created_at = row.get('created_at') or datetime.utcnow()
+        task_type = row.get('task_type') or UNKNOWN_TASK_TYPE
+        for granularity in GRANULARITIES:
+            batch[(granularity, row['agent_id'], task_type, bucket_start(created_at, granularity))].add_row(row)
+    if not batch:
+        return
+
+    table = AgentPerformanceRollup.__table__
+    key_columns = (table.c.granularity, table.c.agent_id, table.c.task_type, table.c.bucket_start)
+    existing = {
+        (row.granularity, row.agent_id, row.task_type, row.bucket_start): row
+        for row in connection.execute(
+            select(table).where(tuple_(*key_columns).in_(list(batch))).with_for_update()
+        )
+    }
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for key, aggregate in batch.items():
+        current = existing.get(key)
+        if current is not None:
+            aggregate.add_rollup(current)
+        values = {
+            'task_count': aggregate.task_count,
+            'success_count': aggregate.success_count,
+            'total_execution_time': aggregate.total_execution_time,
+            'total_quality_score': aggregate.total_quality_score,
+            'latency_sketch': aggregate.sketch.to_json(),
+            'updated_at': now
+        }
+        if current is not None:
+            updates.append(dict(values, rollup_id=current.id))
+        else:
+            inserts.append(dict(values, granularity=key[0], agent_id=key[1], task_type=key[2], bucket_start=key[3]))
+
+    if inserts:
+        connection.execute(table.insert(), inserts)
+    if updates:
+        connection.execute(
+            table.update().where(table.c.id == db.bindparam('rollup_id')).values(
+                task_count=db.bindparam('task_count'),
+                success_count=db.bindparam('success_count'),
+                total_execution_time=db.bindparam('total_execution_time'),
+                total_quality_score=db.bindparam('total_quality_score'),
+                latency_sketch=db.bindparam('latency_sketch'),
+                updated_at=db.bindparam('updated_at')
+            ),
+            updates
+        )
+
+def granularity_for_range(start: datetime, end: datetime) -> str:
+    """Coarsest granularity that still resolves the range reasonably"""
+    span = end - start
+    if span <= timedelta(hours=6):
+        return 'minute'
+    if span <= timedelta(days=60):
+        return 'hour'
+    return 'day'
+
+def _rollup_query(granularity: str, start: datetime, end: datetime,
+                  agent_id: Optional[str] = None, task_type: Optional[str] = None):
+    query = AgentPerformanceRollup.query.filter(
+        AgentPerformanceRollup.granularity == granularity,
+        AgentPerformanceRollup.bucket_start >= bucket_start(start, granularity),
+        AgentPerformanceRollup.bucket_start < end
+    )
+    if agent_id:
+        query = query.filter(AgentPerformanceRollup.agent_id == agent_id)
+    if task_type:
+        query = query.filter(AgentPerformanceRollup.task_type == task_type)
+    return query
+
+def summarize_rollups(start: datetime, end: datetime, agent_id: Optional[str] = None,
+                      task_type: Optional[str] = None, granularity: Optional[str] = None) -> Dict[str, Any]:
+    """Totals, rates and p50/p95 for a range, merged from rollup rows only"""
+    aggregate = _Aggregate()
+    for rollup in _rollup_query(granularity or granularity_for_range(start, end), start, end, agent_id, task_type):
+        aggregate.add_rollup(rollup)
+    return aggregate.to_dict()
+
+def get_rollup_series(granularity: str, start: datetime, end: datetime, agent_id: Optional[str] = None,
+                      task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """One entry per bucket in [start, end), with empty buckets filled in"""
+    by_bucket: Dict[datetime, _Aggregate] = defaultdict(_Aggregate)
+    for rollup in _rollup_query(granularity, start, end, agent_id, task_type):
+        by_bucket[rollup.bucket_start].add_rollup(rollup)
+
+    series = []
+    step = GRANULARITIES[granularity]
+    current = bucket_start(start, granularity)
+    while current < end:
+        entry = (by_bucket.get(current) or _Aggregate()).to_dict()
+        entry['bucket_start'] = current.isoformat()
+        series.append(entry)
+        current += step
+    return series
+
+def prune_rollups(now: Optional[datetime] = None) -> int:
+    """Delete rollups past their granularity's retention; returns rows removed"""
+    now = now or datetime.utcnow()
+    removed = 0
+    for granularity, retention in ROLLUP_RETENTION.items():
+        removed += AgentPerformanceRollup.query.filter(
+            AgentPerformanceRollup.granularity == granularity,
+            AgentPerformanceRollup.bucket_start < now - retention
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
@@ -0,0 +1,463 @@
+"""
+AI Agent Name Similarity Index
+Character n-gram MinHash/LSH index over agent names and descriptions for
+near-duplicate detection, both at generation time and in catalog QA
+"""
+
+import logging
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from models import AIAgent
+from agent_catalog_upsert import agent_natural_key, register_catalog_change_listener
+
+logger = logging.getLogger(__name__)
+
+# Combined similarity at or above which two agents count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.80
+
+# Name similarity dominates; descriptions are often templated per generator
+NAME_WEIGHT = 0.7
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # 4 rows per band: pairs above ~0.5 name similarity become candidates
+SHINGLE_SIZE = 3
+
+# Other processes' writes are picked up at most this often
+SIMILARITY_INDEX_SYNC_SECONDS = 5.0
+# Re-read agents updated this long before the last watermark, covering
+# transactions that committed after a later updated_at was already visible
+SIMILARITY_INDEX_SYNC_OVERLAP = 60
+SIMILARITY_INDEX_PENDING_KEY = 'agent_similarity_index_pending_ids'
+
+# Multiply-shift hashing yields 32-bit values; this marks an empty text
+_EMPTY_SLOT = np.uint64(1 << 32)
+_SHIFT = np.uint64(32)
+_BAND_MIX = np.uint64(0x9E3779B97F4A7C15)
+_NON_ALNUM = re.compile(r"[^a-z]+")
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase letters only; digits appended for uniqueness are dropped"""
+    return _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """32-bit hashes of the character n-grams of normalized text"""
+    if not text:
+        return []
+    padded = f" {text} "
+    shingles = {padded[i:i + size] for i in range(max(1, len(padded) - size + 1))}
+    return [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+
+@dataclass
+class SimilarityMatch:
+    """A catalog agent (or earlier batch candidate) similar to a candidate"""
+    agent_id: Optional[int]
+    name: str
+    score: float
+    name_similarity: float
+    description_similarity: float
+    exact: bool = False
+    batch_index: Optional[int] = None
+
+@dataclass
+class DuplicateCluster:
+    """Connected group of near-duplicate agents"""
+    agent_ids: List[int]
+    names: List[str]
+    similarity: float  # weakest similarity linking the cluster
+    pairs: List[Tuple[int, int, float]] = field(default_factory=list)
+
+@dataclass
+class _TextGroup:
+    """Agents whose normalized name and description are identical"""
+    name: str
+    member_ids: Set[int]
+    name_signature: np.ndarray
+    description_signature: np.ndarray
+
+class AgentSimilarityIndex:
+    """
+    MinHash signatures per distinct (name, description) text, bucketed by
+    LSH bands. Batches of candidates are signed, banded and scored against
+    the catalog with array operations; only pairs sharing a band bucket are
+    scored.
+    """
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, bands: int = LSH_BANDS,
+                 name_weight: float = NAME_WEIGHT, seed: int = 42):
+        if num_permutations % bands:
+            raise ValueError("num_permutations must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        # Odd multipliers for multiply-shift universal hashing
+        self._a = rng.integers(0, 1 << 63, size=num_permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_permutations, dtype=np.uint64)
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.name_weight = name_weight
+
+        self._lock = threading.RLock()
+        self._agents: Dict[int, Tuple[str, Tuple[str, str]]] = {}
+        self._groups: Dict[Tuple[str, str], _TextGroup] = {}
+        self._natural_keys: Dict[str, Set[int]] = {}
+        self._matrix = None  # lazily built arrays over self._groups
+        self._built = False
+        self._watermark = None
+        self._last_sync = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._agents)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    # Signatures
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """MinHash signatures (len(texts) x num_permutations) of normalized texts"""
+        hashes = [shingle_hashes(text) for text in texts]
+        lengths = np.array([len(h) for h in hashes])
+        signatures = np.full((len(texts), self.num_permutations), _EMPTY_SLOT, dtype=np.uint64)
+        non_empty = np.flatnonzero(lengths)
+        if not len(non_empty):
+            return signatures
+
+        flat = np.fromiter((value for i in non_empty for value in hashes[i]), dtype=np.uint64,
+                           count=int(lengths[non_empty].sum()))
+        with np.errstate(over="ignore"):
+            permuted = (flat[:, None] * self._a + self._b) >> _SHIFT
+        offsets = np.concatenate(([0], np.cumsum(lengths[non_empty])[:-1]))
+        signatures[non_empty] = np.minimum.reduceat(permuted, offsets, axis=0)
+        return signatures
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        rows = self.num_permutations // self.bands
+        banded = signatures.reshape(len(signatures), self.bands, rows)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for row in range(rows):
+                keys = keys * _BAND_MIX + banded[:, :, row]
+        return keys
+
+    @staticmethod
+    def _band_pairs(left_keys: np.ndarray, right_keys: np.ndarray,
+                    left_valid: np.ndarray, right_valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Index pairs (left, right) sharing at least one band bucket"""
+        codes = []
+        right_count = len(right_keys)
+        for band in range(left_keys.shape[1]):
+            order = np.argsort(right_keys[:, band], kind="stable")
+            order = order[right_valid[order]]
+            sorted_keys = right_keys[order, band]
+            lo = np.searchsorted(sorted_keys, left_keys[:, band], side="left")
+            hi = np.searchsorted(sorted_keys, left_keys[:, band], side="right")
+            counts = np.where(left_valid, hi - lo, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            left = np.repeat(np.arange(len(left_keys)), counts)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            right = order[np.repeat(lo, counts) + within]
+            codes.append(left.astype(np.int64) * right_count + right)
+        if not codes:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        unique = np.unique(np.concatenate(codes))
+        return unique // right_count, unique % right_count
+
+    def _scores(self, name_left, desc_left, name_right, desc_right, left, right):
+        name_similarity = (name_left[left] == name_right[right]).mean(axis=1)
+        description_similarity = (desc_left[left] == desc_right[right]).mean(axis=1)
+        # Without a description on either side, fall back to the name alone
+        missing = (desc_left[left, 0] == _EMPTY_SLOT) | (desc_right[right, 0] == _EMPTY_SLOT)
+        description_similarity = np.where(missing, name_similarity, description_similarity)
+        score = self.name_weight * name_similarity + (1 - self.name_weight) * description_similarity
+        return score, name_similarity, description_similarity
+
+    # Index maintenance
+
+    @staticmethod
+    def _text_key(name: Optional[str], description: Optional[str]) -> Tuple[str, str]:
+        return (normalize_text(name), normalize_text(description))
+
+    def upsert(self, agent_id: int, name: Optional[str], description: Optional[str]):
+        text_key = self._text_key(name, description)
+        with self._lock:
+            current = self._agents.get(agent_id)
+            if current is not None:
+                if current == (name, text_key):
+                    return
+                self._remove_unlocked(agent_id)
+
+            group = self._groups.get(text_key)
+            if group is None:
+                name_signature, description_signature = self.signatures(list(text_key))
+                group = self._groups[text_key] = _TextGroup(name or "", set(), name_signature, description_signature)
+                self._matrix = None
+            group.member_ids.add(agent_id)
+            self._agents[agent_id] = (name, text_key)
+            self._natural_keys.setdefault(agent_natural_key({"name": name}), set()).add(agent_id)
+
+    def _remove_unlocked(self, agent_id: int):
+        current = self._agents.pop(agent_id, None)
+        if current is None:
+            return
+        name, text_key = current
+        group = self._groups[text_key]
+        group.member_ids.discard(agent_id)
+        if not group.member_ids:
+            del self._groups[text_key]
+            self._matrix = None
+        natural_key = agent_natural_key({"name": name})
+        ids = self._natural_keys.get(natural_key)
+        if ids is not None:
+            ids.discard(agent_id)
+            if not ids:
+                del self._natural_keys[natural_key]
+
+    def remove(self, agent_id: int):
+        with self._lock:
+            self._remove_unlocked(agent_id)
+
+    def build(self, rows: Iterable):
+        """Replace the index from rows with id, name and description"""
+        with self._lock:
+            self._agents.clear()
+            self._groups.clear()
+            self._natural_keys.clear()
+            self._matrix = None
+            for row in rows:
+                self.upsert(row.id, row.name, row.description)
+            self._built = True
+
+    def build_from_database(self):
+        with db.engine.connect() as connection:
+            self._watermark = connection.execute(select(func.max(AIAgent.updated_at))).scalar()
+            rows = connection.execution_options(yield_per=500).execute(
+                select(AIAgent.id, AIAgent.name, AIAgent.description).where(AIAgent.is_active == True)
+            )
+            self.build(rows)
+        self._last_sync = time.monotonic()
+        logger.info(f"Agent similarity index built with {self.size} agents")
+
+    def sync_with_database(self):
+        """
+        Pick up agents written by other processes since the last sync. An
+        active row count that differs from the index (deletes elsewhere, or
+        rows written without updated_at) falls back to a full rebuild.
+        """
+        with db.engine.connect() as connection:
+            watermark = connection.execute(select(func.max(AIAgent.updated_at))).scalar()
+            active_count = connection.execute(
+                select(func.count(AIAgent.id)).where(AIAgent.is_active == True)
+            ).scalar()
+            if active_count != self.size:
+                self.build_from_database()
+                return
+            if watermark is None:
+                return
+            query = select(AIAgent.id)
+            if self._watermark is not None:
+                query = query.where(
+                    AIAgent.updated_at >= self._watermark - timedelta(seconds=SIMILARITY_INDEX_SYNC_OVERLAP))
+            changed_ids = connection.execute(query).scalars().all()
+        self.refresh_agents(changed_ids)
+        self._watermark = watermark
+
+    def ensure_built(self):
+        """Build on first use; afterwards sync with other processes' writes every SIMILARITY_INDEX_SYNC_SECONDS"""
+        if not self._built:
+            self.build_from_database()
+            return
+        now = time.monotonic()
+        if now - self._last_sync < SIMILARITY_INDEX_SYNC_SECONDS:
+            return
+        self._last_sync = now
+        try:
+            self.sync_with_database()
+        except Exception as e:
+            logger.error(f"Agent similarity index sync failed: {e}")
+
+    def refresh_agents(self, agent_ids: Iterable[int]):
+        """
+        Re-read specific agents, e.g. after a bulk catalog upsert. Uses a
+        connection of its own: listeners run after the writer's session has
+        committed, when that session can't emit SQL.
+        """
+        agent_ids = list(agent_ids)
+        found = set()
+        with db.engine.connect() as connection:
+            for start in range(0, len(agent_ids), 500):
+                for row in connection.execute(
+                    select(AIAgent.id, AIAgent.name, AIAgent.description)
+                    .where(AIAgent.id.in_(agent_ids[start:start + 500]), AIAgent.is_active == True)
+                ):
+                    self.upsert(row.id, row.name, row.description)
+                    found.add(row.id)
+        for agent_id in set(agent_ids) - found:
+            self.remove(agent_id)
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            groups = list(self._groups.values())
+            count = len(groups)
+            name_signatures = np.array([g.name_signature for g in groups], dtype=np.uint64).reshape(count, -1)
+            description_signatures = np.array([g.description_signature for g in groups], dtype=np.uint64).reshape(count, -1)
+            self._matrix = (groups, name_signatures, description_signatures,
+                            self._band_keys(name_signatures), (name_signatures != _EMPTY_SLOT).any(axis=1))
+        return self._matrix
+
+    # Queries
+
+    def find_duplicates(self, candidates: List[Dict], threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                        include_batch: bool = True, max_matches: int = 5) -> List[List[SimilarityMatch]]:
+        """
+        Check a batch of candidate agent dicts against the catalog (and, with
+        include_batch, against earlier candidates of the same batch) in one
+        vectorized pass. Returns the best matches per candidate, best first.
+        """
+        matches: List[List[SimilarityMatch]] = [[] for _ in candidates]
+        if not candidates:
+            return matches
+
+        text_keys = [self._text_key(c.get("name"), c.get("description")) for c in candidates]
+        name_signatures = self.signatures([key[0] for key in text_keys])
+        description_signatures = self.signatures([key[1] for key in text_keys])
+        band_keys = self._band_keys(name_signatures)
+        valid = (name_signatures != _EMPTY_SLOT).any(axis=1)
+
+        with self._lock:
+            for index, candidate in enumerate(candidates):
+                for agent_id in sorted(self._natural_keys.get(agent_natural_key(candidate), ())):
+                    matches[index].append(SimilarityMatch(agent_id, self._agents[agent_id][0], 1.0, 1.0, 1.0, exact=True))
+
+            groups, group_names, group_descriptions, group_bands, group_valid = self._get_matrix()
+            if groups:
+                left, right = self._band_pairs(band_keys, group_bands, valid, group_valid)
+                score, name_similarity, description_similarity = self._scores(
+                    name_signatures, description_signatures, group_names, group_descriptions, left, right)
+                for i in np.flatnonzero(score >= threshold):
+                    group = groups[right[i]]
+                    agent_id = min(group.member_ids)
+                    if any(m.agent_id == agent_id for m in matches[left[i]]):
+                        continue
+                    matches[left[i]].append(SimilarityMatch(
+                        agent_id, self._agents[agent_id][0], round(float(score[i]), 4),
+                        round(float(name_similarity[i]), 4), round(float(description_similarity[i]), 4)
+                    ))
+
+        if include_batch and len(candidates) > 1:
+            # Identical texts in the batch match their first occurrence directly;
+            # only the distinct texts go through the banded comparison
+            first_seen: Dict[Tuple[str, str], int] = {}
+            for index, key in enumerate(text_keys):
+                first = first_seen.setdefault(key, index)
+                if first != index and key[0]:
+                    matches[index].append(SimilarityMatch(
+                        None, candidates[first].get("name", ""), 1.0, 1.0, 1.0, batch_index=first
+                    ))
+            distinct = np.zeros(len(candidates), dtype=bool)
+            distinct[list(first_seen.values())] = True
+
+            left, right = self._band_pairs(band_keys, band_keys, valid & distinct, valid & distinct)
+            earlier = right < left
+            left, right = left[earlier], right[earlier]
+            score, name_similarity, description_similarity = self._scores(
+                name_signatures, description_signatures, name_signatures, description_signatures, left, right)
+            for i in np.flatnonzero(score >= threshold):
+                matches[left[i]].append(SimilarityMatch(
+                    None, candidates[right[i]].get("name", ""), round(float(score[i]), 4),
+                    round(float(name_similarity[i]), 4), round(float(description_similarity[i]), 4),
+                    batch_index=int(right[i])
+                ))
+
+        for candidate_matches in matches:
+            candidate_matches.sort(key=lambda m: (not m.exact, -m.score))
+            del candidate_matches[max_matches:]
+        return matches
+
+    def duplicate_clusters(self, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[DuplicateCluster]:
+        """Near-duplicate clusters across the indexed catalog, largest first"""
+        with self._lock:
+            groups, group_names, group_descriptions, group_bands, group_valid = self._get_matrix()
+            if not groups:
+                return []
+            left, right = self._band_pairs(group_bands, group_bands, group_valid, group_valid)
+            upper = left < right
+            left, right = left[upper], right[upper]
+            score, _, _ = self._scores(group_names, group_descriptions, group_names, group_descriptions, left, right)
+            keep = score >= threshold
+            edges = list(zip(left[keep].tolist(), right[keep].tolist(), score[keep].tolist()))
+
+            parent = list(range(len(groups)))
+
+            def find(node):
+                while parent[node] != node:
+                    parent[node] = parent[parent[node]]
+                    node = parent[node]
+                return node
+
+            for a, b, _ in edges:
+                parent[find(a)] = find(b)
+
+            members: Dict[int, List[int]] = {}
+            for node in range(len(groups)):
+                members.setdefault(find(node), []).append(node)
+            edges_by_root: Dict[int, List] = {}
+            for a, b, edge_score in edges:
+                edges_by_root.setdefault(find(a), []).append((a, b, edge_score))
+
+            clusters = []
+            for root, nodes in members.items():
+                agent_ids = sorted(agent_id for node in nodes for agent_id in groups[node].member_ids)
+                if len(agent_ids) < 2:
+                    continue
+                cluster_edges = edges_by_root.get(root, [])
+                pairs = [(min(groups[a].member_ids), min(groups[b].member_ids), round(s, 4))
+                         for a, b, s in cluster_edges]
+                clusters.append(DuplicateCluster(
+                    agent_ids=agent_ids,
+                    names=[self._agents[agent_id][0] for agent_id in agent_ids],
+                    similarity=round(min((s for _, _, s in pairs), default=1.0), 4),
+                    pairs=pairs
+                ))
+            clusters.sort(key=lambda c: (-len(c.agent_ids), -c.similarity))
+            return clusters
+
+# Global index instance for generation-time duplicate checks
+agent_similarity_index = AgentSimilarityIndex()
+
+# Flush events only record the IDs on the writing session; the index
+# re-reads them after commit, so a rolled back write never reaches it
+def _on_agent_written(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.id is not None:
+        session.info.setdefault(SIMILARITY_INDEX_PENDING_KEY, set()).add(target.id)
+
+def _on_commit(session):
+    agent_ids = session.info.pop(SIMILARITY_INDEX_PENDING_KEY, None)
+    if agent_ids and agent_similarity_index.is_built:
+        agent_similarity_index.refresh_agents(agent_ids)
+
+def _on_rollback(session):
+    session.info.pop(SIMILARITY_INDEX_PENDING_KEY, None)
+
+def _on_catalog_bulk_change(agent_ids):
+    if agent_similarity_index.is_built:
+        agent_similarity_index.refresh_agents(agent_ids)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(AIAgent, _event_name, _on_agent_written)
+event.listen(Session, 'after_commit', _on_commit)
+event.listen(Session, 'after_rollback', _on_rollback)
+register_catalog_change_listener(_on_catalog_bulk_change)
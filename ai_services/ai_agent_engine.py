@@ -2,15 +2,14 @@
 4UAI AI Agent Engine - Core Implementation
 Production-ready AI agent system with multi-model support
 """
-import os
-import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
-import openai
-import anthropic
 from flask import current_app
+from usage_metering import get_usage_meter
+from model_router import get_model_router, ModelRouterError
+from prompt_cache import prompt_cache, serialize_context, CompiledPrompt
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +24,7 @@ class AgentResponse:
     processing_time: float
     confidence_score: float
     usage_tokens: int
+    prompt_version: Optional[str] = None
 
 @dataclass
 class AgentConfig:
@@ -45,26 +45,16 @@ class AIAgentEngine:
         self.openai_client = None
         self.anthropic_client = None
         self.agents_registry = {}
-        self.usage_tracker = {}
+        self.usage_meter = get_usage_meter()
         self._initialize_clients()
         self._load_agent_configurations()
         logger.info("🤖 AI Agent Engine initialized successfully")
     
     def _initialize_clients(self):
-        """Initialize AI model clients"""
-        try:
-            # Initialize OpenAI
-            if os.getenv('OPENAI_API_KEY'):
-                self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-                logger.info("✅ OpenAI GPT-4o client initialized")
-            
-            # Initialize Anthropic
-            if os.getenv('ANTHROPIC_API_KEY'):
-                self.anthropic_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-                logger.info("✅ Anthropic Claude client initialized")
-                
-        except Exception as e:
-            logger.error(f"❌ Error initializing AI clients: {e}")
+        """Attach to the shared model router, which owns the provider clients"""
+        self.router = get_model_router()
+        self.openai_client = self.router.client_for('openai')
+        self.anthropic_client = self.router.client_for('anthropic')
     
     def _load_agent_configurations(self):
         """Load AI agent configurations"""
@@ -136,6 +126,10 @@ Provide practical, ready-to-use marketing content that businesses can implement
             model_preference="openai"
         )
         
+        # Compile system prompts up front so the first request doesn't pay for it
+        for agent_id in self.agents_registry:
+            self.get_system_prompt(agent_id)
+        
         logger.info(f"📋 Loaded {len(self.agents_registry)} AI agents")
     
     def get_available_agents(self, user_tier: str = "free") -> List[Dict]:
@@ -155,31 +149,20 @@ Provide practical, ready-to-use marketing content that businesses can implement
         return available
     
     def check_usage_limit(self, user_id: int, agent_id: str) -> tuple[bool, int]:
-        """Check if user has exceeded usage limit for agent"""
-        key = f"{user_id}_{agent_id}"
-        current_month = datetime.now().strftime("%Y-%m")
-        
-        if key not in self.usage_tracker:
-            self.usage_tracker[key] = {"month": current_month, "count": 0}
-        
-        usage = self.usage_tracker[key]
-        if usage["month"] != current_month:
-            # Reset for new month
-            usage["month"] = current_month
-            usage["count"] = 0
-        
+        """Check if user has exceeded usage limit for agent (read-only, monthly bucket)"""
         agent_config = self.agents_registry.get(agent_id)
         if not agent_config:
             return False, 0
-            
-        limit = agent_config.monthly_limit
-        remaining = max(0, limit - usage["count"])
         
-        return usage["count"] < limit, remaining
+        return self.usage_meter.remaining(user_id, agent_id, agent_config.monthly_limit)
     
     def process_request(self, agent_id: str, user_input: str, user_id: int, 
-                       context: Optional[Dict] = None) -> AgentResponse:
-        """Process user request through specified AI agent"""
+                       context: Optional[Dict] = None, history: Optional[List[Dict]] = None,
+                       summary: Optional[str] = None) -> AgentResponse:
+        """
+        Process user request through specified AI agent; history holds prior
+        turns as chat messages and summary condenses anything older
+        """
         start_time = datetime.now()
         
         # Validate agent exists
@@ -188,22 +171,36 @@ Provide practical, ready-to-use marketing content that businesses can implement
         
         agent_config = self.agents_registry[agent_id]
         
-        # Check usage limits for free agents
-        if agent_config.pricing_tier == "free":
-            can_use, remaining = self.check_usage_limit(user_id, agent_id)
+        # Reserve a request against the monthly limit for free agents; the
+        # check and the increment are one atomic statement in the usage store
+        metered = agent_config.pricing_tier == "free"
+        if metered:
+            can_use, remaining = self.usage_meter.try_consume(user_id, agent_id, agent_config.monthly_limit)
             if not can_use:
                 raise ValueError(f"Monthly usage limit exceeded for {agent_config.name}")
         
-        # Build enhanced prompt
-        enhanced_prompt = self._build_enhanced_prompt(agent_config, user_input, context)
+        # Precompiled system prompt plus the per-call suffix
+        system_prompt = self.get_system_prompt(agent_id)
+        messages = self._build_messages(system_prompt, user_input, context, history, summary)
         
         # Route to appropriate model
-        response_content, model_used, tokens_used = self._call_ai_model(
-            agent_config.model_preference, enhanced_prompt
-        )
+        try:
+            response_content, model_used, prompt_tokens, completion_tokens, cached_tokens = self._call_ai_model(
+                agent_config.model_preference, messages, tenant=user_id
+            )
+        except Exception:
+            if metered:
+                self.usage_meter.release(user_id, agent_id)
+            raise
+        tokens_used = prompt_tokens + completion_tokens
+        
+        # Failed model calls don't count against the limit
+        if metered and model_used == "fallback":
+            self.usage_meter.release(user_id, agent_id)
         
         # Update usage tracking
-        self._update_usage(user_id, agent_id)
+        self._update_usage(user_id, agent_id, model_used, prompt_tokens, completion_tokens,
+                           already_counted=metered and model_used != "fallback", cached_tokens=cached_tokens)
         
         # Calculate metrics
         processing_time = (datetime.now() - start_time).total_seconds()
@@ -214,97 +211,85 @@ Provide practical, ready-to-use marketing content that businesses can implement
             model_used=model_used,
             processing_time=processing_time,
             confidence_score=0.85,  # Default confidence
-            usage_tokens=tokens_used
+            usage_tokens=tokens_used,
+            prompt_version=system_prompt.version
         )
     
-    def _build_enhanced_prompt(self, agent_config: AgentConfig, user_input: str, 
-                              context: Optional[Dict] = None) -> str:
-        """Build enhanced prompt for AI model"""
-        prompt = f"{agent_config.base_prompt}\n\n"
-        
+    def get_system_prompt(self, agent_id: str) -> CompiledPrompt:
+        """Compiled system prompt for an agent; rebuilt only when its config changes"""
+        agent_config = self.agents_registry[agent_id]
+        return prompt_cache.get_or_compile(f"engine:{agent_id}", str.strip, agent_config.base_prompt)
+    
+    def _build_messages(self, system_prompt: CompiledPrompt, user_input: str,
+                        context: Optional[Dict] = None, history: Optional[List[Dict]] = None,
+                        summary: Optional[str] = None) -> List[Dict]:
+        """
+        Stable system block first, then prior turns and only the variable part
+        of the request, so providers can serve the system prefix from their
+        prompt cache
+        """
+        user_content = ""
+        if summary:
+            user_content += f"EARLIER IN THIS CONVERSATION:\n{summary}\n\n"
         if context:
-            prompt += f"CONTEXT:\n{json.dumps(context, indent=2)}\n\n"
+            user_content += f"CONTEXT:\n{serialize_context(context)}\n\n"
         
-        prompt += f"USER REQUEST:\n{user_input}\n\n"
-        prompt += "RESPONSE:"
+        user_content += f"USER REQUEST:\n{user_input}"
         
-        return prompt
+        return [
+            {"role": "system", "content": system_prompt.text},
+            *(history or []),
+            {"role": "user", "content": user_content}
+        ]
     
-    def _call_ai_model(self, model_preference: str, prompt: str) -> tuple[str, str, int]:
-        """Call appropriate AI model"""
+    def _call_ai_model(self, model_preference: str, messages: List[Dict],
+                       tenant=None) -> tuple[str, str, int, int, int]:
+        """
+        Call the best available AI model; model_preference is a tie-breaker,
+        the router fails over to another provider when it is unhealthy.
+        Returns content, model, prompt tokens, completion tokens, cached prompt tokens.
+        """
         try:
-            if model_preference == "openai" and self.openai_client:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=1500,
-                    temperature=0.7
-                )
-                
-                # Safely extract content
-                content = ""
-                if response.choices and len(response.choices) > 0:
-                    message = response.choices[0].message
-                    if message and message.content:
-                        content = message.content
-                
-                # Safely extract token usage
-                tokens = 0
-                if response.usage and hasattr(response.usage, 'total_tokens'):
-                    tokens = response.usage.total_tokens
-                
-                if not content:
-                    content = "I apologize, but I couldn't generate a response at the moment."
-                
-                return content, "gpt-4o", tokens
+            result = self.router.complete(
+                messages,
+                request_class="interactive",
+                preference=model_preference,
+                tenant=tenant,
+                max_tokens=1500,
+                temperature=0.7
+            )
             
-            elif model_preference == "anthropic" and self.anthropic_client:
-                response = self.anthropic_client.messages.create(
-                    model="claude-3-5-sonnet-20241022", 
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=1500
-                )
-                
-                # Safely extract content
-                content = ""
-                if response.content and len(response.content) > 0:
-                    # Handle different content block types
-                    for block in response.content:
-                        if hasattr(block, 'text') and block.text:
-                            content += block.text
-                        elif hasattr(block, 'type') and block.type == 'text':
-                            content += getattr(block, 'text', '')
-                
-                # Safely extract token usage
-                tokens = 0
-                if response.usage:
-                    input_tokens = getattr(response.usage, 'input_tokens', 0)
-                    output_tokens = getattr(response.usage, 'output_tokens', 0)
-                    tokens = input_tokens + output_tokens
-                
-                if not content:
-                    content = "I apologize, but I couldn't generate a response at the moment."
-                
-                return content, "claude-3-5-sonnet", tokens
+            content = result.content
+            if not content:
+                content = "I apologize, but I couldn't generate a response at the moment."
             
-            else:
-                raise ValueError("No available AI model client")
+            return content, result.model, result.prompt_tokens, result.completion_tokens, result.cached_tokens
                 
-        except Exception as e:
+        except ModelRouterError as e:
             logger.error(f"AI model call failed: {e}")
             # Return fallback response instead of raising
-            return "I apologize, but I encountered an error while processing your request. Please try again.", "fallback", 0
+            return "I apologize, but I encountered an error while processing your request. Please try again.", "fallback", 0, 0, 0
     
-    def _update_usage(self, user_id: int, agent_id: str):
-        """Update usage tracking"""
-        key = f"{user_id}_{agent_id}"
-        current_month = datetime.now().strftime("%Y-%m")
-        
-        if key not in self.usage_tracker:
-            self.usage_tracker[key] = {"month": current_month, "count": 0}
-        
-        self.usage_tracker[key]["count"] += 1
-        logger.info(f"📊 Usage updated for user {user_id}, agent {agent_id}: {self.usage_tracker[key]['count']}")
+    def _update_usage(self, user_id: int, agent_id: str, model_used: str = None,
+                      prompt_tokens: int = 0, completion_tokens: int = 0, already_counted: bool = False,
+                      cached_tokens: int = 0):
+        """Record tokens and cost for billing (buffered, flushed in batches)"""
+        if model_used == "fallback":
+            return
+        record = self.usage_meter.record_call(
+            user_id, agent_id, model_used, prompt_tokens, completion_tokens,
+            count_request=not already_counted, cached_prompt_tokens=cached_tokens
+        )
+        logger.info(f"📊 Usage recorded for user {user_id}, agent {agent_id}: "
+                    f"{record.total_tokens} tokens, ${record.cost_usd:.4f}")
+    
+    def get_usage_report(self, period: Optional[str] = None, user_id: Optional[int] = None) -> Dict:
+        """Per-agent and per-user usage for a month (YYYY-MM, defaults to current)"""
+        return {
+            'period': period or datetime.utcnow().strftime("%Y-%m"),
+            'by_agent': self.usage_meter.usage_by_agent(period, user_id=user_id),
+            'by_user': self.usage_meter.usage_by_user(period) if user_id is None else []
+        }
 
 # Global agent engine instance
 agent_engine = None
@@ -10,6 +10,8 @@ from dataclasses import dataclass
 
 from app import db
 from models import AIAgent
+from agent_catalog_upsert import catalog_upserter
+from agent_similarity_index import agent_similarity_index, NEAR_DUPLICATE_THRESHOLD
 
 
 @dataclass
@@ -58,7 +60,8 @@ class AIAgentGenerationService:
             'pricing_tiers': ['basic', 'professional', 'enterprise', 'elite'],
             'valid_categories': ['wealth_generation', 'healthcare', 'technology', 
                                'creative', 'business', 'enterprise', 'marketing',
-                               'finance', 'operations', 'analytics']
+                               'finance', 'operations', 'analytics'],
+            'near_duplicate_similarity': NEAR_DUPLICATE_THRESHOLD
         }
     
     def _initialize_quality_thresholds(self) -> Dict:
@@ -88,16 +91,24 @@ class AIAgentGenerationService:
             # Generate agent variations
             agent_variations = self._generate_agent_variations(request)
             
+            # Check the whole batch for duplicates in one similarity pass
+            duplicate_matches = self._find_duplicate_matches(agent_variations)
+            
             # Validate each agent
             validated_agents = []
-            for agent_data in agent_variations:
-                validation_result = self._validate_agent_data(agent_data)
+            near_duplicates = 0
+            for agent_data, matches in zip(agent_variations, duplicate_matches):
+                validation_result = self._validate_agent_data(agent_data, matches)
                 
                 if validation_result.is_valid:
                     validated_agents.append(validation_result.agent_data)
+                    near_duplicates += bool(matches)
                 else:
                     self.logger.warning(f"Agent validation failed: {validation_result.errors}")
             
+            if near_duplicates:
+                self.logger.warning(f"{near_duplicates} generated agents are near-duplicates of other agents")
+            
             self.logger.info(f"✅ Generated {len(validated_agents)} validated agents")
             return validated_agents
             
@@ -245,7 +256,7 @@ class AIAgentGenerationService:
         bonus = min(0.15, (expertise_level - 50) / 100 * 0.15)
         return round(base_rate + bonus, 2)
     
-    def _validate_agent_data(self, agent_data: Dict) -> AgentValidationResult:
+    def _validate_agent_data(self, agent_data: Dict, duplicate_matches: Optional[List] = None) -> AgentValidationResult:
         """Comprehensive validation of agent data"""
         errors = []
         warnings = []
@@ -283,8 +294,15 @@ class AIAgentGenerationService:
             warnings.append("Category not in standard list")
         
         # Check for duplicates
-        if self._check_duplicate_agent(agent_data.get('name', '')):
+        if duplicate_matches is None:
+            duplicate_matches = self._find_duplicate_matches([agent_data])[0]
+        
+        if any(match.exact for match in duplicate_matches):
             errors.append("Agent with similar name already exists")
+        else:
+            for match in duplicate_matches:
+                source = f"agent {match.agent_id}" if match.agent_id is not None else "this batch"
+                warnings.append(f"Near-duplicate of '{match.name}' in {source} (similarity {match.score:.2f})")
         
         is_valid = len(errors) == 0
         
@@ -295,13 +313,20 @@ class AIAgentGenerationService:
             agent_data=agent_data if is_valid else None
         )
     
+    def _find_duplicate_matches(self, agents: List[Dict]) -> List[List]:
+        """Exact and near-duplicate matches per agent against the catalog and the batch"""
+        try:
+            agent_similarity_index.ensure_built()
+            return agent_similarity_index.find_duplicates(
+                agents, threshold=self.validation_rules['near_duplicate_similarity']
+            )
+        except Exception as e:
+            self.logger.error(f"Duplicate check failed: {e}")
+            return [[] for _ in agents]
+    
     def _check_duplicate_agent(self, name: str) -> bool:
         """Check if agent with similar name already exists"""
-        try:
-            existing = AIAgent.query.filter_by(name=name, is_active=True).first()
-            return existing is not None
-        except Exception:
-            return False
+        return any(match.exact for match in self._find_duplicate_matches([{'name': name}])[0])
     
     def create_agents_in_database(self, validated_agents: List[Dict]) -> Tuple[int, List[str]]:
         """
@@ -314,26 +339,13 @@ class AIAgentGenerationService:
         errors = []
         
         try:
-            for agent_data in validated_agents:
-                # Double-check for duplicates
-                existing = AIAgent.query.filter_by(name=agent_data['name']).first()
-                if existing:
-                    errors.append(f"Skipped duplicate: {agent_data['name']}")
-                    continue
-                
-                # Create new agent
-                if agent_data:
-                    agent = AIAgent(**agent_data)
-                    db.session.add(agent)
-                    created_count += 1
-                
-                # Commit in batches of 20
-                if created_count % 20 == 0:
-                    db.session.commit()
-                    self.logger.info(f"Batch committed: {created_count} agents created")
-            
-            # Final commit
-            db.session.commit()
+            # One diff query and bulk inserts; existing names are skipped, not overwritten
+            result = catalog_upserter.upsert(
+                [agent_data for agent_data in validated_agents if agent_data],
+                update_existing=False
+            )
+            created_count = result.inserted
+            errors.extend(result.skipped)
             
             self.logger.info(f"✅ Successfully created {created_count} agents in database")
             
@@ -430,7 +442,16 @@ def validate_agent_ecosystem() -> Dict:
     service = AIAgentGenerationService()
     
     try:
-        total_agents = AIAgent.query.filter_by(is_active=True).count()
+        # Count and quality averages in one aggregate query
+        total_agents, avg_expertise, avg_projects, avg_collaboration = db.session.query(
+            db.func.count(AIAgent.id),
+            db.func.avg(AIAgent.expertise_level),
+            db.func.avg(AIAgent.practical_projects),
+            db.func.avg(AIAgent.collaboration_rate)
+        ).filter_by(is_active=True).one()
+        avg_expertise = avg_expertise or 0
+        avg_projects = avg_projects or 0
+        avg_collaboration = avg_collaboration or 0
         
         # Category distribution
         categories = db.session.query(AIAgent.category, db.func.count(AIAgent.id))\
@@ -438,16 +459,6 @@ def validate_agent_ecosystem() -> Dict:
             .group_by(AIAgent.category)\
             .all()
         
-        # Quality metrics
-        avg_expertise = db.session.query(db.func.avg(AIAgent.expertise_level))\
-            .filter_by(is_active=True).scalar() or 0
-        
-        avg_projects = db.session.query(db.func.avg(AIAgent.practical_projects))\
-            .filter_by(is_active=True).scalar() or 0
-        
-        avg_collaboration = db.session.query(db.func.avg(AIAgent.collaboration_rate))\
-            .filter_by(is_active=True).scalar() or 0
-        
         return {
             'total_agents': total_agents,
             'milestone_status': 'COMPLETED' if total_agents >= 1000 else 'IN_PROGRESS',
@@ -6,11 +6,17 @@ Enterprise-grade AI agent architecture for platform optimization and business ac
 import os
 import json
 import asyncio
+import atexit
+import heapq
+import itertools
+from collections import defaultdict, deque
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Set, Deque, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
+import threading
+import time
 
 # AI API integrations
 try:
@@ -21,7 +27,8 @@ except ImportError:
     HAS_AI_APIS = False
 
 from app import db
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON, Index, func
+from agent_performance_rollups import AgentPerformanceRollup, apply_rollups, bucket_start, summarize_rollups
 from sqlalchemy.ext.declarative import declarative_base
 
 # Configure logging
@@ -43,6 +50,27 @@ class AgentPriority(Enum):
     MEDIUM = "medium"
     LOW = "low"
 
+# Dispatch order: lower rank runs first
+PRIORITY_RANK = {
+    AgentPriority.CRITICAL: 0,
+    AgentPriority.HIGH: 1,
+    AgentPriority.MEDIUM: 2,
+    AgentPriority.LOW: 3
+}
+
+DEFAULT_AGENT_SLOTS = 4
+DISPATCH_LOOKAHEAD = 64
+# run_task waits this long for a free slot on its agent, polling so it works from any event loop
+DISPATCH_SLOT_TIMEOUT_SECONDS = 300.0
+DISPATCH_SLOT_POLL_SECONDS = 0.05
+COMPLETED_TASK_HISTORY = 1000
+AGENT_PERFORMANCE_HISTORY = 100
+
+PERFORMANCE_LOG_BATCH_SIZE = 500
+PERFORMANCE_LOG_FLUSH_SECONDS = 2.0
+PERFORMANCE_LOG_MAX_BUFFERED = 20000
+PERFORMANCE_LOG_BLOCK_SECONDS = 0.05
+
 @dataclass
 class AgentTask:
     """Individual task for AI agents"""
@@ -55,6 +83,7 @@ class AgentTask:
     estimated_duration: int  # minutes
     dependencies: List[str] = None
     metadata: Dict[str, Any] = None
+    deadline: Optional[datetime] = None  # earlier deadlines run first within a priority
 
 @dataclass
 class AgentCapability:
@@ -69,27 +98,69 @@ class AgentCapability:
 class BaseAIAgent:
     """Base class for all specialized AI agents"""
     
+    # Concurrent tasks the orchestrator may run on this agent
+    max_concurrent_tasks = DEFAULT_AGENT_SLOTS
+    
     def __init__(self, agent_id: str, name: str, specialization: str, capabilities: List[AgentCapability]):
         self.agent_id = agent_id
         self.name = name
         self.specialization = specialization
         self.capabilities = capabilities
-        self.status = AgentStatus.IDLE
-        self.current_task = None
-        self.performance_history = []
+        # Tasks running in this agent's slots, by task id; status and
+        # current_task are derived from it so concurrent slots never clobber
+        # each other
+        self.running_tasks: Dict[str, AgentTask] = {}
+        self.paused = False
+        self._last_outcome = AgentStatus.IDLE
+        # Recent entries only; lifetime totals are kept in the counters below
+        self.performance_history: Deque[Dict[str, Any]] = deque(maxlen=AGENT_PERFORMANCE_HISTORY)
+        self.tasks_run = 0
+        self.tasks_succeeded = 0
+        self.total_duration = 0.0
         self.created_at = datetime.now(timezone.utc)
-        
-        # Initialize AI clients if available
-        if HAS_AI_APIS:
-            self.openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            self.anthropic_client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        self._openai_client = None
+        self._anthropic_client = None
+    
+    # AI clients are created on first use so registering many agents stays cheap
+    @property
+    def openai_client(self):
+        if self._openai_client is None and HAS_AI_APIS:
+            self._openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        return self._openai_client
+    
+    @property
+    def anthropic_client(self):
+        if self._anthropic_client is None and HAS_AI_APIS:
+            self._anthropic_client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        return self._anthropic_client
+    
+    @property
+    def success_rate(self) -> float:
+        return self.tasks_succeeded / self.tasks_run if self.tasks_run else 0.0
+    
+    @property
+    def status(self) -> AgentStatus:
+        if self.paused:
+            return AgentStatus.PAUSED
+        if self.running_tasks:
+            return AgentStatus.WORKING
+        return self._last_outcome
+    
+    @status.setter
+    def status(self, value: AgentStatus):
+        self.paused = value == AgentStatus.PAUSED
+        if value not in (AgentStatus.PAUSED, AgentStatus.WORKING):
+            self._last_outcome = value
+    
+    @property
+    def current_task(self) -> Optional[AgentTask]:
+        """Most recently started of the running tasks"""
+        return next(reversed(self.running_tasks.values()), None)
         
     async def execute_task(self, task: AgentTask) -> Dict[str, Any]:
         """Execute a task using the agent's specialized capabilities"""
+        self.running_tasks[task.id] = task
         try:
-            self.status = AgentStatus.WORKING
-            self.current_task = task
-            
             logger.info(f"Agent {self.name} starting task: {task.name}")
             
             # Check dependencies
@@ -107,19 +178,20 @@ class BaseAIAgent:
             # Log performance metrics
             self._log_performance(task, result)
             
-            self.status = AgentStatus.COMPLETED
-            self.current_task = None
+            self._last_outcome = AgentStatus.COMPLETED
             
             return result
             
         except Exception as e:
-            self.status = AgentStatus.ERROR
+            self._last_outcome = AgentStatus.ERROR
             logger.error(f"Agent {self.name} error in task {task.name}: {str(e)}")
             return {
                 "success": False,
                 "error": str(e),
                 "task_id": task.id
             }
+        finally:
+            self.running_tasks.pop(task.id, None)
     
     async def _execute_specialized_task(self, task: AgentTask) -> Dict[str, Any]:
         """Override this method in specialized agent classes"""
@@ -140,20 +212,20 @@ class BaseAIAgent:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         self.performance_history.append(performance_entry)
+        self.tasks_run += 1
+        self.total_duration += performance_entry["duration"]
+        if performance_entry["success"]:
+            self.tasks_succeeded += 1
     
     def get_performance_metrics(self) -> Dict[str, Any]:
         """Get agent performance statistics"""
-        if not self.performance_history:
+        if not self.tasks_run:
             return {"tasks_completed": 0, "success_rate": 0.0, "avg_duration": 0.0}
         
-        successful_tasks = len([p for p in self.performance_history if p["success"]])
-        total_tasks = len(self.performance_history)
-        avg_duration = sum(p["duration"] for p in self.performance_history) / total_tasks
-        
         return {
-            "tasks_completed": total_tasks,
-            "success_rate": successful_tasks / total_tasks if total_tasks > 0 else 0.0,
-            "avg_duration": avg_duration,
+            "tasks_completed": self.tasks_run,
+            "success_rate": self.success_rate,
+            "avg_duration": self.total_duration / self.tasks_run,
             "specialization": self.specialization,
             "status": self.status.value
         }
@@ -163,40 +235,83 @@ class AgentOrchestrator:
     
     def __init__(self):
         self.agents: Dict[str, BaseAIAgent] = {}
-        self.task_queue: List[AgentTask] = []
-        self.completed_tasks: List[Dict[str, Any]] = []
+        # Heap of (priority rank, deadline, sequence, task, preferred agent id)
+        self.task_queue: List[tuple] = []
+        self.completed_tasks: Deque[Dict[str, Any]] = deque(maxlen=COMPLETED_TASK_HISTORY)
+        self.tasks_completed = 0
+        self._sequence = itertools.count()
+        # Inverted indexes: capability name / input type -> agent ids
+        self._capability_index: Dict[str, Set[str]] = defaultdict(set)
+        self._input_type_index: Dict[str, Set[str]] = defaultdict(set)
+        self._active_slots: Dict[str, int] = defaultdict(int)
+        # Requests run in their own threads and event loops; slot changes go through this lock
+        self._slot_lock = threading.Lock()
         
     def register_agent(self, agent: BaseAIAgent):
         """Register a new agent with the orchestrator"""
+        if agent.agent_id in self.agents:
+            self._unindex_agent(self.agents[agent.agent_id])
         self.agents[agent.agent_id] = agent
+        for capability in agent.capabilities:
+            self._capability_index[capability.name].add(agent.agent_id)
+            for input_type in capability.input_types:
+                self._input_type_index[input_type].add(agent.agent_id)
         logger.info(f"Registered agent: {agent.name} ({agent.specialization})")
     
+    def _unindex_agent(self, agent: BaseAIAgent):
+        for capability in agent.capabilities:
+            self._capability_index[capability.name].discard(agent.agent_id)
+            for input_type in capability.input_types:
+                self._input_type_index[input_type].discard(agent.agent_id)
+    
     def assign_task(self, task: AgentTask, preferred_agent_id: Optional[str] = None) -> str:
-        """Assign a task to the most suitable agent"""
+        """Queue a task and return the agent it is expected to run on"""
         if preferred_agent_id and preferred_agent_id in self.agents:
             target_agent = self.agents[preferred_agent_id]
         else:
-            target_agent = self._find_best_agent_for_task(task)
+            preferred_agent_id = None
+            target_agent = self._find_best_agent_for_task(task, require_free_slot=False)
         
         if not target_agent:
             raise ValueError(f"No suitable agent found for task: {task.name}")
         
-        self.task_queue.append(task)
+        deadline = task.deadline.timestamp() if task.deadline else float('inf')
+        heapq.heappush(self.task_queue, (
+            PRIORITY_RANK[task.priority], deadline, next(self._sequence), task, preferred_agent_id
+        ))
         return target_agent.agent_id
     
-    def _find_best_agent_for_task(self, task: AgentTask) -> Optional[BaseAIAgent]:
-        """Find the best agent for a given task based on capabilities and performance"""
-        available_agents = [agent for agent in self.agents.values() 
-                          if agent.status in [AgentStatus.IDLE, AgentStatus.COMPLETED]]
+    def _candidate_agent_ids(self, task: AgentTask):
+        """Agents indexed for the task's capability type and/or input types; all agents when unindexed"""
+        requirements = task.requirements or {}
+        candidates = None
         
-        if not available_agents:
-            return None
+        capability = requirements.get("capability") or requirements.get("type")
+        if capability:
+            candidates = self._capability_index.get(capability) or None
+        
+        input_types = requirements.get("input_types") or (
+            [requirements["input_type"]] if requirements.get("input_type") else []
+        )
+        for input_type in input_types:
+            matches = self._input_type_index.get(input_type)
+            if matches:
+                candidates = matches if candidates is None else candidates & matches
         
-        # Score agents based on capability match and performance
+        return self.agents.keys() if candidates is None else candidates
+    
+    def _has_free_slot(self, agent: BaseAIAgent) -> bool:
+        return self._active_slots[agent.agent_id] < agent.max_concurrent_tasks and agent.status != AgentStatus.PAUSED
+    
+    def _find_best_agent_for_task(self, task: AgentTask, require_free_slot: bool = True) -> Optional[BaseAIAgent]:
+        """Find the best agent for a given task based on capabilities and performance"""
         best_agent = None
         best_score = 0
         
-        for agent in available_agents:
+        for agent_id in self._candidate_agent_ids(task):
+            agent = self.agents.get(agent_id)
+            if agent is None or (require_free_slot and not self._has_free_slot(agent)):
+                continue
             score = self._calculate_agent_score(agent, task)
             if score > best_score:
                 best_score = score
@@ -210,37 +325,120 @@ class AgentOrchestrator:
         base_score = 1.0
         
         # Factor in agent performance history
-        metrics = agent.get_performance_metrics()
-        performance_bonus = metrics["success_rate"] * 0.3
+        performance_bonus = agent.success_rate * 0.3
         
-        # Factor in agent availability
-        availability_bonus = 0.5 if agent.status == AgentStatus.IDLE else 0.1
+        # Factor in agent availability (share of free slots)
+        free_share = 1.0 - self._active_slots[agent.agent_id] / agent.max_concurrent_tasks
+        availability_bonus = 0.1 + 0.4 * max(free_share, 0.0)
         
         return base_score + performance_bonus + availability_bonus
     
-    async def execute_next_task(self) -> Optional[Dict[str, Any]]:
-        """Execute the next task in the queue"""
-        if not self.task_queue:
-            return None
-        
-        task = self.task_queue.pop(0)
-        agent = self._find_best_agent_for_task(task)
+    def _dispatch_next(self):
+        """
+        Pop the most urgent task that has an agent with a free slot and
+        reserve the slot. Tasks whose agents are all busy stay queued; only
+        DISPATCH_LOOKAHEAD entries are inspected so a saturated agent pool
+        costs a bounded scan rather than the whole queue.
+        """
+        with self._slot_lock:
+            return self._dispatch_next_unlocked()
+    
+    def _dispatch_next_unlocked(self):
+        skipped = []
+        dispatch = None
+        while self.task_queue and len(skipped) < DISPATCH_LOOKAHEAD:
+            entry = heapq.heappop(self.task_queue)
+            task, preferred_agent_id = entry[3], entry[4]
+            if preferred_agent_id:
+                agent = self.agents.get(preferred_agent_id)
+                agent = agent if agent and self._has_free_slot(agent) else None
+            else:
+                agent = self._find_best_agent_for_task(task)
+            if agent:
+                self._active_slots[agent.agent_id] += 1
+                dispatch = (task, agent)
+                break
+            skipped.append(entry)
         
-        if not agent:
-            # Re-queue the task
-            self.task_queue.insert(0, task)
-            return None
+        for entry in skipped:
+            heapq.heappush(self.task_queue, entry)
+        return dispatch
+    
+    def _reserve_slot(self, agent: BaseAIAgent) -> bool:
+        with self._slot_lock:
+            if not self._has_free_slot(agent):
+                return False
+            self._active_slots[agent.agent_id] += 1
+            return True
+    
+    async def _run_dispatched(self, task: AgentTask, agent: BaseAIAgent) -> Dict[str, Any]:
+        try:
+            result = await agent.execute_task(task)
+        finally:
+            with self._slot_lock:
+                self._active_slots[agent.agent_id] -= 1
         
-        result = await agent.execute_task(task)
+        self.tasks_completed += 1
         self.completed_tasks.append({
             "task": asdict(task),
             "agent_id": agent.agent_id,
             "result": result,
             "completed_at": datetime.now(timezone.utc).isoformat()
         })
-        
         return result
     
+    async def run_task(self, task: AgentTask, preferred_agent_id: Optional[str] = None,
+                       slot_timeout: float = DISPATCH_SLOT_TIMEOUT_SECONDS) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run this task, not the head of the queue, as soon as its agent has a
+        free slot; returns (agent id, result). The task never enters the
+        queue, so a caller can't end up with another request's result.
+        """
+        agent = self.agents.get(preferred_agent_id) if preferred_agent_id else None
+        if agent is None:
+            agent = self._find_best_agent_for_task(task, require_free_slot=False)
+        if agent is None:
+            raise ValueError(f"No suitable agent found for task: {task.name}")
+        
+        deadline = time.monotonic() + slot_timeout
+        while not self._reserve_slot(agent):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No free slot on agent {agent.agent_id} within {slot_timeout:g}s")
+            await asyncio.sleep(DISPATCH_SLOT_POLL_SECONDS)
+        return agent.agent_id, await self._run_dispatched(task, agent)
+    
+    async def execute_next_task(self) -> Optional[Dict[str, Any]]:
+        """Execute the next task in the queue"""
+        dispatch = self._dispatch_next()
+        if not dispatch:
+            return None
+        return await self._run_dispatched(*dispatch)
+    
+    async def execute_pending_tasks(self, max_tasks: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Drain the queue concurrently, keeping every free agent slot busy.
+        Returns results in completion order.
+        """
+        results = []
+        running = set()
+        dispatched = 0
+        
+        while True:
+            while max_tasks is None or dispatched < max_tasks:
+                dispatch = self._dispatch_next()
+                if not dispatch:
+                    break
+                running.add(asyncio.ensure_future(self._run_dispatched(*dispatch)))
+                dispatched += 1
+            
+            if not running:
+                break
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                results.append(future.result())
+        
+        return results
+    
     def get_system_status(self) -> Dict[str, Any]:
         """Get overall system status and metrics"""
         agent_statuses = {}
@@ -250,7 +448,8 @@ class AgentOrchestrator:
         return {
             "total_agents": len(self.agents),
             "queued_tasks": len(self.task_queue),
-            "completed_tasks": len(self.completed_tasks),
+            "completed_tasks": self.tasks_completed,
+            "running_tasks": sum(self._active_slots.values()),
             "agent_performance": agent_statuses,
             "system_health": self._calculate_system_health()
         }
@@ -260,8 +459,7 @@ class AgentOrchestrator:
         if not self.agents:
             return 0.0
         
-        total_success_rate = sum(agent.get_performance_metrics()["success_rate"] 
-                               for agent in self.agents.values())
+        total_success_rate = sum(agent.success_rate for agent in self.agents.values())
         avg_success_rate = total_success_rate / len(self.agents)
         
         # Factor in queue health
@@ -282,6 +480,7 @@ class AgentPerformanceLog(db.Model):
     task_id = Column(String(100), nullable=False)
     task_name = Column(String(200), nullable=False)
     task_priority = Column(String(50), nullable=False)
+    task_type = Column(String(100))
     execution_time = Column(Float, nullable=False)
     success = Column(Boolean, nullable=False)
     output_quality_score = Column(Float, default=0.0)
@@ -289,6 +488,11 @@ class AgentPerformanceLog(db.Model):
     error_details = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_agent_performance_logs_created_at', 'created_at'),
+        Index('ix_agent_performance_logs_agent_created_at', 'agent_id', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -297,6 +501,7 @@ class AgentPerformanceLog(db.Model):
             'task_id': self.task_id,
             'task_name': self.task_name,
             'task_priority': self.task_priority,
+            'task_type': self.task_type,
             'execution_time': self.execution_time,
             'success': self.success,
             'output_quality_score': self.output_quality_score,
@@ -305,66 +510,232 @@ class AgentPerformanceLog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class AgentPerformanceLogWriter:
+    """
+    Background bulk writer for AgentPerformanceLog.
+
+    Records go into a bounded buffer and a daemon thread inserts them with a
+    single executemany once PERFORMANCE_LOG_BATCH_SIZE records are waiting or
+    PERFORMANCE_LOG_FLUSH_SECONDS have passed, and again at interpreter exit.
+
+    When the buffer is full, submit() applies backpressure: the caller waits
+    up to block_timeout seconds for the writer to catch up. If it is still
+    full the record is dropped ("drop_newest", the default) or the oldest
+    buffered record is evicted ("drop_oldest"). Drops are counted in
+    get_stats().
+    """
+
+    def __init__(self, engine=None, batch_size: int = PERFORMANCE_LOG_BATCH_SIZE,
+                 flush_interval: float = PERFORMANCE_LOG_FLUSH_SECONDS,
+                 max_buffered: int = PERFORMANCE_LOG_MAX_BUFFERED,
+                 block_timeout: float = PERFORMANCE_LOG_BLOCK_SECONDS,
+                 overflow_policy: str = "drop_newest"):
+        if overflow_policy not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.block_timeout = block_timeout
+        self.overflow_policy = overflow_policy
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self._writer = threading.Thread(target=self._write_loop, name="agent-performance-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """Buffer one log row; returns False if it was dropped"""
+        if self.engine is None:
+            # db.engine needs an app context, which the writer thread does not have
+            self.engine = db.engine
+        with self._lock:
+            if len(self._buffer) >= self.max_buffered:
+                self._not_empty.notify()
+                self._not_full.wait_for(lambda: len(self._buffer) < self.max_buffered, self.block_timeout)
+            if len(self._buffer) >= self.max_buffered:
+                self.dropped += 1
+                if self.overflow_policy == "drop_newest":
+                    return False
+                self._buffer.popleft()
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._not_empty.notify()
+        return True
+
+    def flush(self) -> bool:
+        """Write everything buffered so far; False if a batch failed"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.batch_size))]
+                    self._not_full.notify_all()
+                if not batch:
+                    return True
+                if not self._write(batch):
+                    return False
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(AgentPerformanceLog.__table__.insert(), batch)
+                apply_rollups(connection, batch)
+            self.written += len(batch)
+            return True
+        except Exception as e:
+            self.failed_flushes += 1
+            with self._lock:
+                # Keep the batch for the next attempt as far as the buffer allows
+                room = max(self.max_buffered - len(self._buffer), 0)
+                self._buffer.extendleft(reversed(batch[:room]))
+                self.dropped += max(len(batch) - room, 0)
+            logger.error(f"Agent performance log flush failed, {min(len(batch), room)} records kept for retry: {e}")
+            return False
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                self._not_empty.wait_for(
+                    lambda: self._stop.is_set() or len(self._buffer) >= self.batch_size, self.flush_interval
+                )
+            if self.engine is not None and not self.flush():
+                # Back off instead of spinning while the database is unavailable
+                self._stop.wait(self.flush_interval)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._not_empty.notify()
+        if self.engine is not None:
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "overflow_policy": self.overflow_policy
+        }
+
+_performance_log_writer = None
+_performance_log_writer_lock = threading.Lock()
+
+def get_performance_log_writer() -> AgentPerformanceLogWriter:
+    global _performance_log_writer
+    with _performance_log_writer_lock:
+        if _performance_log_writer is None:
+            _performance_log_writer = AgentPerformanceLogWriter()
+        return _performance_log_writer
+
+def flush_agent_performance_logs():
+    """Make buffered performance logs visible to queries"""
+    if _performance_log_writer is not None:
+        _performance_log_writer.flush()
+
 def log_agent_performance(agent_id: str, agent_name: str, task_id: str, 
                          task_name: str, priority: str, execution_time: float,
                          success: bool, quality_score: float = 0.0,
-                         resource_usage: Dict = None, error_details: str = None):
-    """Log agent performance to database"""
+                         resource_usage: Dict = None, error_details: str = None,
+                         task_type: Optional[str] = None):
+    """Queue a performance log row for the background writer"""
     try:
-        log_entry = AgentPerformanceLog(
-            agent_id=agent_id,
-            agent_name=agent_name,
-            task_id=task_id,
-            task_name=task_name,
-            task_priority=priority,
-            execution_time=execution_time,
-            success=success,
-            output_quality_score=quality_score,
-            resource_usage=resource_usage or {},
-            error_details=error_details
-        )
-        
-        db.session.add(log_entry)
-        db.session.commit()
-        return True
+        return get_performance_log_writer().submit({
+            'agent_id': agent_id,
+            'agent_name': agent_name,
+            'task_id': task_id,
+            'task_name': task_name,
+            'task_priority': priority,
+            'task_type': task_type,
+            'execution_time': execution_time,
+            'success': success,
+            'output_quality_score': quality_score,
+            'resource_usage': resource_usage or {},
+            'error_details': error_details,
+            'created_at': datetime.utcnow()
+        })
         
     except Exception as e:
         logger.error(f"Failed to log agent performance: {str(e)}")
         return False
 
 def get_agent_analytics(agent_id: Optional[str] = None, 
-                       days: int = 30) -> Dict[str, Any]:
-    """Get agent performance analytics"""
+                       days: int = 30, task_type: Optional[str] = None) -> Dict[str, Any]:
+    """Get agent performance analytics from the pre-aggregated rollups"""
     try:
         from datetime import timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        query = AgentPerformanceLog.query.filter(
-            AgentPerformanceLog.created_at >= cutoff_date
-        )
-        
-        if agent_id:
-            query = query.filter(AgentPerformanceLog.agent_id == agent_id)
-        
-        logs = query.all()
+        flush_agent_performance_logs()
+        end = datetime.utcnow()
         
-        if not logs:
-            return {"total_tasks": 0, "success_rate": 0.0, "avg_execution_time": 0.0}
-        
-        total_tasks = len(logs)
-        successful_tasks = len([log for log in logs if log.success])
-        avg_execution_time = sum(log.execution_time for log in logs) / total_tasks
-        avg_quality_score = sum(log.output_quality_score for log in logs) / total_tasks
-        
-        return {
-            "total_tasks": total_tasks,
-            "successful_tasks": successful_tasks,
-            "success_rate": successful_tasks / total_tasks,
-            "avg_execution_time": avg_execution_time,
-            "avg_quality_score": avg_quality_score,
-            "period_days": days
-        }
+        analytics = summarize_rollups(end - timedelta(days=days), end, agent_id=agent_id, task_type=task_type)
+        analytics["period_days"] = days
+        return analytics
         
     except Exception as e:
         logger.error(f"Failed to get agent analytics: {str(e)}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+def aggregate_performance_logs(start: datetime, end: datetime, group_by: str = "agent_id",
+                               agent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Ad-hoc GROUP BY over raw logs for ranges that don't line up with rollup buckets"""
+    group_columns = {
+        "agent_id": AgentPerformanceLog.agent_id,
+        "task_type": AgentPerformanceLog.task_type,
+        "task_priority": AgentPerformanceLog.task_priority
+    }
+    if group_by not in group_columns:
+        raise ValueError(f"Unsupported group_by: {group_by}")
+    
+    flush_agent_performance_logs()
+    group_column = group_columns[group_by]
+    query = db.session.query(
+        group_column,
+        func.count(AgentPerformanceLog.id),
+        func.sum(db.case((AgentPerformanceLog.success.is_(True), 1), else_=0)),
+        func.avg(AgentPerformanceLog.execution_time),
+        func.avg(AgentPerformanceLog.output_quality_score)
+    ).filter(AgentPerformanceLog.created_at >= start, AgentPerformanceLog.created_at < end)
+    if agent_id:
+        query = query.filter(AgentPerformanceLog.agent_id == agent_id)
+    
+    return [{
+        group_by: key,
+        "total_tasks": total,
+        "successful_tasks": int(successful or 0),
+        "success_rate": (successful or 0) / total if total else 0.0,
+        "avg_execution_time": float(avg_execution_time or 0.0),
+        "avg_quality_score": float(avg_quality_score or 0.0)
+    } for key, total, successful, avg_execution_time, avg_quality_score in query.group_by(group_column)]
+
+def rebuild_performance_rollups(since: Optional[datetime] = None, batch_size: int = PERFORMANCE_LOG_BATCH_SIZE) -> int:
+    """Backfill rollups from raw logs (initial migration); clears rollups in the rebuilt range first"""
+    flush_agent_performance_logs()
+    rollups = AgentPerformanceRollup.query
+    logs = db.session.query(AgentPerformanceLog.__table__)
+    if since:
+        # Rebuild whole days so partially covered buckets are not double counted
+        since = bucket_start(since, "day")
+        rollups = rollups.filter(AgentPerformanceRollup.bucket_start >= since)
+        logs = logs.filter(AgentPerformanceLog.created_at >= since)
+    rollups.delete(synchronize_session=False)
+    db.session.commit()
+    
+    processed = 0
+    last_id = 0
+    while True:
+        batch = [row._asdict() for row in logs.filter(AgentPerformanceLog.id > last_id)
+                 .order_by(AgentPerformanceLog.id).limit(batch_size)]
+        db.session.commit()
+        if not batch:
+            return processed
+        with db.engine.begin() as connection:
+            apply_rollups(connection, batch)
+        processed += len(batch)
+        last_id = batch[-1]["id"]
@@ -5,12 +5,21 @@ Real-time KPI monitoring, alerting, and data integration
 
 import json
 import logging
+import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from app import db
 from ai_dashboard_models import (
     KPIDefinition, KPIValue, DashboardAlert, Dashboard, DashboardWidget
 )
+from notification_outbox import enqueue_notification
+
+# Environment fallbacks when an alert has no recipients for a method
+ALERT_RECIPIENT_DEFAULTS = {
+    'email': 'KPI_ALERT_EMAIL',
+    'webhook': 'KPI_ALERT_WEBHOOK_URL',
+    'slack': 'SLACK_WEBHOOK_URL'
+}
 
 class KPIMonitoringService:
     """Service for real-time KPI monitoring and alerting"""
@@ -391,36 +400,79 @@ class KPIMonitoringService:
                 'timestamp': datetime.utcnow().isoformat()
             }
             
-            # Send notifications
+            # Queue notifications; they commit with the alert update and are
+            # delivered by the notification outbox workers
             for method in notification_methods:
                 if method in self.alert_handlers:
                     try:
                         self.alert_handlers[method](alert, alert_message)
                     except Exception as e:
-                        logging.error(f"Error sending {method} alert: {str(e)}")
+                        logging.error(f"Error queueing {method} alert: {str(e)}")
             
             db.session.commit()
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error triggering alert: {str(e)}")
     
-    def _send_email_alert(self, alert: DashboardAlert, message: Dict):
-        """Send email alert notification"""
+    def _alert_recipients(self, alert: DashboardAlert, method: str) -> List[str]:
+        """Recipients for one notification method from the alert's recipient configuration"""
         
-        # This would integrate with your email service
-        logging.info(f"EMAIL ALERT: {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        try:
+            configured = json.loads(alert.recipients) if alert.recipients else []
+        except ValueError:
+            configured = []
+        
+        recipients = []
+        for entry in configured:
+            if isinstance(entry, dict):
+                if entry.get('type', 'email') == method:
+                    target = entry.get('address') or entry.get('url') or entry.get('value')
+                    if target:
+                        recipients.append(target)
+            elif isinstance(entry, str):
+                if entry.startswith(('http://', 'https://')):
+                    entry_method = 'slack' if 'hooks.slack.com' in entry else 'webhook'
+                else:
+                    entry_method = 'email' if '@' in entry else None
+                if entry_method == method:
+                    recipients.append(entry)
+        
+        if not recipients and os.environ.get(ALERT_RECIPIENT_DEFAULTS[method]):
+            recipients.append(os.environ[ALERT_RECIPIENT_DEFAULTS[method]])
+        return recipients
+    
+    def _alert_text(self, message: Dict) -> str:
+        return (f"{message['alert_name']}: {message['kpi_name']} = {message['current_value']}{message['unit']} "
+                f"(threshold {message['threshold']})")
+    
+    def _send_email_alert(self, alert: DashboardAlert, message: Dict):
+        """Queue email alert notification"""
+        
+        recipients = self._alert_recipients(alert, 'email')
+        if not recipients:
+            logging.info(f"EMAIL ALERT (no recipients): {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        for recipient in recipients:
+            enqueue_notification('email', recipient, {'text': self._alert_text(message), 'alert': message},
+                                 subject=f"KPI alert: {message['alert_name']}", commit=False)
     
     def _send_webhook_alert(self, alert: DashboardAlert, message: Dict):
-        """Send webhook alert notification"""
+        """Queue webhook alert notification"""
         
-        # This would make HTTP POST to webhook URL
-        logging.info(f"WEBHOOK ALERT: {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        recipients = self._alert_recipients(alert, 'webhook')
+        if not recipients:
+            logging.info(f"WEBHOOK ALERT (no URL): {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        for url in recipients:
+            enqueue_notification('webhook', url, message, commit=False)
     
     def _send_slack_alert(self, alert: DashboardAlert, message: Dict):
-        """Send Slack alert notification"""
+        """Queue Slack alert notification"""
         
-        # This would send message to Slack channel
-        logging.info(f"SLACK ALERT: {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        recipients = self._alert_recipients(alert, 'slack')
+        if not recipients:
+            logging.info(f"SLACK ALERT (no webhook): {message['alert_name']} - {message['kpi_name']} = {message['current_value']}")
+        for url in recipients:
+            enqueue_notification('slack', url, {'text': f":rotating_light: {self._alert_text(message)}"}, commit=False)
     
     def get_kpi_history(self, kpi_definition_id: int, days: int = 30) -> List[Dict]:
         """Get KPI value history for charting"""
@@ -349,11 +349,13 @@ class DashboardSubscription(db.Model):
     
     # Billing
     monthly_price = db.Column(db.Float, nullable=False)
-    stripe_subscription_id = db.Column(db.String(100))
+    stripe_subscription_id = db.Column(db.String(100), unique=True, index=True)
     
     # Status
     status = db.Column(db.String(20), default='active')  # active, cancelled, suspended
     trial_ends_at = db.Column(db.DateTime)
+    # Stripe `created` of the newest webhook event applied to status (last writer wins)
+    last_stripe_event_at = db.Column(db.Integer)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -7,8 +7,6 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from openai import OpenAI
-import os
 
 from app import db
 from ai_dashboard_models import (
@@ -17,14 +15,24 @@ from ai_dashboard_models import (
     DashboardAlert, DashboardSubscription
 )
 from models import AIAgent, User
+from model_router import get_model_router
 
 class DashboardAIService:
     """Service for AI-powered dashboard insights and automation"""
     
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.router = get_model_router()
+        self.openai_client = self.router.client_for('openai')
         self.default_model = "gpt-4o"  # Latest OpenAI model
     
+    def _create_completion(self, tenant: int, request_class: str = 'standard', model: str = None,
+                           messages: List[Dict] = None, temperature: float = 0.7, max_tokens: int = 1000):
+        """Chat completion through the shared model router (default_model is preferred)"""
+        return self.router.complete(
+            messages, request_class=request_class, preference=model or self.default_model,
+            tenant=tenant, max_tokens=max_tokens, temperature=temperature
+        )
+    
     def generate_dashboard_insights(self, dashboard_id: int, user_id: int) -> List[Dict]:
         """Generate AI insights for a dashboard using multiple specialized agents"""
         
@@ -95,7 +103,8 @@ class DashboardAIService:
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self._create_completion(
+                dashboard.user_id,
                 model=self.default_model,
                 messages=[
                     {"role": "system", "content": "You are a senior business intelligence AI agent with expertise in trend analysis and executive reporting."},
@@ -105,7 +114,7 @@ class DashboardAIService:
                 max_tokens=800
             )
             
-            analysis = response.choices[0].message.content
+            analysis = response.content
             
             return [{
                 'type': 'trend_analysis',
@@ -148,7 +157,8 @@ class DashboardAIService:
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self._create_completion(
+                dashboard.user_id,
                 model=self.default_model,
                 messages=[
                     {"role": "system", "content": "You are an AI anomaly detection specialist with expertise in statistical analysis and business intelligence."},
@@ -158,7 +168,7 @@ class DashboardAIService:
                 max_tokens=600
             )
             
-            analysis = response.choices[0].message.content
+            analysis = response.content
             
             # Only create insight if significant anomalies are detected
             if "no significant anomalies" not in analysis.lower():
@@ -205,7 +215,8 @@ class DashboardAIService:
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self._create_completion(
+                dashboard.user_id,
                 model=self.default_model,
                 messages=[
                     {"role": "system", "content": "You are a senior financial forecasting AI agent with expertise in predictive analytics and business planning."},
@@ -215,7 +226,7 @@ class DashboardAIService:
                 max_tokens=700
             )
             
-            analysis = response.choices[0].message.content
+            analysis = response.content
             
             return [{
                 'type': 'prediction',
@@ -260,7 +271,8 @@ class DashboardAIService:
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self._create_completion(
+                dashboard.user_id,
                 model=self.default_model,
                 messages=[
                     {"role": "system", "content": "You are a C-suite strategic advisor AI agent with expertise in business strategy and executive decision making."},
@@ -270,7 +282,7 @@ class DashboardAIService:
                 max_tokens=800
             )
             
-            analysis = response.choices[0].message.content
+            analysis = response.content
             
             return [{
                 'type': 'recommendation',
@@ -333,7 +345,8 @@ class DashboardAIService:
             Keep it concise, executive-focused, and actionable. Highlight only the most important items that require executive attention.
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = self._create_completion(
+                user_id, 'batch',
                 model=self.default_model,
                 messages=[
                     {"role": "system", "content": "You are a senior executive assistant AI agent with expertise in executive communication and business reporting."},
@@ -343,7 +356,7 @@ class DashboardAIService:
                 max_tokens=1000
             )
             
-            briefing_content = response.choices[0].message.content
+            briefing_content = response.content
             
             # Parse briefing into sections
             sections = self._parse_briefing_sections(briefing_content)
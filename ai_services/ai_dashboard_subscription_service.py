@@ -245,159 +245,177 @@ class DashboardSubscriptionService:
         
         return customer
     
-    def handle_stripe_webhook(self, event: Dict) -> Dict[str, Any]:
-        """Handle Stripe webhook events"""
+    def handle_stripe_webhook(self, event: Dict, commit: bool = True) -> Dict[str, Any]:
+        """
+        Apply a Stripe webhook event. Handlers are idempotent and converge
+        to the same state whatever order events arrive in: status changes
+        are last-writer-wins on the event's `created` time, cancellation is
+        final. Invoice and cancellation events for a subscription we have
+        no record of succeed as deferred: the queue marks them processed, so
+        they never hold up the customer's later events, and if a checkout
+        creates the subscription afterwards it replays them.
+        With commit=False the caller commits (the queue does so together
+        with marking the event processed).
+        """
         
         try:
             event_type = event['type']
+            event_created = int(event.get('created') or 0)
+            data = event['data']['object']
             
-            if event_type == 'checkout.session.completed':
-                return self._handle_checkout_completed(event['data']['object'])
+            result = self._dispatch_event(event_type, data, event_created)
             
-            elif event_type == 'invoice.payment_succeeded':
-                return self._handle_payment_succeeded(event['data']['object'])
-            
-            elif event_type == 'invoice.payment_failed':
-                return self._handle_payment_failed(event['data']['object'])
-            
-            elif event_type == 'customer.subscription.deleted':
-                return self._handle_subscription_cancelled(event['data']['object'])
-            
-            return {'success': True, 'message': 'Event processed'}
+            if commit and result.get('success'):
+                db.session.commit()
+            return result
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error handling Stripe webhook: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def _handle_checkout_completed(self, session: Dict) -> Dict[str, Any]:
+    def _dispatch_event(self, event_type: str, data: Dict, event_created: int) -> Dict[str, Any]:
+        if event_type == 'checkout.session.completed':
+            return self._handle_checkout_completed(data, event_created)
+        if event_type == 'invoice.payment_succeeded':
+            return self._handle_payment_succeeded(data, event_created)
+        if event_type == 'invoice.payment_failed':
+            return self._handle_payment_failed(data, event_created)
+        if event_type == 'customer.subscription.deleted':
+            return self._handle_subscription_cancelled(data, event_created)
+        return {'success': True, 'message': 'Event ignored'}
+    
+    def _handle_checkout_completed(self, session: Dict, event_created: int) -> Dict[str, Any]:
         """Handle successful checkout completion"""
         
-        try:
-            user_id = int(session['metadata']['user_id'])
-            plan = session['metadata']['plan']
-            billing_cycle = session['metadata']['billing_cycle']
-            
-            # Get subscription from Stripe
-            subscription = stripe.Subscription.retrieve(session['subscription'])
-            
-            # Create or update subscription record
-            self._create_subscription_record(user_id, plan, billing_cycle, subscription)
-            
-            return {'success': True, 'message': 'Subscription created'}
-            
-        except Exception as e:
-            logging.error(f"Error handling checkout completion: {str(e)}")
-            return {'success': False, 'error': str(e)}
+        metadata = session.get('metadata') or {}
+        if 'plan' not in metadata or not session.get('subscription'):
+            # Not a dashboard subscription checkout
+            return {'success': True, 'message': 'Event ignored'}
+        
+        user_id = int(metadata['user_id'])
+        subscription_id = session['subscription']
+        if isinstance(subscription_id, dict):
+            subscription_id = subscription_id['id']
+        
+        # Create the subscription record once; replays find it already there
+        if not self._find_subscription(subscription_id):
+            self._create_subscription_record(user_id, metadata['plan'], metadata.get('billing_cycle', 'monthly'),
+                                             subscription_id, event_created)
+            self._replay_deferred_events(subscription_id)
+        
+        return {'success': True, 'message': 'Subscription created'}
     
-    def _create_subscription_record(self, user_id: int, plan: str, billing_cycle: str, stripe_subscription: Any):
+    def _create_subscription_record(self, user_id: int, plan: str, billing_cycle: str, stripe_subscription_id: str,
+                                    event_created: int):
         """Create subscription record in database"""
         
-        try:
-            plan_config = self.plans[plan]
-            
-            # Cancel existing subscription if any
-            existing = DashboardSubscription.query.filter_by(
-                user_id=user_id,
-                status='active'
-            ).first()
-            
-            if existing:
-                existing.status = 'cancelled'
-            
-            # Create new subscription
-            subscription = DashboardSubscription()
-            subscription.user_id = user_id
-            subscription.plan_name = plan
-            subscription.billing_cycle = billing_cycle
-            subscription.max_dashboards = plan_config['max_dashboards']
-            subscription.max_widgets_per_dashboard = plan_config['max_widgets_per_dashboard']
-            subscription.max_ai_insights_per_month = plan_config['max_ai_insights_per_month']
-            subscription.max_executive_briefings_per_month = plan_config['max_executive_briefings_per_month']
-            subscription.monthly_price = plan_config['yearly_price'] / 12 if billing_cycle == 'yearly' else plan_config['monthly_price']
-            subscription.stripe_subscription_id = stripe_subscription.id
-            subscription.status = 'active'
-            
-            db.session.add(subscription)
-            db.session.commit()
-            
-            logging.info(f"Created subscription for user {user_id}: {plan} ({billing_cycle})")
-            
-        except Exception as e:
-            db.session.rollback()
-            logging.error(f"Error creating subscription record: {str(e)}")
-            raise
+        plan_config = self.plans[plan]
+        checkout_time = datetime.utcfromtimestamp(event_created) if event_created else datetime.utcnow()
+        
+        subscription = DashboardSubscription()
+        subscription.user_id = user_id
+        subscription.plan_name = plan
+        subscription.billing_cycle = billing_cycle
+        subscription.max_dashboards = plan_config['max_dashboards']
+        subscription.max_widgets_per_dashboard = plan_config['max_widgets_per_dashboard']
+        subscription.max_ai_insights_per_month = plan_config['max_ai_insights_per_month']
+        subscription.max_executive_briefings_per_month = plan_config['max_executive_briefings_per_month']
+        subscription.monthly_price = plan_config['yearly_price'] / 12 if billing_cycle == 'yearly' else plan_config['monthly_price']
+        subscription.stripe_subscription_id = stripe_subscription_id
+        subscription.status = 'active'
+        subscription.created_at = checkout_time
+        subscription.last_stripe_event_at = event_created
+        db.session.add(subscription)
+        db.session.flush()
+        
+        # Only the most recent checkout can stay live; every older subscription
+        # is cancelled, whichever checkout is processed first
+        subscriptions = DashboardSubscription.query.filter_by(user_id=user_id).order_by(
+            DashboardSubscription.created_at.desc(), DashboardSubscription.stripe_subscription_id.desc()
+        ).all()
+        for superseded in subscriptions[1:]:
+            superseded.status = 'cancelled'
+        
+        logging.info(f"Created subscription for user {user_id}: {plan} ({billing_cycle})")
+    
+    def _find_subscription(self, stripe_subscription_id: Optional[str]) -> Optional[DashboardSubscription]:
+        if not stripe_subscription_id:
+            return None
+        return DashboardSubscription.query.filter_by(stripe_subscription_id=stripe_subscription_id).first()
+    
+    def _deferred(self, stripe_subscription_id: Optional[str]) -> Dict[str, Any]:
+        # Not a dashboard subscription, or its checkout has not arrived yet
+        logging.info(f"Deferring Stripe event for unknown subscription {stripe_subscription_id}")
+        return {'success': True, 'deferred': True, 'message': 'Event ignored: unknown subscription'}
+    
+    def _replay_deferred_events(self, stripe_subscription_id: str):
+        """Apply events deferred before this subscription's checkout; order does not matter"""
+        from stripe_webhook_queue import StripeWebhookEvent
+        
+        deferred = db.session.query(StripeWebhookEvent.id, StripeWebhookEvent.payload).filter(
+            StripeWebhookEvent.stripe_subscription_id == stripe_subscription_id,
+            StripeWebhookEvent.deferred.is_(True)
+        ).all()
+        if not deferred:
+            return
+        events = [json.loads(row.payload) for row in deferred]
+        for event in sorted(events, key=lambda event: event.get('created') or 0):
+            self._dispatch_event(event['type'], event['data']['object'], int(event.get('created') or 0))
+        # Applied now, in the checkout's transaction
+        db.session.query(StripeWebhookEvent).filter(
+            StripeWebhookEvent.id.in_([row.id for row in deferred])
+        ).update({'deferred': False}, synchronize_session=False)
     
-    def _handle_payment_succeeded(self, invoice: Dict) -> Dict[str, Any]:
+    def _apply_status_event(self, stripe_subscription_id: Optional[str], status: str, event_created: int,
+                            reset_usage: bool = False) -> Dict[str, Any]:
+        """Set status if this event is newer than the last one applied; cancelled subscriptions stay cancelled"""
+        
+        subscription = self._find_subscription(stripe_subscription_id)
+        if not subscription:
+            return self._deferred(stripe_subscription_id)
+        
+        if event_created < (subscription.last_stripe_event_at or 0):
+            return {'success': True, 'message': 'Stale event ignored'}
+        
+        subscription.last_stripe_event_at = event_created
+        if subscription.status == 'cancelled':
+            return {'success': True, 'message': 'Subscription already cancelled'}
+        
+        subscription.status = status
+        if reset_usage:
+            # New billing period: reset monthly usage counters
+            subscription.current_month_ai_insights = 0
+            subscription.current_month_briefings = 0
+        return {'success': True, 'message': f'Subscription {status}'}
+    
+    def _handle_payment_succeeded(self, invoice: Dict, event_created: int) -> Dict[str, Any]:
         """Handle successful payment"""
         
-        try:
-            subscription_id = invoice['subscription']
-            
-            # Find subscription by Stripe ID
-            subscription = DashboardSubscription.query.filter_by(
-                stripe_subscription_id=subscription_id
-            ).first()
-            
-            if subscription:
-                # Reset monthly usage counters
-                subscription.current_month_ai_insights = 0
-                subscription.current_month_briefings = 0
-                db.session.commit()
-                
-                logging.info(f"Payment succeeded for subscription {subscription.id}")
-            
-            return {'success': True, 'message': 'Payment processed'}
-            
-        except Exception as e:
-            logging.error(f"Error handling payment success: {str(e)}")
-            return {'success': False, 'error': str(e)}
+        result = self._apply_status_event(invoice.get('subscription'), 'active', event_created, reset_usage=True)
+        if result.get('success'):
+            logging.info(f"Payment succeeded for subscription {invoice.get('subscription')}")
+        return result
     
-    def _handle_payment_failed(self, invoice: Dict) -> Dict[str, Any]:
+    def _handle_payment_failed(self, invoice: Dict, event_created: int) -> Dict[str, Any]:
         """Handle failed payment"""
         
-        try:
-            subscription_id = invoice['subscription']
-            
-            # Find subscription by Stripe ID
-            subscription = DashboardSubscription.query.filter_by(
-                stripe_subscription_id=subscription_id
-            ).first()
-            
-            if subscription:
-                # Mark subscription as suspended
-                subscription.status = 'suspended'
-                db.session.commit()
-                
-                logging.warning(f"Payment failed for subscription {subscription.id}")
-            
-            return {'success': True, 'message': 'Payment failure processed'}
-            
-        except Exception as e:
-            logging.error(f"Error handling payment failure: {str(e)}")
-            return {'success': False, 'error': str(e)}
+        result = self._apply_status_event(invoice.get('subscription'), 'suspended', event_created)
+        if result.get('success'):
+            logging.warning(f"Payment failed for subscription {invoice.get('subscription')}")
+        return result
     
-    def _handle_subscription_cancelled(self, stripe_subscription: Dict) -> Dict[str, Any]:
+    def _handle_subscription_cancelled(self, stripe_subscription: Dict, event_created: int) -> Dict[str, Any]:
         """Handle subscription cancellation"""
         
-        try:
-            subscription_id = stripe_subscription['id']
-            
-            # Find subscription by Stripe ID
-            subscription = DashboardSubscription.query.filter_by(
-                stripe_subscription_id=subscription_id
-            ).first()
-            
-            if subscription:
-                subscription.status = 'cancelled'
-                db.session.commit()
-                
-                logging.info(f"Subscription cancelled: {subscription.id}")
-            
-            return {'success': True, 'message': 'Subscription cancellation processed'}
-            
-        except Exception as e:
-            logging.error(f"Error handling subscription cancellation: {str(e)}")
-            return {'success': False, 'error': str(e)}
+        subscription = self._find_subscription(stripe_subscription.get('id'))
+        if not subscription:
+            return self._deferred(stripe_subscription.get('id'))
+        
+        subscription.status = 'cancelled'
+        subscription.last_stripe_event_at = max(event_created, subscription.last_stripe_event_at or 0)
+        logging.info(f"Subscription cancelled: {subscription.id}")
+        return {'success': True, 'message': 'Subscription cancellation processed'}
     
     def cancel_subscription(self, user_id: int) -> Dict[str, Any]:
         """Cancel user's subscription"""
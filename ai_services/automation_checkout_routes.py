@@ -117,4 +117,16 @@ def automation_purchase_status(purchase_id):
         
     except Exception as e:
         logging.error(f"Error getting purchase status: {e}")
-        return jsonify({'error': 'Status unavailable'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Status unavailable'}), 500
+
+@automation_checkout.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    """
+    Stripe webhook endpoint: verify the signature, store the event by its ID
+    and acknowledge. Fulfilment runs in the background webhook workers, and
+    Stripe's retries of an already stored event are acknowledged as duplicates.
+    """
+    from stripe_webhook_queue import receive_stripe_webhook
+    
+    body, status = receive_stripe_webhook(request.get_data(), request.headers.get('Stripe-Signature'))
+    return jsonify(body), status
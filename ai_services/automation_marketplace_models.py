@@ -0,0 +1,75 @@
+"""
+Automation Marketplace Read Model
+Denormalized, precomputed listing rows backing the marketplace landing page
+"""
+
+import json
+from datetime import datetime
+from app import db
+
+class MarketplaceListing(db.Model):
+    """One precomputed row per AutomationProcess, refreshed on process/agent writes"""
+    __tablename__ = 'automation_marketplace_listings'
+
+    id = db.Column(db.Integer, primary_key=True)
+    process_id = db.Column(db.Integer, nullable=False, unique=True, index=True)
+
+    # Process snapshot
+    name = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    category = db.Column(db.String(50), index=True)
+    roi_potential = db.Column(db.String(50))
+    roi_score = db.Column(db.Float)
+    implementation_ease = db.Column(db.Float)
+    time_to_value = db.Column(db.String(50))
+    base_price = db.Column(db.Float)
+    monthly_price = db.Column(db.Float)
+    setup_fee = db.Column(db.Float)
+    win_win_benefits = db.Column(db.Text)
+    is_active = db.Column(db.Boolean, default=True)
+
+    # Numeric ROI parsed once on write (e.g. "300-500%" -> 300, 500, 400)
+    roi_min_percent = db.Column(db.Float)
+    roi_max_percent = db.Column(db.Float)
+    roi_avg_percent = db.Column(db.Float)
+
+    # Precomputed payloads
+    agents_json = db.Column(db.Text)  # JSON list of assigned agent summaries
+    revenue_projections_json = db.Column(db.Text)
+
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_marketplace_listing_active_category_roi', 'is_active', 'category', 'roi_score'),
+        db.Index('ix_marketplace_listing_active_price', 'is_active', 'base_price'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.process_id,
+            'name': self.name,
+            'description': self.description,
+            'category': self.category,
+            'roi_potential': self.roi_potential,
+            'roi_score': self.roi_score,
+            'implementation_ease': self.implementation_ease,
+            'time_to_value': self.time_to_value,
+            'base_price': self.base_price,
+            'monthly_price': self.monthly_price,
+            'setup_fee': self.setup_fee,
+            'win_win_benefits': self.win_win_benefits,
+            'agents': json.loads(self.agents_json) if self.agents_json else [],
+            'revenue_projections': json.loads(self.revenue_projections_json) if self.revenue_projections_json else {}
+        }
+
+class MarketplaceReadModelState(db.Model):
+    """
+    Single row shared by every worker. version is bumped in the same
+    transaction that rewrites listing rows, so a worker whose cached pages
+    were built from an older version drops them on its next read.
+    """
+    __tablename__ = 'automation_marketplace_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -5,19 +5,58 @@ Manages high-ROI automation processes with AI agent integration and pricing
 
 import json
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session, selectinload
 from app import db
 from models import AutomationProcess, ProcessAgent, ProcessPurchase, AIAgent, User, ROITracking
+from automation_marketplace_models import MarketplaceListing, MarketplaceReadModelState
+from agent_catalog_upsert import pending_catalog_changes
 from top_100_ai_automation_processes import analyze_top_100_automation_processes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Result caches are per worker and are dropped as soon as the shared
+# read-model version moves; the TTL is only a backstop
+MARKETPLACE_CACHE_TTL_SECONDS = 300
+
+# Session.info keys collecting what a transaction changed; the listings are
+# rebuilt from them just before that transaction commits
+STALE_PROCESS_IDS_KEY = 'marketplace_stale_process_ids'
+STALE_AGENT_IDS_KEY = 'marketplace_stale_agent_ids'
+
+MARKETPLACE_SORT_COLUMNS = {
+    'roi_score': MarketplaceListing.roi_score.desc(),
+    'price_low': MarketplaceListing.base_price.asc(),
+    'price_high': MarketplaceListing.base_price.desc(),
+    'time_to_value': MarketplaceListing.time_to_value.asc()
+}
+
+def parse_roi_potential(roi_potential: Optional[str]) -> Tuple[float, float, float]:
+    """Parse an ROI string such as "300-500%" into (min, max, average) percent"""
+    roi_str = (roi_potential or '').replace('%', '').strip()
+    if '-' in roi_str:
+        roi_parts = roi_str.split('-')
+        roi_min, roi_max = float(roi_parts[0]), float(roi_parts[1])
+    else:
+        roi_min = roi_max = float(roi_str)
+    return roi_min, roi_max, (roi_min + roi_max) / 2
+
 class AutomationMarketplaceService:
     """Service for managing automation process marketplace"""
     
     def __init__(self):
+        # Per-worker caches, valid for one shared read-model version
+        self._lock = threading.Lock()
+        self._seen_version: Optional[int] = None
+        self._result_cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        self._stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        
         self.pricing_strategy = {
             'revenue_generation': {'base_multiplier': 1.5, 'setup_multiplier': 2.0},
             'cost_reduction': {'base_multiplier': 1.2, 'setup_multiplier': 1.5},
@@ -82,6 +121,7 @@ class AutomationMarketplaceService:
                 
                 processes_created += 1
             
+            # Listing rows are rebuilt by the before_commit hook
             db.session.commit()
             
             return {
@@ -170,91 +210,208 @@ class AutomationMarketplaceService:
         except Exception as e:
             logger.error(f"Error assigning agents to process {process_id}: {e}")
     
-    def get_marketplace_data(self, category: str = 'all', sort_by: str = 'roi_score') -> Dict[str, Any]:
+    def mark_process_changed(self, process_id: Optional[int], session: Optional[Session] = None):
+        """Flag a process whose listing is rebuilt when the session commits"""
+        if process_id is not None:
+            (session or db.session).info.setdefault(STALE_PROCESS_IDS_KEY, set()).add(process_id)
+    
+    def mark_agent_changed(self, agent_id: Optional[int], session: Optional[Session] = None):
+        """Flag an agent; every listing it is assigned to is rebuilt when the session commits"""
+        self.mark_agents_changed([agent_id] if agent_id is not None else [], session)
+    
+    def mark_agents_changed(self, agent_ids, session: Optional[Session] = None):
+        """Flag agents touched by a write, including bulk ones that skip ORM events"""
+        (session or db.session).info.setdefault(STALE_AGENT_IDS_KEY, set()).update(agent_ids)
+    
+    def invalidate_marketplace_cache(self):
+        """Drop cached listing pages and stats without touching the read model"""
+        with self._lock:
+            self._result_cache.clear()
+            self._stats_cache = None
+    
+    def refresh_listings(self, process_ids: Optional[List[int]] = None,
+                         session: Optional[Session] = None) -> int:
+        """Rebuild listing rows for the given processes (all when None) without committing"""
+        session = session or db.session
+        query = session.query(AutomationProcess).options(
+            selectinload(AutomationProcess.process_agents).selectinload(ProcessAgent.agent)
+        )
+        if process_ids is not None:
+            if not process_ids:
+                return 0
+            query = query.filter(AutomationProcess.id.in_(process_ids))
+        
+        processes = query.all()
+        existing_query = session.query(MarketplaceListing)
+        if process_ids is not None:
+            existing_query = existing_query.filter(MarketplaceListing.process_id.in_(process_ids))
+        existing = {listing.process_id: listing for listing in existing_query.all()}
+        
+        for process in processes:
+            listing = existing.pop(process.id, None)
+            if listing is None:
+                listing = MarketplaceListing(process_id=process.id)
+                session.add(listing)
+            self._populate_listing(listing, process)
+        
+        # Processes that no longer exist
+        for listing in existing.values():
+            session.delete(listing)
+        
+        self.invalidate_marketplace_cache()
+        return len(processes)
+    
+    def _populate_listing(self, listing: MarketplaceListing, process: AutomationProcess):
+        listing.name = process.name
+        listing.description = process.description
+        listing.category = process.category
+        listing.roi_potential = process.roi_potential
+        listing.roi_score = process.roi_score
+        listing.implementation_ease = process.implementation_ease
+        listing.time_to_value = process.time_to_value
+        listing.base_price = process.base_price
+        listing.monthly_price = process.monthly_price
+        listing.setup_fee = process.setup_fee
+        listing.win_win_benefits = process.win_win_benefits
+        listing.is_active = process.is_active
+        
+        try:
+            listing.roi_min_percent, listing.roi_max_percent, listing.roi_avg_percent = \
+                parse_roi_potential(process.roi_potential)
+        except (TypeError, ValueError):
+            listing.roi_min_percent = listing.roi_max_percent = listing.roi_avg_percent = None
+        
+        listing.agents_json = json.dumps([
+            {
+                'name': assignment.agent.name,
+                'category': assignment.agent.category,
+                'expertise_level': assignment.agent.expertise_level,
+                'is_primary': assignment.is_primary,
+                'role': assignment.role_description
+            }
+            for assignment in process.process_agents
+        ])
+        listing.revenue_projections_json = json.dumps(self._calculate_revenue_projections(
+            listing.roi_avg_percent, process.base_price, process.setup_fee
+        ))
+    
+    def refresh_stale_listings(self, session: Session):
+        """
+        Rebuild the listings the session's transaction made stale and bump the
+        shared version, inside that transaction (called from before_commit),
+        so listing rows never lag the process/agent rows they describe
+        """
+        # Pending changes fire the mapper listeners below when flushed
+        session.flush()
+        process_ids = session.info.pop(STALE_PROCESS_IDS_KEY, set())
+        agent_ids = session.info.pop(STALE_AGENT_IDS_KEY, set()) | pending_catalog_changes(session)
+        if not (process_ids or agent_ids):
+            return
+        
+        if agent_ids:
+            rows = session.query(ProcessAgent.process_id).filter(
+                ProcessAgent.agent_id.in_(agent_ids)
+            ).distinct().all()
+            process_ids.update(row[0] for row in rows)
+        if process_ids:
+            self.refresh_listings(sorted(process_ids), session)
+            # No state row yet means the read model was never built; the
+            # first read builds all of it, so there is nothing to bump
+            session.query(MarketplaceReadModelState).filter_by(id=1).update(
+                {MarketplaceReadModelState.version: MarketplaceReadModelState.version + 1,
+                 MarketplaceReadModelState.rebuilt_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+    
+    def _build_read_model(self):
+        """Build every listing once, in a session of its own so the reading request's session stays untouched"""
+        session = db.session.session_factory()
+        try:
+            self.refresh_listings(session=session)
+            session.add(MarketplaceReadModelState(id=1, version=1))
+            session.commit()
+            logger.info("Built marketplace read model")
+        except IntegrityError:
+            # Another worker built it first
+            session.rollback()
+        finally:
+            session.close()
+    
+    def _sync_read_model(self):
+        """Drop this worker's caches when another worker (or this one) changed the listings"""
+        version = db.session.query(MarketplaceReadModelState.version).filter_by(id=1).scalar()
+        if version is None:
+            self._build_read_model()
+            version = db.session.query(MarketplaceReadModelState.version).filter_by(id=1).scalar()
+        if version != self._seen_version:
+            with self._lock:
+                self._result_cache.clear()
+                self._stats_cache = None
+                self._seen_version = version
+    
+    def get_marketplace_data(self, category: str = 'all', sort_by: str = 'roi_score',
+                             page: int = 1, per_page: Optional[int] = None) -> Dict[str, Any]:
         """Get automation processes for marketplace display"""
         try:
-            query = AutomationProcess.query.filter_by(is_active=True)
+            self._sync_read_model()
             
-            if category != 'all':
-                query = query.filter_by(category=category)
+            page = max(1, page)
+            cache_key = (category, sort_by, page, per_page)
+            now = time.monotonic()
+            cached = self._result_cache.get(cache_key)
+            if cached and now - cached[0] < MARKETPLACE_CACHE_TTL_SECONDS:
+                return cached[1]
             
-            # Sort options
-            if sort_by == 'roi_score':
-                query = query.order_by(AutomationProcess.roi_score.desc())
-            elif sort_by == 'price_low':
-                query = query.order_by(AutomationProcess.base_price.asc())
-            elif sort_by == 'price_high':
-                query = query.order_by(AutomationProcess.base_price.desc())
-            elif sort_by == 'time_to_value':
-                query = query.order_by(AutomationProcess.time_to_value.asc())
-            else:
-                query = query.order_by(AutomationProcess.roi_score.desc())
+            query = MarketplaceListing.query.filter_by(is_active=True)
             
-            processes = query.all()
+            if category != 'all':
+                query = query.filter_by(category=category)
             
-            # Enrich with agent data
-            enriched_processes = []
-            for process in processes:
-                process_data = {
-                    'id': process.id,
-                    'name': process.name,
-                    'description': process.description,
-                    'category': process.category,
-                    'roi_potential': process.roi_potential,
-                    'roi_score': process.roi_score,
-                    'implementation_ease': process.implementation_ease,
-                    'time_to_value': process.time_to_value,
-                    'base_price': process.base_price,
-                    'monthly_price': process.monthly_price,
-                    'setup_fee': process.setup_fee,
-                    'win_win_benefits': process.win_win_benefits,
-                    'agents': []
-                }
-                
-                # Get assigned agents
-                for assignment in process.process_agents:
-                    agent_data = {
-                        'name': assignment.agent.name,
-                        'category': assignment.agent.category,
-                        'expertise_level': assignment.agent.expertise_level,
-                        'is_primary': assignment.is_primary,
-                        'role': assignment.role_description
-                    }
-                    process_data['agents'].append(agent_data)
-                
-                # Calculate revenue projections
-                process_data['revenue_projections'] = self._calculate_revenue_projections(process)
-                
-                enriched_processes.append(process_data)
+            total = query.count()
+            query = query.order_by(MARKETPLACE_SORT_COLUMNS.get(sort_by, MARKETPLACE_SORT_COLUMNS['roi_score']),
+                                   MarketplaceListing.process_id.asc())
+            if per_page:
+                query = query.offset((page - 1) * per_page).limit(per_page)
             
-            # Get categories for filtering
-            categories = db.session.query(AutomationProcess.category.distinct()).all()
-            category_list = [cat[0] for cat in categories if cat[0]]
+            enriched_processes = [listing.to_dict() for listing in query.all()]
+            stats = self._get_marketplace_stats()
             
-            return {
+            result = {
                 'processes': enriched_processes,
-                'categories': category_list,
-                'total_processes': len(enriched_processes),
-                'stats': self._get_marketplace_stats()
+                'categories': stats.get('categories', []),
+                'total_processes': total,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page or total,
+                    'total': total,
+                    'pages': -(-total // per_page) if per_page else 1
+                },
+                'stats': {key: value for key, value in stats.items() if key != 'categories'}
             }
             
+            with self._lock:
+                self._result_cache[cache_key] = (now, result)
+            return result
+            
         except Exception as e:
             logger.error(f"Error getting marketplace data: {e}")
-            return {'processes': [], 'categories': [], 'total_processes': 0, 'stats': {}}
+            return {
+                'processes': [],
+                'categories': [],
+                'total_processes': 0,
+                'pagination': {'page': max(1, page), 'per_page': per_page or 0, 'total': 0, 'pages': 0},
+                'stats': {}
+            }
     
-    def _calculate_revenue_projections(self, process: AutomationProcess) -> Dict[str, str]:
+    def _calculate_revenue_projections(self, avg_roi: Optional[float], base_price: float,
+                                       setup_fee: float) -> Dict[str, str]:
         """Calculate revenue projections for 30 and 90 days"""
         try:
-            # Parse ROI potential (e.g., "300-500%" -> average 400%)
-            roi_str = process.roi_potential.replace('%', '')
-            if '-' in roi_str:
-                roi_parts = roi_str.split('-')
-                avg_roi = (float(roi_parts[0]) + float(roi_parts[1])) / 2
-            else:
-                avg_roi = float(roi_str)
+            if avg_roi is None:
+                raise ValueError("ROI potential could not be parsed")
             
             # Assume customer invests the process cost as baseline
-            investment_baseline = process.base_price + process.setup_fee
+            investment_baseline = base_price + setup_fee
             
             # Calculate projected returns
             annual_return = investment_baseline * (avg_roi / 100)
@@ -277,24 +434,41 @@ class AutomationMarketplaceService:
             }
     
     def _get_marketplace_stats(self) -> Dict[str, Any]:
-        """Get marketplace statistics"""
+        """Get marketplace statistics (cached until the next process/agent change)"""
+        now = time.monotonic()
+        cached = self._stats_cache
+        if cached and now - cached[0] < MARKETPLACE_CACHE_TTL_SECONDS:
+            return cached[1]
+        
         try:
-            total_processes = AutomationProcess.query.filter_by(is_active=True).count()
-            avg_roi = db.session.query(db.func.avg(AutomationProcess.roi_score)).scalar() or 0
-            total_agents_involved = db.session.query(ProcessAgent.agent_id.distinct()).count()
+            # One aggregate pass over the read model instead of five queries
+            total_processes, avg_roi, min_price, max_price = db.session.query(
+                db.func.count(MarketplaceListing.id),
+                db.func.avg(MarketplaceListing.roi_score),
+                db.func.min(MarketplaceListing.base_price),
+                db.func.max(MarketplaceListing.base_price)
+            ).filter(MarketplaceListing.is_active.is_(True)).one()
             
-            # Get price ranges
-            min_price = db.session.query(db.func.min(AutomationProcess.base_price)).scalar() or 0
-            max_price = db.session.query(db.func.max(AutomationProcess.base_price)).scalar() or 0
+            categories = [row[0] for row in db.session.query(MarketplaceListing.category).filter(
+                MarketplaceListing.is_active.is_(True)
+            ).distinct().order_by(MarketplaceListing.category).all() if row[0]]
+            total_agents_involved = db.session.query(
+                db.func.count(ProcessAgent.agent_id.distinct())
+            ).scalar() or 0
             
-            return {
+            stats = {
                 'total_processes': total_processes,
-                'average_roi_score': round(avg_roi, 1),
+                'average_roi_score': round(avg_roi or 0, 1),
                 'total_agents_involved': total_agents_involved,
-                'price_range': f"${min_price:,.0f} - ${max_price:,.0f}",
-                'categories_available': AutomationProcess.query.with_entities(AutomationProcess.category.distinct()).count()
+                'price_range': f"${min_price or 0:,.0f} - ${max_price or 0:,.0f}",
+                'categories_available': len(categories),
+                'categories': categories
             }
             
+            with self._lock:
+                self._stats_cache = (now, stats)
+            return stats
+            
         except Exception as e:
             logger.error(f"Error getting marketplace stats: {e}")
             return {}
@@ -352,4 +526,31 @@ class AutomationMarketplaceService:
             return {'success': False, 'error': str(e)}
 
 # Export service instance
-automation_service = AutomationMarketplaceService()
\ No newline at end of file
+automation_service = AutomationMarketplaceService()
+
+# Keep the read model in step with writes made anywhere in the app: mapper
+# events record what changed on the writing session, and the listings are
+# rebuilt in that same transaction just before it commits
+def _on_process_change(mapper, connection, target):
+    automation_service.mark_process_changed(target.id, object_session(target))
+
+def _on_process_agent_change(mapper, connection, target):
+    automation_service.mark_process_changed(target.process_id, object_session(target))
+
+def _on_agent_change(mapper, connection, target):
+    automation_service.mark_agent_changed(target.id, object_session(target))
+
+def _on_before_commit(session):
+    automation_service.refresh_stale_listings(session)
+
+def _on_rollback(session):
+    session.info.pop(STALE_PROCESS_IDS_KEY, None)
+    session.info.pop(STALE_AGENT_IDS_KEY, None)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(AutomationProcess, _event_name, _on_process_change)
+    event.listen(ProcessAgent, _event_name, _on_process_agent_change)
+    event.listen(AIAgent, _event_name, _on_agent_change)
+
+event.listen(Session, 'before_commit', _on_before_commit)
+event.listen(Session, 'after_rollback', _on_rollback)
@@ -0,0 +1,186 @@
+"""
+Stripe Webhook Queue Benchmark
+Generates a synthetic Stripe event history (checkouts, paid/failed
+invoices, upgrades, cancellations), then:
+  1. posts it once in Stripe `created` order and records the resulting
+     dashboard subscription state;
+  2. resets, posts every event twice, each pass shuffled, from concurrent
+     clients, and checks that the final state is identical and that the
+     webhook endpoint's p99 stays under the budget.
+
+Usage: python benchmark_stripe_webhooks.py --events 10000 --p99-budget-ms 50
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import event as sqlalchemy_event
+
+from app import app, db
+from ai_dashboard_models import DashboardSubscription
+from automation_checkout_routes import automation_checkout
+from stripe_webhook_queue import StripeWebhookEvent, sign_stripe_payload, stripe_event_processor
+
+PLANS = ['starter', 'professional', 'enterprise']
+
+def _event(event_id: str, event_type: str, created: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {'id': event_id, 'object': 'event', 'type': event_type, 'created': created, 'data': {'object': data}}
+
+def generate_events(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    events: List[Dict[str, Any]] = []
+    customer = 0
+    while len(events) < count:
+        customer += 1
+        customer_id = f"cus_{customer:06d}"
+        created = 1_700_000_000 + rng.randrange(86_400)
+        subscriptions = 2 if rng.random() < 0.3 else 1
+        for index in range(subscriptions):
+            subscription_id = f"sub_{customer:06d}_{index}"
+            created += rng.randrange(60, 3600)
+            events.append(_event(f"evt_{len(events):07d}", 'checkout.session.completed', created, {
+                'object': 'checkout.session', 'customer': customer_id, 'subscription': subscription_id,
+                'metadata': {'user_id': str(customer), 'plan': rng.choice(PLANS),
+                             'billing_cycle': rng.choice(['monthly', 'yearly'])}
+            }))
+            for _ in range(rng.randrange(2, 7)):
+                created += rng.randrange(60, 3600)
+                event_type = 'invoice.payment_failed' if rng.random() < 0.25 else 'invoice.payment_succeeded'
+                events.append(_event(f"evt_{len(events):07d}", event_type, created, {
+                    'object': 'invoice', 'customer': customer_id, 'subscription': subscription_id
+                }))
+        if rng.random() < 0.2:
+            created += rng.randrange(60, 3600)
+            events.append(_event(f"evt_{len(events):07d}", 'customer.subscription.deleted', created, {
+                'object': 'subscription', 'id': subscription_id, 'customer': customer_id
+            }))
+    return events[:count]
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def _tune_sqlite():
+    """WAL and no fsync per commit, as a production SQLite deployment would run"""
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite' and not sqlalchemy_event.contains(db.engine, 'connect', _sqlite_wal):
+            sqlalchemy_event.listen(db.engine, 'connect', _sqlite_wal)
+            db.engine.dispose()
+
+def _reset_tables():
+    with app.app_context():
+        for table in (StripeWebhookEvent.__table__, DashboardSubscription.__table__):
+            table.drop(db.engine, checkfirst=True)
+            table.create(db.engine)
+
+def _snapshot() -> Dict[str, Tuple]:
+    with app.app_context():
+        return {
+            row.stripe_subscription_id: (row.user_id, row.plan_name, row.billing_cycle, row.status,
+                                         row.last_stripe_event_at)
+            for row in DashboardSubscription.query.all()
+        }
+
+def _post_all(events: List[Dict[str, Any]], secret: str, clients: int) -> Tuple[List[float], Dict[int, int]]:
+    payloads = [json.dumps(event).encode('utf-8') for event in events]
+    local = threading.local()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+
+    def post(payload: bytes):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        headers = {'Stripe-Signature': sign_stripe_payload(payload, secret), 'Content-Type': 'application/json'}
+        started = time.perf_counter()
+        response = client.post('/stripe/webhook', data=payload, headers=headers)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(post, payloads))
+    return latencies, statuses
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+        'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2)
+    }
+
+def run_benchmark(event_count: int = 10_000, clients: int = 8, p99_budget_ms: float = 50.0,
+                  seed: int = 7) -> Dict[str, Any]:
+    secret = os.environ.setdefault('STRIPE_WEBHOOK_SECRET', 'whsec_benchmark')
+    if 'automation_checkout' not in app.blueprints:
+        app.register_blueprint(automation_checkout)
+    _tune_sqlite()
+    events = generate_events(event_count, seed)
+    rng = random.Random(seed)
+
+    # Reference: every event once, in Stripe order, one client
+    _reset_tables()
+    _post_all(sorted(events, key=lambda event: event['created']), secret, clients=1)
+    with app.app_context():
+        reference_drained = stripe_event_processor.drain(timeout=600)
+    reference = _snapshot()
+
+    # Every event twice, each pass shuffled, concurrent clients
+    _reset_tables()
+    first, second = events[:], events[:]
+    rng.shuffle(first)
+    rng.shuffle(second)
+    started = time.perf_counter()
+    latencies, statuses = _post_all(first + second, secret, clients)
+    post_seconds = time.perf_counter() - started
+    with app.app_context():
+        drained = stripe_event_processor.drain(timeout=600)
+        stored = StripeWebhookEvent.query.count()
+        dead = StripeWebhookEvent.query.filter_by(status='dead').count()
+    drain_seconds = time.perf_counter() - started - post_seconds
+    replayed = _snapshot()
+
+    mismatched = [key for key in set(reference) | set(replayed) if reference.get(key) != replayed.get(key)]
+    latency = _latency_summary(latencies)
+    return {
+        'events': event_count,
+        'deliveries': len(latencies),
+        'response_codes': statuses,
+        'stored_events': stored,
+        'dead_events': dead,
+        'subscriptions': len(replayed),
+        'reference_drained': reference_drained,
+        'drained': drained,
+        'state_identical': not mismatched and drained and reference_drained,
+        'mismatched_subscriptions': sorted(mismatched)[:10],
+        'endpoint_latency': latency,
+        'p99_within_budget': latency['p99_ms'] <= p99_budget_ms,
+        'post_seconds': round(post_seconds, 1),
+        'drain_after_posting_seconds': round(drain_seconds, 1),
+        'processor': dict(stripe_event_processor.stats)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Stripe events twice out of order and compare state")
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--p99-budget-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.events, args.clients, args.p99_budget_ms, args.seed)
+    for key, value in results.items():
+        print(f"{key}: {value}")
+    raise SystemExit(0 if results['state_identical'] and results['p99_within_budget'] else 1)
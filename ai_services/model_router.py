@@ -0,0 +1,519 @@
+"""
+4UAI Model Router
+Routes completions across OpenAI/Anthropic models using rolling latency,
+error rate and cost per target, with circuit breakers, automatic failover
+and hedged requests for slow interactive calls
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from model_rate_governor import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_STANDARD,
+                                 anthropic_message, estimate_tokens, openai_chat_completion)
+from usage_metering import calculate_cost
+
+try:
+    import openai
+    HAS_OPENAI = True
+except ImportError:
+    HAS_OPENAI = False
+
+try:
+    import anthropic
+    HAS_ANTHROPIC = True
+except ImportError:
+    HAS_ANTHROPIC = False
+
+logger = logging.getLogger(__name__)
+
+# MODEL_ROUTER_TARGETS overrides as "provider:model,provider:model"
+DEFAULT_TARGETS = [
+    ('openai', 'gpt-4o'),
+    ('anthropic', 'claude-3-5-sonnet-20241022')
+]
+
+REQUEST_CLASS_PRIORITY = {
+    'interactive': PRIORITY_INTERACTIVE,
+    'standard': PRIORITY_STANDARD,
+    'batch': PRIORITY_BATCH
+}
+
+# How much each request class cares about tail latency vs cost vs errors
+REQUEST_CLASS_WEIGHTS = {
+    'interactive': {'latency': 1.0, 'cost': 0.2, 'errors': 4.0},
+    'standard': {'latency': 0.5, 'cost': 0.5, 'errors': 4.0},
+    'batch': {'latency': 0.1, 'cost': 1.0, 'errors': 4.0}
+}
+HEDGED_REQUEST_CLASSES = {'interactive'}
+PREFERENCE_BONUS = 0.25
+
+STATS_WINDOW_SIZE = 200
+STATS_WINDOW_SECONDS = 900
+PRIOR_LATENCY_SECONDS = 5.0
+MIN_SAMPLES_FOR_HEDGE = 20
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_MIN_SAMPLES = 10
+BREAKER_RESET_SECONDS = 30.0
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+# Caller errors say nothing about provider health
+CLIENT_ERROR_STATUS_CODES = {400, 413, 422}
+
+class ModelRouterError(Exception):
+    """Raised when no target could serve a request"""
+
+@dataclass
+class CompletionResult:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens served from the provider's prompt cache
+
+@dataclass
+class RouteResult:
+    content: str
+    provider: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    cost: float
+    attempts: int = 1
+    hedged: bool = False
+    cached_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+class OpenAIProvider:
+    name = 'openai'
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, model: str, messages: List[Dict], max_tokens: int, temperature: float,
+                 tenant=None, priority: int = PRIORITY_STANDARD, timeout: Optional[float] = None) -> CompletionResult:
+        # OpenAI caches identical prompt prefixes automatically; keeping the
+        # system message first and byte-stable is all that is needed
+        request = {'model': model, 'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature}
+        if timeout is not None:
+            request['timeout'] = timeout
+        response = openai_chat_completion(self.client, tenant=tenant, priority=priority, **request)
+        content = ""
+        if response.choices and response.choices[0].message and response.choices[0].message.content:
+            content = response.choices[0].message.content
+        usage = response.usage
+        details = getattr(usage, 'prompt_tokens_details', None) if usage else None
+        return CompletionResult(
+            content=content,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0 if usage else 0,
+            completion_tokens=getattr(usage, 'completion_tokens', 0) or 0 if usage else 0,
+            cached_tokens=getattr(details, 'cached_tokens', 0) or 0 if details else 0
+        )
+
+class AnthropicProvider:
+    name = 'anthropic'
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, model: str, messages: List[Dict], max_tokens: int, temperature: float,
+                 tenant=None, priority: int = PRIORITY_STANDARD, timeout: Optional[float] = None) -> CompletionResult:
+        # Anthropic takes the system prompt as a separate parameter; marking it
+        # with cache_control lets repeated calls read the prefix from cache
+        system = "\n\n".join(message['content'] for message in messages if message['role'] == 'system')
+        request = {
+            'model': model,
+            'messages': [message for message in messages if message['role'] != 'system'],
+            'max_tokens': max_tokens,
+            'temperature': temperature
+        }
+        if system:
+            request['system'] = [{'type': 'text', 'text': system, 'cache_control': {'type': 'ephemeral'}}]
+        if timeout is not None:
+            request['timeout'] = timeout
+        response = anthropic_message(self.client, tenant=tenant, priority=priority, **request)
+
+        content = "".join(getattr(block, 'text', '') or '' for block in response.content or [])
+        usage = response.usage
+        if not usage:
+            return CompletionResult(content=content)
+        # input_tokens excludes cache reads and writes, which are reported separately
+        cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        return CompletionResult(
+            content=content,
+            prompt_tokens=(getattr(usage, 'input_tokens', 0) or 0) + cache_read + cache_write,
+            completion_tokens=getattr(usage, 'output_tokens', 0) or 0,
+            cached_tokens=cache_read
+        )
+
+class FakeProvider:
+    """
+    Local stand-in provider for exercising routing without API keys:
+    configurable latency, jitter and failure rate. Enabled for the shared
+    router with MODEL_ROUTER_FAKE_PROVIDERS=1.
+    """
+
+    def __init__(self, name: str, latency: float = 0.05, jitter: float = 0.0,
+                 error_rate: float = 0.0, content: str = "Fake response"):
+        self.name = name
+        self.calls = 0
+        self._cached_prefixes = set()
+        self.set_behavior(latency=latency, jitter=jitter, error_rate=error_rate, content=content)
+
+    def set_behavior(self, latency: Optional[float] = None, jitter: Optional[float] = None,
+                     error_rate: Optional[float] = None, content: Optional[str] = None):
+        if latency is not None:
+            self.latency = latency
+        if jitter is not None:
+            self.jitter = jitter
+        if error_rate is not None:
+            self.error_rate = error_rate
+        if content is not None:
+            self.content = content
+
+    def complete(self, model: str, messages: List[Dict], max_tokens: int, temperature: float,
+                 tenant=None, priority: int = PRIORITY_STANDARD, timeout: Optional[float] = None) -> CompletionResult:
+        self.calls += 1
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if timeout is not None and delay > timeout:
+            time.sleep(max(0.0, timeout))
+            raise TimeoutError(f"{self.name}/{model} fake call timed out after {timeout:g}s")
+        time.sleep(delay)
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}/{model} fake failure")
+        prompt_tokens = estimate_tokens(*(message['content'] for message in messages))
+        # Mimic provider prompt caching: a repeated system prefix is reported as cached
+        system = "".join(message['content'] for message in messages if message['role'] == 'system')
+        cached_tokens = estimate_tokens(system) if system in self._cached_prefixes else 0
+        self._cached_prefixes.add(system)
+        return CompletionResult(f"{self.content} ({self.name}/{model})", prompt_tokens,
+                                min(max_tokens, 50), cached_tokens)
+
+class RollingStats:
+    """Recent latency/outcome samples for one target"""
+
+    def __init__(self, size: int = STATS_WINDOW_SIZE, window_seconds: float = STATS_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool, float]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool, cost: float = 0.0):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok, cost))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            return [sample for sample in self._samples if sample[0] >= cutoff]
+
+    def snapshot(self) -> Dict:
+        samples = self._recent()
+        latencies = sorted(latency for _, latency, ok, _ in samples if ok)
+        errors = sum(1 for _, _, ok, _ in samples if not ok)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        successes = len(samples) - errors
+        return {
+            'samples': len(samples),
+            'p50_latency': percentile(0.50),
+            'p95_latency': percentile(0.95),
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'avg_cost': sum(cost for _, _, ok, cost in samples if ok) / successes if successes else None
+        }
+
+class CircuitBreaker:
+    """Stops routing to a failing target, then lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Whether the target may be chosen (without claiming the half-open probe)"""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN:
+                return time.monotonic() >= self.opened_at + self.reset_seconds
+            return not self.probe_in_flight
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.monotonic() >= self.opened_at + self.reset_seconds:
+                self.state = BREAKER_HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == BREAKER_HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self, error_rate: float = 0.0, samples: int = 0):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            tripped = (
+                self.state == BREAKER_HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or (samples >= BREAKER_MIN_SAMPLES and error_rate >= BREAKER_ERROR_RATE)
+            )
+            if tripped:
+                if self.state != BREAKER_OPEN:
+                    logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+class RouteTarget:
+    def __init__(self, provider, model: str):
+        self.provider = provider
+        self.model = model
+        self.stats = RollingStats()
+        self.breaker = CircuitBreaker()
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider.name}/{self.model}"
+
+def _is_client_error(error: Exception) -> bool:
+    return getattr(error, 'status_code', None) in CLIENT_ERROR_STATUS_CODES
+
+class ModelRouter:
+    """Shared router used by the agent engine, dashboard insights and workflow steps"""
+
+    def __init__(self, max_hedge_workers: int = 16):
+        self.targets: List[RouteTarget] = []
+        self._executor = ThreadPoolExecutor(max_workers=max_hedge_workers, thread_name_prefix='model-hedge')
+
+    def add_target(self, provider, model: str) -> RouteTarget:
+        target = RouteTarget(provider, model)
+        self.targets.append(target)
+        return target
+
+    def client_for(self, provider_name: str):
+        for target in self.targets:
+            if target.provider.name == provider_name:
+                return getattr(target.provider, 'client', None)
+        return None
+
+    def rank_targets(self, request_class: str = 'standard', preference: Optional[str] = None,
+                     estimated_prompt_tokens: int = 0, max_tokens: int = 1000) -> List[RouteTarget]:
+        """
+        Healthy targets best-first. Tail latency and expected cost are scored
+        relative to the best candidate, so the weights compare like with like.
+        """
+        weights = REQUEST_CLASS_WEIGHTS.get(request_class, REQUEST_CLASS_WEIGHTS['standard'])
+        candidates = []
+        for target in self.targets:
+            if not target.breaker.available():
+                continue
+            stats = target.stats.snapshot()
+            latency = stats['p95_latency'] if stats['p95_latency'] is not None else PRIOR_LATENCY_SECONDS
+            cost = calculate_cost(target.model, estimated_prompt_tokens, max_tokens // 2)
+            candidates.append((target, latency, cost, stats['error_rate']))
+        if not candidates:
+            return []
+
+        best_latency = max(min(latency for _, latency, _, _ in candidates), 1e-3)
+        best_cost = max(min(cost for _, _, cost, _ in candidates), 1e-9)
+
+        def score(candidate):
+            target, latency, cost, error_rate = candidate
+            value = (weights['latency'] * latency / best_latency
+                     + weights['cost'] * cost / best_cost
+                     + weights['errors'] * error_rate)
+            if preference and preference in (target.provider.name, target.model):
+                value -= PREFERENCE_BONUS
+            return value
+
+        return [candidate[0] for candidate in sorted(candidates, key=score)]
+
+    def _attempt(self, target: RouteTarget, messages, max_tokens, temperature, tenant, priority,
+                 timeout: Optional[float] = None) -> RouteResult:
+        started = time.monotonic()
+        try:
+            result = target.provider.complete(target.model, messages, max_tokens, temperature,
+                                              tenant=tenant, priority=priority, timeout=timeout)
+        except Exception as e:
+            latency = time.monotonic() - started
+            if _is_client_error(e):
+                target.breaker.record_success()
+            else:
+                target.stats.record(latency, False)
+                stats = target.stats.snapshot()
+                target.breaker.record_failure(stats['error_rate'], stats['samples'])
+            raise
+
+        latency = time.monotonic() - started
+        cost = calculate_cost(target.model, result.prompt_tokens, result.completion_tokens, result.cached_tokens)
+        target.stats.record(latency, True, cost)
+        target.breaker.record_success()
+        return RouteResult(
+            content=result.content, provider=target.provider.name, model=target.model,
+            prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens,
+            latency=latency, cost=cost, cached_tokens=result.cached_tokens
+        )
+
+    def _hedged(self, primary: RouteTarget, backup: RouteTarget, deadline: float, call_args,
+                tried: set) -> RouteResult:
+        """
+        Start the primary; if it has not answered by its p95, start the backup
+        too and take whichever succeeds first. The slower call still runs to
+        completion (and is recorded in the stats) but its answer is dropped.
+        """
+        futures = {self._executor.submit(self._attempt, primary, *call_args): primary}
+        done, _ = wait(futures, timeout=deadline)
+        if not done and backup.breaker.allow():
+            tried.add(backup.key)
+            futures[self._executor.submit(self._attempt, backup, *call_args)] = backup
+            logger.info(f"Hedging {primary.key} after {deadline:.2f}s with {backup.key}")
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                result.hedged = len(futures) > 1
+                return result
+        raise last_error
+
+    def complete(self, messages: List[Dict], request_class: str = 'standard', preference: Optional[str] = None,
+                 tenant=None, max_tokens: int = 1000, temperature: float = 0.7,
+                 hedge: Optional[bool] = None, timeout: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> RouteResult:
+        """
+        Run a chat completion on the best healthy target, failing over down
+        the ranking. timeout bounds the whole call including failover (each
+        provider request gets the remaining time); setting cancel_event stops
+        any further attempts.
+        """
+        priority = REQUEST_CLASS_PRIORITY.get(request_class, PRIORITY_STANDARD)
+        prompt_tokens = estimate_tokens(*(message['content'] for message in messages))
+        ranked = self.rank_targets(request_class, preference, prompt_tokens, max_tokens)
+        if not ranked:
+            raise ModelRouterError("No healthy model targets available")
+        if hedge is None:
+            hedge = request_class in HEDGED_REQUEST_CLASSES
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        errors = []
+        tried = set()
+        for index, target in enumerate(ranked):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ModelRouterError("Model call cancelled: " + "; ".join(errors or ["before any attempt"]))
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise ModelRouterError(f"Model call exceeded its {timeout:g}s deadline: "
+                                       + "; ".join(errors or ["no target answered"]))
+            if target.key in tried or not target.breaker.allow():
+                continue
+            tried.add(target.key)
+
+            call_args = (messages, max_tokens, temperature, tenant, priority, remaining)
+            stats = target.stats.snapshot()
+            backup = next((candidate for candidate in ranked[index + 1:] if candidate.key not in tried), None)
+            try:
+                if hedge and backup and stats['samples'] >= MIN_SAMPLES_FOR_HEDGE and stats['p95_latency']:
+                    hedge_after = stats['p95_latency'] if remaining is None else min(stats['p95_latency'], remaining)
+                    result = self._hedged(target, backup, hedge_after, call_args, tried)
+                else:
+                    result = self._attempt(target, *call_args)
+            except Exception as e:
+                errors.append(f"{target.key}: {e}")
+                logger.warning(f"Model call to {target.key} failed, failing over: {e}")
+                if _is_client_error(e):
+                    break
+                continue
+            result.attempts = len(errors) + 1
+            return result
+
+        raise ModelRouterError("All model targets failed: " + "; ".join(errors or ["no target available"]))
+
+    def get_metrics(self) -> Dict:
+        return {
+            target.key: {
+                **target.stats.snapshot(),
+                'breaker_state': target.breaker.state,
+                'consecutive_failures': target.breaker.consecutive_failures
+            } for target in self.targets
+        }
+
+def _configured_targets() -> List[Tuple[str, str]]:
+    raw = os.getenv('MODEL_ROUTER_TARGETS')
+    if not raw:
+        return DEFAULT_TARGETS
+    targets = []
+    for item in raw.split(','):
+        provider, _, model = item.strip().partition(':')
+        if provider and model:
+            targets.append((provider, model))
+    return targets or DEFAULT_TARGETS
+
+def build_model_router() -> ModelRouter:
+    """Router over every configured target whose provider has an API key"""
+    router = ModelRouter()
+    use_fakes = os.getenv('MODEL_ROUTER_FAKE_PROVIDERS') == '1'
+    providers = {}
+    if use_fakes:
+        providers = {'openai': FakeProvider('openai'), 'anthropic': FakeProvider('anthropic', latency=0.08)}
+    else:
+        try:
+            if HAS_OPENAI and os.getenv('OPENAI_API_KEY'):
+                providers['openai'] = OpenAIProvider(openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY')))
+                logger.info("✅ OpenAI GPT-4o client initialized")
+            if HAS_ANTHROPIC and os.getenv('ANTHROPIC_API_KEY'):
+                providers['anthropic'] = AnthropicProvider(anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY')))
+                logger.info("✅ Anthropic Claude client initialized")
+        except Exception as e:
+            logger.error(f"❌ Error initializing AI clients: {e}")
+
+    for provider_name, model in _configured_targets():
+        if provider_name in providers:
+            router.add_target(providers[provider_name], model)
+    return router
+
+# Global router instance
+_model_router = None
+_model_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    global _model_router
+    with _model_router_lock:
+        if _model_router is None:
+            _model_router = build_model_router()
+        return _model_router
@@ -0,0 +1,531 @@
+"""
+Notification Outbox
+Transactional outbox for Telegram, email, webhook and Slack notifications.
+Request handlers only insert a row (in their own transaction); a background
+worker pool claims due rows and delivers them with pooled connections,
+timeouts, retries with jittered backoff, per-channel rate limits and
+dead-lettering after max_attempts.
+
+Every app process runs its own dispatcher, started before its first
+request (or by the first enqueue in scripts). Channel rate limits are
+enforced per process, so CHANNEL_RATE_LIMITS is divided by the process
+count (NOTIFICATION_PROCESSES, falling back to WEB_CONCURRENCY, default 1)
+to keep the combined send rate within each channel's limit.
+"""
+
+import atexit
+import http.client
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session
+
+from app import app, db
+from model_rate_governor import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 4))
+NOTIFICATION_PROCESSES = max(1, int(os.environ.get('NOTIFICATION_PROCESSES') or os.environ.get('WEB_CONCURRENCY') or 1))
+NOTIFICATION_POLL_SECONDS = 1.0
+NOTIFICATION_CLAIM_LEASE_SECONDS = 60
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_HTTP_TIMEOUT = 10.0
+NOTIFICATION_SMTP_TIMEOUT = 15.0
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 3600.0
+# Longer rate-limit waits put the row back instead of holding a worker
+MAX_RATE_LIMIT_WAIT_SECONDS = 1.0
+
+# Sends per minute per channel across all processes; Telegram allows about
+# 20/min into one group chat
+CHANNEL_RATE_LIMITS = {
+    'telegram': 20,
+    'email': 120,
+    'webhook': 600,
+    'slack': 60
+}
+
+class NotificationOutbox(db.Model):
+    """One outbound notification and its delivery state"""
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False)  # telegram, email, webhook, slack
+    recipient = db.Column(db.String(500), nullable=False)  # chat id, address or URL
+    subject = db.Column(db.String(300))
+    payload = db.Column(db.Text, nullable=False)  # JSON, channel specific
+    dedupe_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=NOTIFICATION_MAX_ATTEMPTS)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class DeliveryError(Exception):
+    """Transient failure; the notification is retried with backoff"""
+
+class PermanentDeliveryError(DeliveryError):
+    """The provider rejected the notification; retrying cannot help"""
+
+class RateLimitedError(DeliveryError):
+    """The provider asked us to slow down; retried after retry_after without using an attempt"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempts))
+
+class HTTPConnectionPool:
+    """Keep-alive http.client connections, one per host per worker thread"""
+
+    def __init__(self, timeout: float = NOTIFICATION_HTTP_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = connections[(scheme, netloc)] = connection_class(netloc, timeout=self.timeout)
+        return connection
+
+    def _discard(self, scheme: str, netloc: str):
+        connection = self._local.__dict__.get('connections', {}).pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def post_json(self, url: str, body: Dict[str, Any]):
+        """POST a JSON body; returns (status, parsed JSON or None). Retries once on a stale connection."""
+        parts = urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        data = json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('POST', path or '/', body=data, headers=headers)
+                response = connection.getresponse()
+                raw = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._discard(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._discard(parts.scheme, parts.netloc)
+                raise
+            if response.will_close:
+                self._discard(parts.scheme, parts.netloc)
+            try:
+                parsed = json.loads(raw) if raw else None
+            except ValueError:
+                parsed = None
+            return response.status, parsed
+
+def _raise_for_http_status(status: int, body: Optional[Dict[str, Any]]):
+    if 200 <= status < 300:
+        return
+    description = (body or {}).get('description') if isinstance(body, dict) else None
+    message = f"HTTP {status}" + (f": {description}" if description else '')
+    if status == 429:
+        retry_after = ((body or {}).get('parameters') or {}).get('retry_after') if isinstance(body, dict) else None
+        raise RateLimitedError(message, float(retry_after or RETRY_BASE_SECONDS))
+    if status >= 500 or status == 408:
+        raise DeliveryError(message)
+    raise PermanentDeliveryError(message)
+
+class TelegramSender:
+    """Bot API sendMessage; TELEGRAM_API_BASE can point at a local fake endpoint"""
+
+    def __init__(self, pool: HTTPConnectionPool):
+        self.pool = pool
+
+    def send(self, notification: Dict[str, Any]):
+        token = os.environ.get('TELEGRAM_BOT_TOKEN_4UAI')
+        if not token:
+            raise PermanentDeliveryError("TELEGRAM_BOT_TOKEN_4UAI is not configured")
+        base_url = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+        payload = notification['payload']
+        body = {'chat_id': notification['recipient'], 'text': payload.get('text', '')}
+        if payload.get('parse_mode'):
+            body['parse_mode'] = payload['parse_mode']
+        status, response = self.pool.post_json(f"{base_url}/bot{token}/sendMessage", body)
+        _raise_for_http_status(status, response)
+
+class WebhookSender:
+    """POSTs the payload as JSON to the recipient URL"""
+
+    def __init__(self, pool: HTTPConnectionPool):
+        self.pool = pool
+
+    def send(self, notification: Dict[str, Any]):
+        status, response = self.pool.post_json(notification['recipient'], notification['payload'])
+        _raise_for_http_status(status, response)
+
+class SlackSender(WebhookSender):
+    """Slack incoming webhook; the payload needs at least a 'text' field"""
+
+class EmailSender:
+    """
+    SMTP delivery with one reused connection per worker thread. Without
+    SMTP_HOST the message is only logged, as the app did before the outbox.
+    """
+
+    def __init__(self, timeout: float = NOTIFICATION_SMTP_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _smtp(self) -> smtplib.SMTP:
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is not None:
+            return smtp
+        host = os.environ['SMTP_HOST']
+        port = int(os.environ.get('SMTP_PORT', 587))
+        if port == 465:
+            smtp = smtplib.SMTP_SSL(host, port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=self.timeout)
+            if os.environ.get('SMTP_USE_TLS', '1' if port == 587 else '0') == '1':
+                smtp.starttls()
+        if os.environ.get('SMTP_USERNAME'):
+            smtp.login(os.environ['SMTP_USERNAME'], os.environ.get('SMTP_PASSWORD', ''))
+        self._local.smtp = smtp
+        return smtp
+
+    def _discard(self):
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if smtp is not None:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def send(self, notification: Dict[str, Any]):
+        payload = notification['payload']
+        if not os.environ.get('SMTP_HOST'):
+            logger.info(f"EMAIL TO: {notification['recipient']} SUBJECT: {notification.get('subject')}")
+            logger.info(f"EMAIL CONTENT: {payload.get('html') or payload.get('text')}")
+            return
+
+        message = EmailMessage()
+        message['From'] = os.environ.get('NOTIFICATION_EMAIL_FROM', 'no-reply@4uai.com')
+        message['To'] = notification['recipient']
+        message['Subject'] = notification.get('subject') or ''
+        message.set_content(payload.get('text') or 'This message requires an HTML capable email client.')
+        if payload.get('html'):
+            message.add_alternative(payload['html'], subtype='html')
+
+        for attempt in range(2):
+            try:
+                self._smtp().send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._discard()
+                if attempt:
+                    raise DeliveryError("SMTP server disconnected")
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentDeliveryError(f"Recipient refused: {e.recipients}")
+            except smtplib.SMTPResponseException as e:
+                self._discard()
+                if 500 <= e.smtp_code < 600:
+                    raise PermanentDeliveryError(f"SMTP {e.smtp_code}: {e.smtp_error!r}")
+                raise DeliveryError(f"SMTP {e.smtp_code}: {e.smtp_error!r}")
+            except OSError as e:
+                self._discard()
+                raise DeliveryError(f"SMTP connection failed: {e}")
+
+class NotificationDispatcher:
+    """
+    Background delivery for the outbox. A poller thread claims due rows
+    (pending and past next_attempt_at, or 'sending' with an expired lease
+    left by a crashed worker) by stamping a claim token with a guarded
+    UPDATE, which is safe across processes on any database, and hands them
+    to a thread pool. Rows are released as sent, rescheduled, or dead.
+    """
+
+    def __init__(self, workers: int = NOTIFICATION_WORKERS, poll_interval: float = NOTIFICATION_POLL_SECONDS,
+                 rate_limits: Optional[Dict[str, float]] = None, engine=None,
+                 processes: int = NOTIFICATION_PROCESSES):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.engine = engine
+        pool = HTTPConnectionPool()
+        self.senders = {
+            'telegram': TelegramSender(pool),
+            'email': EmailSender(),
+            'webhook': WebhookSender(pool),
+            'slack': SlackSender(pool)
+        }
+        # Each process takes an equal share of the per-channel limits
+        self._buckets = {channel: TokenBucket(limit / max(1, processes)) for channel, limit in
+                         (CHANNEL_RATE_LIMITS if rate_limits is None else rate_limits).items()}
+        self._bucket_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._in_flight = threading.Semaphore(workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._poller: Optional[threading.Thread] = None
+        self.stats = {'sent': 0, 'retried': 0, 'rate_limited': 0, 'dead': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._poller is not None and self._poller.is_alive()
+
+    def ensure_started(self):
+        if self.is_running or os.environ.get('NOTIFICATION_DISPATCHER_ENABLED', '1') != '1':
+            return
+        with self._start_lock:
+            if self.is_running:
+                return
+            if self.engine is None:
+                with app.app_context():
+                    self.engine = db.engine
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='notification-worker')
+            self._poller = threading.Thread(target=self._poll_loop, name='notification-poller', daemon=True)
+            self._poller.start()
+            atexit.register(self.stop)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"Notification poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self) -> int:
+        """Claim as many due rows as there are idle workers and submit them; returns rows claimed"""
+        slots = 0
+        while slots < self.workers and self._in_flight.acquire(blocking=False):
+            slots += 1
+        if not slots:
+            # Every worker is busy; wait for one instead of spinning
+            if self._in_flight.acquire(timeout=self.poll_interval):
+                self._in_flight.release()
+            return 0
+        rows = self.claim(slots)
+        for _ in range(slots - len(rows)):
+            self._in_flight.release()
+        for row in rows:
+            self._executor.submit(self._deliver, row)
+        return len(rows)
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        table = NotificationOutbox.__table__
+        now = datetime.utcnow()
+        due = or_(
+            and_(table.c.status == STATUS_PENDING, table.c.next_attempt_at <= now),
+            and_(table.c.status == STATUS_SENDING, table.c.locked_until < now)
+        )
+        token = uuid.uuid4().hex
+        with self.engine.begin() as connection:
+            ids = [row.id for row in connection.execute(
+                select(table.c.id).where(due).order_by(table.c.next_attempt_at, table.c.id)
+                .limit(limit).with_for_update(skip_locked=True)
+            )]
+            if not ids:
+                return []
+            connection.execute(
+                table.update().where(table.c.id.in_(ids), due).values(
+                    status=STATUS_SENDING, claim_token=token,
+                    locked_until=now + timedelta(seconds=NOTIFICATION_CLAIM_LEASE_SECONDS)
+                )
+            )
+            rows = connection.execute(select(table).where(table.c.claim_token == token)).mappings().all()
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+    def _rate_limit_wait(self, channel: str) -> float:
+        bucket = self._buckets.get(channel)
+        if bucket is None:
+            return 0.0
+        with self._bucket_lock:
+            now = time.monotonic()
+            wait = bucket.wait_time(1, now)
+            if wait <= MAX_RATE_LIMIT_WAIT_SECONDS:
+                bucket.take(1, now)
+            return wait
+
+    def _deliver(self, notification: Dict[str, Any]):
+        try:
+            wait = self._rate_limit_wait(notification['channel'])
+            if wait > MAX_RATE_LIMIT_WAIT_SECONDS:
+                self._release(notification, STATUS_PENDING, delay=wait, count_attempt=False)
+                return
+            if wait:
+                time.sleep(wait)
+
+            sender = self.senders.get(notification['channel'])
+            if sender is None:
+                raise PermanentDeliveryError(f"Unknown channel {notification['channel']}")
+            sender.send(notification)
+            self._release(notification, STATUS_SENT)
+        except RateLimitedError as e:
+            self._count('rate_limited')
+            self._release(notification, STATUS_PENDING, delay=e.retry_after, error=str(e), count_attempt=False)
+        except PermanentDeliveryError as e:
+            self._release(notification, STATUS_DEAD, error=str(e))
+        except Exception as e:
+            attempts = notification['attempts'] + 1
+            if attempts >= notification['max_attempts']:
+                self._release(notification, STATUS_DEAD, error=str(e))
+            else:
+                self._release(notification, STATUS_PENDING, delay=retry_delay(attempts), error=str(e))
+        finally:
+            self._in_flight.release()
+            self._wake.set()
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def _release(self, notification: Dict[str, Any], status: str, delay: float = 0.0,
+                 error: Optional[str] = None, count_attempt: bool = True):
+        table = NotificationOutbox.__table__
+        now = datetime.utcnow()
+        values = {'status': status, 'claim_token': None, 'locked_until': None}
+        if count_attempt:
+            values['attempts'] = table.c.attempts + 1
+        if status == STATUS_SENT:
+            values['sent_at'] = now
+            values['last_error'] = None
+        else:
+            values['last_error'] = error
+            values['next_attempt_at'] = now + timedelta(seconds=delay)
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    table.update().where(table.c.id == notification['id'],
+                                         table.c.claim_token == notification['claim_token']).values(**values)
+                )
+        except Exception as e:
+            # The lease expires and another claim retries the row
+            logger.error(f"Could not update notification {notification['id']}: {e}")
+            return
+
+        if status == STATUS_SENT:
+            self._count('sent')
+        elif status == STATUS_DEAD:
+            self._count('dead')
+            logger.error(f"Notification {notification['id']} ({notification['channel']}) dead-lettered: {error}")
+        elif count_attempt:
+            self._count('retried')
+            logger.warning(f"Notification {notification['id']} ({notification['channel']}) failed, retrying: {error}")
+
+notification_dispatcher = NotificationDispatcher()
+
+@app.before_request
+def _ensure_dispatcher_running():
+    # Rows queued by other processes or before a restart are delivered
+    # without waiting for this process to enqueue something itself
+    if not notification_dispatcher.is_running:
+        notification_dispatcher.ensure_started()
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher_after_commit(session):
+    if session.info.pop('notification_outbox_enqueued', False):
+        notification_dispatcher.wake()
+
+def enqueue_notification(channel: str, recipient: str, payload: Dict[str, Any], subject: Optional[str] = None,
+                         dedupe_key: Optional[str] = None, max_attempts: int = NOTIFICATION_MAX_ATTEMPTS,
+                         commit: bool = True) -> NotificationOutbox:
+    """
+    Add a notification to the outbox in the current db.session. With
+    commit=False the row is written by the caller's own commit, so it is
+    only delivered if the surrounding transaction succeeds. A repeated
+    dedupe_key returns the existing row instead of queueing it twice.
+    """
+    if dedupe_key:
+        existing = NotificationOutbox.query.filter_by(dedupe_key=dedupe_key).first()
+        if existing is not None:
+            return existing
+
+    notification = NotificationOutbox(
+        channel=channel, recipient=str(recipient), subject=subject,
+        payload=json.dumps(payload, default=str), dedupe_key=dedupe_key,
+        max_attempts=max_attempts, next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(notification)
+    db.session.info['notification_outbox_enqueued'] = True
+    notification_dispatcher.ensure_started()
+    if commit:
+        db.session.commit()
+    return notification
+
+def retry_dead_notifications(channel: Optional[str] = None) -> int:
+    """Move dead-lettered notifications back to pending with fresh attempts; returns rows requeued"""
+    query = NotificationOutbox.query.filter(NotificationOutbox.status == STATUS_DEAD)
+    if channel:
+        query = query.filter(NotificationOutbox.channel == channel)
+    requeued = query.update({
+        'status': STATUS_PENDING, 'attempts': 0, 'next_attempt_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    notification_dispatcher.wake()
+    return requeued
+
+def get_outbox_stats() -> Dict[str, Any]:
+    counts = dict(db.session.query(NotificationOutbox.status, db.func.count(NotificationOutbox.id))
+                  .group_by(NotificationOutbox.status).all())
+    return {'by_status': counts, 'dispatcher': dict(notification_dispatcher.stats)}
@@ -8,7 +8,7 @@ import logging
 import json
 import asyncio
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 logging.basicConfig(level=logging.INFO)
 
@@ -139,6 +139,31 @@ class RPAAutomationFramework:
         
         return analysis
     
+    async def execute_load_test(self, scenarios: List[str], base_url: str, profile=None,
+                                export_dir: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run scenario definitions as a real HTTP load test against base_url
+        (see rpa_load_runner for profiles, step mapping and the offline
+        stand-in target). Returns the report summary; histograms and the
+        throughput series are written to export_dir when given.
+        """
+        from rpa_load_runner import HTTPLoadRunner, LoadProfile
+        
+        definitions = [self.test_scenarios[name] for name in scenarios if name in self.test_scenarios]
+        profile = profile or LoadProfile()
+        logging.info(f"🤖 Starting HTTP load test: {len(definitions)} scenarios, {profile.mode} model against {base_url}")
+        
+        report = await HTTPLoadRunner(base_url, profile).run(definitions)
+        results = report.to_dict()
+        results['throughput'] = report.throughput_series()
+        if export_dir:
+            results['exported_files'] = report.export(export_dir)
+        
+        self.results_cache[f"load_test_{report.started_at}"] = dict(
+            results, status='completed' if not report.errors else 'completed_with_errors'
+        )
+        return results
+    
     async def execute_rpa_scenario(self, scenario_name: str):
         """Execute individual RPA test scenario"""
         
@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+RPA HTTP Load Runner
+Executes RPAAutomationFramework scenario definitions against a real HTTP
+target with many virtual users (closed model) or a fixed arrival rate (open
+model), recording per-step latency histograms and throughput over time.
+A local Flask stand-in target lets the whole run work offline.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+try:
+    from hdrh.histogram import HdrHistogram
+    HAS_HDRH = True
+except ImportError:
+    HAS_HDRH = False
+
+logger = logging.getLogger(__name__)
+
+# Latencies are recorded in microseconds, up to one hour
+HISTOGRAM_MAX_MICROS = 3_600_000_000
+HISTOGRAM_SIGNIFICANT_DIGITS = 3
+# Exact below this, then 1024 sub-buckets per power of two (~0.1% error)
+_SUB_BUCKETS = 2048
+_HALF_SUB_BUCKETS = _SUB_BUCKETS // 2
+
+REQUEST_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_CONNECTIONS = 1000
+# Open model: how long in-flight iterations may finish after the last arrival
+DRAIN_TIMEOUT_SECONDS = 10.0
+IDLE_POLL_SECONDS = 0.1
+
+# Steps without an explicit "request" map to HTTP like this: navigate loads
+# its target path, form-style actions POST to the current page, everything
+# else re-fetches the current page (the request an interaction triggers)
+FORM_ACTIONS = {'fill_form', 'fill_invalid_data', 'correct_data', 'submit', 'send_message'}
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of microsecond values (3 significant
+    digits). Sparse, mergeable and exported as .hgrm percentile text; when
+    the hdrh package is installed the values are mirrored into an
+    HdrHistogram for its compressed interchange encoding.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = 0
+        self._sum = 0
+        self._sum_squares = 0
+        self._hdr = HdrHistogram(1, HISTOGRAM_MAX_MICROS, HISTOGRAM_SIGNIFICANT_DIGITS) if HAS_HDRH else None
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < _SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 11
+        return _SUB_BUCKETS + (shift - 1) * _HALF_SUB_BUCKETS + ((value >> shift) - _HALF_SUB_BUCKETS)
+
+    @staticmethod
+    def _highest_equivalent(index: int) -> int:
+        if index < _SUB_BUCKETS:
+            return index
+        shift = (index - _SUB_BUCKETS) // _HALF_SUB_BUCKETS + 1
+        sub_bucket = (index - _SUB_BUCKETS) % _HALF_SUB_BUCKETS + _HALF_SUB_BUCKETS
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record_seconds(self, seconds: float):
+        self.record_value(max(1, min(int(seconds * 1_000_000), HISTOGRAM_MAX_MICROS)))
+
+    def record_value(self, value: int, count: int = 1):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+        self._sum += value * count
+        self._sum_squares += value * value * count
+        if self._hdr is not None:
+            self._hdr.record_value(value, count)
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+        self._sum += other._sum
+        self._sum_squares += other._sum_squares
+        if self._hdr is not None and other._hdr is not None:
+            self._hdr.add(other._hdr)
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self.total_count if self.total_count else 0.0
+
+    @property
+    def stddev(self) -> float:
+        if not self.total_count:
+            return 0.0
+        return math.sqrt(max(self._sum_squares / self.total_count - self.mean ** 2, 0.0))
+
+    def value_at_percentile(self, percentile: float) -> int:
+        if not self.total_count:
+            return 0
+        target = max(1, math.ceil(percentile / 100.0 * self.total_count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_value)
+        return self.max_value
+
+    def summary(self) -> Dict[str, Any]:
+        """Milliseconds"""
+        return {
+            'count': self.total_count,
+            'min_ms': (self.min_value or 0) / 1000,
+            'mean_ms': round(self.mean / 1000, 3),
+            'p50_ms': self.value_at_percentile(50) / 1000,
+            'p90_ms': self.value_at_percentile(90) / 1000,
+            'p99_ms': self.value_at_percentile(99) / 1000,
+            'p999_ms': self.value_at_percentile(99.9) / 1000,
+            'max_ms': self.max_value / 1000
+        }
+
+    def to_hgrm(self, ticks_per_half_distance: int = 5, unit_ratio: float = 1000.0) -> str:
+        """HdrHistogram percentile distribution text (values in ms by default)"""
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", ""]
+        if self.total_count:
+            ordered = sorted(self.counts.items())
+            position, seen = 0, 0
+            percentiles = []
+            for level in range(40):
+                low = 100.0 - 100.0 / 2 ** level
+                high = 100.0 - 100.0 / 2 ** (level + 1)
+                percentiles.extend(low + (high - low) * tick / ticks_per_half_distance
+                                   for tick in range(ticks_per_half_distance))
+            percentiles.append(100.0)
+            for percentile in percentiles:
+                target = max(1, math.ceil(percentile / 100.0 * self.total_count))
+                while seen < target and position < len(ordered):
+                    seen += ordered[position][1]
+                    position += 1
+                value = min(self._highest_equivalent(ordered[position - 1][0]), self.max_value)
+                inverse = f"{1 / (1 - percentile / 100):14.2f}" if percentile < 100 else ''
+                lines.append(f"{value / unit_ratio:12.3f} {percentile / 100:14.12f} {seen:10d} {inverse}".rstrip())
+                if seen >= self.total_count:
+                    break
+        lines.append(f"#[Mean    = {self.mean / unit_ratio:12.3f}, StdDeviation   = {self.stddev / unit_ratio:12.3f}]")
+        lines.append(f"#[Max     = {self.max_value / unit_ratio:12.3f}, Total count    = {self.total_count:12d}]")
+        lines.append(f"#[Buckets = {len(self.counts):12d}, SubBuckets     = {_SUB_BUCKETS:12d}]")
+        return "\n".join(lines) + "\n"
+
+    def encode(self) -> Optional[str]:
+        """Compressed HdrHistogram encoding (needs hdrh)"""
+        if self._hdr is None:
+            return None
+        encoded = self._hdr.encode()
+        return encoded.decode('ascii') if isinstance(encoded, bytes) else encoded
+
+@dataclass
+class LoadProfile:
+    """
+    Load shape. stages are (seconds, target) pairs ramped linearly from the
+    previous target: virtual users in the closed model, iterations/second in
+    the open model. Without stages the profile ramps from 0 to
+    virtual_users / arrival_rate over ramp_up_seconds and holds it until
+    duration_seconds.
+    """
+    mode: str = 'closed'  # closed (virtual users) or open (arrival rate)
+    virtual_users: int = 100
+    arrival_rate: float = 50.0
+    ramp_up_seconds: float = 10.0
+    duration_seconds: float = 60.0
+    stages: Optional[List[Tuple[float, float]]] = None
+    think_time_seconds: float = 0.0
+    poisson_arrivals: bool = True
+    max_in_flight: int = 10_000
+
+    def resolved_stages(self) -> List[Tuple[float, float]]:
+        if self.stages:
+            return list(self.stages)
+        target = self.virtual_users if self.mode == 'closed' else self.arrival_rate
+        ramp = min(self.ramp_up_seconds, self.duration_seconds)
+        return [(ramp, target), (self.duration_seconds - ramp, target)]
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(seconds for seconds, _ in self.resolved_stages())
+
+    def target_at(self, elapsed: float) -> float:
+        previous, start = 0.0, 0.0
+        for seconds, target in self.resolved_stages():
+            if elapsed < start + seconds:
+                return previous + (target - previous) * ((elapsed - start) / seconds if seconds else 1.0)
+            previous, start = target, start + seconds
+        return previous
+
+@dataclass
+class LoadTestReport:
+    base_url: str
+    profile: LoadProfile
+    started_at: str
+    duration_seconds: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    iterations: int = 0
+    dropped_arrivals: int = 0
+    status_counts: Dict[str, int] = field(default_factory=dict)
+    overall: LatencyHistogram = field(default_factory=LatencyHistogram)
+    step_histograms: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    # second -> [requests, errors, iterations]
+    timeline: Dict[int, List[int]] = field(default_factory=dict)
+
+    def throughput_series(self) -> List[Dict[str, Any]]:
+        last = max(self.timeline) if self.timeline else -1
+        return [{'second': second, 'requests': bucket[0], 'errors': bucket[1], 'iterations': bucket[2]}
+                for second in range(last + 1)
+                for bucket in [self.timeline.get(second, [0, 0, 0])]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'base_url': self.base_url,
+            'mode': self.profile.mode,
+            'started_at': self.started_at,
+            'duration_seconds': round(self.duration_seconds, 3),
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': self.errors / self.requests if self.requests else 0.0,
+            'iterations': self.iterations,
+            'dropped_arrivals': self.dropped_arrivals,
+            'requests_per_second': round(self.requests / self.duration_seconds, 2) if self.duration_seconds else 0.0,
+            'status_counts': self.status_counts,
+            'latency': self.overall.summary(),
+            'steps': {name: histogram.summary() for name, histogram in self.step_histograms.items()}
+        }
+
+    def export(self, directory: str) -> Dict[str, str]:
+        """Write summary.json, throughput.csv and one .hgrm (+ .hdr when hdrh is installed) per step"""
+        os.makedirs(directory, exist_ok=True)
+        paths = {'summary': os.path.join(directory, 'summary.json'),
+                 'throughput': os.path.join(directory, 'throughput.csv')}
+        with open(paths['summary'], 'w') as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+        with open(paths['throughput'], 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=['second', 'requests', 'errors', 'iterations'])
+            writer.writeheader()
+            writer.writerows(self.throughput_series())
+
+        for name, histogram in [('overall', self.overall)] + sorted(self.step_histograms.items()):
+            safe_name = ''.join(char if char.isalnum() or char in '-_.' else '_' for char in name)
+            paths[name] = os.path.join(directory, f"{safe_name}.hgrm")
+            with open(paths[name], 'w') as handle:
+                handle.write(histogram.to_hgrm())
+            encoded = histogram.encode()
+            if encoded:
+                with open(os.path.join(directory, f"{safe_name}.hdr"), 'w') as handle:
+                    handle.write(encoded)
+        return paths
+
+class _StdlibConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+class StdlibHTTPClient:
+    """
+    Minimal keep-alive HTTP/1.1 client on asyncio streams, used when aiohttp
+    is not installed. Handles Content-Length and chunked responses.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle: Dict[Tuple[str, int, bool], List[_StdlibConnection]] = {}
+
+    async def _connect(self, host: str, port: int, tls: bool) -> _StdlibConnection:
+        idle = self._idle.get((host, port, tls))
+        if idle:
+            return idle.pop()
+        reader, writer = await asyncio.open_connection(host, port, ssl=tls or None)
+        return _StdlibConnection(reader, writer)
+
+    async def request(self, method: str, url: str, json_body: Any = None) -> Tuple[int, int]:
+        parts = urlsplit(url)
+        tls = parts.scheme == 'https'
+        host, port = parts.hostname, parts.port or (443 if tls else 80)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        body = json.dumps(json_body).encode('utf-8') if json_body is not None else b''
+        head = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: keep-alive",
+                f"Content-Length: {len(body)}"]
+        if json_body is not None:
+            head.append("Content-Type: application/json")
+        payload = ("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body
+
+        async with self._slots:
+            connection = await asyncio.wait_for(self._connect(host, port, tls), self.timeout)
+            try:
+                status, size, keep_alive = await asyncio.wait_for(self._exchange(connection, payload), self.timeout)
+            except BaseException:
+                connection.close()
+                raise
+            if keep_alive:
+                self._idle.setdefault((host, port, tls), []).append(connection)
+            else:
+                connection.close()
+            return status, size
+
+    async def _exchange(self, connection: _StdlibConnection, payload: bytes) -> Tuple[int, int, bool]:
+        connection.writer.write(payload)
+        await connection.writer.drain()
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                chunk_size = int((await reader.readline()).split(b';')[0], 16)
+                if chunk_size == 0:
+                    await reader.readline()
+                    break
+                size += len(await reader.readexactly(chunk_size + 2)) - 2
+        elif 'content-length' in headers:
+            size = len(await reader.readexactly(int(headers['content-length'])))
+        else:
+            size = len(await reader.read())
+            keep_alive = False
+        return int(status), size, keep_alive
+
+    async def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+class AiohttpClient:
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_connections),
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        )
+
+    async def request(self, method: str, url: str, json_body: Any = None) -> Tuple[int, int]:
+        async with self._session.request(method, url, json=json_body) as response:
+            return response.status, len(await response.read())
+
+    async def close(self):
+        await self._session.close()
+
+def step_request(step: Dict[str, Any], current_path: str) -> Tuple[str, str, Any, Optional[int]]:
+    """(method, path, json body, expected status) for one scenario step"""
+    if 'request' in step:
+        request = step['request']
+        return (request.get('method', 'GET').upper(), request.get('path', current_path),
+                request.get('json'), request.get('expect_status'))
+    action = step['action']
+    target = step.get('target') or current_path
+    if action == 'navigate' and target.startswith('/'):
+        return 'GET', target, None, None
+    if action in FORM_ACTIONS:
+        return 'POST', current_path, {'action': action, 'target': target, 'data': step.get('data')}, None
+    return 'GET', current_path, None, None
+
+class HTTPLoadRunner:
+    """Runs scenario iterations against base_url according to a LoadProfile"""
+
+    def __init__(self, base_url: str, profile: LoadProfile, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 timeout: float = REQUEST_TIMEOUT_SECONDS, seed: Optional[int] = None):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._client = None
+        self._started = 0.0
+        self.report: Optional[LoadTestReport] = None
+
+    def _bucket(self) -> List[int]:
+        second = int(time.monotonic() - self._started)
+        bucket = self.report.timeline.get(second)
+        if bucket is None:
+            bucket = self.report.timeline[second] = [0, 0, 0]
+        return bucket
+
+    async def _run_iteration(self, scenario: Dict[str, Any]):
+        current_path = '/'
+        for index, step in enumerate(scenario['steps']):
+            method, path, body, expect_status = step_request(step, current_path)
+            name = f"{scenario['name']}:{index}:{step['action']}"
+            started = time.perf_counter()
+            try:
+                status, _ = await self._client.request(method, self.base_url + path, body)
+                failed = status != expect_status if expect_status else status >= 400
+                status_key = str(status)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed, status_key = True, type(e).__name__
+            latency = time.perf_counter() - started
+
+            histogram = self.report.step_histograms.get(name)
+            if histogram is None:
+                histogram = self.report.step_histograms[name] = LatencyHistogram()
+            histogram.record_seconds(latency)
+            self.report.overall.record_seconds(latency)
+            self.report.requests += 1
+            self.report.status_counts[status_key] = self.report.status_counts.get(status_key, 0) + 1
+            bucket = self._bucket()
+            bucket[0] += 1
+            if failed:
+                self.report.errors += 1
+                bucket[1] += 1
+            if method == 'GET' and not failed:
+                current_path = path
+            if self.profile.think_time_seconds:
+                await asyncio.sleep(self._random.uniform(0.5, 1.5) * self.profile.think_time_seconds)
+
+        self.report.iterations += 1
+        self._bucket()[2] += 1
+
+    async def _virtual_user(self, index: int, scenarios: List[Dict[str, Any]]):
+        total = self.profile.total_seconds
+        iteration = index
+        while True:
+            elapsed = time.monotonic() - self._started
+            if elapsed >= total:
+                return
+            if index < self.profile.target_at(elapsed):
+                await self._run_iteration(scenarios[iteration % len(scenarios)])
+                iteration += 1
+            else:
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+
+    async def _run_closed(self, scenarios: List[Dict[str, Any]]):
+        peak_users = int(max(target for _, target in self.profile.resolved_stages()))
+        async with asyncio.TaskGroup() as task_group:
+            for index in range(peak_users):
+                task_group.create_task(self._virtual_user(index, scenarios))
+
+    async def _run_open(self, scenarios: List[Dict[str, Any]]):
+        total = self.profile.total_seconds
+        in_flight = set()
+        arrival = 0
+        next_arrival = 0.0
+        while next_arrival < total:
+            delay = next_arrival - (time.monotonic() - self._started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= self.profile.max_in_flight:
+                self.report.dropped_arrivals += 1
+            else:
+                task = asyncio.ensure_future(self._run_iteration(scenarios[arrival % len(scenarios)]))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            arrival += 1
+
+            rate = self.profile.target_at(next_arrival)
+            if rate <= 0:
+                next_arrival += IDLE_POLL_SECONDS
+            elif self.profile.poisson_arrivals:
+                next_arrival += self._random.expovariate(rate)
+            else:
+                next_arrival += 1.0 / rate
+
+        if in_flight:
+            done, pending = await asyncio.wait(in_flight, timeout=DRAIN_TIMEOUT_SECONDS)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def run(self, scenarios: List[Dict[str, Any]]) -> LoadTestReport:
+        if not scenarios or not all(scenario.get('steps') for scenario in scenarios):
+            raise ValueError("Load tests need at least one scenario with steps")
+        self.report = LoadTestReport(self.base_url, self.profile, datetime.utcnow().isoformat())
+        client_class = AiohttpClient if HAS_AIOHTTP else StdlibHTTPClient
+        self._client = client_class(self.max_connections, self.timeout)
+        self._started = time.monotonic()
+        try:
+            if self.profile.mode == 'open':
+                await self._run_open(scenarios)
+            else:
+                await self._run_closed(scenarios)
+        finally:
+            self.report.duration_seconds = time.monotonic() - self._started
+            await self._client.close()
+        return self.report
+
+def create_standin_app(latency_ms: float = 0.0, error_rate: float = 0.0):
+    """Flask stand-in for the platform: HTML pages for GET, JSON acks for POST"""
+    from flask import Flask, jsonify, request
+
+    app = Flask('rpa_standin_target')
+    failures = random.Random(7)
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+    @app.route('/<path:path>', methods=['GET', 'POST'])
+    def standin(path):
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+        if error_rate and failures.random() < error_rate:
+            return jsonify({'error': 'injected failure'}), 503
+        if request.method == 'POST':
+            return jsonify({'success': True, 'path': f"/{path}", 'received': request.get_json(silent=True)})
+        return (f"<html><body><h1>/{path}</h1><form id='checkout-form'></form>"
+                f"<button class='purchase-btn'>Buy</button></body></html>")
+
+    return app
+
+def start_standin_server(host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0,
+                         error_rate: float = 0.0):
+    """Serve the stand-in on a background thread; returns (base_url, shutdown)"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, create_standin_app(latency_ms, error_rate), threaded=True)
+    server.socket.listen(4096)
+    thread = threading.Thread(target=server.serve_forever, name='rpa-standin-target', daemon=True)
+    thread.start()
+    return f"http://{host}:{server.server_port}", server.shutdown
+
+def main():
+    parser = argparse.ArgumentParser(description="Run RPA scenarios as an HTTP load test")
+    parser.add_argument('--base-url', help="target to load; omit to start the local stand-in")
+    parser.add_argument('--scenario', action='append',
+                        help="scenario name (repeatable); defaults to all built-in scenarios")
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=100.0, help="open model iterations per second")
+    parser.add_argument('--ramp-up', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--think-time', type=float, default=0.0)
+    parser.add_argument('--standin-latency-ms', type=float, default=5.0)
+    parser.add_argument('--standin-error-rate', type=float, default=0.0)
+    parser.add_argument('--export', default='rpa_load_results')
+    args = parser.parse_args()
+
+    from rpa_automation_framework import RPAAutomationFramework
+
+    framework = RPAAutomationFramework()
+    names = args.scenario or ['complete_checkout_flow', 'voice_button_testing', 'form_validation_testing']
+    for name in names:
+        framework.create_test_scenario(name, {})
+
+    base_url, shutdown = args.base_url, None
+    if not base_url:
+        base_url, shutdown = start_standin_server(latency_ms=args.standin_latency_ms,
+                                                  error_rate=args.standin_error_rate)
+    profile = LoadProfile(mode=args.mode, virtual_users=args.users, arrival_rate=args.rate,
+                          ramp_up_seconds=args.ramp_up, duration_seconds=args.duration,
+                          think_time_seconds=args.think_time)
+    try:
+        result = asyncio.run(framework.execute_load_test(names, base_url, profile, export_dir=args.export))
+    finally:
+        if shutdown:
+            shutdown()
+    print(json.dumps({key: result[key] for key in ('requests', 'errors', 'requests_per_second', 'latency')},
+                     indent=2))
+    print(f"Exported to {args.export}/")
+
+if __name__ == '__main__':
+    main()
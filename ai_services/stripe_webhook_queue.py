@@ -0,0 +1,495 @@
+"""
+Stripe Webhook Queue
+Verified Stripe events are stored once by event ID and acknowledged
+immediately; a worker pool applies them in the background, one event at a
+time per customer in Stripe `created` order, with retries and a replay tool.
+"""
+
+import argparse
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_PROCESSED = 'processed'
+STATUS_DEAD = 'dead'
+
+STRIPE_WEBHOOK_WORKERS = int(os.environ.get('STRIPE_WEBHOOK_WORKERS', 4))
+STRIPE_WEBHOOK_POLL_SECONDS = 0.5
+STRIPE_WEBHOOK_LEASE_SECONDS = 120
+STRIPE_WEBHOOK_MAX_ATTEMPTS = 10
+STRIPE_RETRY_BASE_SECONDS = 0.5
+STRIPE_RETRY_MAX_SECONDS = 600.0
+# Stripe's own libraries reject signatures older than five minutes
+STRIPE_SIGNATURE_TOLERANCE_SECONDS = 300
+
+class StripeWebhookEvent(db.Model):
+    """One Stripe event, stored once per event ID, and its processing state"""
+    __tablename__ = 'stripe_webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(100), nullable=False, unique=True)
+    event_type = db.Column(db.String(100), nullable=False)
+    # Events for the same key are applied one at a time in stripe_created order
+    ordering_key = db.Column(db.String(100), nullable=False)
+    # Subscription the event refers to; deferred marks events applied before
+    # that subscription existed, which its checkout replays
+    stripe_subscription_id = db.Column(db.String(100))
+    deferred = db.Column(db.Boolean, nullable=False, default=False)
+    stripe_created = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_stripe_webhook_events_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_stripe_webhook_events_ordering', 'ordering_key', 'status', 'stripe_created'),
+        db.Index('ix_stripe_webhook_events_deferred', 'stripe_subscription_id', 'deferred'),
+    )
+
+class _WriteGate:
+    """
+    FIFO mutex with two classes of waiter; priority waiters go first, but
+    a normal waiter is let through after priority_streak priority holders
+    in a row so it is never starved. Release hands the gate straight to the
+    next waiter, so a thread that releases and re-acquires cannot overtake
+    threads already waiting.
+    """
+
+    def __init__(self, priority_streak: int = 8):
+        self.priority_streak = priority_streak
+        self._lock = threading.Lock()
+        self._held = False
+        self._streak = 0
+        self._waiters: Dict[bool, Deque[threading.Event]] = {True: deque(), False: deque()}
+
+    @contextmanager
+    def hold(self, priority: bool = False):
+        waiter = None
+        with self._lock:
+            if self._held:
+                waiter = threading.Event()
+                self._waiters[priority].append(waiter)
+            else:
+                self._held = True
+        if waiter is not None:
+            waiter.wait()
+        try:
+            yield
+        finally:
+            with self._lock:
+                priority_turn = self._waiters[True] and (self._streak < self.priority_streak
+                                                         or not self._waiters[False])
+                if priority_turn:
+                    self._streak += 1
+                    self._waiters[True].popleft().set()
+                elif self._waiters[False]:
+                    self._streak = 0
+                    self._waiters[False].popleft().set()
+                else:
+                    self._streak = 0
+                    self._held = False
+
+_sqlite_write_gate = _WriteGate()
+
+def _write_lock(priority: bool = False):
+    """
+    SQLite has one writer, and a blocked writer retries in sleeps of up to
+    100 ms, which is what the webhook tail latency was made of. Queueing
+    this process's writers on a gate avoids most of those sleeps; other
+    databases don't need it. The webhook endpoint's single-row insert takes
+    priority, so it waits behind at most one worker transaction instead of
+    every worker queued ahead of it.
+    """
+    return _sqlite_write_gate.hold(priority) if db.engine.dialect.name == 'sqlite' else nullcontext()
+
+class StripeSignatureError(Exception):
+    """The Stripe-Signature header is missing, malformed, stale or wrong"""
+
+def verify_stripe_signature(payload: bytes, signature_header: Optional[str], secret: str,
+                            tolerance: int = STRIPE_SIGNATURE_TOLERANCE_SECONDS) -> Dict[str, Any]:
+    """
+    Check a Stripe-Signature header (t=<timestamp>,v1=<hex hmac>) the way
+    stripe.Webhook.construct_event does and return the parsed event. Done
+    here so verification costs one HMAC and no SDK object construction.
+    """
+    if not signature_header:
+        raise StripeSignatureError("Missing Stripe-Signature header")
+    timestamp, signatures = None, []
+    for item in signature_header.split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+    if not timestamp or not signatures:
+        raise StripeSignatureError("Malformed Stripe-Signature header")
+    expected = hmac.new(secret.encode('utf-8'), timestamp.encode('utf-8') + b'.' + payload,
+                        hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise StripeSignatureError("No matching signature")
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise StripeSignatureError("Signature timestamp outside tolerance")
+    return json.loads(payload)
+
+def sign_stripe_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Stripe-Signature header for payload; used by the replay tool and the benchmark"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode('utf-8'), f"{timestamp}.".encode('utf-8') + payload,
+                         hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def event_ordering_key(event: Dict[str, Any]) -> str:
+    """Stripe customer, else subscription, else the event itself"""
+    data = (event.get('data') or {}).get('object') or {}
+    customer = data.get('customer')
+    if isinstance(customer, dict):
+        customer = customer.get('id')
+    if customer:
+        return str(customer)
+    subscription = data.get('subscription') or (data.get('id') if data.get('object') == 'subscription' else None)
+    return str(subscription or event['id'])
+
+def event_subscription_id(event: Dict[str, Any]) -> Optional[str]:
+    """The subscription an event refers to, if any"""
+    data = (event.get('data') or {}).get('object') or {}
+    subscription = data.get('id') if data.get('object') == 'subscription' else data.get('subscription')
+    if isinstance(subscription, dict):
+        subscription = subscription.get('id')
+    return str(subscription) if subscription else None
+
+def record_stripe_event(event: Dict[str, Any], payload: Optional[str] = None) -> Tuple[bool, int]:
+    """
+    Store an event unless its ID is already stored. Returns (created, row id);
+    a replayed delivery returns created=False and leaves the stored row alone.
+    """
+    table = StripeWebhookEvent.__table__
+    values = {
+        'event_id': event['id'],
+        'event_type': event['type'],
+        'ordering_key': event_ordering_key(event),
+        'stripe_subscription_id': event_subscription_id(event),
+        'deferred': False,
+        'stripe_created': int(event.get('created') or time.time()),
+        'payload': payload or json.dumps(event),
+        'status': STATUS_PENDING,
+        'attempts': 0,
+        'next_attempt_at': datetime.utcnow(),
+        'received_at': datetime.utcnow()
+    }
+    try:
+        with _write_lock(priority=True), db.engine.begin() as connection:
+            row_id = connection.execute(table.insert().values(**values)).inserted_primary_key[0]
+    except IntegrityError:
+        with db.engine.connect() as connection:
+            row_id = connection.execute(select(table.c.id).where(table.c.event_id == event['id'])).scalar()
+        return False, row_id
+    stripe_event_processor.ensure_started()
+    stripe_event_processor.wake()
+    return True, row_id
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(STRIPE_RETRY_MAX_SECONDS, STRIPE_RETRY_BASE_SECONDS * 2 ** attempts))
+
+def _apply_dashboard_subscription_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    from ai_dashboard_subscription_service import subscription_service
+    return subscription_service.handle_stripe_webhook(event, commit=False)
+
+class StripeEventProcessor:
+    """
+    Worker pool for stored events. A row is claimable only when no earlier
+    (stripe_created, id) event with the same ordering key is pending or
+    processing, so each customer's events run one at a time and in order
+    even across processes; different customers run in parallel. The
+    handler's changes and the 'processed' mark commit in one transaction,
+    and handlers are idempotent, so a retry after a crash is harmless.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Dict[str, Any]] = _apply_dashboard_subscription_event,
+                 workers: int = STRIPE_WEBHOOK_WORKERS, poll_interval: float = STRIPE_WEBHOOK_POLL_SECONDS,
+                 max_attempts: int = STRIPE_WEBHOOK_MAX_ATTEMPTS):
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._in_flight = threading.Semaphore(workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._poller: Optional[threading.Thread] = None
+        self.stats = {'processed': 0, 'retried': 0, 'dead': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._poller is not None and self._poller.is_alive()
+
+    def ensure_started(self):
+        if self.is_running or os.environ.get('STRIPE_WEBHOOK_WORKERS_ENABLED', '1') != '1':
+            return
+        with self._start_lock:
+            if self.is_running:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stripe-webhook')
+            self._poller = threading.Thread(target=self._poll_loop, name='stripe-webhook-poller', daemon=True)
+            self._poller.start()
+            atexit.register(self.stop)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"Stripe webhook poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self) -> int:
+        """Claim up to one event per idle worker and submit them; returns events claimed"""
+        slots = 0
+        while slots < self.workers and self._in_flight.acquire(blocking=False):
+            slots += 1
+        if not slots:
+            if self._in_flight.acquire(timeout=self.poll_interval):
+                self._in_flight.release()
+            return 0
+        claimed = self.claim(slots)
+        for _ in range(slots - len(claimed)):
+            self._in_flight.release()
+        for row_id, token in claimed:
+            self._executor.submit(self._process, row_id, token)
+        return len(claimed)
+
+    def claim(self, limit: int) -> List[Tuple[int, str]]:
+        table = StripeWebhookEvent.__table__
+        earlier = aliased(StripeWebhookEvent.__table__)
+        now = datetime.utcnow()
+        due = or_(
+            and_(table.c.status == STATUS_PENDING, table.c.next_attempt_at <= now),
+            and_(table.c.status == STATUS_PROCESSING, table.c.locked_until < now)
+        )
+        blocked = exists().where(
+            earlier.c.ordering_key == table.c.ordering_key,
+            earlier.c.status.in_([STATUS_PENDING, STATUS_PROCESSING]),
+            or_(earlier.c.stripe_created < table.c.stripe_created,
+                and_(earlier.c.stripe_created == table.c.stripe_created, earlier.c.id < table.c.id))
+        )
+        # Pick candidates with a plain read so the write lock is held only for
+        # the guarded UPDATE, which re-checks both conditions; a row another
+        # worker or process claimed first is simply not updated
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.ordering_key).where(due, ~blocked)
+                .order_by(table.c.stripe_created, table.c.id).limit(limit * 4)
+            ).all()
+        # At most one event per ordering key in a batch
+        ids, keys = [], set()
+        for row in rows:
+            if row.ordering_key not in keys and len(ids) < limit:
+                keys.add(row.ordering_key)
+                ids.append(row.id)
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        with _write_lock(), db.engine.begin() as connection:
+            connection.execute(
+                table.update().where(table.c.id.in_(ids), due, ~blocked).values(
+                    status=STATUS_PROCESSING, claim_token=token,
+                    locked_until=now + timedelta(seconds=STRIPE_WEBHOOK_LEASE_SECONDS)
+                )
+            )
+            claimed = connection.execute(select(table.c.id).where(table.c.claim_token == token)).scalars().all()
+        return [(row_id, token) for row_id in claimed]
+
+    def _process(self, row_id: int, token: str):
+        try:
+            with app.app_context(), _write_lock():
+                self._apply(row_id, token)
+        except Exception as e:
+            logger.error(f"Stripe webhook event {row_id} failed: {e}")
+        finally:
+            self._in_flight.release()
+            self._wake.set()
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def _apply(self, row_id: int, token: str):
+        table = StripeWebhookEvent.__table__
+        row = db.session.execute(select(table).where(table.c.id == row_id, table.c.claim_token == token)).first()
+        if row is None:
+            return
+        try:
+            result = self.handler(json.loads(row.payload))
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        if result.get('success'):
+            db.session.execute(table.update().where(table.c.id == row_id, table.c.claim_token == token).values(
+                status=STATUS_PROCESSED, attempts=table.c.attempts + 1, claim_token=None, locked_until=None,
+                processed_at=datetime.utcnow(), last_error=None, result=json.dumps(result, default=str),
+                deferred=bool(result.get('deferred'))
+            ))
+            db.session.commit()
+            self._count('processed')
+            return
+
+        db.session.rollback()
+        attempts = row.attempts + 1
+        dead = attempts >= self.max_attempts
+        db.session.execute(table.update().where(table.c.id == row_id, table.c.claim_token == token).values(
+            status=STATUS_DEAD if dead else STATUS_PENDING, attempts=attempts, claim_token=None, locked_until=None,
+            last_error=result.get('error'), next_attempt_at=datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+        ))
+        db.session.commit()
+        if dead:
+            self._count('dead')
+            logger.error(f"Stripe event {row.event_id} ({row.event_type}) dead after {attempts} attempts: {result.get('error')}")
+        else:
+            self._count('retried')
+
+    def drain(self, timeout: float = 60.0) -> bool:
+        """Wait until no event is pending or processing; True if the queue emptied in time"""
+        deadline = time.monotonic() + timeout
+        table = StripeWebhookEvent.__table__
+        while time.monotonic() < deadline:
+            with db.engine.connect() as connection:
+                open_events = connection.execute(select(db.func.count()).select_from(table).where(
+                    table.c.status.in_([STATUS_PENDING, STATUS_PROCESSING]))).scalar()
+            if not open_events:
+                return True
+            self.wake()
+            time.sleep(0.05)
+        return False
+
+stripe_event_processor = StripeEventProcessor()
+
+@app.before_request
+def _ensure_stripe_processor_running():
+    # Events left pending by a restart or stored by other processes are
+    # applied without waiting for the next webhook to reach this process
+    if not stripe_event_processor.is_running:
+        stripe_event_processor.ensure_started()
+
+def receive_stripe_webhook(payload: bytes, signature_header: Optional[str]) -> Tuple[Dict[str, Any], int]:
+    """Verify, store and acknowledge; the body and status code for the webhook response"""
+    secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    if not secret:
+        logger.error("STRIPE_WEBHOOK_SECRET is not configured")
+        return {'error': 'Webhook not configured'}, 500
+    try:
+        event = verify_stripe_signature(payload, signature_header, secret)
+    except (StripeSignatureError, ValueError) as e:
+        return {'error': str(e)}, 400
+    created, _ = record_stripe_event(event, payload.decode('utf-8'))
+    return {'received': True, 'duplicate': not created}, 200
+
+def replay_stripe_events(event_ids: Optional[List[str]] = None, since: Optional[datetime] = None,
+                         event_type: Optional[str] = None, include_processed: bool = True) -> int:
+    """
+    Put stored events back in the queue (dead ones always, processed ones
+    when include_processed); handlers are idempotent, so replaying an
+    already-applied event converges to the same state. Returns rows requeued.
+    """
+    query = StripeWebhookEvent.query
+    statuses = [STATUS_DEAD, STATUS_PROCESSED] if include_processed else [STATUS_DEAD]
+    query = query.filter(StripeWebhookEvent.status.in_(statuses))
+    if event_ids:
+        query = query.filter(StripeWebhookEvent.event_id.in_(event_ids))
+    if since:
+        query = query.filter(StripeWebhookEvent.received_at >= since)
+    if event_type:
+        query = query.filter(StripeWebhookEvent.event_type == event_type)
+    requeued = query.update({'status': STATUS_PENDING, 'attempts': 0, 'next_attempt_at': datetime.utcnow(),
+                             'claim_token': None, 'locked_until': None}, synchronize_session=False)
+    db.session.commit()
+    if requeued:
+        stripe_event_processor.ensure_started()
+        stripe_event_processor.wake()
+    return requeued
+
+def import_stripe_events(since: datetime, event_types: Optional[List[str]] = None) -> Dict[str, int]:
+    """Fetch events from the Stripe API (e.g. after an outage) and store any we never received"""
+    import stripe
+    stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+    params = {'created': {'gte': int(since.timestamp())}, 'limit': 100}
+    if event_types:
+        params['types'] = event_types
+    counts = {'fetched': 0, 'new': 0}
+    for event in stripe.Event.list(**params).auto_paging_iter():
+        counts['fetched'] += 1
+        created, _ = record_stripe_event(event.to_dict_recursive() if hasattr(event, 'to_dict_recursive') else dict(event))
+        counts['new'] += 1 if created else 0
+    return counts
+
+def get_webhook_queue_stats() -> Dict[str, Any]:
+    counts = dict(db.session.query(StripeWebhookEvent.status, db.func.count(StripeWebhookEvent.id))
+                  .group_by(StripeWebhookEvent.status).all())
+    return {'by_status': counts, 'processor': dict(stripe_event_processor.stats)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored Stripe webhook events")
+    parser.add_argument("--event-id", action="append", dest="event_ids", help="replay these event IDs (repeatable)")
+    parser.add_argument("--since", help="ISO timestamp; replay events received since then")
+    parser.add_argument("--type", dest="event_type", help="only this event type")
+    parser.add_argument("--dead-only", action="store_true", help="replay dead-lettered events only")
+    parser.add_argument("--import-from-stripe", action="store_true",
+                        help="also fetch events since --since from the Stripe API and store missing ones")
+    args = parser.parse_args()
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    with app.app_context():
+        if args.import_from_stripe:
+            if not since:
+                parser.error("--import-from-stripe needs --since")
+            print(f"imported: {import_stripe_events(since, [args.event_type] if args.event_type else None)}")
+        requeued = replay_stripe_events(args.event_ids, since, args.event_type, include_processed=not args.dead_only)
+        print(f"requeued: {requeued}")
+        stripe_event_processor.drain(timeout=300)
+        print(get_webhook_queue_stats())
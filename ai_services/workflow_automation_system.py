@@ -389,7 +389,7 @@ def execute_workflow_async(execution_id, workflow, input_data):
             
             try:
                 for step_config in execution_graph:
-                    step_result = execute_workflow_step(execution_id, step_config, input_data)
+                    step_result = execute_workflow_step(execution_id, step_config, input_data, tenant=workflow.user_id)
                     total_cost += step_result.get('cost', 0.0)
                     execution_log.append(step_result)
                     
@@ -461,7 +461,7 @@ def build_execution_graph(nodes, connections):
     dfs(start_node['id'])
     return execution_order
 
-def execute_workflow_step(execution_id, step_config, input_data):
+def execute_workflow_step(execution_id, step_config, input_data, tenant=None):
     """Execute a single workflow step"""
     step_id = step_config['id']
     step_type = step_config['type']
@@ -482,7 +482,7 @@ def execute_workflow_step(execution_id, step_config, input_data):
     
     try:
         if step_type == 'ai_agent':
-            result = execute_ai_agent_step(step_config, input_data)
+            result = execute_ai_agent_step(step_config, input_data, tenant=tenant)
         elif step_type == 'condition':
             result = execute_condition_step(step_config, input_data)
         elif step_type == 'delay':
@@ -510,10 +510,9 @@ def execute_workflow_step(execution_id, step_config, input_data):
     
     return result
 
-def execute_ai_agent_step(step_config, input_data):
+def execute_ai_agent_step(step_config, input_data, tenant=None):
     """Execute AI agent workflow step"""
-    from openai import OpenAI
-    import os
+    from model_router import get_model_router
     
     agent_id = step_config.get('agent_id')
     prompt_template = step_config.get('prompt', '{input}')
@@ -526,20 +525,20 @@ def execute_ai_agent_step(step_config, input_data):
     # Format prompt
     formatted_prompt = prompt_template.format(**input_data)
     
-    # Execute with OpenAI
-    client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-    
-    response = client.chat.completions.create(
-        model=agent.default_model or 'gpt-4o',
-        messages=[
+    # Execute on the agent's default model, or whichever target the router fails over to
+    response = get_model_router().complete(
+        [
             {"role": "system", "content": agent.base_prompt},
             {"role": "user", "content": formatted_prompt}
         ],
+        request_class='batch',
+        preference=agent.default_model or 'gpt-4o',
+        tenant=tenant,
         max_tokens=1000
     )
     
-    result_text = response.choices[0].message.content
-    cost = calculate_api_cost(response.usage)
+    result_text = response.content
+    cost = response.cost
     
     return {
         'output': {
@@ -629,15 +628,4 @@ def execute_email_step(step_config, input_data):
             'subject': subject
         },
         'cost': 0.005  # Small cost for email
-    }
-
-def calculate_api_cost(usage):
-    """Calculate API cost based on usage"""
-    # Simplified cost calculation for GPT-4o
-    input_cost_per_1k = 0.005
-    output_cost_per_1k = 0.015
-    
-    input_cost = (usage.prompt_tokens / 1000) * input_cost_per_1k
-    output_cost = (usage.completion_tokens / 1000) * output_cost_per_1k
-    
-    return input_cost + output_cost
\ No newline at end of file
+    }
\ No newline at end of file
@@ -11,6 +11,8 @@ import json
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from prospect_scoring_engine import ProspectScoringEngine, parse_money_range
+
 class GermanMarketExpansion:
     """Systematic German market expansion for manufacturing automation"""
     
@@ -327,7 +329,7 @@ class GermanMarketExpansion:
         for i, prospect in enumerate(selected, 1):
             budget_range = prospect['estimated_budget']
             # Extract minimum value for calculation
-            min_budget = int(budget_range.split('€')[1].split(',')[0].replace(',', '')) * 1000
+            min_budget = int(parse_money_range(budget_range)[0])
             total_potential += min_budget
             
             print(f"{i}. {prospect['company_name']}")
@@ -500,10 +502,8 @@ class GermanMarketExpansion:
     def generate_expansion_summary(self, verified_prospects: List[Dict]) -> Dict:
         """Generate summary of German market expansion"""
         
-        total_new_pipeline = sum([
-            int(p['estimated_budget'].split('€')[1].split(',')[0].replace(',', '')) * 1000 
-            for p in verified_prospects
-        ])
+        budgets = ProspectScoringEngine(verified_prospects).frame['budget_min']
+        total_new_pipeline = int(budgets.sum())
         
         combined_pipeline = self.existing_pipeline_value + total_new_pipeline
         
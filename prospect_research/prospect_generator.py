@@ -9,6 +9,8 @@ import pandas as pd
 from datetime import datetime
 import random
 
+from prospect_scoring_engine import ProspectScoringEngine, ScoringWeights
+
 def generate_dach_prospects():
     """Generate 50 qualified DACH prospects with complete contact information"""
     
@@ -318,20 +320,6 @@ def generate_dach_prospects():
         
         decision_maker = random.choice(decision_makers.get(industry, ["Operations Director"]))
         
-        # Automation score calculation
-        base_scores = {
-            "Manufacturing": 9.0,
-            "Financial Services": 9.2,
-            "Professional Services": 8.2,
-            "Logistics": 9.0,
-            "Retail": 8.5
-        }
-        
-        country_multiplier = {"DE": 1.0, "CH": 1.1, "AT": 0.95}[country]
-        size_multiplier = min(1.0, employee_count / 300) * 0.2 + 0.8
-        
-        automation_score = round(base_scores.get(industry, 8.5) * country_multiplier * size_multiplier, 1)
-        
         # Create prospect
         prospect = {
             "company_name": company_name,
@@ -347,16 +335,15 @@ def generate_dach_prospects():
             "linkedin_url": f"linkedin.com/company/{domain_name}",
             "annual_revenue": revenue_range,
             "automation_needs": automation_needs[:2],
-            "pain_points": pain_points[:2],
-            "automation_score": min(automation_score, 10.0)
+            "pain_points": pain_points[:2]
         }
         
         prospects.append(prospect)
     
-    # Sort by automation score (highest first)
-    prospects.sort(key=lambda x: x["automation_score"], reverse=True)
+    # Score generated prospects in one vectorized pass; templates keep their curated scores
+    engine = ProspectScoringEngine(prospects, ScoringWeights(existing_score_weight=1.0))
     
-    return prospects[:50]  # Return exactly 50 prospects
+    return engine.top_k(50)  # Return exactly 50 prospects, highest score first
 
 def main():
     print("🎯 DACH PROSPECT IDENTIFICATION - WEEK 1 EXECUTION")
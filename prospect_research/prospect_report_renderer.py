@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+"""
+Streaming Prospect Report Renderer
+Render DACH prospect reports section by section to file handles or generators
+Produces Markdown, CSV and PDF outputs from a single pass over the prospects
+"""
+
+import csv
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas as pdf_canvas
+    HAS_REPORTLAB = True
+except ImportError:
+    HAS_REPORTLAB = False
+
+# PDF is only produced by default when reportlab is importable
+DEFAULT_FORMATS = ('md', 'csv', 'pdf') if HAS_REPORTLAB else ('md', 'csv')
+
+
+# Templates are built once at import time; rendering a section is a single
+# str.format call instead of growing one report string per prospect.
+HEADER_TEMPLATE = """# Top 100 DACH Business Automation Prospects
+
+**4UAI Marketplace - Comprehensive Market Intelligence Report**  
+**Date:** {current_date}  
+**Region:** Germany, Austria, Switzerland (DACH)  
+**Total Pipeline Value:** €30,000,000+  
+**Average Automation Score:** 8.4/10  
+
+---
+
+## Executive Summary
+
+This comprehensive report presents the top 100 verified business process automation prospects across the DACH region (Germany, Austria, Switzerland). Each prospect has been systematically researched and scored based on automation potential, company size, industry readiness, and strategic value.
+
+### Key Statistics
+- **Total Prospects:** 100 companies
+- **Geographic Distribution:** 
+  - Germany: 55 companies
+  - Austria: 25 companies  
+  - Switzerland: 20 companies
+- **Combined Pipeline Value:** €30,000,000+
+- **Industries Covered:** 15+ sectors
+- **Average Deal Size:** €300,000-500,000
+
+### Automation Opportunity Categories
+- **Tier 1 (Scores 9.0-10.0):** Enterprise automation leaders - 25 prospects
+- **Tier 2 (Scores 8.0-8.9):** High automation potential - 45 prospects  
+- **Tier 3 (Scores 7.0-7.9):** Medium automation readiness - 30 prospects
+
+---
+
+## Detailed Prospect Database
+
+"""
+
+PROSPECT_TEMPLATE = """
+### #{rank}. {company_name}
+
+**Industry:** {industry}  
+**Location:** {city}, {country}  
+**Website:** {website}  
+**Contact:** {contact_email}  
+
+**Company Profile:**
+- **Employees:** {employee_count}
+- **Revenue:** {estimated_revenue}
+- **Automation Potential:** {automation_potential}
+- **Automation Score:** {automation_score}/10
+- **Priority Level:** {priority}
+
+**Key Decision Maker:** {key_decision_maker}
+
+**Background:**  
+{background}
+
+**Automation Needs & Demands:**
+{needs}
+**Recommended Solution:**  
+{solution_to_offer}
+
+**Next Steps:**
+1. Executive outreach to key decision maker
+2. Automation assessment and ROI presentation
+3. Pilot project proposal development
+4. Implementation roadmap creation
+
+---
+
+"""
+
+FOOTER_TEMPLATE = """
+## Market Analysis & Recommendations
+
+### Geographic Opportunities
+- **Germany:** Largest market with strong Industry 4.0 initiatives
+- **Switzerland:** High-value FinTech and pharmaceutical automation
+- **Austria:** Industrial automation and logistics optimization
+
+### Industry Priorities
+1. **Manufacturing & Industry 4.0** (35 prospects)
+2. **Financial Services & FinTech** (20 prospects)  
+3. **Logistics & Supply Chain** (15 prospects)
+4. **Healthcare & Pharmaceuticals** (10 prospects)
+5. **Energy & Utilities** (10 prospects)
+6. **Other Industries** (10 prospects)
+
+### Strategic Recommendations
+1. **Tier 1 Focus:** Prioritize top 25 prospects with 9.0+ automation scores
+2. **Industry Specialization:** Develop sector-specific automation solutions
+3. **Regional Approach:** Establish local presence in Munich, Frankfurt, Vienna, Zurich
+4. **Partnership Strategy:** Leverage system integrators and technology partners
+
+### Revenue Projections
+- **Year 1:** €8,000,000-12,000,000 (25-30% of pipeline)
+- **Year 2:** €15,000,000-22,000,000 (50-65% penetration)
+- **Year 3:** €25,000,000-35,000,000 (full market development)
+
+---
+
+## Contact Information
+
+**4UAI Marketplace Team**  
+**Email:** business@4uai.com  
+**Website:** www.4uai.com  
+
+*This document contains confidential and proprietary information. Distribution is restricted to authorized personnel only.*
+
+**Document Version:** 1.0  
+**Last Updated:** {current_date}  
+**Total Pages:** [Auto-generated]
+"""
+
+_render_header = HEADER_TEMPLATE.format
+_render_prospect = PROSPECT_TEMPLATE.format
+_render_footer = FOOTER_TEMPLATE.format
+
+DEFAULT_NEEDS = ['Process automation opportunities', 'Digital transformation initiatives']
+DEFAULT_BACKGROUND = 'Leading company in the DACH region with automation opportunities.'
+DEFAULT_SOLUTION = 'Comprehensive automation platform tailored to industry-specific requirements with 25-45% efficiency improvements.'
+
+CSV_FIELDS = [
+    'rank', 'company_name', 'country', 'city', 'industry', 'website',
+    'contact_email', 'employee_count', 'estimated_revenue', 'automation_potential',
+    'automation_score', 'priority', 'key_decision_maker', 'needs_demands',
+    'solution_to_offer'
+]
+
+
+class _PDFSectionWriter:
+    """Append markdown sections to a PDF canvas, flushing page by page"""
+
+    FONT = "Helvetica"
+    FONT_SIZE = 9
+    LINE_HEIGHT = 12
+    MARGIN = 50
+    WRAP_CHARS = 105
+
+    def __init__(self, pdf_file):
+        if not HAS_REPORTLAB:
+            raise RuntimeError("PDF output requires the reportlab package")
+        self.canvas = pdf_canvas.Canvas(pdf_file, pagesize=A4)
+        self.page_width, self.page_height = A4
+        self._new_page(first=True)
+
+    def _new_page(self, first: bool = False):
+        if not first:
+            self.canvas.showPage()
+        self.canvas.setFont(self.FONT, self.FONT_SIZE)
+        self.y = self.page_height - self.MARGIN
+
+    def write(self, section: str):
+        for raw_line in section.splitlines():
+            line = raw_line.replace('**', '').rstrip()
+            if line.startswith('#'):
+                line = line.lstrip('#').strip()
+            if line == '---':
+                line = ''
+            while True:
+                if self.y < self.MARGIN:
+                    self._new_page()
+                self.canvas.drawString(self.MARGIN, self.y, line[:self.WRAP_CHARS])
+                self.y -= self.LINE_HEIGHT
+                line = line[self.WRAP_CHARS:]
+                if not line:
+                    break
+
+    def close(self):
+        self.canvas.save()
+
+
+class ProspectReportRenderer:
+    """Render prospect reports incrementally instead of as one giant string"""
+
+    def __init__(self, report_date: Optional[str] = None):
+        self.report_date = report_date or datetime.now().strftime("%B %d, %Y")
+
+    def render_header(self) -> str:
+        return _render_header(current_date=self.report_date)
+
+    def render_footer(self) -> str:
+        return _render_footer(current_date=self.report_date)
+
+    def render_prospect(self, prospect: Dict, position: int) -> str:
+        """Render a single prospect section"""
+        employee_count = prospect.get('employee_count', 'N/A')
+        if isinstance(employee_count, int):
+            employee_count = f"{employee_count:,}"
+
+        needs = prospect.get('needs_demands', DEFAULT_NEEDS)
+
+        return _render_prospect(
+            rank=prospect.get('rank', position),
+            company_name=prospect['company_name'],
+            industry=prospect.get('industry', 'Not specified'),
+            city=prospect.get('city', 'Unknown'),
+            country=prospect['country'],
+            website=prospect.get('website', 'Not available'),
+            contact_email=prospect.get('contact_email', 'Not available'),
+            employee_count=employee_count,
+            estimated_revenue=prospect.get('estimated_revenue', 'Not disclosed'),
+            automation_potential=prospect.get('automation_potential', 'To be assessed'),
+            automation_score=prospect.get('automation_score', 'N/A'),
+            priority=prospect.get('priority', 'MEDIUM'),
+            key_decision_maker=prospect.get('key_decision_maker', 'To be identified'),
+            background=prospect.get('background', DEFAULT_BACKGROUND),
+            needs=''.join(f"- {need}\n" for need in needs),
+            solution_to_offer=prospect.get('solution_to_offer', DEFAULT_SOLUTION)
+        )
+
+    def iter_markdown(self, prospects: Iterable[Dict]) -> Iterator[str]:
+        """Yield the Markdown report one section at a time"""
+        yield self.render_header()
+        for position, prospect in enumerate(prospects, 1):
+            yield self.render_prospect(prospect, position)
+        yield self.render_footer()
+
+    def write_markdown(self, prospects: Iterable[Dict], fh: TextIO) -> int:
+        """Stream the Markdown report to an open file handle"""
+        return self.render(prospects, markdown_file=fh)
+
+    @staticmethod
+    def _csv_row(prospect: Dict, position: int) -> Dict:
+        row = {field: prospect.get(field, '') for field in CSV_FIELDS}
+        row['rank'] = prospect.get('rank', position)
+        row['needs_demands'] = '; '.join(prospect.get('needs_demands', []))
+        return row
+
+    def render(self, prospects: Iterable[Dict], markdown_file: Optional[TextIO] = None,
+               csv_file: Optional[TextIO] = None, pdf_file=None) -> int:
+        """
+        Render every requested output in a single pass over the prospects.
+
+        markdown_file and csv_file are open text handles; pdf_file is a path or
+        binary handle. Returns the number of prospects rendered.
+        """
+        pdf_writer = _PDFSectionWriter(pdf_file) if pdf_file is not None else None
+        csv_writer = None
+        if csv_file is not None:
+            csv_writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+            csv_writer.writeheader()
+
+        sinks: List = []
+        if markdown_file is not None:
+            sinks.append(markdown_file.write)
+        if pdf_writer is not None:
+            sinks.append(pdf_writer.write)
+
+        def emit(section: str):
+            for sink in sinks:
+                sink(section)
+
+        count = 0
+        emit(self.render_header())
+        for position, prospect in enumerate(prospects, 1):
+            if sinks:
+                emit(self.render_prospect(prospect, position))
+            if csv_writer is not None:
+                csv_writer.writerow(self._csv_row(prospect, position))
+            count = position
+        emit(self.render_footer())
+
+        if pdf_writer is not None:
+            pdf_writer.close()
+        return count
+
+    def render_to_files(self, prospects: Iterable[Dict], basename: str,
+                        formats: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Write <basename>.<ext> for each requested format from one pass"""
+        formats = set(DEFAULT_FORMATS if formats is None else formats)
+        # Fail before any output file is created rather than leave empty ones behind
+        if 'pdf' in formats and not HAS_REPORTLAB:
+            raise RuntimeError("PDF output requires the reportlab package")
+        filenames = {fmt: f"{basename}.{fmt}" for fmt in formats}
+
+        markdown_file = open(filenames['md'], 'w', encoding='utf-8') if 'md' in formats else None
+        csv_file = open(filenames['csv'], 'w', encoding='utf-8', newline='') if 'csv' in formats else None
+        try:
+            self.render(prospects, markdown_file=markdown_file, csv_file=csv_file,
+                        pdf_file=filenames.get('pdf'))
+        finally:
+            for fh in (markdown_file, csv_file):
+                if fh is not None:
+                    fh.close()
+
+        return filenames
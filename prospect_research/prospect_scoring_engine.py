@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized Prospect Scoring Engine
+Load prospects into a columnar frame, parse budget/revenue ranges once,
+and re-score the whole prospect base with configurable weights
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+import numpy as np
+import pandas as pd
+
+
+COUNTRY_CODES = {
+    "Germany": "DE", "Austria": "AT", "Switzerland": "CH",
+    "DE": "DE", "AT": "AT", "CH": "CH"
+}
+
+UNIT_MULTIPLIERS = {"": 1.0, "K": 1e3, "M": 1e6, "B": 1e9}
+
+# "€300,000-600,000", "€35-50M", "€2.1B", "$500M AUM"
+_MONEY_RANGE_PATTERN = (
+    r"^\D*(?P<lo>\d[\d,]*(?:\.\d+)?)\s*(?P<lo_unit>[KMB])?"
+    r"(?:\s*-\s*\D*(?P<hi>\d[\d,]*(?:\.\d+)?)\s*(?P<hi_unit>[KMB])?)?"
+)
+_MONEY_RANGE_RE = re.compile(_MONEY_RANGE_PATTERN)
+
+
+def parse_money_range(text: str) -> Tuple[float, float]:
+    """Parse a single money range string into (min, max) euros"""
+    match = _MONEY_RANGE_RE.match(text or "")
+    if not match:
+        return (np.nan, np.nan)
+
+    lo, lo_unit, hi, hi_unit = match.group("lo", "lo_unit", "hi", "hi_unit")
+    # "€35-50M": the trailing unit applies to both ends
+    lo_unit = lo_unit or hi_unit or ""
+    hi_unit = hi_unit or lo_unit
+
+    low = float(lo.replace(",", "")) * UNIT_MULTIPLIERS[lo_unit]
+    high = float(hi.replace(",", "")) * UNIT_MULTIPLIERS[hi_unit] if hi else low
+    return (low, high)
+
+
+def parse_money_ranges(values: pd.Series) -> pd.DataFrame:
+    """Vectorized parse of a column of money range strings into min/max columns"""
+    parts = values.fillna("").astype(str).str.extract(_MONEY_RANGE_PATTERN)
+
+    lo_unit = parts["lo_unit"].fillna(parts["hi_unit"]).fillna("")
+    hi_unit = parts["hi_unit"].fillna(lo_unit)
+
+    low = pd.to_numeric(parts["lo"].str.replace(",", "", regex=False), errors="coerce")
+    low = low * lo_unit.map(UNIT_MULTIPLIERS)
+    high = pd.to_numeric(parts["hi"].str.replace(",", "", regex=False), errors="coerce")
+    high = (high * hi_unit.map(UNIT_MULTIPLIERS)).fillna(low)
+
+    return pd.DataFrame({"min": low.to_numpy(dtype=float), "max": high.to_numpy(dtype=float)},
+                        index=values.index)
+
+
+@dataclass
+class ScoringWeights:
+    """Weighted scoring formula; the defaults reproduce generate_dach_prospects"""
+    industry_base: Dict[str, float] = field(default_factory=lambda: {
+        "Manufacturing": 9.0,
+        "Financial Services": 9.2,
+        "Professional Services": 8.2,
+        "Logistics": 9.0,
+        "Retail": 8.5
+    })
+    default_industry_base: float = 8.5
+    country_multipliers: Dict[str, float] = field(default_factory=lambda: {
+        "DE": 1.0, "CH": 1.1, "AT": 0.95
+    })
+    default_country_multiplier: float = 1.0
+    size_pivot: float = 300.0
+    size_weight: float = 0.2
+    # Blend weights for budget size and any pre-existing automation_score
+    budget_weight: float = 0.0
+    existing_score_weight: float = 0.0
+    max_score: float = 10.0
+
+
+class ProspectScoringEngine:
+    """Columnar prospect store with vectorized scoring and top-k selection"""
+
+    BUDGET_FIELDS = ("estimated_budget", "automation_potential")
+    REVENUE_FIELDS = ("annual_revenue", "estimated_revenue")
+
+    def __init__(self, prospects: Iterable[Dict], weights: Optional[ScoringWeights] = None):
+        self.prospects = list(prospects)
+        self.weights = weights or ScoringWeights()
+        self.frame = self._build_frame(self.prospects)
+
+        # Category codes let weight tables be applied with one array lookup
+        self._industry = pd.Categorical(self.frame["industry"])
+        self._country = pd.Categorical(self.frame["country_code"])
+
+    def _first_present(self, prospect: Dict, fields: Tuple[str, ...]) -> Optional[str]:
+        for name in fields:
+            if prospect.get(name):
+                return prospect[name]
+        return None
+
+    def _build_frame(self, prospects: List[Dict]) -> pd.DataFrame:
+        frame = pd.DataFrame({
+            "company_name": [p.get("company_name") for p in prospects],
+            "country_code": [COUNTRY_CODES.get(p.get("country"), p.get("country")) for p in prospects],
+            "industry": [p.get("industry", "") for p in prospects],
+            "employee_count": pd.to_numeric(
+                pd.Series([p.get("employee_count") for p in prospects], dtype=object),
+                errors="coerce"
+            ),
+            "automation_score": pd.to_numeric(
+                pd.Series([p.get("automation_score") for p in prospects], dtype=object),
+                errors="coerce"
+            ),
+            "budget": [self._first_present(p, self.BUDGET_FIELDS) for p in prospects],
+            "revenue": [self._first_present(p, self.REVENUE_FIELDS) for p in prospects]
+        })
+
+        budget = parse_money_ranges(frame["budget"])
+        revenue = parse_money_ranges(frame["revenue"])
+        frame["budget_min"], frame["budget_max"] = budget["min"], budget["max"]
+        frame["revenue_min"], frame["revenue_max"] = revenue["min"], revenue["max"]
+        return frame.drop(columns=["budget", "revenue"])
+
+    def _lookup(self, categories: pd.Categorical, table: Dict[str, float], default: float) -> np.ndarray:
+        values = np.array([table.get(cat, default) for cat in categories.categories] + [default])
+        # Missing values have code -1, which indexes the trailing default
+        return values[categories.codes]
+
+    def score(self, weights: Optional[ScoringWeights] = None) -> np.ndarray:
+        """Score every prospect in one vectorized pass"""
+        w = weights or self.weights
+
+        base = self._lookup(self._industry, w.industry_base, w.default_industry_base)
+        country = self._lookup(self._country, w.country_multipliers, w.default_country_multiplier)
+
+        employees = self.frame["employee_count"].to_numpy(dtype=float)
+        size = np.minimum(1.0, np.nan_to_num(employees) / w.size_pivot) * w.size_weight + (1.0 - w.size_weight)
+
+        scores = base * country * size
+
+        if w.budget_weight:
+            budget = np.nan_to_num(self.frame["budget_min"].to_numpy(dtype=float))
+            peak = budget.max() if len(budget) else 0.0
+            budget_score = budget / peak * w.max_score if peak else np.zeros_like(budget)
+            scores = (1.0 - w.budget_weight) * scores + w.budget_weight * budget_score
+
+        if w.existing_score_weight:
+            existing = self.frame["automation_score"].to_numpy(dtype=float)
+            existing = np.where(np.isnan(existing), scores, existing)
+            scores = (1.0 - w.existing_score_weight) * scores + w.existing_score_weight * existing
+
+        return np.minimum(np.round(scores, 1), w.max_score)
+
+    @staticmethod
+    def _top_k_from_scores(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.array([], dtype=int)
+
+        # argpartition finds the k-th best score; ties at that boundary are
+        # then taken in input order so results match a stable full sort
+        kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth_score)
+        ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+    def top_k_indices(self, k: int, weights: Optional[ScoringWeights] = None) -> np.ndarray:
+        """Indices of the k best prospects, highest score first"""
+        return self._top_k_from_scores(self.score(weights), k)
+
+    def top_k(self, k: int, weights: Optional[ScoringWeights] = None) -> List[Dict]:
+        """Return the k best prospects with their automation_score updated"""
+        scores = self.score(weights)
+        return [
+            {**self.prospects[i], "automation_score": float(scores[i])}
+            for i in self._top_k_from_scores(scores, k)
+        ]
@@ -8,9 +8,11 @@ Including potential, background, needs/demands, and solutions to offer
 
 import json
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Iterable, Optional
 import os
 
+from prospect_report_renderer import ProspectReportRenderer
+
 class Top100DACHProspectsGenerator:
     """Generate comprehensive top 100 DACH prospects database"""
     
@@ -872,129 +874,17 @@ class Top100DACHProspectsGenerator:
     def generate_pdf_content(self, prospects: List[Dict]) -> str:
         """Generate markdown content for PDF conversion"""
         
-        current_date = datetime.now().strftime("%B %d, %Y")
-        
-        content = f"""# Top 100 DACH Business Automation Prospects
-
-**4UAI Marketplace - Comprehensive Market Intelligence Report**  
-**Date:** {current_date}  
-**Region:** Germany, Austria, Switzerland (DACH)  
-**Total Pipeline Value:** €30,000,000+  
-**Average Automation Score:** 8.4/10  
-
----
-
-## Executive Summary
-
-This comprehensive report presents the top 100 verified business process automation prospects across the DACH region (Germany, Austria, Switzerland). Each prospect has been systematically researched and scored based on automation potential, company size, industry readiness, and strategic value.
-
-### Key Statistics
-- **Total Prospects:** 100 companies
-- **Geographic Distribution:** 
-  - Germany: 55 companies
-  - Austria: 25 companies  
-  - Switzerland: 20 companies
-- **Combined Pipeline Value:** €30,000,000+
-- **Industries Covered:** 15+ sectors
-- **Average Deal Size:** €300,000-500,000
-
-### Automation Opportunity Categories
-- **Tier 1 (Scores 9.0-10.0):** Enterprise automation leaders - 25 prospects
-- **Tier 2 (Scores 8.0-8.9):** High automation potential - 45 prospects  
-- **Tier 3 (Scores 7.0-7.9):** Medium automation readiness - 30 prospects
-
----
-
-## Detailed Prospect Database
-
-"""
-        
-        # Add each prospect
-        for i, prospect in enumerate(prospects, 1):
-            content += f"""
-### #{prospect.get('rank', i)}. {prospect['company_name']}
-
-**Industry:** {prospect.get('industry', 'Not specified')}  
-**Location:** {prospect.get('city', 'Unknown')}, {prospect['country']}  
-**Website:** {prospect.get('website', 'Not available')}  
-**Contact:** {prospect.get('contact_email', 'Not available')}  
-
-**Company Profile:**
-- **Employees:** {prospect.get('employee_count', 'N/A'):,}
-- **Revenue:** {prospect.get('estimated_revenue', 'Not disclosed')}
-- **Automation Potential:** {prospect.get('automation_potential', 'To be assessed')}
-- **Automation Score:** {prospect.get('automation_score', 'N/A')}/10
-- **Priority Level:** {prospect.get('priority', 'MEDIUM')}
-
-**Key Decision Maker:** {prospect.get('key_decision_maker', 'To be identified')}
-
-**Background:**  
-{prospect.get('background', 'Leading company in the DACH region with automation opportunities.')}
-
-**Automation Needs & Demands:**
-"""
-            
-            needs = prospect.get('needs_demands', ['Process automation opportunities', 'Digital transformation initiatives'])
-            for need in needs:
-                content += f"- {need}\n"
-            
-            content += f"""
-**Recommended Solution:**  
-{prospect.get('solution_to_offer', 'Comprehensive automation platform tailored to industry-specific requirements with 25-45% efficiency improvements.')}
-
-**Next Steps:**
-1. Executive outreach to key decision maker
-2. Automation assessment and ROI presentation
-3. Pilot project proposal development
-4. Implementation roadmap creation
-
----
-
-"""
+        return "".join(ProspectReportRenderer().iter_markdown(prospects))
+    
+    def write_report(self, prospects: Iterable[Dict], basename: str,
+                     formats: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Stream Markdown/CSV/PDF reports to disk in a single pass over the prospects;
+        by default every format the installed packages support
+        """
         
-        content += """
-## Market Analysis & Recommendations
-
-### Geographic Opportunities
-- **Germany:** Largest market with strong Industry 4.0 initiatives
-- **Switzerland:** High-value FinTech and pharmaceutical automation
-- **Austria:** Industrial automation and logistics optimization
-
-### Industry Priorities
-1. **Manufacturing & Industry 4.0** (35 prospects)
-2. **Financial Services & FinTech** (20 prospects)  
-3. **Logistics & Supply Chain** (15 prospects)
-4. **Healthcare & Pharmaceuticals** (10 prospects)
-5. **Energy & Utilities** (10 prospects)
-6. **Other Industries** (10 prospects)
+        return ProspectReportRenderer().render_to_files(prospects, basename, formats)
 
-### Strategic Recommendations
-1. **Tier 1 Focus:** Prioritize top 25 prospects with 9.0+ automation scores
-2. **Industry Specialization:** Develop sector-specific automation solutions
-3. **Regional Approach:** Establish local presence in Munich, Frankfurt, Vienna, Zurich
-4. **Partnership Strategy:** Leverage system integrators and technology partners
-
-### Revenue Projections
-- **Year 1:** €8,000,000-12,000,000 (25-30% of pipeline)
-- **Year 2:** €15,000,000-22,000,000 (50-65% penetration)
-- **Year 3:** €25,000,000-35,000,000 (full market development)
-
----
-
-## Contact Information
-
-**4UAI Marketplace Team**  
-**Email:** business@4uai.com  
-**Website:** www.4uai.com  
-
-*This document contains confidential and proprietary information. Distribution is restricted to authorized personnel only.*
-
-**Document Version:** 1.0  
-**Last Updated:** {current_date}  
-**Total Pages:** [Auto-generated]
-"""
-        
-        return content
 
 def main():
     """Generate Top 100 DACH Prospects Database and PDF"""
@@ -1011,14 +901,11 @@ def main():
     
     print(f"✅ Generated {len(all_prospects)} prospects")
     
-    # Generate PDF content
+    # Stream PDF-ready content straight to disk
     print("📄 Creating PDF-ready content...")
-    pdf_content = generator.generate_pdf_content(all_prospects)
-    
-    # Save markdown file
     filename = f"Top_100_DACH_Prospects_{datetime.now().strftime('%Y%m%d')}.md"
     with open(filename, 'w', encoding='utf-8') as f:
-        f.write(pdf_content)
+        ProspectReportRenderer().write_markdown(all_prospects, f)
     
     print(f"✅ PDF content saved to: {filename}")
     